@@ -2,7 +2,6 @@
 
 import json
 import os
-import re
 import socket
 import time
 import urllib.error
@@ -324,20 +323,28 @@ def get_default_runner_version_info(runner_name: str, version: str | None = None
     return get_runner_version_from_cache(runner_name, version) or get_runner_version_from_api(runner_name, version)
 
 
-def get_http_post_response(url: str, payload: bytes) -> Any:
+def get_http_post_response(url: str, payload: bytes, raise_errors: bool = False) -> Any:
+    """Post a JSON payload and return the decoded response, or None if the request failed.
+    With raise_errors, failures raise an HTTPError carrying the status code instead."""
     response = http.Request(url, headers={"Content-Type": "application/json"})
     try:
         response.post(data=payload)
     except http.HTTPError as ex:
+        if raise_errors:
+            raise
         logger.error("Unable to get games from API: %s", ex)
         return None
     if response.status_code != 200:
+        if raise_errors:
+            raise http.HTTPError("API call failed: %s" % response.status_code, code=response.status_code)
         logger.error("API call failed: %s", response.status_code)
         return None
     return response.json
 
 
-def get_game_api_page(game_slugs: Collection[str] | None, page: int | str = 1) -> GamesPageDict:
+def get_game_api_page(
+    game_slugs: Collection[str] | None, page: int | str = 1, raise_errors: bool = False
+) -> GamesPageDict:
     """Read a single page of games from the API and return the response
 
     Args:
@@ -350,10 +357,12 @@ def get_game_api_page(game_slugs: Collection[str] | None, page: int | str = 1) -
     if not game_slugs:
         return {}
     payload = json.dumps({"games": game_slugs, "page": page}).encode("utf-8")
-    return cast(GamesPageDict, get_http_post_response(url, payload))
+    return cast(GamesPageDict, get_http_post_response(url, payload, raise_errors=raise_errors))
 
 
-def get_game_service_api_page(service: str, appids: Collection[str] | None, page: int | str = 1) -> GamesPageDict:
+def get_game_service_api_page(
+    service: str, appids: Collection[str] | None, page: int | str = 1, raise_errors: bool = False
+) -> GamesPageDict:
     """Get matching Lutris games from a list of appids from a given service"""
     url = settings.SITE_URL + "/api/games/service/%s" % service
     if int(page) > 1:
@@ -361,37 +370,43 @@ def get_game_service_api_page(service: str, appids: Collection[str] | None, page
     if not appids:
         return {}
     payload = json.dumps({"appids": appids}).encode("utf-8")
-    return cast(GamesPageDict, get_http_post_response(url, payload))
+    return cast(GamesPageDict, get_http_post_response(url, payload, raise_errors=raise_errors))
 
 
 def get_api_games(
     game_slugs: Collection[str] | None = None, page: int = 1, service: str | None = None
 ) -> list[ApiGameDict]:
-    """Return all games from the Lutris API matching the given game slugs"""
-    if service:
-        response_data = get_game_service_api_page(service, game_slugs)
-    else:
-        response_data = get_game_api_page(game_slugs)
+    """Return all games from the Lutris API matching the given game slugs, from the given
+    page on. Once the first page is fetched, the number of pages is known and the other
+    ones are fetched concurrently."""
 
-    if not response_data:
-        return []
-    results: list[ApiGameDict] = response_data.get("results", [])
-    while response_data.get("next"):
-        page_match = re.search(r"page=(\d+)", response_data["next"])
-        if page_match:
-            next_page = page_match.group(1)
-        else:
-            logger.error("No page found in %s", response_data["next"])
-            break
+    def fetch_page(page: int) -> GamesPageDict:
+        # Errors carry their status code, so that only the transient ones are retried
         if service:
-            response_data = get_game_service_api_page(service, game_slugs, page=next_page)
-        else:
-            response_data = get_game_api_page(game_slugs, page=next_page)
-        if not response_data:
-            logger.warning("Unable to get response for page %s", next_page)
-            break
-        results += cast(list[ApiGameDict], response_data.get("results"))
-    return results
+            return get_game_service_api_page(service, game_slugs, page=page, raise_errors=True)
+        return get_game_api_page(game_slugs, page=page, raise_errors=True)
+
+    def get_page_count(response_data: GamesPageDict) -> int:
+        """Return the number of pages to fetch, counting the first one"""
+        if not response_data.get("next"):
+            return 1
+        page_size = len(response_data.get("results") or [])
+        if not page_size or not response_data.get("count"):
+            logger.error("No page count in response, only the first page is returned")
+            return 1
+        total_pages = -(-response_data["count"] // page_size)
+        return max(total_pages - page + 1, 1)
+
+    def on_page_error(page: int, ex: Exception) -> GamesPageDict:
+        logger.warning("Skipping page %s of games: %s", page, ex)
+        return {}
+
+    try:
+        pages = http.fetch_pages(fetch_page, get_page_count, first_page=page, on_error=on_page_error)
+    except http.HTTPError as ex:
+        logger.error("Unable to get games from API: %s", ex)
+        return []
+    return [game for response_data in pages for game in response_data.get("results") or []]
 
 
 def get_game_installers(game_slug: str, revision: str | None = None) -> list[InstallerDict]:
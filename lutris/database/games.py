@@ -265,3 +265,23 @@ def get_game_count(param: str, value: Any) -> int | None:
     if res:
         return cast(int, res[0]["COUNT(id)"])
     return None
+
+
+def get_library_journal() -> tuple[int, list[DbGameDict]]:
+    """Return the id of the last entry of the library journal, and the games changed since
+    the library was last synced."""
+    with sql.db_cursor(settings.DB_PATH) as cursor:
+        last_entry_id = cursor.execute("select max(id) from library_journal").fetchone()[0] or 0
+    games = sql.db_query(
+        settings.DB_PATH,
+        "select games.* from library_journal join games on games.id = library_journal.game_id "
+        "where library_journal.id <= ?",
+        (last_entry_id,),
+    )
+    return last_entry_id, _stringify_game_ids(games)
+
+
+def clear_library_journal(last_entry_id: int) -> None:
+    """Remove the entries of the library journal up to 'last_entry_id', once they are synced."""
+    with sql.db_cursor(settings.DB_PATH) as cursor:
+        sql.cursor_execute(cursor, "delete from library_journal where id <= ?", (last_entry_id,))
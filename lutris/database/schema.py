@@ -49,6 +49,7 @@ DATABASE: dict[str, DBSchema] = {
         {"name": "url", "type": "TEXT"},
         {"name": "details", "type": "TEXT"},
         {"name": "lutris_slug", "type": "TEXT"},
+        {"name": "content_hash", "type": "TEXT"},
     ],
     "sources": [
         {"name": "id", "type": "INTEGER", "indexed": True},
@@ -67,6 +68,31 @@ DATABASE: dict[str, DBSchema] = {
         {"name": "name", "type": "TEXT", "unique": True},
         {"name": "search", "type": "TEXT", "unique": False},
     ],
+    # Games changed since the library was last synced with lutris.net; replacing the entry of a
+    # game gives it a new id, so the ids tell which changes were made after a sync started.
+    # The ids of deleted entries must never be given again, hence AUTOINCREMENT.
+    "library_journal": [
+        {"name": "id", "type": "INTEGER", "indexed": True, "autoincrement": True},
+        {"name": "game_id", "type": "INTEGER", "unique": True},
+    ],
+}
+
+JOURNAL_GAME = "INSERT OR REPLACE INTO library_journal (game_id) VALUES (%s)"
+JOURNAL_FIELDS = ("name", "slug", "runner", "platform", "playtime", "lastplayed", "service", "service_id")
+
+# Triggers filling the library journal, so any change to the games is seen by the sync
+TRIGGERS: dict[str, str] = {
+    "library_journal_game_added": "AFTER INSERT ON games BEGIN %s; END" % (JOURNAL_GAME % "NEW.id"),
+    "library_journal_game_updated": "AFTER UPDATE OF %s ON games WHEN %s BEGIN %s; END"
+    % (
+        ", ".join(JOURNAL_FIELDS),
+        " OR ".join("OLD.%s IS NOT NEW.%s" % (field, field) for field in JOURNAL_FIELDS),
+        JOURNAL_GAME % "NEW.id",
+    ),
+    "library_journal_game_deleted": "AFTER DELETE ON games BEGIN DELETE FROM library_journal WHERE game_id=OLD.id; END",
+    "library_journal_category_added": "AFTER INSERT ON games_categories BEGIN %s; END" % (JOURNAL_GAME % "NEW.game_id"),
+    "library_journal_category_removed": "AFTER DELETE ON games_categories BEGIN %s; END"
+    % (JOURNAL_GAME % "OLD.game_id"),
 }
 
 
@@ -95,11 +121,19 @@ def get_schema(tablename: str) -> DBSchema:
     return tables
 
 
-def field_to_string(name: str = "", type: str = "", indexed: bool = False, unique: bool = False) -> str:  # pylint: disable=redefined-builtin
+def field_to_string(
+    name: str = "",
+    type: str = "",  # pylint: disable=redefined-builtin
+    indexed: bool = False,
+    unique: bool = False,
+    autoincrement: bool = False,
+) -> str:
     """Converts a python based table definition to it's SQL statement"""
     field_query = "%s %s" % (name, type)
     if indexed:
         field_query += " PRIMARY KEY"
+        if autoincrement:
+            field_query += " AUTOINCREMENT"
     if unique:
         field_query += " UNIQUE"
     return field_query
@@ -144,5 +178,12 @@ def migrate(table: str, schema: DBSchema) -> list[str]:
 def syncdb() -> None:
     """Update the database to the current version, making necessary changes
     for backwards compatibility."""
+    is_journal_new = not get_schema("library_journal")
     for table_name, table_data in DATABASE.items():
         migrate(table_name, table_data)
+    with sql.db_cursor(settings.DB_PATH) as cursor:
+        for trigger_name, trigger in TRIGGERS.items():
+            cursor.execute("CREATE TRIGGER IF NOT EXISTS %s %s" % (trigger_name, trigger))
+        if is_journal_new:
+            # Changes made before the journal existed are unknown, so the next sync sends every game
+            cursor.execute("INSERT OR IGNORE INTO library_journal (game_id) SELECT id FROM games")
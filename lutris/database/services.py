@@ -1,5 +1,10 @@
-from collections.abc import Sequence
-from typing import TypeAlias
+import hashlib
+import json
+import sqlite3
+import threading
+from collections.abc import Iterable, Iterator, Sequence
+from contextlib import contextmanager
+from typing import Any, TypeAlias
 
 from lutris import settings
 from lutris.database import sql
@@ -9,6 +14,10 @@ DBServiceGame: TypeAlias = dict[str, str | int]
 
 
 class ServiceGameCollection:
+    # Updates of the services being loaded, by service
+    _updates: dict[str, "ServiceGameUpdate"] = {}
+    _updates_lock = threading.Lock()
+
     @classmethod
     def get_service_games(
         cls,
@@ -25,6 +34,7 @@ class ServiceGameCollection:
     def get_for_service(cls, service: str) -> list[DBServiceGame]:
         if not service:
             raise ValueError("No service provided")
+        cls._flush_update(service)
         return sql.filtered_query(settings.DB_PATH, "service_games", filters={"service": service})
 
     @classmethod
@@ -34,6 +44,7 @@ class ServiceGameCollection:
             raise ValueError("No service provided")
         if not appid:
             raise ValueError("No appid provided")
+        cls._flush_update(service)
         results: list[DBServiceGame] = sql.filtered_query(
             settings.DB_PATH, "service_games", filters={"service": service, "appid": appid}
         )
@@ -42,3 +53,157 @@ class ServiceGameCollection:
         if len(results) > 1:
             logger.warning("More than one game found for %s on %s", appid, service)
         return results[0]
+
+    @classmethod
+    def save_game(cls, game_data: DBServiceGame) -> None:
+        """Save a game to the database, or to the update of its service if it is being loaded"""
+        update = cls._updates.get(str(game_data["service"]))
+        if update:
+            update.add(game_data)
+            return
+        game_data = dict(game_data, content_hash=get_content_hash(game_data))
+        existing_game = cls.get_game(str(game_data["service"]), str(game_data["appid"]))
+        if existing_game:
+            sql.db_update(settings.DB_PATH, "service_games", game_data, {"id": existing_game["id"]})
+        else:
+            sql.db_insert(settings.DB_PATH, "service_games", game_data)
+
+    @classmethod
+    @contextmanager
+    def update_service_games(cls, service: str) -> Iterator["ServiceGameUpdate"]:
+        """Collect the games of a service saved within the block in an update, rather than
+        writing them one by one. The update is only written when applied; if the block
+        raises, the games of the service are left as they were."""
+        update = ServiceGameUpdate(service)
+        with cls._updates_lock:
+            if service in cls._updates:
+                raise RuntimeError("The games of %s are already being updated" % service)
+            cls._updates[service] = update
+        try:
+            yield update
+        finally:
+            with cls._updates_lock:
+                del cls._updates[service]
+
+    @classmethod
+    def _flush_update(cls, service: str) -> None:
+        """Write the games pending in the update of a service, so that a service
+        reading back its games while it loads finds those it saved"""
+        update = cls._updates.get(service)
+        if update:
+            update.flush()
+
+
+def get_content_hash(game_data: DBServiceGame) -> str:
+    """Return a hash of the content of a service game, used to tell whether it changed"""
+    content = json.dumps(
+        {key: game_data[key] for key in game_data if key != "content_hash"}, sort_keys=True, default=str
+    )
+    return hashlib.sha1(content.encode("utf-8")).hexdigest()
+
+
+class ServiceGameChanges:
+    """The appids of the games of a service added, updated and removed by an update"""
+
+    def __init__(self, service: str) -> None:
+        self.service = service
+        self.added: set[str] = set()
+        self.updated: set[str] = set()
+        self.removed: set[str] = set()
+
+    def __bool__(self) -> bool:
+        return bool(self.added or self.updated or self.removed)
+
+    def __str__(self) -> str:
+        return "%d added, %d updated, %d removed" % (len(self.added), len(self.updated), len(self.removed))
+
+
+class ServiceGameUpdate:
+    """The games of a service saved while it loads, to be compared with those in the
+    database by appid and content hash. Only the games that are new or changed get
+    written, and those the service no longer has get deleted, in a single transaction."""
+
+    def __init__(self, service: str) -> None:
+        self.service = service
+        self.changes = ServiceGameChanges(service)
+        self._pending: dict[str, DBServiceGame] = {}
+        self._saved_appids: set[str] = set()
+        self._lock = threading.Lock()
+
+    def add(self, game_data: DBServiceGame) -> None:
+        with self._lock:
+            self._pending[str(game_data["appid"])] = game_data
+
+    def flush(self) -> ServiceGameChanges:
+        """Write the new and changed games saved so far"""
+        return self._write(prune=False)
+
+    def apply(self) -> ServiceGameChanges:
+        """Write the new and changed games and delete those that weren't saved,
+        returning all the changes made by the update"""
+        return self._write(prune=True)
+
+    def _write(self, prune: bool) -> ServiceGameChanges:
+        with self._lock:
+            pending, self._pending = self._pending, {}
+            self._saved_appids.update(pending)
+            if not pending and not prune:
+                return self.changes
+            with sql.db_cursor(settings.DB_PATH) as cursor:
+                existing_games = {}
+                duplicate_ids = []
+                rows = sql.cursor_execute(
+                    cursor, "select id, appid, content_hash from service_games where service=?", (self.service,)
+                )
+                for game_id, appid, content_hash in rows.fetchall():
+                    if str(appid) in existing_games:
+                        duplicate_ids.append(game_id)
+                    else:
+                        existing_games[str(appid)] = (game_id, content_hash)
+
+                inserts = []
+                updates = []
+                for appid, game_data in pending.items():
+                    game_data = dict(game_data, content_hash=get_content_hash(game_data))
+                    if appid not in existing_games:
+                        inserts.append(game_data)
+                        self.changes.added.add(appid)
+                    elif existing_games[appid][1] != game_data["content_hash"]:
+                        updates.append((existing_games[appid][0], game_data))
+                        if appid not in self.changes.added:
+                            self.changes.updated.add(appid)
+                self._insert_games(cursor, inserts)
+                self._update_games(cursor, updates)
+
+                if prune:
+                    removed_ids = duplicate_ids
+                    for appid, (game_id, _content_hash) in existing_games.items():
+                        if appid not in self._saved_appids:
+                            removed_ids.append(game_id)
+                            self.changes.removed.add(appid)
+                    cursor.executemany("delete from service_games where id=?", [(game_id,) for game_id in removed_ids])
+        return self.changes
+
+    @staticmethod
+    def _insert_games(cursor: sqlite3.Cursor, games: list[DBServiceGame]) -> None:
+        for fields, rows in _group_by_fields((game_data, ()) for game_data in games).items():
+            query = "insert into service_games(%s) values (%s)" % (", ".join(fields), ", ".join("?" * len(fields)))
+            cursor.executemany(query, rows)
+
+    @staticmethod
+    def _update_games(cursor: sqlite3.Cursor, games: list[tuple[int, DBServiceGame]]) -> None:
+        for fields, rows in _group_by_fields((game_data, (game_id,)) for game_id, game_data in games).items():
+            query = "update service_games set %s where id=?" % ", ".join("%s=?" % field for field in fields)
+            cursor.executemany(query, rows)
+
+
+def _group_by_fields(
+    games: Iterable[tuple[DBServiceGame, tuple[Any, ...]]],
+) -> dict[tuple[str, ...], list[tuple[Any, ...]]]:
+    """Group the values of games by the fields they have, for executemany(); the
+    extra values given with each game are appended to its values"""
+    rows_by_fields: dict[tuple[str, ...], list[tuple[Any, ...]]] = {}
+    for game_data, extra_values in games:
+        fields = tuple(sorted(game_data))
+        rows_by_fields.setdefault(fields, []).append(tuple(game_data[field] for field in fields) + extra_values)
+    return rows_by_fields
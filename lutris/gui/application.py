@@ -46,13 +46,14 @@ from lutris.installer import InstallationKind, get_installers
 from lutris.migrations import migrate
 from lutris.monitored_command import exec_command
 from lutris.runners import InvalidRunnerError, RunnerInstallationError, get_runner_names, import_runner
+from lutris.scanners.tosec import import_tosec_dats
 from lutris.services import get_enabled_services
 from lutris.startup import init_lutris, run_all_checks
 from lutris.style_manager import StyleManager
 from lutris.util import datapath, log, resources, system
 from lutris.util.http import HTTPError, Request
 from lutris.util.log import file_handler, logger
-from lutris.util.savesync import save_check, show_save_stats, upload_save
+from lutris.util.savesync import download_save, save_check, show_save_stats, upload_save
 from lutris.util.steam.appmanifest import AppManifest, get_appmanifests
 from lutris.util.steam.config import get_steamapps_dirs
 
@@ -276,6 +277,14 @@ class LutrisApplication(Gtk.Application):
             _("Import a game"),
             None,
         )
+        self.add_main_option(
+            "import-tosec-dat",
+            0,
+            GLib.OptionFlags.NONE,
+            GLib.OptionArg.STRING,
+            _("Import a TOSEC DAT file, or a folder of them, to identify ROMs offline"),
+            None,
+        )
         if LUTRIS_EXPERIMENTAL_FEATURES_ENABLED:
             self.add_main_option(
                 "save-stats",
@@ -293,6 +302,14 @@ class LutrisApplication(Gtk.Application):
                 _("Upload saves"),
                 None,
             )
+            self.add_main_option(
+                "save-download",
+                0,
+                GLib.OptionFlags.NONE,
+                GLib.OptionArg.STRING,
+                _("Restore the latest uploaded saves"),
+                None,
+            )
             self.add_main_option(
                 "save-check",
                 0,
@@ -601,6 +618,15 @@ class LutrisApplication(Gtk.Application):
                 import_game(filepath, dest_dir)
             return 0
 
+        if option := options.lookup_value("import-tosec-dat"):
+            dat_path = option.get_string()
+            if not os.path.exists(dat_path):
+                self._print(command_line, _("No such file: %s") % dat_path)
+                return 1
+            game_count = import_tosec_dats(dat_path)
+            self._print(command_line, _("%d TOSEC games imported") % game_count)
+            return 0
+
         if LUTRIS_EXPERIMENTAL_FEATURES_ENABLED:
 
             def get_game_match(slug: str) -> Game | None:
@@ -630,6 +656,11 @@ class LutrisApplication(Gtk.Application):
                 if game:
                     upload_save(game)
                 return 0
+            if option := options.lookup_value("save-download"):
+                game = get_game_match(option.get_string())
+                if game:
+                    download_save(game)
+                return 0
             if option := options.lookup_value("save-check"):
                 game = get_game_match(option.get_string())
                 if game:
@@ -9,7 +9,7 @@ from lutris.gui.config.updates_box import UpdateButtonBox
 from lutris.gui.dialogs import ClientLoginDialog, QuestionDialog
 from lutris.gui.widgets import EMPTY_NOTIFICATION_REGISTRATION
 from lutris.services.lutris import sync_media
-from lutris.util.jobs import AsyncCall
+from lutris.util.jobs import AsyncCall, Priority
 from lutris.util.library_sync import (
     LOCAL_LIBRARY_SYNCED,
     LOCAL_LIBRARY_SYNCING,
@@ -174,14 +174,14 @@ class AccountsBox(BaseConfigBox):
         self.rebuild_lutris_options()
 
     def on_sync_again_clicked(self, _button):
-        AsyncCall(LibrarySyncer().sync_local_library, None, force=True)
+        AsyncCall(LibrarySyncer().sync_local_library, None, force=True, priority=Priority.BACKGROUND)
 
     def on_local_library_syncing(self):
         self.sync_box.show_running_markup(_("<i>Syncing library...</i>"))
 
     def on_local_library_synced(self):
         self.sync_box.show_completion_markup(self.get_sync_box_label(), "")
-        AsyncCall(sync_media, None)
+        AsyncCall(sync_media, None, priority=Priority.BACKGROUND)
 
     def get_sync_box_label(self):
         synced_at = settings.read_setting("last_library_sync_at")
@@ -203,7 +203,7 @@ class AccountsBox(BaseConfigBox):
                 }
             )
             if sync_warn_dialog.result == Gtk.ResponseType.YES:
-                AsyncCall(LibrarySyncer().sync_local_library, None)
+                AsyncCall(LibrarySyncer().sync_local_library, None, priority=Priority.BACKGROUND)
             else:
                 return
 
@@ -8,7 +8,7 @@ from lutris.gui.config.base_config_box import BaseConfigBox
 from lutris.gui.dialogs import NoticeDialog
 from lutris.runtime import RuntimeUpdater
 from lutris.services.lutris import sync_media
-from lutris.util.jobs import AsyncCall
+from lutris.util.jobs import AsyncCall, Priority
 from lutris.util.log import logger
 from lutris.util.strings import gtk_safe
 
@@ -54,7 +54,7 @@ class UpdatesBox(BaseConfigBox):
 
     def on_download_media_clicked(self, _widget):
         self.update_media_box.show_running_markup(_("<i>Checking for missing media...</i>"))
-        AsyncCall(sync_media, self.on_media_updated)
+        AsyncCall(sync_media, self.on_media_updated, priority=Priority.BACKGROUND)
 
     def on_media_updated(self, result, error):
         if error:
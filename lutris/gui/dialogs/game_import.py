@@ -9,7 +9,7 @@ from lutris.database.games import add_game
 from lutris.game import GAME_INSTALLED, GAME_UPDATED, Game
 from lutris.gui.dialogs import ModelessDialog
 from lutris.scanners.default_installers import DEFAULT_INSTALLERS
-from lutris.scanners.tosec import clean_rom_name, guess_platform, search_tosec_by_md5
+from lutris.scanners.tosec import clean_rom_name, guess_platform, search_tosec_by_md5s
 from lutris.services.lutris import download_lutris_media
 from lutris.util.jobs import AsyncCall
 from lutris.util.log import logger
@@ -120,44 +120,50 @@ class ImportGameDialog(ModelessDialog):
 
             return None
 
-        def search_single(filepath):
-            existing_game = get_existing_game(filepath)
-            if existing_game:
-                # Found a game to launch instead of installing, but we can't safely
-                # do this on this thread, so we return the game and handle it later.
-                return [{"name": existing_game.name, "game": existing_game, "roms": []}]
+        def get_checksum(filepath):
             show_progress(filepath, _("Calculating checksum..."))
             if filepath.lower().endswith(".zip"):
-                md5 = get_md5_in_zip(filepath)
-            else:
-                md5 = get_md5_hash(filepath)
-
-            if self.search_stopping:
-                return None
-
-            show_progress(filename, _("Looking up checksum on Lutris.net..."))
-            result = search_tosec_by_md5(md5)
-            if not result:
-                raise RuntimeError(_("This ROM could not be identified."))
-            return result
+                return get_md5_in_zip(filepath)
+            return get_md5_hash(filepath)
 
         results = OrderedDict()  # must preserve order, on any Python version
+        checksums = {}
         for filename in self.files:
             if self.search_stopping:
                 break
 
             try:
                 show_progress(filename, _("Looking for installed game..."))
-                result = search_single(filename)
+                existing_game = get_existing_game(filename)
+                if existing_game:
+                    # Found a game to launch instead of installing, but we can't safely
+                    # do this on this thread, so we return the game and handle it later.
+                    results[filename] = [{"name": existing_game.name, "game": existing_game, "roms": []}]
+                else:
+                    checksums[filename] = get_checksum(filename)
+                    results[filename] = None
             except Exception as error:
-                result = [{"error": error, "roms": []}]
+                results[filename] = [{"error": error, "roms": []}]
             finally:
                 show_progress(filename, "")
 
-            if result:
-                results[filename] = result
+        if checksums and not self.search_stopping:
+            # All the checksums are looked up at once, in the local TOSEC index then on Lutris.net
+            for filename in checksums:
+                show_progress(filename, _("Looking up checksum on Lutris.net..."))
+            try:
+                matches = search_tosec_by_md5s(checksums.values())
+            except Exception as error:
+                matches = {}
+                logger.error("Failed to look up checksums: %s", error)
+            for filename, md5 in checksums.items():
+                show_progress(filename, "")
+                if matches.get(md5):
+                    results[filename] = matches[md5]
+                else:
+                    results[filename] = [{"error": RuntimeError(_("This ROM could not be identified.")), "roms": []}]
 
-        return results
+        return OrderedDict((filename, result) for filename, result in results.items() if result)
 
     def search_result_finished(self, results, error):
         self.search_call = None
@@ -13,7 +13,7 @@ from lutris.gui.dialogs import QuestionDialog
 from lutris.gui.widgets.gi_composites import GtkTemplate
 from lutris.gui.widgets.utils import get_required_main_window, get_widget_children
 from lutris.util import datapath
-from lutris.util.jobs import AsyncCall
+from lutris.util.jobs import AsyncCall, Priority
 from lutris.util.library_sync import LibrarySyncer
 from lutris.util.log import logger
 from lutris.util.path_cache import remove_from_path_cache
@@ -308,7 +308,7 @@ class UninstallDialog(Gtk.Dialog):
                 library_syncer.sync_local_library()
                 library_syncer.delete_from_remote_library(games_removed_from_library)
 
-            AsyncCall(sync_local_library, None)
+            AsyncCall(sync_local_library, None, priority=Priority.BACKGROUND)
 
         get_required_main_window().on_game_removed()
         self.destroy()
@@ -9,7 +9,7 @@ from lutris.gui.widgets import NotificationSource
 from lutris.gui.widgets.gi_composites import GtkTemplate
 from lutris.gui.widgets.progress_box import ProgressBox
 from lutris.util import datapath
-from lutris.util.jobs import AsyncCall
+from lutris.util.jobs import AsyncCall, Priority
 from lutris.util.log import logger
 
 DOWNLOAD_QUEUE_COMPLETED = NotificationSource()
@@ -196,5 +196,5 @@ class DownloadQueue(Gtk.ScrolledWindow):
                 completion_function(result)
             DOWNLOAD_QUEUE_COMPLETED.fire()
 
-        AsyncCall(operation, completion_callback)
+        AsyncCall(operation, completion_callback, priority=Priority.BULK_IO)
         return True
@@ -6,6 +6,7 @@ import os
 from collections import namedtuple
 from collections.abc import Callable, Iterable
 from datetime import datetime
+from functools import lru_cache
 from gettext import gettext as _
 from gettext import ngettext
 from typing import cast
@@ -44,6 +45,8 @@ from lutris.gui.dialogs.delegates import DialogInstallUIDelegate, DialogLaunchUI
 from lutris.gui.dialogs.game_import import ImportGameDialog
 from lutris.gui.download_queue import DownloadQueue
 from lutris.gui.views import (
+    COL_ID,
+    COL_INSTALLED,
     COL_INSTALLED_AT,
     COL_INSTALLED_AT_TEXT,
     COL_LASTPLAYED,
@@ -56,7 +59,7 @@ from lutris.gui.views import (
 )
 from lutris.gui.views.grid import GameGridView
 from lutris.gui.views.list import GameListView
-from lutris.gui.views.store import GameStore
+from lutris.gui.views.store import MAX_IN_PLACE_STORE_CHANGES, GameStore
 from lutris.gui.widgets.game_bar import GameBar
 from lutris.gui.widgets.gi_composites import GtkTemplate
 from lutris.gui.widgets.progress_box import ProgressBox, ProgressInfo
@@ -66,12 +69,18 @@ from lutris.gui.widgets.utils import load_icon_theme, open_uri
 from lutris.runtime import ComponentUpdater, RuntimeUpdater
 from lutris.search import GameSearch
 from lutris.search_predicate import NotPredicate
-from lutris.services.base import SERVICE_GAMES_LOADED, SERVICE_LOGIN, SERVICE_LOGOUT
+from lutris.services.base import (
+    SERVICE_GAMES_CHANGED,
+    SERVICE_GAMES_LOADED,
+    SERVICE_LOGIN,
+    SERVICE_LOGOUT,
+    reload_services,
+)
 from lutris.services.lutris import LutrisService, sync_media
 from lutris.style_manager import THEME_CHANGED
 from lutris.util import datapath
 from lutris.util.busy import BUSY_STARTED, BUSY_STOPPED
-from lutris.util.jobs import COMPLETED_IDLE_TASK, AsyncCall, schedule_at_idle
+from lutris.util.jobs import COMPLETED_IDLE_TASK, AsyncCall, Priority, schedule_at_idle
 from lutris.util.library_sync import LOCAL_LIBRARY_UPDATED, LibrarySyncer
 from lutris.util.linux import LINUX_SYSTEM
 from lutris.util.log import logger
@@ -81,6 +90,16 @@ from lutris.util.system import update_desktop_icons
 from lutris.util.wine.wine import clear_wine_version_cache
 
 
+@lru_cache(maxsize=4096)
+def parse_year(value: str) -> int:
+    """Returns the year of a year or YYYY-MM-DD date string; raises ValueError
+    if it is neither. Games share few distinct years, so these are cached."""
+    try:
+        return int(value)
+    except ValueError:
+        return datetime.strptime(value, "%Y-%m-%d").year
+
+
 @GtkTemplate(ui=os.path.join(datapath.get(), "ui", "lutris-window.ui"))
 class LutrisWindow(Gtk.ApplicationWindow, DialogLaunchUIDelegate, DialogInstallUIDelegate):  # type:ignore[misc]
     """Handler class for main window signals."""
@@ -137,6 +156,8 @@ class LutrisWindow(Gtk.ApplicationWindow, DialogLaunchUIDelegate, DialogInstallU
         self.icon_type = self.load_icon_type()
         self.game_store = GameStore(self.service, self.service_media)
         self._game_store_generation = 0
+        # Services whose last changes were applied to the store, which needn't be rebuilt once they're loaded
+        self._applied_service_changes = set()
         self.current_view = Gtk.Box()
         self.views = {}
         self._is_busy = False
@@ -211,6 +232,7 @@ class LutrisWindow(Gtk.ApplicationWindow, DialogLaunchUIDelegate, DialogInstallU
         BUSY_STOPPED.register(self.on_busy_stopped)
         SERVICE_LOGIN.register(self.on_service_login)
         SERVICE_LOGOUT.register(self.on_service_logout)
+        SERVICE_GAMES_CHANGED.register(self.on_service_games_changed)
         SERVICE_GAMES_LOADED.register(self.on_service_games_loaded)
         CATEGORIES_UPDATED.register(self.on_categories_updated)
         SAVED_SEARCHES_UPDATED.register(self.on_categories_updated)
@@ -310,6 +332,7 @@ class LutrisWindow(Gtk.ApplicationWindow, DialogLaunchUIDelegate, DialogInstallU
             "open-discord": Action(lambda *x: open_uri("https://discord.gg/Pnt5CuY")),
             "donate": Action(lambda *x: open_uri("https://lutris.net/donate")),
             "kill-wine": Action(self.on_kill_wine),
+            "reload-services": Action(self.on_reload_services),
         }
 
         self.actions = {}
@@ -345,10 +368,15 @@ class LutrisWindow(Gtk.ApplicationWindow, DialogLaunchUIDelegate, DialogInstallU
         def on_library_synced(_result, error):
             """Sync media after the library is loaded"""
             if not error:
-                AsyncCall(sync_media, None)
+                AsyncCall(sync_media, None, priority=Priority.BACKGROUND)
 
         if settings.read_bool_setting("library_sync_enabled", True):
-            AsyncCall(LibrarySyncer().sync_local_library, on_library_synced if force else None, force=force)
+            AsyncCall(
+                LibrarySyncer().sync_local_library,
+                on_library_synced if force else None,
+                force=force,
+                priority=Priority.BACKGROUND,
+            )
 
     def update_action_state(self):
         """This invokes the functions to update the enabled states of all the actions
@@ -516,7 +544,8 @@ class LutrisWindow(Gtk.ApplicationWindow, DialogLaunchUIDelegate, DialogInstallU
             """Returns the default value to use when the value is missing; we may be able
             to extract this from the item.."""
             if view_sorting == "year" and service:
-                service_year = service.get_game_release_date(item)
+                # Service games come with the year already read from their details
+                service_year = item["year"] if "year" in item else service.get_game_release_date(item)
                 service_year = convert_value(service_year)
                 if service_year:
                     return service_year
@@ -537,12 +566,9 @@ class LutrisWindow(Gtk.ApplicationWindow, DialogLaunchUIDelegate, DialogInstallU
                     # Years can take many forms! We'll try to convert as best we can.
                     if isinstance(value, datetime):
                         return int(value.year)
-                    else:
-                        try:
-                            return int(value)
-                        except ValueError:
-                            as_date = datetime.strptime(str(value), "%Y-%m-%d")
-                            return int(as_date.year)
+                    if isinstance(value, str):
+                        return parse_year(value)
+                    return int(value)
                 else:
                     return float(value)
             except ValueError:
@@ -682,9 +708,14 @@ class LutrisWindow(Gtk.ApplicationWindow, DialogLaunchUIDelegate, DialogInstallU
             service_game["year"] = service_game["year"] if "year" in service_game else lutris_game["year"]
         return service_game
 
-    def get_service_games(self, service_id):
-        """Return games for the service indicated."""
-        service_games = ServiceGameCollection.get_for_service(service_id)
+    def get_service_games(self, service_id, appids=None):
+        """Return games for the service indicated, or only those with these appids."""
+        if appids is None:
+            service_games = ServiceGameCollection.get_for_service(service_id)
+        else:
+            service_games = ServiceGameCollection.get_service_games(
+                filters={"service": service_id, "appid": list(appids)}
+            )
         for game in service_games:
             game["year"] = self.service.get_game_release_year(game)
 
@@ -837,10 +868,24 @@ class LutrisWindow(Gtk.ApplicationWindow, DialogLaunchUIDelegate, DialogInstallU
         self._game_store_generation += 1
         generation = self._game_store_generation
 
+        # The current store is updated in place if it shows the same kind of games and
+        # only a few rows change; otherwise a new one is built.
+        current_store = self.game_store
+        current_values = None
+        if current_store and current_store.service is service and current_store.service_media is service_media:
+            current_values = current_store.get_values()
+
         def make_game_store(games):
+            rows = current_store.get_rows(games, service_id) if current_values is not None else None
+            change_count = GameStore.count_changes(current_values, rows) if rows is not None else None
+            if change_count is not None and change_count <= MAX_IN_PLACE_STORE_CHANGES:
+                return games, current_store, rows
             game_store = GameStore(service, service_media)
-            game_store.add_preloaded_games(games, service_id)
-            return games, game_store
+            if rows is None:
+                rows = game_store.get_rows(games, service_id)
+            for row in rows:
+                game_store.add_row(row)
+            return games, game_store, None
 
         def on_games_ready(games, error):
             if generation != self._game_store_generation:
@@ -864,7 +909,21 @@ class LutrisWindow(Gtk.ApplicationWindow, DialogLaunchUIDelegate, DialogInstallU
             if error:
                 raise error  # bounce any error against the backstop
 
-            games, game_store = result
+            games, game_store, rows = result
+            if rows is not None:
+                if self.game_store is game_store and game_store.get_values() is not None:
+                    added_count, removed_count, updated_count = game_store.apply_rows(rows)
+                    logger.debug(
+                        "Game store updated: %d added, %d removed, %d updated",
+                        added_count,
+                        removed_count,
+                        updated_count,
+                    )
+                else:
+                    # The store changed while the rows were prepared; build a new one from them
+                    game_store = GameStore(service, service_media)
+                    for row in rows:
+                        game_store.add_row(row)
 
             placeholder_text = self._get_search_placeholder_text(games)
             self.search_entry.set_placeholder_text(placeholder_text)
@@ -1153,8 +1212,77 @@ class LutrisWindow(Gtk.ApplicationWindow, DialogLaunchUIDelegate, DialogInstallU
                 client_version = runtime_versions.get("client_version")
                 settings.write_setting("ignored_supported_lutris_version", client_version or "")
 
+    def on_service_games_changed(self, service, changes):
+        """Apply the games a service added, updated and removed to the store, when it
+        shows the games of that service, rather than building it again"""
+        game_store = self.game_store
+        if self.filters.get("service") != service.id or game_store.service is not self.service:
+            return
+        current_values = game_store.get_values()
+        if current_values is None:
+            return  # the store can't be updated in place; it is rebuilt once the service is loaded
+        self._applied_service_changes.add(service.id)
+        generation = self._game_store_generation
+
+        def get_rows():
+            changed_appids = changes.added | changes.updated
+            games = self.get_service_games(service.id, changed_appids) if changed_appids else []
+            changed_rows = {row[COL_ID]: row for row in game_store.get_rows(games, service.id)}
+            rows = [
+                row
+                for game_id, row in current_values.items()
+                if game_id not in changes.removed and game_id not in changed_appids
+            ]
+            rows.extend(changed_rows.values())
+            sort_items = self.apply_view_sort([self._get_row_sort_fields(row) for row in rows])
+            return [item["row"] for item in sort_items]
+
+        def apply_rows(rows, error):
+            if generation != self._game_store_generation or self.game_store is not game_store:
+                return  # the store was replaced in the meantime
+
+            if error:
+                raise error  # bounce any error against the backstop
+
+            if game_store.get_values() is None:
+                self.update_store()
+                return
+            added_count, removed_count, updated_count = game_store.apply_rows(rows)
+            logger.debug(
+                "%s games applied to the store: %d added, %d removed, %d updated",
+                service.name,
+                added_count,
+                removed_count,
+                updated_count,
+            )
+            self.search_entry.set_placeholder_text(self._get_search_placeholder_text(rows))
+            if rows:
+                self.hide_overlay()
+            else:
+                self.show_empty_label()
+
+        AsyncCall(get_rows, apply_rows)
+
+    @staticmethod
+    def _get_row_sort_fields(row):
+        """Return the fields apply_view_sort() sorts on, for a row of the game store"""
+        return {
+            "row": row,
+            "name": row[COL_NAME],
+            "sortname": row[COL_SORTNAME],
+            "year": row[COL_YEAR],
+            "lastplayed": row[COL_LASTPLAYED],
+            "installed_at": row[COL_INSTALLED_AT],
+            "playtime": row[COL_PLAYTIME],
+            "installed": row[COL_INSTALLED],
+        }
+
     def on_service_games_loaded(self, service):
-        """Request a view update when service games are loaded"""
+        """Request a view update when service games are loaded, unless their
+        changes were already applied to the store"""
+        if service.id in self._applied_service_changes:
+            self._applied_service_changes.discard(service.id)
+            return
         self.update_store()
 
     def on_categories_updated(self):
@@ -1183,6 +1311,19 @@ class LutrisWindow(Gtk.ApplicationWindow, DialogLaunchUIDelegate, DialogInstallU
         service.start_reload(self._service_reloaded_cb)
         return True
 
+    def on_reload_services(self, *_args):
+        """Reload the games of all enabled services, the online ones only if logged in"""
+        enabled_services = [service_class() for service_class in services.get_enabled_services().values()]
+        reload_services(
+            [service for service in enabled_services if not service.online or service.is_authenticated()],
+            self._services_reloaded_cb,
+            refresh=True,
+        )
+
+    def _services_reloaded_cb(self, errors):
+        for error in errors.values():
+            dialogs.display_error(error, parent=self)
+
     def _service_reloaded_cb(self, error):
         if error:
             dialogs.display_error(error, parent=self)
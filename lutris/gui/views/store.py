@@ -33,6 +33,10 @@ from . import (
     COL_YEAR,
 )
 
+# Above this many rows added, removed or updated, it is cheaper for the views to get a new
+# store than to follow the changes of the one they show row by row
+MAX_IN_PLACE_STORE_CHANGES = 512
+
 
 def try_lower(value):
     try:
@@ -77,6 +81,7 @@ class GameStore(GObject.Object):
         self.service = service
         self.service_media = service_media
         self._rows_by_id: dict[str, Gtk.TreeRowReference] = {}
+        self._values_by_id: dict[str, tuple] = {}
 
         # The timestamp columns must be INT64; a bare 'int' is a 32-bit gint, which
         # overflows for any date past 2038 (or sooner, if a game was recorded while the
@@ -121,6 +126,7 @@ class GameStore(GObject.Object):
         row = self.get_row_by_id(game_id)
         if row:
             self._rows_by_id.pop(str(game_id), None)
+            self._values_by_id.pop(str(game_id), None)
             self.store.remove(row.iter)
 
     def update(self, db_game: dict) -> set[int] | None:
@@ -166,6 +172,9 @@ class GameStore(GObject.Object):
             row_ref = self._rows_by_id.pop(old_id, None)
             if row_ref is not None:
                 self._rows_by_id[new_id] = row_ref
+        old_values = self._values_by_id.pop(old_id, None)
+        if old_values is not None:
+            self._values_by_id[new_id] = tuple(new_values.get(idx, value) for idx, value in enumerate(old_values))
 
         return changed_indices
 
@@ -175,42 +184,111 @@ class GameStore(GObject.Object):
         self.add_item(store_item)
 
     def add_item(self, store_item):
-        tree_iter = self.store.append(
-            (
-                store_item.id,
-                store_item.slug,
-                store_item.name,
-                store_item.sortname if store_item.sortname else store_item.name,
-                store_item.get_media_paths() if settings.SHOW_MEDIA else [],
-                store_item.year,
-                store_item.runner,
-                store_item.runner_text,
-                gtk_safe(store_item.platform),
-                store_item.lastplayed,
-                store_item.lastplayed_text,
-                store_item.installed,
-                store_item.installed_at,
-                store_item.installed_at_text,
-                store_item.playtime,
-                store_item.playtime_text,
-            )
-        )
-        self._rows_by_id[store_item.id] = Gtk.TreeRowReference(self.store, self.store.get_path(tree_iter))
+        self.add_row(self.get_row(store_item))
 
-    def add_preloaded_games(self, db_games, service_id):
-        """Add games to the store, but preload their installed-game data
-        all at once, for faster database access. This should be used if all or almost all
-        games are being loaded."""
+    def add_row(self, values):
+        tree_iter = self.store.append(values)
+        game_id = values[COL_ID]
+        self._rows_by_id[game_id] = Gtk.TreeRowReference(self.store, self.store.get_path(tree_iter))
+        self._values_by_id[game_id] = values
 
+    @staticmethod
+    def get_row(store_item):
+        """Return the values of the row of the store for a game"""
+        return (
+            store_item.id,
+            store_item.slug,
+            store_item.name,
+            store_item.sortname if store_item.sortname else store_item.name,
+            store_item.get_media_paths() if settings.SHOW_MEDIA else [],
+            store_item.year,
+            store_item.runner,
+            store_item.runner_text,
+            gtk_safe(store_item.platform),
+            store_item.lastplayed,
+            store_item.lastplayed_text,
+            store_item.installed,
+            store_item.installed_at,
+            store_item.installed_at_text,
+            store_item.playtime,
+            store_item.playtime_text,
+        )
+
+    def get_rows(self, db_games, service_id):
+        """Return the rows for games, preloading their installed-game data all at once,
+        for faster database access. This doesn't touch the store itself, so it can be
+        used from any thread."""
         installed_db_games = {}
         if service_id and db_games:
             installed_db_games = get_all_installed_game_for_service(service_id)
 
+        rows = []
         for db_game in db_games:
+            store_item = StoreItem(db_game, self.service, self.service_media)
             if installed_db_games is not None and "appid" in db_game:
-                appid = db_game["appid"]
-                store_item = StoreItem(db_game, self.service, self.service_media)
-                store_item.apply_installed_game_data(installed_db_games.get(appid))
-                self.add_item(store_item)
-            else:
-                self.add_game(db_game)
+                store_item.apply_installed_game_data(installed_db_games.get(db_game["appid"]))
+            rows.append(self.get_row(store_item))
+        return rows
+
+    def add_preloaded_games(self, db_games, service_id):
+        """Add games to the store, but preload their installed-game data
+        all at once, for faster database access. This should be used if all or almost all
+        games are being loaded."""
+        for row in self.get_rows(db_games, service_id):
+            self.add_row(row)
+
+    def get_values(self):
+        """Return a copy of the values of the rows by game ID, or None if some games
+        have several rows, in which case the store can't be updated by apply_rows()."""
+        if len(self._values_by_id) != len(self.store):
+            return None
+        return dict(self._values_by_id)
+
+    @staticmethod
+    def count_changes(values_by_id, rows):
+        """Return how many rows apply_rows(rows) would add, remove or update in a store
+        whose get_values() returned values_by_id, or None if it can't be used. This can be
+        used from any thread, to decide whether to update a store or build a new one."""
+        if values_by_id is None:
+            return None
+        new_ids = {row[COL_ID] for row in rows}
+        if len(new_ids) != len(rows):
+            return None
+        changes = len(values_by_id.keys() - new_ids)
+        for row in rows:
+            if values_by_id.get(row[COL_ID]) != row:
+                changes += 1
+        return changes
+
+    def apply_rows(self, rows):
+        """Make the store hold these rows, in this order, by removing, adding, updating and
+        finally moving only the rows that need it. The views showing the store keep their
+        scroll position and selection. The rows must have distinct game IDs.
+
+        Returns the numbers of rows added, removed and updated."""
+        new_rows = {row[COL_ID]: row for row in rows}
+        removed_ids = [game_id for game_id in self._values_by_id if game_id not in new_rows]
+        for game_id in removed_ids:
+            self.remove_game(game_id)
+
+        added_count = updated_count = 0
+        for game_id, row in new_rows.items():
+            old_row = self._values_by_id.get(game_id)
+            if old_row is None:
+                self.add_row(row)
+                added_count += 1
+            elif old_row != row:
+                columns = [idx for idx, value in enumerate(row) if old_row[idx] != value]
+                tree_iter = self.store.get_iter(self.get_path_by_id(game_id))
+                self.store.set(tree_iter, columns, [row[idx] for idx in columns])
+                self._values_by_id[game_id] = row
+                updated_count += 1
+
+        # A store sorted by a column of the list view keeps itself sorted
+        sort_column_id, _order = self.store.get_sort_column_id()
+        if sort_column_id is None or sort_column_id < 0:
+            positions = {row[COL_ID]: position for position, row in enumerate(self.store)}
+            new_order = [positions[game_id] for game_id in new_rows]
+            if new_order != list(range(len(new_order))):
+                self.store.reorder(new_order)
+        return added_count, len(removed_ids), updated_count
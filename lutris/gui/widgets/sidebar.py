@@ -169,7 +169,7 @@ class ServiceSidebarRow(SidebarRow):
             self.service.logout()
             self.service.login(parent=self.get_toplevel())  # login will trigger reload if successful
             return
-        self.service.start_reload(self.service_reloaded_cb)
+        self.service.start_reload(self.service_reloaded_cb, refresh=True)
 
     def service_reloaded_cb(self, error):
         if error:
@@ -14,6 +14,7 @@ from lutris.cache import is_file_in_custom_cache
 from lutris.exceptions import MissingExecutableError, UnspecifiedVersionError
 from lutris.installer.errors import ScriptingError
 from lutris.installer.installer import LutrisInstaller
+from lutris.installer.installer_file import InstallerFile
 from lutris.monitored_command import MonitoredCommand
 from lutris.runners import InvalidRunnerError, import_runner, import_task
 from lutris.runners.wine import wine
@@ -208,10 +209,24 @@ class CommandsMixin:
             self.interpreter_ui_delegate.report_status(msg)
             merge_single = "nomerge" not in data
             extractor = data.get("format")
-            logger.debug("extracting file %s to %s", filename, dest_path)
-            self._killable_process(extract.extract_archive, filename, dest_path, merge_single, extractor)
+            staging_path = self._take_streamed_extraction(filename, extractor)
+            if staging_path:
+                logger.debug("file %s was extracted while downloading, moving it to %s", filename, dest_path)
+                self._killable_process(extract.merge_staged_extraction, staging_path, dest_path, merge_single)
+            else:
+                logger.debug("extracting file %s to %s", filename, dest_path)
+                self._killable_process(extract.extract_archive, filename, dest_path, merge_single, extractor)
         logger.debug("Extract done")
 
+    def _take_streamed_extraction(self, filename, extractor):
+        """Return the folder where `filename` was extracted while downloading, if it was."""
+        for installer_file in self.installer.files:
+            if isinstance(installer_file, InstallerFile):
+                staging_path = installer_file.take_streamed_extraction(filename, extractor)
+                if staging_path:
+                    return staging_path
+        return None
+
     def input_menu(self, data):
         """Display an input request as a dropdown menu with options."""
         self._check_required_params("options", data, "input_menu")
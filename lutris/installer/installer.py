@@ -237,6 +237,10 @@ class LutrisInstaller:  # pylint: disable=too-many-instance-attributes
             except (AuthenticationError, UnavailableGameError) as ex:
                 logger.exception("Failed to get extras: %s", ex)
 
+        for file in files:
+            if isinstance(file, InstallerFile):
+                file.prepare_stream_extraction(self.interpreter.target_path)
+
         # Commit changes only at the end; this is more robust in this method is runner
         # my two threads concurrently- the GIL can probably save us. It's not desirable
         # to do this, but this is the easiest workaround.
@@ -7,8 +7,8 @@ from urllib.parse import urlparse
 from lutris.cache import get_url_cache_path, has_valid_custom_cache_path, save_to_cache
 from lutris.gui.widgets.download_progress_box import DownloadProgressBox
 from lutris.installer.errors import ScriptingError
-from lutris.util import system
-from lutris.util.downloader import BaseDownloader
+from lutris.util import extract, hash_cache, system
+from lutris.util.downloader import BaseDownloader, SimpleDownloader
 from lutris.util.log import logger
 from lutris.util.strings import gtk_safe_urls
 
@@ -23,6 +23,7 @@ class InstallerFile:
         self._dest_file_override = None  # Used to override the destination
         self._dest_file_found = None  # Lazy storage for the resolved destination file
         self.allow_pga_cache = True
+        self.stream_extractor = None  # Set when the file is extracted while downloading
         if isinstance(self._file_meta, dict):
             self._downloader = self._file_meta.get("downloader")
         else:
@@ -105,6 +106,16 @@ class InstallerFile:
             return self._file_meta.get("downloader_class")
         return None
 
+    @property
+    def stream_extract(self):
+        """Whether the file is an archive that the script wants extracted while it downloads.
+
+        This is opted in with `stream_extract: true` in the file's entry, and only applies
+        to tar based archives."""
+        if not isinstance(self._file_meta, dict) or not self._file_meta.get("stream_extract"):
+            return False
+        return extract.is_streamable(self.filename)
+
     @property
     def checksum(self):
         if isinstance(self._file_meta, dict):
@@ -247,10 +258,51 @@ class InstallerFile:
             get_url_cache_path(self.url, self.id, self.game_slug, prepare=True)
 
     def create_download_progress_box(self):
+        downloader = self.downloader
+        if not downloader and self.stream_extractor:
+            downloader = SimpleDownloader(
+                self.url,
+                self.download_file,
+                referer=self.referer,
+                overwrite=True,
+                stream_extractor=self.stream_extractor,
+            )
         return DownloadProgressBox(
-            url=self.url, dest=self.dest_file, temp=self.download_file, referer=self.referer, downloader=self.downloader
+            url=self.url, dest=self.dest_file, temp=self.download_file, referer=self.referer, downloader=downloader
         )
 
+    def prepare_stream_extraction(self, target_path):
+        """Set up the extraction of the file while it downloads, if the file opted in.
+
+        The files are staged in a folder next to the game directory, on the same
+        filesystem, so moving them in place later on is cheap."""
+        if not self.stream_extract or not target_path:
+            return
+        target_path = os.path.normpath(target_path)
+        staging_path = os.path.join(
+            os.path.dirname(target_path), ".%s-%s.extract" % (os.path.basename(target_path), self.id)
+        )
+        hash_type = self.checksum.split(":", 1)[0] if self.checksum and ":" in self.checksum else None
+        self.stream_extractor = extract.StreamingExtractor.for_archive(self.filename, staging_path, hash_type)
+
+    def take_streamed_extraction(self, path, extractor=None):
+        """Return the staging folder holding the extracted contents of `path`, if this
+        file was extracted while it downloaded. The staged files can only be taken once."""
+        streamed = self.stream_extractor
+        if not streamed or not streamed.completed or path != self.dest_file:
+            return None
+        if extractor and extractor != streamed.extractor:
+            return None
+        if not os.path.isdir(streamed.staging_path):
+            return None
+        self.stream_extractor = None
+        return streamed.staging_path
+
+    def discard_streamed_extraction(self):
+        """Delete files extracted while downloading that the script never used."""
+        if self.stream_extractor:
+            self.stream_extractor.abort()
+
     def check_hash(self):
         """Checks the checksum of `file` and compare it to `value`
 
@@ -269,7 +321,12 @@ class InstallerFile:
             ) from err
 
         logger.info("Checking hash %s for %s", hash_type, self.dest_file)
-        calculated_hash = system.get_file_checksum(self.dest_file, hash_type)
+        if self.stream_extractor and self.stream_extractor.digest and self.stream_extractor.hash_type == hash_type:
+            # Already computed while the file was downloaded
+            calculated_hash = self.stream_extractor.digest
+            hash_cache.store_file_hash(self.dest_file, hash_type, calculated_hash)
+        else:
+            calculated_hash = system.get_file_checksum(self.dest_file, hash_type)
         if calculated_hash != expected_hash:
             raise ScriptingError(
                 hash_type.capitalize() + _(" checksum mismatch "), faulty_data=f"{expected_hash} != {calculated_hash}"
@@ -14,6 +14,7 @@ from lutris.installer import get_entry_point_path
 from lutris.installer.commands import CommandsMixin
 from lutris.installer.errors import MissingGameDependencyError, ScriptingError
 from lutris.installer.installer import LutrisInstaller
+from lutris.installer.installer_file import InstallerFile
 from lutris.runners import NonInstallableRunnerError, RunnerInstallationError, steam, wine
 from lutris.services.lutris import download_lutris_media
 from lutris.util import system
@@ -410,6 +411,13 @@ class ScriptInterpreter(GObject.Object, CommandsMixin):
         from lutris.util.download_cache import safe_delete_folder
 
         safe_delete_folder(self.cache_path)
+        self._discard_streamed_extractions()
+
+    def _discard_streamed_extractions(self):
+        """Delete archives extracted during their download that the script didn't use."""
+        for installer_file in self.installer.files:
+            if isinstance(installer_file, InstallerFile):
+                installer_file.discard_streamed_extraction()
 
     def _update_cache_locks_state(self, state_name: str) -> None:
         """Update cache lock state for all files in the cache directory.
@@ -456,6 +464,8 @@ class ScriptInterpreter(GObject.Object, CommandsMixin):
                 if self.abort_current_task:
                     self.abort_current_task()
 
+                self._discard_streamed_extractions()
+
                 if self.target_path and remove_game_dir:
                     system.remove_folder(self.target_path)
 
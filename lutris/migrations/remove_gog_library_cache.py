@@ -0,0 +1,16 @@
+"""Remove the GOG library file, replaced by the cached pages of the GOG API"""
+
+import os
+
+from lutris import settings
+from lutris.util.log import logger
+
+
+def migrate():
+    """Run migration"""
+    cache_path = os.path.join(settings.CACHE_DIR, "gog-library.json")
+    try:
+        if os.path.exists(cache_path):
+            os.remove(cache_path)
+    except OSError as ex:
+        logger.warning("Unable to remove %s: %s", cache_path, ex)
@@ -5,7 +5,7 @@ from gettext import gettext as _
 from lutris.config import LutrisConfig
 from lutris.exceptions import MissingBiosError, MissingGameExecutableError
 from lutris.runners.runner import Runner
-from lutris.util import display, extract, system
+from lutris.util import display, extract, hash_cache, system
 
 
 def get_resolutions():
@@ -105,8 +105,10 @@ class atari800(Runner):
     def find_good_bioses(self, bios_path):
         """Check for correct bios files"""
         good_bios = {}
-        for filename in os.listdir(bios_path):
-            real_hash = system.get_md5_hash(os.path.join(bios_path, filename))
+        filenames = os.listdir(bios_path)
+        real_hashes = hash_cache.get_file_hashes(os.path.join(bios_path, filename) for filename in filenames)
+        for filename in filenames:
+            real_hash = real_hashes.get(os.path.join(bios_path, filename))
             for bios_file, checksum in self.bios_checksums.items():
                 if real_hash == checksum:
                     logging.debug("%s Checksum : OK", filename)
@@ -14,6 +14,7 @@ from lutris.runners.runner import Runner
 from lutris.util import async_choices, cache_single, system
 from lutris.util.libretro import RetroConfig
 from lutris.util.log import logger
+from lutris.util.retroarch.core_info import CORE_INFO_INDEX
 from lutris.util.retroarch.firmware import get_firmware, scan_firmware_directory
 
 RETROARCH_DIR = os.path.join(settings.RUNNER_DIR, "retroarch")
@@ -160,9 +161,15 @@ def _download_libretro_info():
     return False
 
 
+def get_core_info_path(core):
+    """Return the path of the info file of a core, like 'snes9x'"""
+    return os.path.join(RETROARCH_DIR, "info", f"{core}_libretro.info")
+
+
 @cache_single
 def get_libretro_cores():
-    """Return the list of available libretro cores by reading installed info files.
+    """Return the list of available libretro cores from the installed info files. Only the
+    info files added or changed since they were last read are parsed.
 
     If the info archive hasn't been downloaded yet, performs a synchronous download. Callers on
     the UI thread should prefer triggering the async download via get_core_choices() first, so
@@ -172,16 +179,12 @@ def get_libretro_cores():
     if not os.path.exists(info_path):
         if not _download_libretro_info():
             return []
-    cores = []
-    for info_file in os.listdir(info_path):
-        if "_libretro.info" not in info_file:
-            continue
-        core_identifier = info_file.replace("_libretro.info", "")
-        core_config = RetroConfig(os.path.join(info_path, info_file))
-        if "categories" in core_config.keys() and "Emulator" in core_config["categories"]:
-            core_label = core_config["display_name"] or ""
-            core_system = core_config["systemname"] or ""
-            cores.append((core_label, core_identifier, core_system))
+    CORE_INFO_INDEX.refresh(info_path)
+    cores = [
+        (core["display_name"], core["core"], core["systemname"])
+        for core in CORE_INFO_INDEX.get_cores()
+        if core["is_emulator"]
+    ]
     cores.sort(key=itemgetter(0))
     return cores
 
@@ -260,9 +263,9 @@ class libretro(Runner):
         if not game_core:
             logger.warning("Game don't have a core set")
             return
-        for core in get_libretro_cores():
-            if core[1] == game_core and core[2] in self.platform_dict:
-                return self.platform_dict[core[2]]
+        core = CORE_INFO_INDEX.get_file(get_core_info_path(game_core))
+        if core and core["systemname"] in self.platform_dict:
+            return self.platform_dict[core["systemname"]]
         logger.warning("'%s' not found in Libretro cores", game_core)
         return ""
 
@@ -381,34 +384,13 @@ class libretro(Runner):
             retro_config = RetroConfig(config_file)
 
         core = self.game_config.get("core")
-        info_file = os.path.join(RETROARCH_DIR, f"info/{core}_libretro.info")
-        if system.path_exists(info_file):
-            retro_config = RetroConfig(info_file)
-            try:
-                firmware_count = int(retro_config["firmware_count"])
-                mandatory_firmware_count = sum(
-                    1 for i in range(firmware_count) if not retro_config.get("firmware%d_opt" % i)
-                )
-            except (ValueError, TypeError):
-                firmware_count = 0
-                mandatory_firmware_count = 0
+        core_info = CORE_INFO_INDEX.get_file(get_core_info_path(core))
+        if core_info:
             system_path = self.get_system_directory(retro_config)
-            notes = str(retro_config["notes"] or "")
-            checksums = {}
-            if notes.startswith("(!)"):
-                parts = notes.split("|")
-                for part in parts:
-                    try:
-                        filename, checksum = part.split(" (md5): ")
-                    except ValueError:
-                        logger.warning("Unable to parse firmware info: %s", notes)
-                        continue
-                    filename = filename.replace("(!) ", "")
-                    checksums[filename] = checksum
 
             # If this requires firmware, confirm we have the firmware folder configured in the first place
             # then rescan it in case the user added anything since the last time they changed it
-            if mandatory_firmware_count > 0:
+            if any(not firmware["optional"] for firmware in core_info["firmware"]):
                 lutris_config = LutrisConfig()
                 firmware_directory = lutris_config.raw_system_config.get("bios_path")
                 if not firmware_directory:
@@ -417,12 +399,11 @@ class libretro(Runner):
                     )
                 scan_firmware_directory(firmware_directory)
 
-            for index in range(firmware_count):
-                optional_prefix = "Optional firmware" if retro_config.get("firmware%d_opt" % index) else "Firmware"
-                firmware_filename = retro_config["firmware%d_path" % index]
+            for firmware in core_info["firmware"]:
+                optional_prefix = "Optional firmware" if firmware["optional"] else "Firmware"
+                firmware_filename = firmware["path"]
                 firmware_path = os.path.join(system_path, firmware_filename)
-                firmware_name = firmware_filename.split("/")[-1]
-                firmware_checksum = checksums.get(firmware_name)
+                firmware_checksum = firmware["md5"]
                 if system.path_exists(firmware_path):
                     if firmware_checksum:
                         checksum = system.get_md5_hash(firmware_path)
@@ -436,7 +417,7 @@ class libretro(Runner):
                 else:
                     logger.warning("%s '%s' not found!", optional_prefix, firmware_filename)
                     if firmware_checksum:
-                        get_firmware(firmware_name, firmware_checksum, system_path)
+                        get_firmware(firmware["name"], firmware_checksum, system_path)
 
     def get_runner_parameters(self):
         parameters = []
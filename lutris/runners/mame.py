@@ -8,12 +8,11 @@ from lutris.exceptions import GameConfigError
 from lutris.runners.runner import Runner
 from lutris.util import async_choices, system
 from lutris.util.log import logger
-from lutris.util.mame.database import get_supported_systems
+from lutris.util.mame.database import MAME_DB_PATH, ensure_database, get_machine, get_systems
 from lutris.util.strings import split_arguments
 
 MAME_CACHE_DIR = os.path.join(settings.CACHE_DIR, "mame")
 MAME_XML_PATH = os.path.join(MAME_CACHE_DIR, "mame.xml")
-MAME_SYSTEMS_PATH = os.path.join(MAME_CACHE_DIR, "systems.json")
 
 
 def build_mame_systems_cache(force=False):
@@ -29,33 +28,31 @@ def build_mame_systems_cache(force=False):
         if system.get_disk_size(MAME_XML_PATH) == 0:
             logger.warning("MAME did not write anything to %s", MAME_XML_PATH)
             return False
-    if not system.path_exists(MAME_SYSTEMS_PATH, exclude_empty=True) or force:
-        logger.info("Building MAME systems list")
-        _ = get_supported_systems(MAME_XML_PATH, force=True)
-    return True
+    return ensure_database(MAME_XML_PATH, force=force)
+
+
+def get_system_name(info, include_year=True):
+    """Return the name of a system for display, from its description and manufacturer"""
+    if info["description"].startswith(info["manufacturer"]):
+        template = ""
+    else:
+        template = "%(manufacturer)s "
+    template += "%(description)s"
+    if include_year:
+        template += " %(year)s"
+    system_name = template % info
+    return system_name.replace("<generic>", "").strip()
 
 
 @async_choices(
     generate=build_mame_systems_cache,
-    ready=lambda: system.path_exists(MAME_SYSTEMS_PATH, exclude_empty=True),
+    ready=lambda: system.path_exists(MAME_DB_PATH, exclude_empty=True),
     error_message="Failed to build MAME systems cache",
 )
 def get_system_choices(include_year=True):
     """Return list of systems for inclusion in dropdown"""
-    for system_id, info in sorted(
-        get_supported_systems(MAME_XML_PATH).items(),
-        key=lambda sys: (sys[1]["manufacturer"], sys[1]["description"]),
-    ):
-        if info["description"].startswith(info["manufacturer"]):
-            template = ""
-        else:
-            template = "%(manufacturer)s "
-        template += "%(description)s"
-        if include_year:
-            template += " %(year)s"
-        system_name = template % info
-        system_name = system_name.replace("<generic>", "").strip()
-        yield (system_name, system_id)
+    for info in get_systems():
+        yield (get_system_name(info, include_year), info["name"])
 
 
 class mame(Runner):  # pylint: disable=invalid-name
@@ -267,10 +264,9 @@ class mame(Runner):  # pylint: disable=invalid-name
 
     def get_platform(self):
         if self.game_config.get("machine"):
-            machine_mapping = {choice[1]: choice[0] for choice in get_system_choices(include_year=False)}
-            # get_system_choices() can return [] if not yet ready, so we'll return
-            # None in that case.
-            return machine_mapping.get(self.game_config["machine"])
+            # The systems may not be read from MAME yet, so we'll return None in that case.
+            info = get_machine(self.game_config["machine"])
+            return get_system_name(info, include_year=False) if info else None
         rom_file = os.path.basename(self.game_config.get("main_file", ""))
         if rom_file.startswith("gnw_"):
             return _("Nintendo Game & Watch")
@@ -1,11 +1,15 @@
 """Runtime handling module"""
 
 import concurrent.futures
+import hashlib
+import json
 import os
+import shutil
 import threading
 import time
 from gettext import gettext as _
 from typing import Any
+from urllib.parse import quote, urljoin
 
 from lutris import settings
 from lutris.api import (
@@ -18,7 +22,7 @@ from lutris.gui.widgets.progress_box import ProgressInfo
 from lutris.util import http, system
 from lutris.util.downloader import SimpleDownloader
 from lutris.util.extract import extract_archive
-from lutris.util.jobs import AsyncCall
+from lutris.util.jobs import AsyncCall, Priority
 from lutris.util.linux import LINUX_SYSTEM
 from lutris.util.log import logger
 from lutris.util.strings import parse_version
@@ -39,6 +43,16 @@ DLL_MANAGERS = {
     "dxvk_nvapi": DXVKNVAPIManager,
 }
 
+# Runtimes whose info has a "manifest_url" can be updated file by file. The manifest lists
+# every file of the runtime, like {"files": {"lib/libz.so.1": {"size": 98936, "sha256": "...",
+# "mode": 420}, "lib/libz.so": {"link": "libz.so.1"}}}, and the files are downloaded from its
+# "base_url", or from beside the manifest. The manifest of the installed files is kept in:
+MANIFEST_FILENAME = ".lutris-manifest.json"
+
+# When more than this share of a runtime's bytes changed, its compressed archive is
+# cheaper to download than the files one by one
+DELTA_MAX_CHANGED_RATIO = 0.25
+
 
 def get_env(
     version: str | None = None, prefer_system_libs: bool = False, wine_path: str | None = None
@@ -314,13 +328,18 @@ class RuntimeComponentUpdater(ComponentUpdater):
 
 
 class RuntimeExtractedComponentUpdater(RuntimeComponentUpdater):
-    """Component updater that downloads and extracts an archive."""
+    """Component updater that downloads and extracts an archive, or only the files
+    that changed if the runtime publishes a manifest of its files."""
 
     def __init__(self, remote_runtime_info: dict[str, Any]) -> None:
         super().__init__(remote_runtime_info)
         self.url = remote_runtime_info["url"]
+        self.manifest_url = remote_runtime_info.get("manifest_url")
         self.downloader: SimpleDownloader | None = None
         self.complete_event = threading.Event()
+        self.delta_size = 0
+        self.delta_downloaded_size = 0
+        self.delta_lock = threading.Lock()
 
     def get_progress(self) -> ProgressInfo:
         progress_info = super().get_progress()
@@ -328,6 +347,9 @@ class RuntimeExtractedComponentUpdater(RuntimeComponentUpdater):
         if self.downloader and not progress_info.has_ended:
             return ProgressInfo(self.downloader.progress_fraction, progress_info.label_markup, self.downloader.cancel)
 
+        if self.delta_size and self.state == ComponentUpdater.DOWNLOADING:
+            return ProgressInfo(self.delta_downloaded_size / self.delta_size, progress_info.label_markup)
+
         return progress_info
 
     @property
@@ -339,13 +361,22 @@ class RuntimeExtractedComponentUpdater(RuntimeComponentUpdater):
         self.state = ComponentUpdater.DOWNLOADING
         self.complete_event.clear()
 
+        manifest = self.get_remote_manifest()
+        if manifest:
+            try:
+                if self.install_delta(manifest):
+                    AsyncCall(self._install, self._install_cb, None, priority=Priority.BULK_IO)
+                    return
+            except (OSError, ValueError, http.HTTPError) as ex:
+                logger.warning("Delta update of %s failed, downloading the full archive: %s", self.name, ex)
+
         archive_path = self.archive_path
         self.downloader = SimpleDownloader(self.url, archive_path, overwrite=True)
         self.downloader.start()
         self.downloader.join()
         self.downloader = None
 
-        AsyncCall(self._install, self._install_cb, archive_path)
+        AsyncCall(self._install, self._install_cb, archive_path, manifest, priority=Priority.BULK_IO)
 
     def join(self):
         self.complete_event.wait()
@@ -354,12 +385,13 @@ class RuntimeExtractedComponentUpdater(RuntimeComponentUpdater):
         self.state = ComponentUpdater.COMPLETED
         self.complete_event.set()
 
-    def _install(self, path: str):
+    def _install(self, path: str | None, manifest: dict[str, Any] | None = None):
         """Finishes the installation after download, on a worker thread. This extracts
-        the archive and downloads the versions file for it, the marks the update complete
-        so join() above will be unblocked."""
+        the archive, if there is one, and downloads the versions file for it, the marks
+        the update complete so join() above will be unblocked."""
         try:
-            self._extract(path)
+            if path and self._extract(path) and manifest and not self.versioned:
+                self.save_manifest(self.local_runtime_path, manifest)
 
             self.set_updated_at()
             if self.name in DLL_MANAGERS:
@@ -372,20 +404,23 @@ class RuntimeExtractedComponentUpdater(RuntimeComponentUpdater):
         if error:
             logger.error("Runtime update failed: %s", error)
 
-    def _extract(self, path: str) -> None:
+    def _extract(self, path: str) -> bool:
         """Actions taken once a runtime is downloaded
 
         Arguments:
             path: local path to the runtime archive, or None on download failure
+
+        Returns:
+            True if the archive was extracted
         """
         if not path:
-            return
+            return False
 
         stats = os.stat(path)
         if not stats.st_size:
             logger.error("Download failed: file %s is empty, Deleting file.", path)
             os.unlink(path)
-            return
+            return False
         directory, _filename = os.path.split(path)
 
         # Determine the destination path
@@ -400,6 +435,148 @@ class RuntimeExtractedComponentUpdater(RuntimeComponentUpdater):
         self.state = ComponentUpdater.EXTRACTING
         archive_path, _destination_path = extract_archive(path, dest_path, merge_single=True)
         os.unlink(archive_path)
+        return True
+
+    def get_remote_manifest(self) -> dict[str, Any] | None:
+        """Return the manifest of the files of the runtime, or None if it has none"""
+        if not self.manifest_url:
+            return None
+        try:
+            manifest = http.Request(self.manifest_url).get().json
+        except (http.HTTPError, ValueError) as ex:
+            logger.warning("Unable to get the manifest of %s: %s", self.name, ex)
+            return None
+        if not isinstance(manifest.get("files"), dict):
+            logger.warning("The manifest of %s has no files", self.name)
+            return None
+        return manifest
+
+    @staticmethod
+    def get_local_manifest(runtime_path: str) -> dict[str, Any] | None:
+        """Return the manifest saved with the files of an installed runtime"""
+        try:
+            with open(os.path.join(runtime_path, MANIFEST_FILENAME), encoding="utf-8") as manifest_file:
+                manifest = json.load(manifest_file)
+        except (OSError, ValueError):
+            return None
+        return manifest if isinstance(manifest.get("files"), dict) else None
+
+    @staticmethod
+    def save_manifest(runtime_path: str, manifest: dict[str, Any]) -> None:
+        with open(os.path.join(runtime_path, MANIFEST_FILENAME), "w", encoding="utf-8") as manifest_file:
+            json.dump(manifest, manifest_file)
+
+    @staticmethod
+    def get_file_path(runtime_path: str, path: str) -> str:
+        """Return where a file of a manifest goes, refusing paths that would end up
+        outside of the runtime"""
+        if os.path.isabs(path) or ".." in path.split("/") or path == MANIFEST_FILENAME:
+            raise ValueError("Invalid path in runtime manifest: %s" % path)
+        return os.path.join(runtime_path, path)
+
+    @classmethod
+    def is_installed(cls, runtime_path: str, path: str, entry: dict[str, Any], local_entry: Any) -> bool:
+        """Return whether the file of a manifest entry is installed, unchanged"""
+        if entry != local_entry:
+            return False
+        file_path = cls.get_file_path(runtime_path, path)
+        if "link" in entry:
+            return os.path.islink(file_path)
+        try:
+            return os.lstat(file_path).st_size == entry.get("size")
+        except OSError:
+            return False
+
+    def get_file_url(self, manifest: dict[str, Any], path: str) -> str:
+        return urljoin(manifest.get("base_url") or self.manifest_url, quote(path))
+
+    def install_delta(self, manifest: dict[str, Any]) -> bool:
+        """Update the runtime by downloading only the files that differ from the installed
+        ones. The new files are put together in a folder beside the runtime, with links to
+        the unchanged ones, and that folder then replaces the runtime.
+
+        Returns False, leaving the runtime alone, when it is better to download the archive:
+        the runtime isn't installed with a manifest, or too much of it changed."""
+        runtime_path = self.local_runtime_path
+        local_manifest = self.get_local_manifest(runtime_path)
+        if self.versioned or not local_manifest:
+            return False
+
+        files = manifest["files"]
+        local_files = local_manifest["files"]
+        changed = [
+            path
+            for path, entry in files.items()
+            if not self.is_installed(runtime_path, path, entry, local_files.get(path))
+        ]
+        downloads = [path for path in changed if "link" not in files[path]]
+        download_set = set(downloads)
+        total_size = sum(entry.get("size", 0) for entry in files.values())
+        changed_size = sum(files[path].get("size", 0) for path in downloads)
+        if total_size and changed_size > total_size * DELTA_MAX_CHANGED_RATIO:
+            logger.info("%s changed too much for a delta update", self.name)
+            return False
+        logger.info("Updating %s of %s files of %s (%s bytes)", len(changed), len(files), self.name, changed_size)
+
+        staging_path = runtime_path + ".update"
+        if os.path.exists(staging_path):
+            system.delete_folder(staging_path)
+        try:
+            self.delta_size = changed_size
+            self.delta_downloaded_size = 0
+
+            def download(path: str) -> None:
+                self._download_delta_file(manifest, staging_path, path)
+
+            http.fetch_concurrently(lambda path: http.fetch_with_retry(download, path), downloads, max_workers=8)
+            for path, entry in files.items():
+                if path in download_set:
+                    continue
+                file_path = self.get_file_path(staging_path, path)
+                os.makedirs(os.path.dirname(file_path), exist_ok=True)
+                if "link" in entry:
+                    os.symlink(entry["link"], file_path)
+                else:
+                    self._link_file(self.get_file_path(runtime_path, path), file_path)
+            self.save_manifest(staging_path, manifest)
+
+            self.state = ComponentUpdater.EXTRACTING
+            previous_path = runtime_path + ".previous"
+            if os.path.exists(previous_path):
+                system.delete_folder(previous_path)
+            os.rename(runtime_path, previous_path)
+            os.rename(staging_path, runtime_path)
+            system.delete_folder(previous_path)
+        except Exception:
+            if os.path.exists(staging_path):
+                system.delete_folder(staging_path)
+            raise
+        finally:
+            self.delta_size = 0
+        return True
+
+    def _download_delta_file(self, manifest: dict[str, Any], staging_path: str, path: str) -> None:
+        entry = manifest["files"][path]
+        content = http.Request(self.get_file_url(manifest, path)).get().content
+        if len(content) != entry.get("size") or hashlib.sha256(content).hexdigest() != entry.get("sha256"):
+            raise ValueError("%s does not match the manifest of %s" % (path, self.name))
+        file_path = self.get_file_path(staging_path, path)
+        os.makedirs(os.path.dirname(file_path), exist_ok=True)
+        with open(file_path, "wb") as runtime_file:
+            runtime_file.write(content)
+        if "mode" in entry:
+            os.chmod(file_path, entry["mode"])
+        with self.delta_lock:
+            self.delta_downloaded_size += len(content)
+
+    @staticmethod
+    def _link_file(source: str, destination: str) -> None:
+        """Put an unchanged file in the new runtime folder, as a hard link if the file
+        system allows it"""
+        try:
+            os.link(source, destination)
+        except OSError:
+            shutil.copy2(source, destination)
 
 
 class RuntimeFilesComponentUpdater(RuntimeComponentUpdater):
@@ -1,13 +1,19 @@
 import os
+from collections.abc import Iterable
+from concurrent.futures import ThreadPoolExecutor
+from xml.etree import ElementTree
 
 from lutris import settings
+from lutris.database import sql
 from lutris.util import http
 from lutris.util.extract import extract_archive
+from lutris.util.hash_cache import get_file_hashes
 from lutris.util.log import logger
-from lutris.util.system import get_md5_hash
 
 archive_formats = [".zip", ".7z", ".rar", ".gz"]
 save_formats = [".srm"]
+TOSEC_DB_PATH = os.path.join(settings.CACHE_DIR, "tosec.db")
+API_LOOKUP_WORKERS = 8
 PLATFORM_PATTERNS = {
     "3DO": "3do",
     "Amiga CD32": "amiga-cd32",
@@ -80,13 +86,211 @@ def search_tosec_by_md5(md5sum):
     return response_data["results"]
 
 
-def scan_folder(folder, extract_archives=False):
-    roms = {}
+class TosecIndex:
+    """Local copy of TOSEC DAT files, stored in SQLite so that ROMs can be
+    identified without querying the Lutris API.
+
+    Games are returned in the same format as the API results."""
+
+    def __init__(self, db_path: str) -> None:
+        self.db_path = db_path
+        self._initialized = False
+
+    def _init_database(self) -> None:
+        if self._initialized:
+            return
+        os.makedirs(os.path.dirname(self.db_path), exist_ok=True)
+        with sql.db_cursor(self.db_path) as cursor:
+            sql.cursor_execute(
+                cursor,
+                "CREATE TABLE IF NOT EXISTS tosec_games "
+                "(id INTEGER PRIMARY KEY AUTOINCREMENT, name TEXT, category TEXT)",
+            )
+            sql.cursor_execute(
+                cursor, "CREATE TABLE IF NOT EXISTS tosec_roms (game_id INTEGER, name TEXT, size INTEGER, md5 TEXT)"
+            )
+            sql.cursor_execute(cursor, "CREATE INDEX IF NOT EXISTS tosec_roms_md5 ON tosec_roms (md5)")
+            sql.cursor_execute(cursor, "CREATE INDEX IF NOT EXISTS tosec_roms_game_id ON tosec_roms (game_id)")
+        self._initialized = True
+
+    @property
+    def is_empty(self) -> bool:
+        if not os.path.exists(self.db_path):
+            return True
+        self._init_database()
+        with sql.db_cursor(self.db_path) as cursor:
+            return not sql.cursor_execute(cursor, "SELECT 1 FROM tosec_games LIMIT 1").fetchone()
+
+    def import_dat(self, dat_path: str) -> int:
+        """Import a TOSEC DAT file, replacing the games previously imported for the
+        same category, and return the number of games imported"""
+        self._init_database()
+        category = None
+        games = []
+        for _event, element in ElementTree.iterparse(dat_path):
+            if element.tag == "name" and category is None:
+                category = element.text
+            elif element.tag == "game":
+                roms = [
+                    (rom.get("name"), int(rom.get("size") or 0), (rom.get("md5") or "").lower())
+                    for rom in element.iter("rom")
+                    if rom.get("md5")
+                ]
+                if roms:
+                    games.append((element.get("name"), roms))
+                element.clear()
+        category = category or os.path.splitext(os.path.basename(dat_path))[0]
+
+        with sql.db_cursor(self.db_path) as cursor:
+            sql.cursor_execute(
+                cursor,
+                "DELETE FROM tosec_roms WHERE game_id IN (SELECT id FROM tosec_games WHERE category=?)",
+                (category,),
+            )
+            sql.cursor_execute(cursor, "DELETE FROM tosec_games WHERE category=?", (category,))
+            for name, roms in games:
+                game_id = sql.cursor_execute(
+                    cursor, "INSERT INTO tosec_games (name, category) VALUES (?, ?)", (name, category)
+                ).lastrowid
+                cursor.executemany(
+                    "INSERT INTO tosec_roms (game_id, name, size, md5) VALUES (?, ?, ?, ?)",
+                    [(game_id, *rom) for rom in roms],
+                )
+        logger.info("Imported %d games from %s", len(games), dat_path)
+        return len(games)
+
+    def search_by_md5s(self, md5sums: Iterable[str]) -> dict[str, list]:
+        """Return the games having a ROM matching each of the given MD5 hashes"""
+        results = {}
+        self._init_database()
+        with sql.db_cursor(self.db_path) as cursor:
+            for md5sum in md5sums:
+                games = []
+                rows = sql.cursor_execute(
+                    cursor,
+                    "SELECT DISTINCT tosec_games.id, tosec_games.name, tosec_games.category FROM tosec_games "
+                    "JOIN tosec_roms ON tosec_roms.game_id = tosec_games.id WHERE tosec_roms.md5=?",
+                    (md5sum.lower(),),
+                ).fetchall()
+                for game_id, name, category in rows:
+                    roms = sql.cursor_execute(
+                        cursor, "SELECT name, size, md5 FROM tosec_roms WHERE game_id=?", (game_id,)
+                    ).fetchall()
+                    games.append(
+                        {
+                            "name": name,
+                            "category": {"name": category},
+                            "roms": [{"name": rom_name, "size": size, "md5": md5} for rom_name, size, md5 in roms],
+                        }
+                    )
+                if games:
+                    results[md5sum] = games
+        return results
+
+
+TOSEC_INDEX = TosecIndex(TOSEC_DB_PATH)
+
+
+def import_tosec_dats(path: str) -> int:
+    """Import a TOSEC DAT file, or all the ones in a folder, into the local index.
+    Returns the number of games imported."""
+    if os.path.isdir(path):
+        dat_paths = sorted(
+            os.path.join(path, filename) for filename in os.listdir(path) if filename.lower().endswith(".dat")
+        )
+    else:
+        dat_paths = [path]
+    game_count = 0
+    for dat_path in dat_paths:
+        try:
+            game_count += TOSEC_INDEX.import_dat(dat_path)
+        except (OSError, ElementTree.ParseError) as ex:
+            logger.error("Unable to import TOSEC DAT file %s: %s", dat_path, ex)
+    return game_count
+
+
+def search_tosec_by_md5s(md5sums: Iterable[str], use_api: bool = True) -> dict[str, list]:
+    """Look up many MD5 hashes at once. The local DAT index is searched first and
+    the hashes it doesn't know are looked up on the Lutris API, concurrently. A hash
+    whose lookup fails is left out, like one that matched nothing."""
+    md5sums = {md5sum for md5sum in md5sums if md5sum}
+    results = {}
+    if md5sums and not TOSEC_INDEX.is_empty:
+        results = TOSEC_INDEX.search_by_md5s(md5sums)
+    missing = [md5sum for md5sum in md5sums if md5sum not in results]
+
+    def search_api(md5sum):
+        try:
+            return search_tosec_by_md5(md5sum)
+        except Exception as ex:  # pylint: disable=broad-except
+            logger.error("Unable to look up %s on the Lutris API: %s", md5sum, ex)
+            return None
+
+    if use_api and missing:
+        with ThreadPoolExecutor(max_workers=min(API_LOOKUP_WORKERS, len(missing))) as executor:
+            for md5sum, games in zip(missing, executor.map(search_api, missing)):
+                if games:
+                    results[md5sum] = games
+    return results
+
+
+def get_rename_plan(rom_files, saves, matches):
+    """Return the (source, destination) renames that give ROMs, and their saves,
+    the names of the TOSEC games they belong to.
+
+    rom_files maps file names to their MD5 hash and matches maps MD5 hashes to
+    the TOSEC games found for them."""
+    checksums = {md5sum: filename for filename, md5sum in rom_files.items() if md5sum}
+    plan = []
+    planned_sources = set()
+    for filename, md5sum in rom_files.items():
+        games = matches.get(md5sum)
+        if not games:
+            logger.info("No result for %s", filename)
+            continue
+        if len(games) > 1:
+            logger.info("More than 1 match for %s", filename)
+            continue
+        game = games[0]
+        if any(game_rom["md5"] not in checksums for game_rom in game["roms"]):
+            logger.info("Incomplete set of ROMs for %s", game["name"])
+            continue
+        logger.info("Found: %s", game["name"])
+        for game_rom in game["roms"]:
+            source = checksums[game_rom["md5"]]
+            dest = game_rom["name"]
+            if source in planned_sources:
+                continue
+            planned_sources.add(source)
+            base_name, _ext = os.path.splitext(source)
+            dest_base_name, _ext = os.path.splitext(dest)
+            if base_name in saves:
+                save_file = saves[base_name]
+                _base_name, ext = os.path.splitext(save_file)
+                plan.append((save_file, dest_base_name + ext))
+            if source != dest:
+                plan.append((source, dest))
+    return plan
+
+
+def apply_rename_plan(folder, plan):
+    for source, dest in plan:
+        try:
+            os.rename(os.path.join(folder, source), os.path.join(folder, dest))
+        except FileNotFoundError:
+            logger.error("Failed to rename %s to %s", source, dest)
+
+
+def scan_folder(folder, extract_archives=False, dry_run=False, use_api=True):
+    """Identify the ROMs in a folder and rename them after the TOSEC games they match.
+
+    ROMs are hashed in parallel (with their hashes cached) and looked up in the local
+    TOSEC index, then on the Lutris API. The rename plan is returned; with dry_run, it is
+    only returned and no file is touched, archives aren't extracted either."""
     archives = []
     saves = {}
-    checksums = {}
     archive_contents = []
-    if extract_archives:
+    if extract_archives and not dry_run:
         for filename in os.listdir(folder):
             basename, ext = os.path.splitext(filename)
             if ext not in archive_formats:
@@ -95,6 +299,7 @@ def scan_folder(folder, extract_archives=False):
             for archive_file in os.listdir(os.path.join(folder, basename)):
                 archive_contents.append("%s/%s" % (basename, archive_file))
 
+    rom_filenames = []
     for filename in os.listdir(folder) + archive_contents:
         basename, ext = os.path.splitext(filename)
         if ext in archive_formats:
@@ -105,38 +310,18 @@ def scan_folder(folder, extract_archives=False):
             continue
         if os.path.isdir(os.path.join(folder, filename)):
             continue
+        rom_filenames.append(filename)
 
-        md5sum = get_md5_hash(os.path.join(folder, filename))
-        roms[filename] = search_tosec_by_md5(md5sum)
-        checksums[md5sum] = filename
-
-    for rom, result in roms.items():
-        if not result:
-            print("no result for %s" % rom)
-            continue
-        if len(result) > 1:
-            print("More than 1 match for %s", rom)
-            continue
-        print("Found: %s" % result[0]["name"])
-        roms_matched = 0
-        renames = {}
-        for game_rom in result[0]["roms"]:
-            source_file = checksums[game_rom["md5"]]
-            dest_file = game_rom["name"]
-            renames[source_file] = dest_file
-            roms_matched += 1
-        if roms_matched == len(result[0]["roms"]):
-            for source, dest in renames.items():
-                base_name, _ext = os.path.splitext(source)
-                dest_base_name, _ext = os.path.splitext(dest)
-                if base_name in saves:
-                    save_file = saves[base_name]
-                    _base_name, ext = os.path.splitext(save_file)
-                    os.rename(os.path.join(folder, save_file), os.path.join(folder, dest_base_name + ext))
-                try:
-                    os.rename(os.path.join(folder, source), os.path.join(folder, dest))
-                except FileNotFoundError:
-                    logger.error("Failed to rename %s to %s", source, dest)
+    md5sums = get_file_hashes([os.path.join(folder, filename) for filename in rom_filenames])
+    rom_files = {filename: md5sums.get(os.path.join(folder, filename)) for filename in rom_filenames}
+    matches = search_tosec_by_md5s(rom_files.values(), use_api=use_api)
+    plan = get_rename_plan(rom_files, saves, matches)
+    if dry_run:
+        for source, dest in plan:
+            logger.info("Would rename %s to %s", source, dest)
+    else:
+        apply_rename_plan(folder, plan)
+    return plan
 
 
 def guess_platform(game):
@@ -485,7 +485,7 @@ class AmazonService(OnlineService):
             logger.exception("Failed http request %s: %s", url, ex)
             raise UnavailableGameError(_("Unable to get game manifest")) from ex
 
-        content = request.content
+        content = memoryview(request.content)
 
         header_size = struct.unpack(">I", content[:4])[0]
 
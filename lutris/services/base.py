@@ -1,7 +1,13 @@
 """Generic service utilities"""
 
+import hashlib
+import json
 import os
 import shutil
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
 from gettext import gettext as _
 from pathlib import Path
 from typing import Any
@@ -24,7 +30,7 @@ from lutris.services.service_media import ServiceMedia
 from lutris.util import system
 from lutris.util.busy import BusyAsyncCall
 from lutris.util.cookies import WebkitCookieJar
-from lutris.util.jobs import AsyncCall
+from lutris.util.jobs import AsyncCall, Priority
 from lutris.util.log import logger
 from lutris.util.strings import slugify
 
@@ -76,8 +82,180 @@ class LutrisCoverartMedium(LutrisCoverart):
     size = (176, 234)
 
 
+# Services reloading at the same time share this many slots
+MAX_CONCURRENT_RELOADS = 3
+RELOAD_SLOTS = threading.BoundedSemaphore(MAX_CONCURRENT_RELOADS)
+
+# Timings of the last reload of each service, by service id
+SERVICE_RELOAD_TIMINGS = {}
+
+# Release years of service games, by service id and appid, with the content hash of the
+# game they were read from, so the details of every game aren't parsed on each sort
+RELEASE_YEARS: dict[tuple[str, str], tuple[str, str]] = {}
+
+
+class ReloadTimings:
+    """Time spent in each phase of a service reload, in seconds"""
+
+    def __init__(self):
+        self.phases = {}
+        self.start = time.monotonic()
+        self.total = 0.0  # Wall clock time of the whole reload, once done
+        self._lock = threading.Lock()
+
+    def __str__(self):
+        return ", ".join("%s %.2fs" % (phase, duration) for phase, duration in self.phases.items())
+
+    @contextmanager
+    def measure(self, phase):
+        start = time.monotonic()
+        try:
+            yield
+        finally:
+            with self._lock:
+                self.phases[phase] = self.phases.get(phase, 0) + time.monotonic() - start
+
+    def call(self, phase, func, *args):
+        with self.measure(phase):
+            return func(*args)
+
+
+# Where the responses of the services' APIs are cached, a file per service
+LIBRARY_CACHE_DIR = os.path.join(settings.CACHE_DIR, "library-cache")
+LIBRARY_CACHE_VERSION = 1
+
+
+class ServiceLibraryCache:
+    """The responses of a service's API, by page, stored with their ETag and Last-Modified
+    headers and the time they were fetched.
+
+    A page fetched less than ttl seconds ago is used as it is. Older pages are fetched
+    again with a conditional request, and are only processed again if they changed.
+    Caches are shared by all the instances of a service; use ServiceLibraryCache.get()."""
+
+    _caches: dict[str, "ServiceLibraryCache"] = {}
+    _caches_lock = threading.Lock()
+
+    def __init__(self, cache_id: str, ttl: float) -> None:
+        self.path = os.path.join(LIBRARY_CACHE_DIR, "%s.json" % cache_id)
+        self.ttl = ttl
+        self._pages: dict[str, dict[str, Any]] | None = None
+        self._modified = False
+        self._lock = threading.RLock()
+
+    @classmethod
+    def get(cls, cache_id: str, ttl: float) -> "ServiceLibraryCache":
+        with cls._caches_lock:
+            cache = cls._caches.get(cache_id)
+            if not cache:
+                cache = cls._caches[cache_id] = cls(cache_id, ttl)
+            cache.ttl = ttl
+            return cache
+
+    @property
+    def pages(self) -> dict[str, dict[str, Any]]:
+        with self._lock:
+            if self._pages is None:
+                self._pages = self._read()
+            return self._pages
+
+    def _read(self) -> dict[str, dict[str, Any]]:
+        try:
+            with open(self.path, "r", encoding="utf-8") as cache_file:
+                content = json.load(cache_file)
+        except FileNotFoundError:
+            return {}
+        except (OSError, ValueError) as ex:
+            logger.warning("Ignoring invalid library cache %s: %s", self.path, ex)
+            return {}
+        if not isinstance(content, dict) or content.get("version") != LIBRARY_CACHE_VERSION:
+            return {}
+        return content.get("pages") or {}
+
+    def get_page(self, key, fetch, process=None):
+        """Return the data of a page and whether it changed since it was last fetched.
+
+        fetch(headers) makes the request for the page with the conditional headers given.
+        It returns None if the server answered that the page was not modified, or else
+        the JSON data of the response and its headers. process(data) turns the data into
+        what is cached and returned; it is only called for pages that changed."""
+        with self._lock:
+            entry = self.pages.get(key)
+        if entry and time.time() - entry["fetched_at"] < self.ttl:
+            return entry["data"], False
+
+        headers = {}
+        if entry and entry.get("etag"):
+            headers["If-None-Match"] = entry["etag"]
+        if entry and entry.get("last_modified"):
+            headers["If-Modified-Since"] = entry["last_modified"]
+        response = fetch(headers)
+        if response is None:
+            if not entry:
+                raise ValueError("Page %s was reported as not modified, but it isn't cached" % key)
+            entry = dict(entry, fetched_at=time.time())
+            changed = False
+        else:
+            data, response_headers = response
+            response_headers = {name.lower(): value for name, value in dict(response_headers or {}).items()}
+            content_hash = hashlib.sha1(json.dumps(data, sort_keys=True).encode("utf-8")).hexdigest()
+            changed = not entry or entry["content_hash"] != content_hash
+            if not changed:
+                data = entry["data"]
+            elif process:
+                data = process(data)
+            entry = {
+                "etag": response_headers.get("etag"),
+                "last_modified": response_headers.get("last-modified"),
+                "fetched_at": time.time(),
+                "content_hash": content_hash,
+                "data": data,
+            }
+        with self._lock:
+            self.pages[key] = entry
+            self._modified = True
+        return entry["data"], changed
+
+    def retain(self, keys):
+        """Forget the pages whose key isn't in keys"""
+        with self._lock:
+            for key in set(self.pages) - set(keys):
+                del self.pages[key]
+                self._modified = True
+
+    def expire(self):
+        """Have all pages checked for changes the next time they are requested"""
+        with self._lock:
+            for entry in self.pages.values():
+                entry["fetched_at"] = 0
+            self._modified = True
+
+    def clear(self):
+        with self._lock:
+            self._pages = {}
+            self._modified = False
+            if os.path.exists(self.path):
+                os.remove(self.path)
+
+    def save(self):
+        """Write the pages to disk, if they changed"""
+        with self._lock:
+            if not self._modified:
+                return
+            os.makedirs(LIBRARY_CACHE_DIR, exist_ok=True)
+            temp_path = self.path + ".tmp"
+            try:
+                with open(temp_path, "w", encoding="utf-8") as cache_file:
+                    json.dump({"version": LIBRARY_CACHE_VERSION, "pages": self.pages}, cache_file)
+                os.replace(temp_path, self.path)
+                self._modified = False
+            except OSError as ex:
+                logger.warning("Unable to save the library cache %s: %s", self.path, ex)
+
+
 SERVICE_GAMES_LOADING = NotificationSource()
 SERVICE_GAMES_LOADED = NotificationSource()
+SERVICE_GAMES_CHANGED = NotificationSource()  # Fired with the service and its ServiceGameChanges
 SERVICE_LOGIN = NotificationSource()
 SERVICE_LOGOUT = NotificationSource()
 
@@ -132,10 +310,18 @@ class BaseService:
             return False
         return launcher.is_installed
 
-    def start_reload(self, reloaded_callback):
+    def start_reload(self, reloaded_callback, refresh=False):
         """Refresh the service's games, asynchronously. This raises signals, but
         does so on the main thread- and runs the reload on a worker thread. It calls
-        reloaded_callback when done, passing any error (or None on success)"""
+        reloaded_callback when done, passing any error (or None on success)
+
+        If refresh is True, as when the user asks for it, the cached responses of the
+        service's API are all checked for changes, even those that are still fresh.
+
+        The games already known are kept while the service loads; once it has, the
+        changes are written and SERVICE_GAMES_CHANGED fires with them. At most
+        MAX_CONCURRENT_RELOADS services reload at the same time, and the time spent
+        in each phase of the reload is recorded in SERVICE_RELOAD_TIMINGS."""
 
         def do_reload():
             if self.is_loading:
@@ -144,44 +330,86 @@ class BaseService:
 
             try:
                 self.is_loading = True
-
-                self.wipe_game_cache()
-                self.load()
-                self.load_icons()
-                self.add_installed_games()
-                logger.debug("'%s' games reloaded", self.name)
+                timings = ReloadTimings()
+                with timings.measure("waiting"):
+                    RELOAD_SLOTS.acquire()  # pylint: disable=consider-using-with
+                try:
+                    changes = self.reload_games(timings, refresh=refresh)
+                finally:
+                    RELOAD_SLOTS.release()
+                timings.total = time.monotonic() - timings.start
+                SERVICE_RELOAD_TIMINGS[self.id] = timings
+                logger.info("'%s' games reloaded in %.2fs (%s)", self.name, timings.total, timings)
+                return changes
             finally:
                 self.is_loading = False
 
-        def reload_cb(_result, error):
+        def reload_cb(changes, error):
             logger.debug("Reload callback")
+            if changes:
+                SERVICE_GAMES_CHANGED.fire(self, changes)
             SERVICE_GAMES_LOADED.fire(self)
             reloaded_callback(error)
 
         SERVICE_GAMES_LOADING.fire(self)
-        AsyncCall(do_reload, reload_cb)
+        AsyncCall(do_reload, reload_cb, priority=Priority.BACKGROUND)
+
+    def reload_games(self, timings, refresh=False):
+        """Reload the games of the service, on a worker thread, and return the changes
+        made to them. The games saved by load() are compared with those already in the
+        database and only the differences are written, once it is done. Media downloads
+        and the sync of installed games don't depend on each other and run side by side."""
+        with timings.measure("load"):
+            if refresh:
+                self.expire_api_cache()
+            self.wipe_api_cache()
+            with ServiceGameCollection.update_service_games(self.id) as update:
+                self.load()
+        with timings.measure("save"):
+            changes = update.apply()
+            logger.debug("%s games: %s", self.name, changes)
+        with ThreadPoolExecutor(max_workers=1) as executor:
+            media_future = executor.submit(timings.call, "media", self.load_icons)
+            timings.call("installed", self.add_installed_games)
+            media_future.result()
+        return changes
 
     def load(self):
         logger.warning("Load method not implemented")
 
     def load_icons(self):
-        """Download all game media from the service"""
+        """Download all game media from the service, all media types at once"""
         logger.debug("Loading icons...")
         all_medias = self.medias.copy()
         all_medias.update(self.extra_medias)
 
         service_medias = [media_type() for media_type in all_medias.values()]
+        if not service_medias:
+            return
 
-        # Download icons
-        for service_media in service_medias:
+        def download_service_media(service_media):
             media_urls = service_media.get_media_urls()
             download_media(media_urls, service_media)
 
+        # Download icons
+        with ThreadPoolExecutor(max_workers=len(service_medias)) as executor:
+            for future in [executor.submit(download_service_media, media) for media in service_medias]:
+                future.result()
+
         # Process icons
         for service_media in service_medias:
             service_media.render()
 
+    def wipe_api_cache(self):
+        """Delete the cached responses of the service's API, if any, so that
+        the next load fetches the games again"""
+
+    def expire_api_cache(self):
+        """Have the next load check the cached responses of the service's API
+        for changes, even those that are still fresh"""
+
     def wipe_game_cache(self):
+        self.wipe_api_cache()
         logger.debug("Deleting games from service-games for %s", self.id)
         sql.db_delete(settings.DB_PATH, "service_games", "service", self.id)
 
@@ -436,8 +664,17 @@ class BaseService:
         """Returns game release year
         Does not have to be rewritten if get_game_release_date returns
         rfc/iso compatible date (YYYY-MM-DD)"""
+        content_hash = db_game.get("content_hash")
+        key = (self.id, db_game.get("appid"))
+        if content_hash:
+            cached_hash, year = RELEASE_YEARS.get(key, (None, ""))
+            if cached_hash == content_hash:
+                return year
         date = self.get_game_release_date(db_game)
-        return date[:4] if date else ""
+        year = date[:4] if date else ""
+        if content_hash:
+            RELEASE_YEARS[key] = (content_hash, year)
+        return year
 
 
 class OnlineService(BaseService):
@@ -446,6 +683,9 @@ class OnlineService(BaseService):
     online = True
     cookies_path = NotImplemented
     cache_path = NotImplemented
+    # Seconds during which the cached responses of the API are used without checking
+    # if they changed; they all are when the user asks for a refresh
+    library_cache_ttl = 6 * 3600
     requires_login_page = False
 
     login_url = NotImplemented
@@ -510,14 +750,24 @@ class OnlineService(BaseService):
             return False
         return all(system.path_exists(path) for path in self.credential_files)
 
-    def wipe_game_cache(self):
-        """Wipe the game cache, allowing it to be reloaded"""
+    @property
+    def library_cache(self) -> ServiceLibraryCache:
+        """The cache of the responses of the service's API; see ServiceLibraryCache"""
+        return ServiceLibraryCache.get(self.id, self.library_cache_ttl)
+
+    def expire_api_cache(self):
+        self.library_cache.expire()
+
+    def wipe_api_cache(self):
         if self.cache_path:
             logger.debug("Deleting %s cache %s", self.id, self.cache_path)
             if os.path.isdir(self.cache_path):
                 shutil.rmtree(self.cache_path)
             elif system.path_exists(self.cache_path):
                 os.remove(self.cache_path)
+
+    def wipe_game_cache(self):
+        self.library_cache.clear()
         super().wipe_game_cache()
 
     def logout(self):
@@ -539,3 +789,32 @@ class OnlineService(BaseService):
         cookiejar = WebkitCookieJar(self.cookies_path)
         cookiejar.load()
         return cookiejar
+
+
+def reload_services(services, reloaded_callback, refresh=False):
+    """Reload several services at once; see BaseService.start_reload(). Once all of them
+    are done, reloaded_callback is called on the main thread with a dict of the errors
+    raised, by service id."""
+    pending = {service.id for service in services}
+    errors = {}
+    if not pending:
+        reloaded_callback(errors)
+        return
+
+    def on_service_reloaded(service, error):
+        if error:
+            errors[service.id] = error
+        pending.discard(service.id)
+        if not pending:
+            logger.info(
+                "Services reloaded: %s",
+                "; ".join(
+                    "%s: %s" % (service.id, SERVICE_RELOAD_TIMINGS[service.id])
+                    for service in services
+                    if service.id in SERVICE_RELOAD_TIMINGS
+                ),
+            )
+            reloaded_callback(errors)
+
+    for service in services:
+        service.start_reload(lambda error, service=service: on_service_reloaded(service, error), refresh=refresh)
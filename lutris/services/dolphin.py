@@ -108,9 +108,10 @@ class DolphinGame(ServiceGame):
         if os.path.exists(banner_path):
             return banner_path
 
-        (width, height), data = cache_entry["volume_banner"]
-        if data:
-            img = Image.frombytes("RGB", (width, height), data, "raw", ("BGRX"))
+        volume_banner = cache_entry["volume_banner"]
+        if volume_banner.size:
+            data = volume_banner.read()
+            img = Image.frombytes("RGB", (volume_banner.width, volume_banner.height), data, "raw", ("BGRX"))
             # 96x32 is a bit small, maybe 2x scale?
             # img.resize((width * 2, height * 2))
             img.save(banner_path)
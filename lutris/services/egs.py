@@ -14,7 +14,7 @@ from lutris.database.games import add_game, get_game_by_field
 from lutris.database.services import ServiceGameCollection
 from lutris.game import Game
 from lutris.gui.widgets.utils import Image, paste_overlay, thumbnail_image
-from lutris.services.base import SERVICE_LOGIN, AuthTokenExpiredError, OnlineService
+from lutris.services.base import SERVICE_LOGIN, AuthTokenExpiredError, OnlineService, ServiceLibraryCache
 from lutris.services.lutris import sync_media
 from lutris.services.service_game import ServiceGame
 from lutris.services.service_media import ServiceMedia
@@ -160,6 +160,7 @@ class EpicGamesStoreService(OnlineService):
     cookies_path = os.path.join(settings.CACHE_DIR, ".egs.auth")
     token_path = os.path.join(settings.CACHE_DIR, ".egs.token")
     cache_path = os.path.join(settings.CACHE_DIR, "egs-library.json")
+    catalog_cache_ttl = 7 * 24 * 3600
     login_url = (
         "https://www.epicgames.com/id/login?redirectUrl="
         "https%3A//www.epicgames.com/id/api/redirect%3F"
@@ -247,22 +248,35 @@ class EpicGamesStoreService(OnlineService):
             auth_file.write(json.dumps(response_content, indent=2))
         self.session_data = response_content
 
+    @property
+    def catalog_cache(self) -> ServiceLibraryCache:
+        """The cache of the catalog details of the games, which seldom change"""
+        return ServiceLibraryCache.get("egs-catalog", self.catalog_cache_ttl)
+
     def get_game_details(self, asset):
         namespace = asset["namespace"]
         catalog_item_id = asset["catalogItemId"]
-        response = self.session.get(
-            "%s/catalog/api/shared/namespace/%s/bulk/items" % (self.catalog_url, namespace),
-            params={
-                "id": catalog_item_id,
-                "includeDLCDetails": True,
-                "includeMainGameDetails": True,
-                "country": "US",
-                "locale": "en",
-            },
-        )
-        response.raise_for_status()
+
+        def fetch(headers):
+            response = self.session.get(
+                "%s/catalog/api/shared/namespace/%s/bulk/items" % (self.catalog_url, namespace),
+                params={
+                    "id": catalog_item_id,
+                    "includeDLCDetails": True,
+                    "includeMainGameDetails": True,
+                    "country": "US",
+                    "locale": "en",
+                },
+                headers=headers,
+            )
+            if response.status_code == 304:
+                return None
+            response.raise_for_status()
+            return response.json(), response.headers
+
+        details, _changed = self.catalog_cache.get_page("%s/%s" % (namespace, catalog_item_id), fetch)
         # Merge the details with the initial asset to keep 'appName'
-        asset.update(response.json()[catalog_item_id])
+        asset.update(details[catalog_item_id])
         return asset
 
     @staticmethod
@@ -302,10 +316,8 @@ class EpicGamesStoreService(OnlineService):
             cursor = resData["responseMetadata"].get("nextCursor", None)
 
         games = []
+        records = [record for record in records if record["namespace"] != "ue"]
         for record in records:
-            if record["namespace"] == "ue":
-                continue
-
             game_details = self.get_game_details(record)
 
             if self.is_editor_resource(game_details):
@@ -317,8 +329,14 @@ class EpicGamesStoreService(OnlineService):
                 continue
 
             games.append(game_details)
+        self.catalog_cache.retain("%s/%s" % (record["namespace"], record["catalogItemId"]) for record in records)
+        self.catalog_cache.save()
         return games
 
+    def wipe_game_cache(self):
+        self.catalog_cache.clear()
+        super().wipe_game_cache()
+
     def load(self):
         """Load the list of games"""
         try:
@@ -67,12 +67,10 @@ class FlathubService(BaseService):
     runner = "flatpak"
     game_class = FlathubGame
 
-    def wipe_game_cache(self):
-        """Wipe the game cache, allowing it to be reloaded"""
+    def wipe_api_cache(self):
         if system.path_exists(self.cache_path):
             logger.debug("Deleting %s cache %s", self.id, self.cache_path)
             os.remove(self.cache_path)
-        super().wipe_game_cache()
 
     def get_flatpak_cmd(self):
         flatpak_abspath = shutil.which("flatpak")
@@ -20,9 +20,16 @@ from lutris.runners import get_runner_human_name
 from lutris.services.base import SERVICE_LOGIN, AuthTokenExpiredError, OnlineService
 from lutris.services.service_game import ServiceGame
 from lutris.services.service_media import ServiceMedia
-from lutris.util import i18n, system
+from lutris.util import i18n
 from lutris.util.gog_downloader import GOGDownloader
-from lutris.util.http import HTTPError, Request, UnauthorizedAccessError
+from lutris.util.http import (
+    HTTPError,
+    Request,
+    UnauthorizedAccessError,
+    fetch_concurrently,
+    fetch_pages,
+    fetch_with_retry,
+)
 from lutris.util.log import logger
 from lutris.util.strings import human_size, slugify
 
@@ -97,7 +104,7 @@ class GOGService(OnlineService):
     login_success_url = "https://www.gog.com/on_login_success"
     cookies_path = os.path.join(settings.CACHE_DIR, ".gog.auth")
     token_path = os.path.join(settings.CACHE_DIR, ".gog.token")
-    cache_path = os.path.join(settings.CACHE_DIR, "gog-library.json")
+    cache_path = None  # The library is cached by library_cache
 
     runner_to_os_dict = {"wine": "windows", "linux": "linux"}
 
@@ -231,6 +238,20 @@ class GOGService(OnlineService):
             raise AuthenticationError("Token expired, please log in again")
         return request.json
 
+    def make_conditional_request(self, url: str, headers: dict[str, str]) -> tuple[Any, list] | None:
+        """Send a cookie authenticated HTTP request to GOG with conditional headers. Return None
+        if the resource was not modified, or else its JSON and the headers of the response."""
+        request = Request(url, headers=headers, cookies=self.load_cookies())
+        try:
+            request.get()
+        except HTTPError as ex:
+            if ex.code == 304:
+                return None
+            raise
+        if request.content.startswith(b"<"):
+            raise AuthenticationError("Token expired, please log in again")
+        return request.json, request.response_headers
+
     def make_api_request(self, url: str) -> Any:
         """Send a token authenticated request to GOG"""
         token = self.load_token()
@@ -249,59 +270,53 @@ class GOGService(OnlineService):
         return self.make_api_request(url)
 
     def get_library(self) -> list[dict]:
-        """Return the user's library of GOG games"""
-        if system.path_exists(self.cache_path):
-            logger.debug("Returning cached GOG library")
-            with open(self.cache_path, "r", encoding="utf-8") as gog_cache:
-                return json.load(gog_cache)
-
-        total_pages = 1
-        games = []
-        page = 1
-        while page <= total_pages:
-            products_response = self.get_products_page(page=page)
-            page += 1
-            total_pages = products_response["totalPages"]
-            games += products_response["products"]
-        with open(self.cache_path, "w", encoding="utf-8") as gog_cache:
-            json.dump(games, gog_cache)
-        return games
+        """Return the user's library of GOG games. Its pages are kept in the library cache
+        and those that didn't change since they were last fetched aren't processed again."""
+        pages = fetch_pages(self.get_library_page, lambda products_response: products_response["totalPages"])
+        self.library_cache.retain(str(page) for page in range(1, len(pages) + 1))
+        self.library_cache.save()
+        return [product for products_response in pages for product in products_response["products"]]
+
+    def get_library_page(self, page: int) -> Any:
+        """Return a single page of the library, from the library cache if it is recent or unchanged"""
+        if not self.is_authenticated():
+            raise AuthenticationError("User is not logged in")
+        url = self.get_products_url(page)
+        products_response, _changed = self.library_cache.get_page(
+            str(page), lambda headers: self.make_conditional_request(url, headers), self.fix_supported_os
+        )
+        return products_response
 
     def get_service_game(self, gog_game: dict) -> GOGGame:
         return GOGGame.new_from_gog_game(gog_game)
 
-    def get_products_page(self, page: int = 1, search: str | None = None) -> Any:
-        """Return a single page of games"""
-        if not self.is_authenticated():
-            raise AuthenticationError("User is not logged in")
+    def get_products_url(self, page: int = 1, search: str | None = None) -> str:
         params = {"mediaType": "1"}
         if page:
             params["page"] = page
         if search:
             params["search"] = search
-        url = self.embed_url + "/account/getFilteredProducts?" + urlencode(params)
-        result = self.make_request(url)
+        return self.embed_url + "/account/getFilteredProducts?" + urlencode(params)
+
+    def get_products_page(self, page: int = 1, search: str | None = None) -> Any:
+        """Return a single page of games"""
+        if not self.is_authenticated():
+            raise AuthenticationError("User is not logged in")
+        return self.fix_supported_os(self.make_request(self.get_products_url(page, search)))
+
+    def fix_supported_os(self, result: dict) -> dict:
+        """Fill in the platforms of the products of a page that don't have any"""
         # HACK:
         # All of this works around the fact that the worksOn tag in the product
         # JSON is currently broken, where a game apparently "worksOn" nothing. So
-        # we fall back to GOG's API for the games on sales.
-        #
-        # Retrieving this info may fail for games that are in your inventory,
-        # but no longer available from the store. In that case we fake it.
-        for product in result["products"]:
+        # we fall back to GOG's API for the games on sales, looking them all up at once.
+        products = [
+            product
+            for product in result["products"]
+            if not any(product["worksOn"].get(os_name) for os_name in ("Windows", "Linux", "Mac"))
+        ]
+        for product, supported_os in zip(products, fetch_concurrently(self.get_supported_os, products)):
             worksOn = product["worksOn"]
-            if worksOn.get("Windows") or worksOn.get("Linux") or worksOn.get("Mac"):
-                continue  # If the game works on any platform, that'll do.
-
-            try:
-                info = self.make_request("https://api.gog.com/v2/games/" + str(product["id"]))
-                supported_os = info["_embedded"]["supportedOperatingSystems"]
-            except Exception as ex:
-                logger.exception(
-                    "Unable to retreive corrected OS support from GOG, falling back to 'Windows only': %s", ex
-                )
-                supported_os = [{"operatingSystem": {"name": "windows"}}]
-
             for cur_os in supported_os:
                 os_name = cur_os["operatingSystem"].get("name")
                 match os_name:
@@ -314,6 +329,18 @@ class GOGService(OnlineService):
         # end hack
         return result
 
+    def get_supported_os(self, product: dict) -> list[dict]:
+        """Return the operating systems a product supports, according to GOG's API.
+
+        Retrieving this info may fail for games that are in your inventory,
+        but no longer available from the store. In that case we fake it."""
+        try:
+            info = fetch_with_retry(self.make_request, "https://api.gog.com/v2/games/" + str(product["id"]))
+            return info["_embedded"]["supportedOperatingSystems"]
+        except Exception as ex:
+            logger.exception("Unable to retreive corrected OS support from GOG, falling back to 'Windows only': %s", ex)
+            return [{"operatingSystem": {"name": "windows"}}]
+
     def get_game_dlcs(self, product_id: str) -> list[dict]:
         """Return the list of DLC products for a game"""
         game_details = self.get_game_details(product_id)
@@ -17,16 +17,21 @@ import gzip
 import hashlib
 import json
 import os
+import sqlite3
+import tempfile
 import urllib.parse
 import urllib.request
 import zlib
-from collections.abc import Callable
+from collections.abc import Callable, Iterable
+from concurrent.futures import ThreadPoolExecutor, as_completed
 from dataclasses import dataclass, field
 from enum import Enum
 from gettext import gettext as _
 from pathlib import Path
-from typing import Any
+from typing import Any, BinaryIO, NamedTuple
 
+from lutris import settings
+from lutris.database import sql
 from lutris.util.http import HTTPError, Request
 from lutris.util.log import logger
 
@@ -47,6 +52,19 @@ EMPTY_GZIP_MD5 = "aadd86936a80ee8a369579c3926f1b3c"
 # Default timeout for cloud storage API requests (seconds)
 CLOUD_API_TIMEOUT = 30
 
+# Files are stored gzip-compressed in the cloud, and identified by the MD5 of the compressed data
+GZIP_COMPRESS_LEVEL = 6
+# The header gzip.compress() writes with mtime=0, so that files compressed in chunks get the same MD5
+GZIP_HEADER = gzip.compress(b"", compresslevel=GZIP_COMPRESS_LEVEL, mtime=0)[:10]
+READ_CHUNK_SIZE = 1024 * 1024
+# Compressed uploads are kept in memory up to this size, then spooled to a temporary file
+UPLOAD_SPOOL_SIZE = 16 * 1024 * 1024
+
+# Number of files uploaded or downloaded at once
+MAX_CONCURRENT_TRANSFERS = 4
+
+SYNC_METADATA_CACHE_PATH = os.path.join(settings.CACHE_DIR, "gog-cloud-files.db")
+
 LOCAL_TIMEZONE = datetime.datetime.now(datetime.timezone.utc).astimezone().tzinfo
 
 
@@ -91,17 +109,27 @@ class SyncFile:
     update_time: str | None = None
     update_ts: float | None = None
 
-    def compute_metadata(self) -> None:
-        """Compute md5 and update_time from the local file."""
-        if not os.path.exists(self.absolute_path):
+    def compute_metadata(self, file_stat: os.stat_result | None = None) -> None:
+        """Compute md5 and update_time from the local file. The file is only read if
+        it changed since its md5 was last computed."""
+        try:
+            file_stat = file_stat or os.stat(self.absolute_path)
+        except FileNotFoundError:
             return
-        ts = os.stat(self.absolute_path).st_mtime
-        date_time_obj = datetime.datetime.fromtimestamp(ts, tz=LOCAL_TIMEZONE).astimezone(datetime.timezone.utc)
+        try:
+            metadata = SYNC_METADATA_CACHE.lookup({self.absolute_path: file_stat}).get(self.absolute_path)
+            if not metadata:
+                metadata = compress_file(self.absolute_path)
+                SYNC_METADATA_CACHE.store([(self.absolute_path, file_stat, metadata)])
+        except OSError as ex:
+            logger.warning("Unable to read %s: %s", self.absolute_path, ex)
+            return
+        self.md5 = metadata.gzip_md5
+        self.set_update_time(file_stat.st_mtime)
 
-        with open(self.absolute_path, "rb") as f:
-            raw_data = f.read()
-        compressed = gzip.compress(raw_data, compresslevel=6, mtime=0)
-        self.md5 = hashlib.md5(compressed).hexdigest()
+    def set_update_time(self, ts: float) -> None:
+        """Set update_time and update_ts from a local modification time."""
+        date_time_obj = datetime.datetime.fromtimestamp(ts, tz=LOCAL_TIMEZONE).astimezone(datetime.timezone.utc)
         self.update_time = date_time_obj.isoformat(timespec="seconds")
         self.update_ts = date_time_obj.timestamp()
 
@@ -133,6 +161,101 @@ class SyncResult:
     error: str | None = None
 
 
+class FileMetadata(NamedTuple):
+    """MD5 of the content of a local file, and of that content compressed the way GOG stores it"""
+
+    md5: str
+    gzip_md5: str
+
+
+def compress_file(path: str, output: BinaryIO | None = None) -> FileMetadata:
+    """Gzip a file in chunks, the same way gzip.compress() would, and return its digests.
+    The compressed data is written to 'output' if given, otherwise it is only hashed."""
+    md5 = hashlib.md5()
+    gzip_md5 = hashlib.md5()
+    compressor = zlib.compressobj(GZIP_COMPRESS_LEVEL, zlib.DEFLATED, -zlib.MAX_WBITS)
+    crc = 0
+    size = 0
+
+    def write(data: bytes) -> None:
+        gzip_md5.update(data)
+        if output:
+            output.write(data)
+
+    write(GZIP_HEADER)
+    with open(path, "rb") as input_file:
+        while True:
+            chunk = input_file.read(READ_CHUNK_SIZE)
+            if not chunk:
+                break
+            md5.update(chunk)
+            crc = zlib.crc32(chunk, crc)
+            size += len(chunk)
+            write(compressor.compress(chunk))
+    write(compressor.flush())
+    write(crc.to_bytes(4, "little") + (size & 0xFFFFFFFF).to_bytes(4, "little"))
+    return FileMetadata(md5.hexdigest(), gzip_md5.hexdigest())
+
+
+class SyncMetadataCache:
+    """Digests of the local save files, persisted to a SQLite database so that files that
+    haven't changed since the last sync are not read again. Entries are keyed by the path,
+    size and modification time of the files. If the database is unusable, files are simply
+    read every time."""
+
+    def __init__(self, db_path: str) -> None:
+        self.db_path = db_path
+        self._initialized = False
+
+    def _init_database(self) -> None:
+        if self._initialized:
+            return
+        os.makedirs(os.path.dirname(self.db_path), exist_ok=True)
+        with sql.db_cursor(self.db_path) as cursor:
+            sql.cursor_execute(
+                cursor,
+                "CREATE TABLE IF NOT EXISTS sync_files ("
+                "path TEXT PRIMARY KEY, size INTEGER, mtime_ns INTEGER, md5 TEXT, gzip_md5 TEXT)",
+            )
+        self._initialized = True
+
+    def lookup(self, files: dict[str, os.stat_result]) -> dict[str, FileMetadata]:
+        """Return the digests of the files that haven't changed since they were stored"""
+        metadata = {}
+        try:
+            self._init_database()
+            with sql.db_cursor(self.db_path) as cursor:
+                for path, file_stat in files.items():
+                    row = sql.cursor_execute(
+                        cursor,
+                        "SELECT md5, gzip_md5 FROM sync_files WHERE path=? AND size=? AND mtime_ns=?",
+                        (path, file_stat.st_size, file_stat.st_mtime_ns),
+                    ).fetchone()
+                    if row:
+                        metadata[path] = FileMetadata(*row)
+        except (OSError, sqlite3.Error) as ex:
+            logger.warning("Unable to read the cloud save cache %s: %s", self.db_path, ex)
+        return metadata
+
+    def store(self, entries: Iterable[tuple[str, os.stat_result, FileMetadata]]) -> None:
+        """Save (path, stat of the file when it was read, digests) entries"""
+        try:
+            self._init_database()
+            with sql.db_cursor(self.db_path) as cursor:
+                for path, file_stat, metadata in entries:
+                    sql.cursor_execute(
+                        cursor,
+                        "INSERT OR REPLACE INTO sync_files (path, size, mtime_ns, md5, gzip_md5) "
+                        "VALUES (?, ?, ?, ?, ?)",
+                        (path, file_stat.st_size, file_stat.st_mtime_ns, metadata.md5, metadata.gzip_md5),
+                    )
+        except (OSError, sqlite3.Error) as ex:
+            logger.warning("Unable to update the cloud save cache %s: %s", self.db_path, ex)
+
+
+SYNC_METADATA_CACHE = SyncMetadataCache(SYNC_METADATA_CACHE_PATH)
+
+
 class GOGCloudStorageClient:
     """Client for GOG's cloud storage REST API.
 
@@ -149,7 +272,7 @@ class GOGCloudStorageClient:
         self,
         method: str,
         path: str,
-        data: bytes | None = None,
+        data: bytes | BinaryIO | None = None,
         extra_headers: dict[str, str] | None = None,
     ) -> tuple[bytes, dict[str, str]]:
         """Make an authenticated request to the cloud storage API.
@@ -157,7 +280,8 @@ class GOGCloudStorageClient:
         Args:
             method: HTTP method (GET, PUT, DELETE).
             path: URL path after the base URL.
-            data: Request body bytes for PUT requests.
+            data: Request body for PUT requests, as bytes or a file object
+                (which then needs a Content-Length header).
             extra_headers: Additional headers to include.
 
         Returns:
@@ -246,7 +370,7 @@ class GOGCloudStorageClient:
     def upload_file(self, sync_file: SyncFile, dir_name: str) -> bool:
         """Upload a local file to cloud storage.
 
-        The file is gzip-compressed and uploaded with metadata headers.
+        The file is gzip-compressed in chunks and uploaded with metadata headers.
 
         Args:
             sync_file: The file to upload (must have absolute_path and metadata computed).
@@ -259,33 +383,38 @@ class GOGCloudStorageClient:
             logger.error("Cannot upload %s: file does not exist", sync_file.absolute_path)
             return False
 
-        with open(sync_file.absolute_path, "rb") as f:
-            raw_data = f.read()
-        compressed_data = gzip.compress(raw_data, compresslevel=6, mtime=0)
-
         fpath = urllib.parse.quote(sync_file.relative_path)
         path = f"/v1/{self.user_id}/{self.client_id}/{dir_name}/{fpath}"
 
-        headers = {
-            "X-Object-Meta-LocalLastModified": sync_file.update_time or "",
-            "Etag": hashlib.md5(compressed_data).hexdigest(),
-            "Content-Encoding": "gzip",
-        }
-
-        try:
-            _response_body, _response_headers = self._make_request(
-                "PUT", path, data=compressed_data, extra_headers=headers
-            )
-            logger.info(
-                "Upload SUCCESS: %s (size: %d bytes compressed, MD5: %s)",
-                sync_file.relative_path,
-                len(compressed_data),
-                headers["Etag"],
-            )
-            return True
-        except HTTPError as ex:
-            logger.error("Upload FAILED: %s - %s", sync_file.relative_path, ex)
-            return False
+        with tempfile.SpooledTemporaryFile(max_size=UPLOAD_SPOOL_SIZE) as compressed_file:
+            try:
+                file_stat = os.stat(sync_file.absolute_path)
+                metadata = compress_file(sync_file.absolute_path, compressed_file)
+            except OSError as ex:
+                logger.error("Upload FAILED: %s - %s", sync_file.relative_path, ex)
+                return False
+            compressed_size = compressed_file.tell()
+            compressed_file.seek(0)
+            headers = {
+                "X-Object-Meta-LocalLastModified": sync_file.update_time or "",
+                "Etag": metadata.gzip_md5,
+                "Content-Encoding": "gzip",
+                "Content-Length": str(compressed_size),
+            }
+            try:
+                self._make_request("PUT", path, data=compressed_file, extra_headers=headers)
+            except HTTPError as ex:
+                logger.error("Upload FAILED: %s - %s", sync_file.relative_path, ex)
+                return False
+        logger.info(
+            "Upload SUCCESS: %s (size: %d bytes compressed, MD5: %s)",
+            sync_file.relative_path,
+            compressed_size,
+            metadata.gzip_md5,
+        )
+        sync_file.md5 = metadata.gzip_md5
+        SYNC_METADATA_CACHE.store([(sync_file.absolute_path, file_stat, metadata)])
+        return True
 
     def download_file(self, sync_file: SyncFile, dir_name: str) -> bool:
         """Download a file from cloud storage to local filesystem.
@@ -325,12 +454,17 @@ class GOGCloudStorageClient:
         # Ensure parent directory exists
         os.makedirs(os.path.dirname(sync_file.absolute_path), exist_ok=True)
 
+        # Write next to the save and move it in place, so an interrupted download never leaves a truncated save
+        temp_path = sync_file.absolute_path + ".lutris-download"
         try:
-            with open(sync_file.absolute_path, "wb") as f:
+            with open(temp_path, "wb") as f:
                 f.write(decompressed_data)
+            os.replace(temp_path, sync_file.absolute_path)
             logger.info("Successfully wrote %d bytes to %s", len(decompressed_data), sync_file.absolute_path)
         except Exception as ex:
             logger.error("Failed to write file %s: %s", sync_file.absolute_path, ex)
+            if os.path.exists(temp_path):
+                os.remove(temp_path)
             return False
 
         # Restore file modification time from cloud metadata
@@ -346,6 +480,9 @@ class GOGCloudStorageClient:
                     last_modified,
                 )
 
+        # The file was just hashed, no need to read it again on the next sync
+        metadata = FileMetadata(hashlib.md5(decompressed_data).hexdigest(), hashlib.md5(body).hexdigest())
+        SYNC_METADATA_CACHE.store([(sync_file.absolute_path, os.stat(sync_file.absolute_path), metadata)])
         logger.info("Download complete: %s", sync_file.relative_path)
         return True
 
@@ -685,6 +822,33 @@ def resolve_save_path(
     return os.path.normpath(resolved)
 
 
+def scan_directory(path: str) -> dict[str, os.stat_result]:
+    """List all files under a directory, with their stat, in a single pass.
+
+    Args:
+        path: Root directory to scan.
+
+    Returns:
+        Dict of absolute file paths to their stat results.
+    """
+    files: dict[str, os.stat_result] = {}
+    directories = [path]
+    while directories:
+        try:
+            entries = list(os.scandir(directories.pop()))
+        except (FileNotFoundError, NotADirectoryError):
+            continue
+        for entry in entries:
+            try:
+                if entry.is_dir():
+                    directories.append(entry.path)
+                else:
+                    files[entry.path] = entry.stat()
+            except OSError as ex:
+                logger.warning("Unable to read %s: %s", entry.path, ex)
+    return files
+
+
 def create_directory_map(path: str) -> list[str]:
     """Recursively list all files in a directory.
 
@@ -694,16 +858,85 @@ def create_directory_map(path: str) -> list[str]:
     Returns:
         List of absolute file paths.
     """
-    files = []
-    if not os.path.exists(path):
-        return files
-    for entry in os.listdir(path):
-        abs_path = os.path.join(path, entry)
-        if os.path.isdir(abs_path):
-            files.extend(create_directory_map(abs_path))
-        else:
-            files.append(abs_path)
-    return files
+    return list(scan_directory(path))
+
+
+def get_local_files(save_path: str) -> list[SyncFile]:
+    """List the files of a save directory with their metadata. Only the files that
+    changed since the last sync are read, a few at a time.
+
+    Args:
+        save_path: The local save directory.
+
+    Returns:
+        List of SyncFile objects with their metadata computed.
+    """
+    file_stats = scan_directory(save_path)
+    metadata = SYNC_METADATA_CACHE.lookup(file_stats)
+    missing = [path for path in file_stats if path not in metadata]
+
+    def read_file(path: str) -> tuple[str, FileMetadata | None]:
+        try:
+            return path, compress_file(path)
+        except OSError as ex:
+            logger.warning("Unable to read %s: %s", path, ex)
+            return path, None
+
+    if missing:
+        with ThreadPoolExecutor(max_workers=min(MAX_CONCURRENT_TRANSFERS, len(missing))) as executor:
+            computed = {
+                path: file_metadata for path, file_metadata in executor.map(read_file, missing) if file_metadata
+            }
+        SYNC_METADATA_CACHE.store((path, file_stats[path], digests) for path, digests in computed.items())
+        metadata.update(computed)
+    logger.debug("Read %d of %d local save files", len(missing), len(file_stats))
+
+    local_files = []
+    for path, file_stat in file_stats.items():
+        if path not in metadata:
+            continue
+        sync_file = SyncFile(relative_path=get_relative_path(save_path, path), absolute_path=path)
+        sync_file.md5 = metadata[path].gzip_md5
+        sync_file.set_update_time(file_stat.st_mtime)
+        local_files.append(sync_file)
+    return local_files
+
+
+def run_transfers(
+    transfer: Callable[[SyncFile], bool],
+    files: list[SyncFile],
+    progress_callback: Callable[[int, int, str], None] | None = None,
+    start: int = 0,
+    total: int = 0,
+) -> list[SyncFile]:
+    """Run transfer() on files, a few at a time, and return those it succeeded for.
+
+    Args:
+        transfer: Uploads, downloads or deletes a file, returning True on success.
+        files: The files to transfer.
+        progress_callback: Optional callable invoked as each file is done, with
+            arguments (current_index, total_files, filename). If it raises, the
+            transfers that haven't started yet are cancelled.
+        start: Index of the first file, for the progress callback.
+        total: Total number of files, for the progress callback.
+
+    Returns:
+        The files transferred successfully, in the order they were given.
+    """
+    if not files:
+        return []
+    succeeded = set()
+    executor = ThreadPoolExecutor(max_workers=min(MAX_CONCURRENT_TRANSFERS, len(files)))
+    try:
+        futures = {executor.submit(transfer, f): index for index, f in enumerate(files)}
+        for index, future in enumerate(as_completed(futures), start):
+            if progress_callback:
+                progress_callback(index, total or len(files), files[futures[future]].relative_path)
+            if future.result():
+                succeeded.add(futures[future])
+    finally:
+        executor.shutdown(cancel_futures=True)
+    return [f for index, f in enumerate(files) if index in succeeded]
 
 
 def get_relative_path(root: str, path: str) -> str:
@@ -740,8 +973,6 @@ class GOGCloudSync:
 
     def _get_timestamp_path(self) -> str:
         """Return the path to the sync timestamps file."""
-        from lutris import settings
-
         return os.path.join(settings.CACHE_DIR, "gog_cloud_sync_timestamps.json")
 
     def _load_sync_timestamps(self) -> None:
@@ -857,17 +1088,7 @@ class GOGCloudSync:
         client = GOGCloudStorageClient(user_id, client_id, access_token)
 
         # Step 5: Scan local files
-        dir_list = create_directory_map(save_path)
-        local_files = [
-            SyncFile(
-                relative_path=get_relative_path(save_path, f),
-                absolute_path=f,
-            )
-            for f in dir_list
-        ]
-        for f in local_files:
-            f.compute_metadata()
-
+        local_files = get_local_files(save_path)
         logger.info("Local files: %d", len(local_files))
 
         # Step 6: Get cloud files
@@ -879,15 +1100,18 @@ class GOGCloudSync:
         downloadable_cloud = [f for f in cloud_files if f.md5 != EMPTY_GZIP_MD5]
         logger.info("Cloud files: %d", len(cloud_files))
 
+        def upload(f: SyncFile) -> bool:
+            return client.upload_file(f, location_name)
+
+        def download(f: SyncFile) -> bool:
+            return client.download_file(f, location_name)
+
         # Step 7: Handle trivial cases
         if local_files and not cloud_files:
             logger.info("No files in cloud, uploading all local files")
             action = SyncAction.UPLOAD
-            for i, f in enumerate(local_files):
-                if progress_callback:
-                    progress_callback(i, len(local_files), f.relative_path)
-                if client.upload_file(f, location_name):
-                    result.uploaded.append(f.relative_path)
+            uploaded = run_transfers(upload, local_files, progress_callback)
+            result.uploaded.extend(f.relative_path for f in uploaded)
             result.action = action
             result.timestamp = datetime.datetime.now().timestamp()
             self.set_sync_timestamp(game_id, location_name, result.timestamp)
@@ -896,11 +1120,8 @@ class GOGCloudSync:
         if not local_files and cloud_files:
             logger.info("No local files, downloading all cloud files")
             action = SyncAction.DOWNLOAD
-            for i, f in enumerate(downloadable_cloud):
-                if progress_callback:
-                    progress_callback(i, len(downloadable_cloud), f.relative_path)
-                if client.download_file(f, location_name):
-                    result.downloaded.append(f.relative_path)
+            downloaded = run_transfers(download, downloadable_cloud, progress_callback)
+            result.downloaded.extend(f.relative_path for f in downloaded)
             result.action = action
             result.timestamp = datetime.datetime.now().timestamp()
             self.set_sync_timestamp(game_id, location_name, result.timestamp)
@@ -930,37 +1151,31 @@ class GOGCloudSync:
                 result.action = SyncAction.NONE
                 return result
 
-        # Step 10: Execute sync
+        # Step 10: Execute sync, skipping the files whose content is the same on both sides
+        local_md5s = {f.relative_path: f.md5 for f in local_files}
+        cloud_md5s = {f.relative_path: f.md5 for f in cloud_files}
         if action == SyncAction.UPLOAD:
-            all_upload = classifier.updated_local + classifier.not_existing_locally
-            total = len(all_upload)
-            logger.info("Uploading %d files", len(classifier.updated_local))
-            idx = 0
-            for f in classifier.updated_local:
-                if progress_callback:
-                    progress_callback(idx, total, f.relative_path)
-                if client.upload_file(f, location_name):
-                    result.uploaded.append(f.relative_path)
-                idx += 1
-            for f in classifier.not_existing_locally:
-                if progress_callback:
-                    progress_callback(idx, total, f.relative_path)
-                if client.delete_file(f, location_name):
-                    result.deleted_cloud.append(f.relative_path)
-                idx += 1
+            to_upload = [f for f in classifier.updated_local if cloud_md5s.get(f.relative_path) != f.md5]
+            total = len(to_upload) + len(classifier.not_existing_locally)
+            logger.info("Uploading %d files", len(to_upload))
+            uploaded = run_transfers(upload, to_upload, progress_callback, total=total)
+            result.uploaded.extend(f.relative_path for f in uploaded)
+            deleted = run_transfers(
+                lambda f: client.delete_file(f, location_name),
+                classifier.not_existing_locally,
+                progress_callback,
+                start=len(to_upload),
+                total=total,
+            )
+            result.deleted_cloud.extend(f.relative_path for f in deleted)
 
         elif action == SyncAction.DOWNLOAD:
-            all_download = classifier.updated_cloud + classifier.not_existing_remotely
-            total = len(all_download)
-            logger.info("Downloading %d files", len(classifier.updated_cloud))
-            idx = 0
-            for f in classifier.updated_cloud:
-                if progress_callback:
-                    progress_callback(idx, total, f.relative_path)
-                if client.download_file(f, location_name):
-                    result.downloaded.append(f.relative_path)
-                idx += 1
-            for f in classifier.not_existing_remotely:
+            to_download = [f for f in classifier.updated_cloud if local_md5s.get(f.relative_path) != f.md5]
+            total = len(to_download) + len(classifier.not_existing_remotely)
+            logger.info("Downloading %d files", len(to_download))
+            downloaded = run_transfers(download, to_download, progress_callback, total=total)
+            result.downloaded.extend(f.relative_path for f in downloaded)
+            for idx, f in enumerate(classifier.not_existing_remotely, len(to_download)):
                 if progress_callback:
                     progress_callback(idx, total, f.relative_path)
                 logger.info("Deleting local file: %s", f.absolute_path)
@@ -969,7 +1184,6 @@ class GOGCloudSync:
                     result.deleted_local.append(f.relative_path)
                 except OSError as ex:
                     logger.error("Failed to delete %s: %s", f.absolute_path, ex)
-                idx += 1
 
         elif action == SyncAction.CONFLICT:
             logger.warning("Save files are in conflict — user action required")
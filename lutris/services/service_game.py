@@ -1,7 +1,5 @@
 """Service game module"""
 
-from lutris import settings
-from lutris.database import sql
 from lutris.database.services import ServiceGameCollection
 from lutris.services.service_media import ServiceMedia
 
@@ -36,8 +34,4 @@ class ServiceGame:
             "logo": self.logo,
             "details": str(self.details),
         }
-        existing_game = ServiceGameCollection.get_game(self.service, self.appid)
-        if existing_game:
-            sql.db_update(settings.DB_PATH, "service_games", game_data, {"id": existing_game["id"]})
-        else:
-            sql.db_insert(settings.DB_PATH, "service_games", game_data)
+        ServiceGameCollection.save_game(game_data)
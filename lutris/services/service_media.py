@@ -25,6 +25,14 @@ class MediaPath:
         self.service_media = service_media
         self.size = size or service_media.size
 
+    def __eq__(self, other: object) -> bool:
+        if not isinstance(other, MediaPath):
+            return NotImplemented
+        return (self.path, self.size, type(self.service_media)) == (other.path, other.size, type(other.service_media))
+
+    def __hash__(self) -> int:
+        return hash((self.path, self.size, type(self.service_media)))
+
     @property
     def width(self) -> int:
         return self.size[0]
@@ -2,9 +2,15 @@
 
 import json
 import os
+import re
+import shutil
 from collections import defaultdict
+from functools import cached_property
 from gettext import gettext as _
 
+import requests
+from gi.repository import Gio
+
 from lutris import settings
 from lutris.config import LutrisConfig, write_game_config
 from lutris.database import sql
@@ -12,40 +18,89 @@ from lutris.database.games import add_game, get_game_by_field, get_games
 from lutris.database.services import ServiceGameCollection
 from lutris.game import Game
 from lutris.installer.installer_file import InstallerFile
-from lutris.services.base import BaseService
+from lutris.services.base import SERVICE_GAMES_LOADED, BaseService
 from lutris.services.lutris import sync_media
 from lutris.services.service_game import ServiceGame
 from lutris.services.service_media import ServiceMedia
+from lutris.util import system
+from lutris.util.jobs import AsyncCall
 from lutris.util.log import logger
-from lutris.util.steam.appmanifest import AppManifest, get_appmanifests
-from lutris.util.steam.config import get_active_steamid64, get_steam_library, get_steamapps_dirs
+from lutris.util.steam.appinfo import get_app_info, get_appinfo_reader, get_asset_filename, get_library_cache_path
+from lutris.util.steam.appmanifest import AppManifestIndex, get_appmanifests
+from lutris.util.steam.config import get_active_steamid64, get_steam_dir, get_steam_library, get_steamapps_dirs
+from lutris.util.steam.watcher import SteamWatcher
 from lutris.util.strings import slugify
 
+# App manifest indexes and watchers of the Steam services, by service id
+MANIFEST_INDEXES = {}
+STEAM_WATCHERS = {}
+
+
+class SteamMedia(ServiceMedia):
+    """Media of Steam games, taken from Steam's own library cache when it has them"""
 
-class SteamBanner(ServiceMedia):
     service = "steam"
+    api_field = "appid"
+    library_asset = None  # Name of the asset in appinfo.vdf
+    library_filename = None  # Default name of the file in the library cache, if Steam keeps it there
+
+    @cached_property
+    def steam_dir(self):
+        """Steam installation with a library cache, if any"""
+        steam_dir = get_steam_dir()
+        if steam_dir and os.path.isdir(os.path.join(steam_dir, "appcache", "librarycache")):
+            return steam_dir
+        return None
+
+    def get_media_url(self, details):
+        appid = details.get(self.api_field)
+        steam_dir = self.steam_dir if self.library_filename else None
+        if appid and steam_dir:
+            filename = self.library_filename
+            app_info = get_app_info(appid, steam_dir)
+            if app_info:
+                filename = get_asset_filename(app_info, self.library_asset) or filename
+            local_path = get_library_cache_path(steam_dir, appid, filename)
+            if local_path:
+                return local_path
+        return super().get_media_url(details)
+
+    def download(self, slug, url):
+        if not url or url.startswith("http"):
+            return super().download(slug, url)
+        cache_path = os.path.join(self.dest_path, self.get_filename(slug))
+        if system.path_exists(cache_path, exclude_empty=True):
+            return
+        try:
+            shutil.copy(url, cache_path)
+        except OSError as ex:
+            logger.error("Failed to copy %s from the Steam library cache: %s", url, ex)
+            return
+        return cache_path
+
+
+class SteamBanner(SteamMedia):
     size = (184, 69)
     dest_path = os.path.join(settings.CACHE_DIR, "steam/banners")
     file_patterns = ["%s.jpg"]
-    api_field = "appid"
     url_pattern = "http://cdn.akamai.steamstatic.com/steam/apps/%s/capsule_184x69.jpg"
 
 
-class SteamCover(ServiceMedia):
-    service = "steam"
+class SteamCover(SteamMedia):
     size = (200, 300)
     dest_path = os.path.join(settings.CACHE_DIR, "steam/covers")
     file_patterns = ["%s.jpg"]
-    api_field = "appid"
+    library_asset = "library_capsule"
+    library_filename = "library_600x900.jpg"
     url_pattern = "http://cdn.steamstatic.com/steam/apps/%s/library_600x900.jpg"
 
 
-class SteamBannerLarge(ServiceMedia):
-    service = "steam"
+class SteamBannerLarge(SteamMedia):
     size = (460, 215)
     dest_path = os.path.join(settings.CACHE_DIR, "steam/header")
     file_patterns = ["%s.jpg"]
-    api_field = "appid"
+    library_asset = "header_image"
+    library_filename = "header.jpg"
     url_pattern = "https://cdn.cloudflare.steamstatic.com/steam/apps/%s/header.jpg"
 
 
@@ -93,7 +148,11 @@ class SteamService(BaseService):
         if not steamid:
             logger.error("Unable to find SteamID from Steam config")
             return
-        steam_games = get_steam_library(steamid)
+        try:
+            steam_games = get_steam_library(steamid)
+        except requests.RequestException as ex:
+            logger.warning("Unable to reach the Steam Web API (%s), loading the installed games from Steam", ex)
+            steam_games = self.get_offline_library()
         if not steam_games:
             raise RuntimeError(_("Failed to load games. Check that your profile is set to public during the sync."))
         for steam_game in steam_games:
@@ -104,13 +163,35 @@ class SteamService(BaseService):
         self.match_games()
         return steam_games
 
+    def get_offline_library(self):
+        """Return the installed Steam games, in the format of the Web API, with the
+        names and types Steam keeps in its appinfo.vdf"""
+        steam_games = []
+        appids = set()
+        for steamapps_path in self.steamapps_paths:
+            try:
+                appids.update(re.findall(r"\d+", filename)[0] for filename in get_appmanifests(steamapps_path))
+            except OSError as ex:
+                logger.warning("Unable to read Steam library folder %s: %s", steamapps_path, ex)
+        with get_appinfo_reader() as reader:
+            if not reader:
+                return []
+            for appid in sorted(appids, key=int):
+                app_info = reader.get_app_info(appid)
+                if app_info and app_info["name"] and app_info["type"] == "game":
+                    steam_games.append({"appid": app_info["appid"], "name": app_info["name"]})
+        return steam_games
+
     def match_game(self, service_game, lutris_game):
         super().match_game(service_game, lutris_game)
 
         if service_game:
             # Copy playtimes from Steam's data
+            steam_game_playtime = json.loads(service_game["details"]).get("playtime_forever")
+            if steam_game_playtime is None:
+                # Not known when the library was loaded offline
+                return
             for game in get_games(filters={"service": self.id, "service_id": service_game["appid"]}):
-                steam_game_playtime = json.loads(service_game["details"]).get("playtime_forever")
                 playtime = steam_game_playtime / 60
                 sql.db_update(settings.DB_PATH, "games", {"playtime": playtime}, conditions={"id": game["id"]})
 
@@ -165,56 +246,128 @@ class SteamService(BaseService):
     def steamapps_paths(self):
         return get_steamapps_dirs()
 
-    def add_installed_games(self):
-        """Syncs installed Steam games with Lutris"""
-        stats = {"installed": 0, "removed": 0, "deduped": 0, "paths": []}
-        installed_slugs = []
-        installed_appids = []
+    @property
+    def library_config_path(self):
+        """Path of the libraryfolders.vdf file listing the Steam library folders"""
+        steam_dir = get_steam_dir()
+        if steam_dir:
+            return os.path.join(steam_dir, "config/libraryfolders.vdf")
+        return None
 
-        for steamapps_path in self.steamapps_paths:
-            for appmanifest_file in get_appmanifests(steamapps_path):
-                if steamapps_path not in stats["paths"]:
-                    stats["paths"].append(steamapps_path)
-                app_manifest_path = os.path.join(steamapps_path, appmanifest_file)
-                try:
-                    app_manifest = AppManifest(app_manifest_path)
-                    installed_appids.append(app_manifest.steamid)
-                    slug = self.install_from_steam(app_manifest)
-                    if slug:
-                        installed_slugs.append(slug)
-                    stats["installed"] += 1
-                except Exception as ex:
-                    logger.error("Failed to process app manifest %s: %s", app_manifest_path, ex)
+    @property
+    def manifest_index(self):
+        """Index of the app manifests, shared by all instances of the service"""
+        if self.id not in MANIFEST_INDEXES:
+            MANIFEST_INDEXES[self.id] = AppManifestIndex(
+                os.path.join(settings.CACHE_DIR, "steam", "%s-manifests.json" % self.id)
+            )
+        return MANIFEST_INDEXES[self.id]
+
+    def has_lutris_game(self, appid):
+        """Return whether the game was added to Lutris from its Steam install"""
+        return bool(get_game_by_field("%s-%s" % (self.id, appid), "installer_slug"))
+
+    def install_from_manifests(self, app_manifests):
+        """Add the games of app manifests to Lutris and return the slugs of those added.
 
-        if stats["paths"]:
-            logger.debug("%s Steam games detected and installed", stats["installed"])
-            logger.debug("Games found in: %s", ", ".join(stats["paths"]))
+        The manifests of installed games that couldn't be added, because they aren't in the
+        service's library yet or because of an error, are dropped from the manifest index so
+        that they are tried again on the next sync."""
+        installed_slugs = []
+        for app_manifest in app_manifests:
+            slug = self.install_from_steam(app_manifest)
+            if slug:
+                installed_slugs.append(slug)
+            elif app_manifest.is_installed() and not self.has_lutris_game(app_manifest.steamid):
+                self.manifest_index.forget(app_manifest.appmanifest_path)
+        return installed_slugs
+
+    def add_installed_games(self):
+        """Syncs installed Steam games with Lutris
+
+        Only the app manifests that changed since the previous sync are parsed. All of them
+        are on the first sync, or when the library folders changed; only then are the Steam
+        games of the database checked against the installed games and deduplicated."""
+        steamapps_paths = list(self.steamapps_paths)
+        manifest_index = self.manifest_index
+        full_scan = manifest_index.needs_full_scan(steamapps_paths)
+        changed_manifests, removed_appids = manifest_index.update(steamapps_paths)
+
+        installed_slugs = self.install_from_manifests(changed_manifests)
+        logger.debug(
+            "%s Steam app manifests %s in: %s",
+            len(changed_manifests),
+            "scanned" if full_scan else "changed",
+            ", ".join(steamapps_paths) or "no Steam folder",
+        )
+
+        if full_scan:
+            removed_count = self.uninstall_missing_games(manifest_index.installed_appids)
+            deduped_count = self.deduplicate_games()
+            logger.debug("%s Steam games removed, %s deduplicated", removed_count, deduped_count)
         else:
-            logger.debug("No Steam folder found with games")
+            self.uninstall_appids(removed_appids)
 
-        db_games = get_games(filters={"runner": "steam"})
-        for db_game in db_games:
-            steam_game = Game(db_game["id"])
-            if steam_game.config is None:
-                logger.warning("Steam game %s has no config", db_game["id"])
-                continue
-            try:
-                appid = steam_game.config.game_level["game"]["appid"]
-            except KeyError:
-                logger.warning("Steam game %s has no AppID", db_game["id"])
-                continue
-            if appid not in installed_appids:
+        manifest_index.save()
+        sync_media(installed_slugs)
+
+    def sync_app_manifest(self, appmanifest_path):
+        """Update the Lutris library after a single app manifest was created, modified or deleted"""
+        try:
+            app_manifest, removed_appids = self.manifest_index.update_manifest(appmanifest_path)
+        except Exception as ex:
+            logger.error("Failed to process app manifest %s: %s", appmanifest_path, ex)
+            return
+        if app_manifest:
+            installed_slugs = self.install_from_manifests([app_manifest])
+            if installed_slugs:
+                sync_media(installed_slugs)
+        self.uninstall_appids(removed_appids)
+        self.manifest_index.save()
+
+    @staticmethod
+    def _get_db_game_appid(db_game):
+        if db_game["service_id"]:
+            return db_game["service_id"]
+        # Games not added from the Steam service only have their AppID in their configuration
+        steam_game = Game(db_game["id"])
+        if steam_game.config is None:
+            logger.warning("Steam game %s has no config", db_game["id"])
+            return None
+        try:
+            return steam_game.config.game_level["game"]["appid"]
+        except KeyError:
+            logger.warning("Steam game %s has no AppID", db_game["id"])
+            return None
+
+    def uninstall_missing_games(self, installed_appids):
+        """Uninstall the Steam games of the database that are no longer installed in Steam"""
+        removed_count = 0
+        for db_game in get_games(filters={"runner": "steam"}):
+            appid = self._get_db_game_appid(db_game)
+            if appid and appid not in installed_appids:
                 try:
-                    steam_game.uninstall()
-                    stats["removed"] += 1
+                    Game(db_game["id"]).uninstall()
+                    removed_count += 1
                 except Exception as ex:
                     logger.error("Failed to uninstall game %s: %s", appid, ex)
+        return removed_count
 
-        logger.debug("%s Steam games removed", stats["removed"])
+    def uninstall_appids(self, appids):
+        """Uninstall the Steam games of the database matching some AppIDs"""
+        for appid in appids:
+            for db_game in get_games(filters={"runner": "steam", "service_id": appid}):
+                try:
+                    Game(db_game["id"]).uninstall()
+                    logger.debug("Steam game %s was uninstalled", appid)
+                except Exception as ex:
+                    logger.error("Failed to uninstall game %s: %s", appid, ex)
 
+    def deduplicate_games(self):
+        """Delete the unplayed copies of Steam games added more than once"""
+        deduped_count = 0
         db_appids = defaultdict(list)
-        db_games = get_games(filters={"service": "steam"})
-        for db_game in db_games:
+        for db_game in get_games(filters={"service": "steam"}):
             db_appids[db_game["service_id"]].append(db_game["id"])
 
         for _appid, game_ids in db_appids.items():
@@ -230,12 +383,50 @@ class SteamService(BaseService):
                         # Unsafe to emit a signal from a worker thread!
                         steam_game.uninstall()
                         steam_game.delete()
-                        stats["deduped"] += 1
+                        deduped_count += 1
                     except Exception as ex:
                         logger.error("Failed to deduplicate game %s: %s", game_id, ex)
-
-        sync_media(installed_slugs)
-        logger.debug("%s Steam games deduplicated", stats["deduped"])
+        return deduped_count
+
+    def start_reload(self, reloaded_callback, refresh=False):
+        def on_reloaded(error):
+            if not error and self.id not in STEAM_WATCHERS:
+                self.start_watching()
+            reloaded_callback(error)
+
+        super().start_reload(on_reloaded, refresh=refresh)
+
+    def start_watching(self):
+        """Watch the Steam library folders and keep installed games in sync as Steam
+        installs and uninstalls them. This must be called on the main thread."""
+        watcher = STEAM_WATCHERS.pop(self.id, None)
+        if watcher:
+            watcher.stop()
+        STEAM_WATCHERS[self.id] = SteamWatcher(
+            self.steamapps_paths, self._on_steam_library_changed, library_config_path=self.library_config_path
+        )
+
+    def _on_steam_library_changed(self, event_type, path):
+        if path == self.library_config_path:
+            if event_type != Gio.FileMonitorEvent.CHANGES_DONE_HINT:
+                return
+            logger.info("Steam library folders changed, rescanning them")
+            self.manifest_index.invalidate()
+            self.start_watching()
+            AsyncCall(self.add_installed_games, self._on_steam_library_synced)
+        elif event_type in (
+            Gio.FileMonitorEvent.CHANGES_DONE_HINT,
+            Gio.FileMonitorEvent.DELETED,
+            Gio.FileMonitorEvent.MOVED_IN,
+            Gio.FileMonitorEvent.MOVED_OUT,
+        ):
+            AsyncCall(self.sync_app_manifest, self._on_steam_library_synced, path)
+
+    def _on_steam_library_synced(self, _result, error):
+        if error:
+            logger.error("Failed to sync the Steam library: %s", error)
+            return
+        SERVICE_GAMES_LOADED.fire(self)
 
     def generate_installer(self, db_game):
         """Generate a basic Steam installer"""
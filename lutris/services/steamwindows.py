@@ -73,6 +73,11 @@ class SteamWindowsService(SteamService):
 
         application.show_installer_window(installers, service=self, appid=appid)
 
+    @property
+    def library_config_path(self):
+        # Only the main steamapps folder of the Windows Steam client is used
+        return None
+
     @property
     def steamapps_paths(self):
         """Return steamapps paths"""
@@ -2,7 +2,6 @@
 
 import json
 import os
-import time
 import typing
 from gettext import gettext as _
 from typing import Any
@@ -17,13 +16,16 @@ from lutris.services.base import SERVICE_LOGIN, OnlineService
 from lutris.services.service_game import ServiceGame
 from lutris.services.service_media import ServiceMedia
 from lutris.util import system
-from lutris.util.http import HTTPError, Request
+from lutris.util.http import HTTPError, Request, fetch_pages
 from lutris.util.log import logger
 from lutris.util.strings import computer_size
 
 if typing.TYPE_CHECKING:
     from lutris.installer.installer import LutrisInstaller
 
+# Pages of the library fetched at the same time
+ZOOM_MAX_REQUESTS = 2
+
 
 class ZoomCover(ServiceMedia):
     """Small size game logo"""
@@ -157,20 +159,19 @@ class ZoomService(OnlineService):
                 return json.load(zoom_cache)
 
         url = f"{self.api_url}/li/games"
-        response = self.make_request(url)
-        current_page = response.get("current_page", 0)
-        total_pages = response.get("total_pages", 0)
-
-        games = response["games"]
-        while current_page < total_pages - 1:
-            time.sleep(1)  # Avoid hitting the API too fast, until HTTP 429 is handled in the Request class
-            logger.debug("Fetching additional pages of Zoom library")
-            current_page += 1
-            next_page_url = f"{url}?page={current_page}"
-            response = self.make_request(next_page_url)
-            games.extend(response["games"])
-
-        # print(games)
+
+        def fetch_page(page: int) -> dict:
+            if page:
+                logger.debug("Fetching additional pages of Zoom library")
+                return self.make_request(f"{url}?page={page}")
+            return self.make_request(url)
+
+        # Zoom doesn't like being hit too fast; requests answered with HTTP 429 are retried
+        pages = fetch_pages(
+            fetch_page, lambda response: response.get("total_pages", 0), first_page=0, max_workers=ZOOM_MAX_REQUESTS
+        )
+        games = [game for response in pages for game in response["games"]]
+
         with open(self.cache_path, "w", encoding="utf-8") as zoom_cache:
             json.dump(games, zoom_cache)
 
@@ -20,9 +20,11 @@ from lutris.runners.json import load_json_runners
 from lutris.services import DEFAULT_SERVICES
 from lutris.util.graphics import vkquery
 from lutris.util.graphics.gpu import preload_gpus
+from lutris.util.hash_cache import FILE_HASH_CACHE
 from lutris.util.linux import LINUX_SYSTEM
 from lutris.util.log import logger
 from lutris.util.path_cache import build_path_cache
+from lutris.util.probe_cache import PROBE_CACHE
 from lutris.util.system import create_folder
 from lutris.util.wine.dxvk import REQUIRED_VULKAN_API_VERSION
 
@@ -147,6 +149,11 @@ def run_all_checks(async_ops: bool = True) -> None:
     check_libs run on a background thread to avoid blocking the UI. When False,
     everything runs synchronously on the calling thread so that log output
     stays predictable (useful for CLI paths with no main loop)."""
+    if async_ops:
+        # Probes of the system whose cached results are stale are run again before they are needed
+        threading.Thread(target=PROBE_CACHE.refresh, daemon=True).start()
+        # Digests of files that were deleted or modified since they were hashed are dropped
+        threading.Thread(target=FILE_HASH_CACHE.prune, daemon=True).start()
     preload_gpus(async_ops=async_ops)
     if async_ops:
         threading.Thread(target=check_libs, daemon=True).start()
@@ -1,5 +1,4 @@
 import struct
-from io import BytesIO
 
 # for the record:
 #  - int32 = signed varint
@@ -176,7 +175,72 @@ class type_bytes(PrimativeType):
 type_enum = type_int64
 
 
+class LazyMessageField:
+    """Attribute of the Message fields holding other messages. The location of those
+    messages is recorded when their parent is decoded, but they are only decoded when
+    the attribute is first accessed; the result then shadows the descriptor in the
+    instance's __dict__."""
+
+    def __init__(self, name, default=None):
+        self.name = name
+        self.default = default
+
+    def __get__(self, instance, owner=None):
+        if instance is None:
+            return self.default
+        spans = instance.__dict__.get("_spans")
+        pending = spans.pop(self.name, None) if spans else None
+        if pending is None:
+            # Not set, or decoded by another thread in the meantime
+            return instance.__dict__.get(self.name, self.default)
+        field_type, buffer, field_spans, repeated = pending
+        values = []
+        for start, end in field_spans:
+            value = field_type()
+            value.decode_from(buffer, start, end)
+            values.append(value)
+        value = values if repeated else values[-1]
+        instance.__dict__[self.name] = value
+        return value
+
+
+class FieldTable:
+    """Fields of a Message class indexed by field number, built from its __lookup__"""
+
+    def __init__(self, message_class, lookup):
+        self.message_class = message_class
+        self.fields = {}
+        for field_multiplicity, field_type, field_name, field_number in lookup:
+            if issubclass(field_type, Message):
+                is_message = True
+                decode = None
+            elif issubclass(field_type, PrimativeType):
+                is_message = False
+                decode = field_type.decode
+            else:
+                raise TypeError("field type must be a subclass of PrimativeType or Message")
+            self.fields[field_number] = (
+                field_type,
+                field_name,
+                field_multiplicity == "repeated",
+                is_message,
+                decode,
+            )
+
+
+_fixed_sizes = {1: 8, 5: 4}
+
+# Single messages up to this size are decoded right away, deferring them would cost more
+EAGER_MESSAGE_SIZE = 128
+
+
 class Message:
+    """Base class of protobuf messages. Subclasses list their fields in __lookup__ as
+    (multiplicity, type, name, number) tuples, and declare the fields as class attributes
+    holding their default values."""
+
+    _field_table = None
+
     @staticmethod
     def read_varint(stream):
         res = 0
@@ -189,6 +253,22 @@ class Message:
             i += 1
         return res
 
+    @staticmethod
+    def read_varint_at(buffer, position):
+        """Read a varint from a buffer, return its value and the position after it"""
+        c = buffer[position]
+        if c < 128:
+            return c, position + 1
+        res = c & 127
+        shift = 7
+        while 1:
+            position += 1
+            c = buffer[position]
+            res |= (c & 127) << shift
+            if c < 128:
+                return res, position + 1
+            shift += 7
+
     @staticmethod
     def signed_to_long(x, bits):
         "converts a previously read signed varint into a long"
@@ -229,36 +309,122 @@ class Message:
             raise TypeError("unknown wire type (%d)" % wire_type)
         return (field_number, wire_type, data)
 
+    def get_field_table(self):
+        """Return the table of the fields of the message class, built on first use. The
+        fields holding messages become LazyMessageField descriptors so they can be decoded
+        on access."""
+        cls = type(self)
+        table = cls._field_table
+        if table is None or table.message_class is not cls:
+            table = FieldTable(cls, self.__lookup__)
+            for _field_type, field_name, _repeated, is_message, _decode in table.fields.values():
+                if is_message and not isinstance(cls.__dict__.get(field_name), LazyMessageField):
+                    setattr(cls, field_name, LazyMessageField(field_name, getattr(cls, field_name, None)))
+            cls._field_table = table
+        return table
+
     def lookup_id(self, _id):
-        for _, i in enumerate(self.__lookup__):
-            if i[3] == _id:
-                return i
-
-    def decode(self, s: bytes):
-        f = BytesIO(s)
-        while f.tell() < len(s):
-            field_number, _, data = self.read_tag(f)
-            field = self.lookup_id(field_number)
+        field = self.get_field_table().fields.get(_id)
+        if field:
+            field_type, field_name, repeated, _is_message, _decode = field
+            return ("repeated" if repeated else "optional", field_type, field_name, _id)
+        return None
+
+    def decode(self, s):
+        """Decode the message from bytes, a bytearray or a memoryview. The data is not
+        copied: repeated and large nested messages keep a reference to it and are only
+        decoded when accessed, so it must not be modified in the meantime."""
+        if not isinstance(s, (bytes, memoryview)):
+            s = memoryview(s)
+        self.decode_from(s, 0, len(s))
+
+    def decode_from(self, buffer, position, end):
+        """Decode the message from buffer[position:end]"""
+        table = type(self)._field_table
+        if table is None or table.message_class is not type(self):
+            table = self.get_field_table()
+        fields = table.fields
+        read_varint_at = self.read_varint_at
+        copy_data = type(buffer) is not bytes  # Slices of bytes are already bytes
+        values = self.__dict__
+        spans = values.get("_spans")
+        while position < end:
+            tag = buffer[position]
+            if tag < 128:
+                position += 1
+            else:
+                tag, position = read_varint_at(buffer, position)
+            wire_type = tag & 7
+
+            if wire_type == 0:
+                data, position = read_varint_at(buffer, position)
+            elif wire_type == 2:
+                length = buffer[position]
+                if length < 128:
+                    position += 1
+                else:
+                    length, position = read_varint_at(buffer, position)
+                data_start = position
+                position += length
+            elif wire_type in _fixed_sizes:
+                data_start = position
+                position += _fixed_sizes[wire_type]
+            elif wire_type in (3, 4):
+                raise NotImplementedError("groups are deprecated")
+            else:
+                raise TypeError("unknown wire type (%d)" % wire_type)
+            if position > end:
+                raise ValueError("truncated message")
+
+            field = fields.get(tag >> 3)
             if not field:
                 continue
+            field_type, field_name, repeated, is_message, decode = field
 
-            field_multiplicity, field_type, field_name, _ = field
-            if issubclass(field_type, PrimativeType):
-                value = field_type.decode(data)
-            elif issubclass(field_type, Message):
+            if is_message and not repeated and position - data_start <= EAGER_MESSAGE_SIZE:
                 value = field_type()
-                value.decode(data)
+                value.decode_from(buffer, data_start, position)
+                if spans and field_name in spans:
+                    del spans[field_name]
+                values[field_name] = value
+            elif is_message:
+                if spans is None:
+                    spans = values["_spans"] = {}
+                if field_name in spans:
+                    spans[field_name][2].append((data_start, position))
+                else:
+                    values.pop(field_name, None)
+                    spans[field_name] = (field_type, buffer, [(data_start, position)], repeated)
+            elif wire_type == 2 and field_type.wire_type != 2:
+                # Packed repeated scalars
+                field_values = self._decode_packed(field_type, buffer, data_start, position)
+                if repeated:
+                    if values.get(field_name) is None:
+                        values[field_name] = []
+                    values[field_name].extend(field_values)
+                elif field_values:
+                    values[field_name] = field_values[-1]
             else:
-                raise TypeError("field type must be a subclass of PrimativeType or Message")
-
-            if field_multiplicity == "repeated":
-                if getattr(self, field_name) is None:
-                    # if not isinstance(getattr(self, field_name), list):
-                    # ? what if the attribute was already filled with data ?
-                    setattr(self, field_name, [])
-                getattr(self, field_name).append(value)
-            else:
-                setattr(self, field_name, value)
+                if wire_type != 0:
+                    data = bytes(buffer[data_start:position]) if copy_data else buffer[data_start:position]
+                if repeated:
+                    if values.get(field_name) is None:
+                        values[field_name] = []
+                    values[field_name].append(decode(data))
+                else:
+                    values[field_name] = decode(data)
+
+    def _decode_packed(self, field_type, buffer, position, end):
+        values = []
+        if field_type.wire_type == 0:
+            while position < end:
+                data, position = self.read_varint_at(buffer, position)
+                values.append(field_type.decode(data))
+        else:
+            size = _fixed_sizes[field_type.wire_type]
+            for offset in range(position, end, size):
+                values.append(field_type.decode(bytes(buffer[offset : offset + size])))
+        return values
 
     def __lookup__(self):
         return
@@ -36,16 +36,21 @@ class SignatureAlgorithm:
 class CompressionSettings(Message):
     algorithm = CompressionAlgorithm.none
 
-    def __init__(self):
-        self.__lookup__ = [("optional", type_enum, "algorithm", 1)]
+    __lookup__ = [("optional", type_enum, "algorithm", 1)]
 
 
 class Dir(Message):
     path = None
     mode = None
 
-    def __init__(self):
-        self.__lookup__ = [("optional", type_string, "path", 1), ("optional", type_uint32, "mode", 2)]
+    __lookup__ = [("optional", type_string, "path", 1), ("optional", type_uint32, "mode", 2)]
+
+
+class Hash(Message):
+    algorithm = HashAlgorithm.sha256
+    value = None
+
+    __lookup__ = [("optional", type_enum, "algorithm", 1), ("optional", type_bytes, "value", 2)]
 
 
 class File(Message):
@@ -57,31 +62,22 @@ class File(Message):
     hidden = None
     system = None
 
-    def __init__(self):
-        self.__lookup__ = [
-            ("optional", type_string, "path", 1),
-            ("optional", type_uint32, "mode", 2),
-            ("optional", type_int64, "size", 3),
-            ("optional", type_string, "created", 4),
-            ("optional", Hash, "hash", 5),
-            ("optional", type_bool, "hidden", 6),
-            ("optional", type_bool, "system", 7),
-        ]
+    __lookup__ = [
+        ("optional", type_string, "path", 1),
+        ("optional", type_uint32, "mode", 2),
+        ("optional", type_int64, "size", 3),
+        ("optional", type_string, "created", 4),
+        ("optional", Hash, "hash", 5),
+        ("optional", type_bool, "hidden", 6),
+        ("optional", type_bool, "system", 7),
+    ]
 
 
-class Hash(Message):
-    algorithm = HashAlgorithm.sha256
+class Signature(Message):
+    algorithm = SignatureAlgorithm.sha256_with_rsa
     value = None
 
-    def __init__(self):
-        self.__lookup__ = [("optional", type_enum, "algorithm", 1), ("optional", type_bytes, "value", 2)]
-
-
-class Manifest(Message):
-    packages = None
-
-    def __init__(self):
-        self.__lookup__ = [("repeated", Package, "packages", 1)]
+    __lookup__ = [("optional", type_enum, "algorithm", 1), ("optional", type_bytes, "value", 2)]
 
 
 class ManifestHeader(Message):
@@ -89,12 +85,11 @@ class ManifestHeader(Message):
     hash = None
     signature = None
 
-    def __init__(self):
-        self.__lookup__ = [
-            ("optional", CompressionSettings, "compression", 1),
-            ("optional", Hash, "hash", 2),
-            ("optional", Signature, "signature", 3),
-        ]
+    __lookup__ = [
+        ("optional", CompressionSettings, "compression", 1),
+        ("optional", Hash, "hash", 2),
+        ("optional", Signature, "signature", 3),
+    ]
 
 
 class Package(Message):
@@ -102,17 +97,14 @@ class Package(Message):
     files = None
     dirs = None
 
-    def __init__(self):
-        self.__lookup__ = [
-            ("optional", type_string, "name", 1),
-            ("repeated", File, "files", 2),
-            ("repeated", Dir, "dirs", 3),
-        ]
+    __lookup__ = [
+        ("optional", type_string, "name", 1),
+        ("repeated", File, "files", 2),
+        ("repeated", Dir, "dirs", 3),
+    ]
 
 
-class Signature(Message):
-    algorithm = SignatureAlgorithm.sha256_with_rsa
-    value = None
+class Manifest(Message):
+    packages = None
 
-    def __init__(self):
-        self.__lookup__ = [("optional", type_enum, "algorithm", 1), ("optional", type_bytes, "value", 2)]
+    __lookup__ = [("repeated", Package, "packages", 1)]
@@ -28,32 +28,29 @@ class BaseProductState(Message):
     playable = None
     current_version_str = None
 
-    def __init__(self):
-        self.__lookup__ = [
-            ("optional", type_bool, "installed", 1),
-            ("optional", type_bool, "playable", 2),
-            ("optional", type_utf8_string, "current_version_str", 7),
-        ]
+    __lookup__ = [
+        ("optional", type_bool, "installed", 1),
+        ("optional", type_bool, "playable", 2),
+        ("optional", type_utf8_string, "current_version_str", 7),
+    ]
 
 
 class CachedProductState(Message):
     base_product_state = None
 
-    def __init__(self):
-        self.__lookup__ = [
-            ("optional", BaseProductState, "base_product_state", 1),
-        ]
+    __lookup__ = [
+        ("optional", BaseProductState, "base_product_state", 1),
+    ]
 
 
 class UserSettings(Message):
     install_path = None
     play_region = None
 
-    def __init__(self):
-        self.__lookup__ = [
-            ("optional", type_utf8_string, "install_path", 1),
-            ("optional", type_utf8_string, "play_region", 2),
-        ]
+    __lookup__ = [
+        ("optional", type_utf8_string, "install_path", 1),
+        ("optional", type_utf8_string, "play_region", 2),
+    ]
 
 
 class ProductInstall(Message):
@@ -62,19 +59,17 @@ class ProductInstall(Message):
     settings = None
     cached_product_state = None
 
-    def __init__(self):
-        self.__lookup__ = [
-            ("optional", type_utf8_string, "uid", 1),
-            ("optional", type_utf8_string, "product_code", 2),
-            ("optional", UserSettings, "settings", 3),
-            ("optional", CachedProductState, "cached_product_state", 4),
-        ]
+    __lookup__ = [
+        ("optional", type_utf8_string, "uid", 1),
+        ("optional", type_utf8_string, "product_code", 2),
+        ("optional", UserSettings, "settings", 3),
+        ("optional", CachedProductState, "cached_product_state", 4),
+    ]
 
 
 class ProductDb(Message):
     product_installs = None
 
-    def __init__(self):
-        self.__lookup__ = [
-            ("repeated", ProductInstall, "product_installs", 1),
-        ]
+    __lookup__ = [
+        ("repeated", ProductInstall, "product_installs", 1),
+    ]
@@ -48,3 +48,10 @@ class BusyAsyncCall(AsyncCall):
 
         super().__init__(func, on_completion, *args, **kwargs)
         start_busy()
+
+    def cancel(self) -> bool:
+        # A call dropped before it ran never reaches its callback, so stop_busy() must be called here
+        if super().cancel():
+            stop_busy()
+            return True
+        return False
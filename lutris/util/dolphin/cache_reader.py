@@ -1,140 +1,214 @@
 """Reads the Dolphin game database, stored in a binary format"""
 
+import mmap
 import os
+import struct
+from typing import Any, NamedTuple
 
 from lutris.util.log import logger
 
 DOLPHIN_GAME_CACHE_FILE = os.path.expanduser("~/.cache/dolphin-emu/gamelist.cache")
 SUPPORTED_CACHE_VERSION = 24
 
+UINT32 = struct.Struct("<I")
+
 
 def get_hex_string(string):
     """Return the hexadecimal representation of a string"""
-    return " ".join("{:02x}".format(c) for c in string)
+    return string.hex(" ")
+
+
+class CacheImage(NamedTuple):
+    """An image stored in the Dolphin cache. Its content is only read when needed, unless the
+    games were read with their images."""
 
+    path: str
+    offset: int
+    size: int
+    width: int = 0
+    height: int = 0
+    data: bytes | None = None
 
-def get_word_len(string):
-    """Return the length of a string as specified in the Dolphin format"""
-    return int("0x" + "".join("{:02x}".format(c) for c in string[::-1]), 0)
+    def read(self) -> bytes:
+        if self.data is not None:
+            return self.data
+        if not self.size:
+            return b""
+        with open(self.path, "rb") as cache_file:
+            cache_file.seek(self.offset)
+            data = cache_file.read(self.size)
+        if len(data) != self.size:
+            raise ValueError("Image at offset %s of %s is truncated" % (self.offset, self.path))
+        return data
 
 
 # https://github.com/dolphin-emu/dolphin/blob/90a994f93780ef8a7cccfc02e00576692e0f2839/Source/Core/UICommon/GameFile.h#L140
 # https://github.com/dolphin-emu/dolphin/blob/90a994f93780ef8a7cccfc02e00576692e0f2839/Source/Core/UICommon/GameFile.cpp#L318
+STRUCTURE_V24 = {
+    "valid": "b",
+    "file_path": "s",
+    "file_name": "s",
+    "file_size": 8,
+    "volume_size": 8,
+    "volume_size_type": 4,
+    "is_datel_disc": "b",
+    "is_nkit": "b",
+    "short_names": "a",
+    "long_names": "a",
+    "short_makers": "a",
+    "long_makers": "a",
+    "descriptions": "a",
+    "internal_name": "s",
+    "game_id": "s",
+    "gametdb_id": "s",
+    "title_id": 8,
+    "maker_id": "s",
+    "region": 4,
+    "country": 4,
+    "platform": 1,
+    "platform_": 3,
+    "blob_type": 4,
+    "block_size": 8,
+    "compression_method": "s",
+    "revision": 2,
+    "disc_number": 1,
+    "apploader_date": "s",
+    "custom_name": "s",
+    "custom_description": "s",
+    "custom_maker": "s",
+    "volume_banner": "i",
+    "custom_banner": "i",
+    "default_cover": "c",
+    "custom_cover": "c",
+}
+
+
+def compile_structure(structure: dict[str, Any]) -> list[tuple[str, Any]]:
+    """Turn the structure of a cache entry into a list of steps, runs of fixed size fields
+    being read at once with a single struct"""
+    steps: list[tuple[str, Any]] = []
+    fixed_keys: list[str] = []
+    fixed_format = "<"
+    for key, field_type in structure.items():
+        if field_type == "b" or isinstance(field_type, int):
+            fixed_keys.append(key)
+            fixed_format += "?" if field_type == "b" else "%ds" % field_type
+            continue
+        if fixed_keys:
+            steps.append(("fixed", (struct.Struct(fixed_format), fixed_keys)))
+            fixed_keys = []
+            fixed_format = "<"
+        steps.append((field_type, key))
+    if fixed_keys:
+        steps.append(("fixed", (struct.Struct(fixed_format), fixed_keys)))
+    return steps
+
+
+# Layouts of the entries, by version of the cache; other versions are read with the latest one
+CACHE_LAYOUTS = {24: compile_structure(STRUCTURE_V24)}
+
+# Games read from cache files, by path, with the size and modification time of the file
+_PARSED_CACHES: dict[str, tuple[tuple[int, int], list[dict[str, Any]]]] = {}
 
 
 class DolphinCacheReader:
     header_size = 20
-    structure = {
-        "valid": "b",
-        "file_path": "s",
-        "file_name": "s",
-        "file_size": 8,
-        "volume_size": 8,
-        "volume_size_type": 4,
-        "is_datel_disc": "b",
-        "is_nkit": "b",
-        "short_names": "a",
-        "long_names": "a",
-        "short_makers": "a",
-        "long_makers": "a",
-        "descriptions": "a",
-        "internal_name": "s",
-        "game_id": "s",
-        "gametdb_id": "s",
-        "title_id": 8,
-        "maker_id": "s",
-        "region": 4,
-        "country": 4,
-        "platform": 1,
-        "platform_": 3,
-        "blob_type": 4,
-        "block_size": 8,
-        "compression_method": "s",
-        "revision": 2,
-        "disc_number": 1,
-        "apploader_date": "s",
-        "custom_name": "s",
-        "custom_description": "s",
-        "custom_maker": "s",
-        "volume_banner": "i",
-        "custom_banner": "i",
-        "default_cover": "c",
-        "custom_cover": "c",
-    }
-
-    def __init__(self):
-        self.offset = 0
-        with open(DOLPHIN_GAME_CACHE_FILE, "rb") as dolphin_cache_file:
-            self.cache_content = dolphin_cache_file.read()
-        cache_version = get_word_len(self.cache_content[:4])
-        if cache_version != SUPPORTED_CACHE_VERSION:
-            logger.warning("Dolphin cache version expected %s but found %s", SUPPORTED_CACHE_VERSION, cache_version)
-
-    def get_game(self):
-        game = {}
-        for key, i in self.structure.items():
-            if i == "s":
-                game[key] = self.get_string()
-            elif i == "b":
-                game[key] = self.get_boolean()
-            elif i == "a":
-                game[key] = self.get_array()
-            elif i == "i":
-                game[key] = self.get_image()
-            elif i == "c":
-                game[key] = self.get_cover()
-            else:
-                game[key] = self.get_raw(i)
-        return game
+    structure = STRUCTURE_V24
 
-    def get_games(self):
-        self.offset += self.header_size
+    def __init__(self, path: str = DOLPHIN_GAME_CACHE_FILE) -> None:
+        self.path = path
+        self.offset = 0
+        self.cache_version = None
+
+    def get_games(self, load_images: bool = False) -> list[dict[str, Any]]:
+        """Return the games of the cache. Their images are only read if 'load_images' is
+        set; otherwise they can be read later with CacheImage.read()"""
+        file_stat = os.stat(self.path)
+        file_key = (file_stat.st_size, file_stat.st_mtime_ns)
+        parsed = _PARSED_CACHES.get(self.path)
+        if not load_images and parsed and parsed[0] == file_key:
+            return list(parsed[1])
+
+        if not file_stat.st_size:
+            return []
+        with open(self.path, "rb") as cache_file:
+            with mmap.mmap(cache_file.fileno(), 0, access=mmap.ACCESS_READ) as content:
+                games = self._read_games(content, load_images)
+        if not load_images:
+            _PARSED_CACHES[self.path] = (file_key, games)
+        return list(games)
+
+    def _read_games(self, content: mmap.mmap, load_images: bool) -> list[dict[str, Any]]:
+        if len(content) < self.header_size:
+            logger.error("Dolphin database %s is truncated", self.path)
+            return []
+        (self.cache_version,) = UINT32.unpack_from(content, 0)
+        if self.cache_version not in CACHE_LAYOUTS:
+            logger.warning(
+                "Dolphin cache version expected %s but found %s", SUPPORTED_CACHE_VERSION, self.cache_version
+            )
+        steps = CACHE_LAYOUTS.get(self.cache_version, CACHE_LAYOUTS[SUPPORTED_CACHE_VERSION])
+        self.offset = self.header_size
         games = []
-        while self.offset < len(self.cache_content):
+        while self.offset < len(content):
+            entry_offset = self.offset
             try:
-                games.append(self.get_game())
-            except Exception as ex:
-                logger.error("Failed to read Dolphin database: %s", ex)
+                games.append(self._read_game(content, steps, load_images))
+            except (struct.error, ValueError) as ex:
+                # Nothing after a bad entry can be trusted, since we don't know where the next one starts
+                logger.error("Failed to read Dolphin database %s at offset %s: %s", self.path, entry_offset, ex)
+                break
         return games
 
-    def get_boolean(self):
-        res = bool(get_word_len(self.cache_content[self.offset : self.offset + 1]))
-        self.offset += 1
-        return res
+    def _read_game(self, content: mmap.mmap, steps: list[tuple[str, Any]], load_images: bool) -> dict[str, Any]:
+        game: dict[str, Any] = {}
+        for step_type, step in steps:
+            if step_type == "fixed":
+                fixed_struct, keys = step
+                for key, value in zip(keys, fixed_struct.unpack_from(content, self.offset)):
+                    game[key] = value if isinstance(value, bool) else get_hex_string(value)
+                self.offset += fixed_struct.size
+            elif step_type == "s":
+                game[step] = self._read_bytes(content, self._read_uint32(content)).decode("utf8")
+            elif step_type == "a":
+                game[step] = self._read_array(content)
+            elif step_type == "i":
+                game[step] = self._read_image(content, load_images)
+            elif step_type == "c":
+                game[step] = self._read_blob(content, self._read_uint32(content), load_images)
+        return game
+
+    def _read_uint32(self, content: mmap.mmap) -> int:
+        (value,) = UINT32.unpack_from(content, self.offset)
+        self.offset += UINT32.size
+        return value
+
+    def _read_bytes(self, content: mmap.mmap, size: int) -> bytes:
+        if self.offset + size > len(content):
+            raise ValueError("%s bytes expected but only %s left" % (size, len(content) - self.offset))
+        data = content[self.offset : self.offset + size]
+        self.offset += size
+        return data
 
-    def get_array(self):
-        array_len = get_word_len(self.cache_content[self.offset : self.offset + 4])
-        self.offset += 4
+    def _read_array(self, content: mmap.mmap) -> dict[str, str]:
         array = {}
-        for _i in range(array_len):
-            array_key = self.get_raw(4)
-            array[array_key] = self.get_string()
+        for _i in range(self._read_uint32(content)):
+            array_key = get_hex_string(self._read_bytes(content, 4))
+            array[array_key] = self._read_bytes(content, self._read_uint32(content)).decode("utf8")
         return array
 
-    def get_image(self):
-        data_len = get_word_len(self.cache_content[self.offset : self.offset + 4])
-        self.offset += 4
-        res = self.cache_content[self.offset : self.offset + data_len * 4]  # vector<u32>
-        self.offset += data_len * 4
-        width = get_word_len(self.cache_content[self.offset : self.offset + 4])
-        self.offset += 4
-        height = get_word_len(self.cache_content[self.offset : self.offset + 4])
-        self.offset += 4
-        return (width, height), res
-
-    def get_cover(self):
-        array_len = get_word_len(self.cache_content[self.offset : self.offset + 4])
-        self.offset += 4
-        return self.get_raw(array_len)
-
-    def get_raw(self, word_len):
-        res = get_hex_string(self.cache_content[self.offset : self.offset + word_len])
-        self.offset += word_len
-        return res
-
-    def get_string(self):
-        word_len = get_word_len(self.cache_content[self.offset : self.offset + 4])
-        self.offset += 4
-        string = self.cache_content[self.offset : self.offset + word_len]
-        self.offset += word_len
-        return string.decode("utf8")
+    def _read_blob(self, content: mmap.mmap, size: int, load_images: bool) -> CacheImage:
+        offset = self.offset
+        if load_images:
+            return CacheImage(self.path, offset, size, data=self._read_bytes(content, size))
+        if offset + size > len(content):
+            raise ValueError("Image of %s bytes goes past the end of the file" % size)
+        self.offset += size
+        return CacheImage(self.path, offset, size)
+
+    def _read_image(self, content: mmap.mmap, load_images: bool) -> CacheImage:
+        pixel_count = self._read_uint32(content)
+        image = self._read_blob(content, pixel_count * 4, load_images)  # vector<u32>
+        width = self._read_uint32(content)
+        height = self._read_uint32(content)
+        return image._replace(width=width, height=height)
@@ -10,6 +10,7 @@ import requests
 
 from lutris import __version__
 from lutris.util import jobs
+from lutris.util.extract import StreamingExtractor
 from lutris.util.log import logger
 
 # `time.time` can skip ahead or even go backwards if the current
@@ -178,7 +179,7 @@ class BaseDownloader(abc.ABC):
         self.state = self.DOWNLOADING
         self.last_check_time = get_time()
         self._prepare_destination()
-        self.thread = jobs.AsyncCall(self.async_download, None)
+        self.thread = jobs.AsyncCall(self.async_download, None, priority=jobs.Priority.BULK_IO)
         self.stop_request = self.thread.stop_request
 
     def reset(self):
@@ -290,10 +291,11 @@ class BaseDownloader(abc.ABC):
         if not self.full_size:
             self.progress_fraction = 1.0
             self.progress_percentage = 100
-        self.state = self.COMPLETED
+        # The file must be closed before join() returns and the caller reads it.
         self._release_resources()
         # Download is complete — the resumable state is no longer needed.
         self._discard_persistent_state()
+        self.state = self.COMPLETED
 
     def get_stats(self):
         """Calculate and store download stats."""
@@ -354,16 +356,22 @@ class BaseDownloader(abc.ABC):
 
 
 class SimpleDownloader(BaseDownloader):
-    """Single-connection downloader: fetches the whole file in one stream."""
+    """Single-connection downloader: fetches the whole file in one stream.
+
+    Since the bytes arrive in order, a StreamingExtractor can be attached to
+    extract a tar archive while it downloads."""
 
-    def __init__(self, *args: Any, **kwargs: Any) -> None:
+    def __init__(self, *args: Any, stream_extractor: StreamingExtractor | None = None, **kwargs: Any) -> None:
         super().__init__(*args, **kwargs)
         self.file_pointer = None
+        self.stream_extractor = stream_extractor
 
     def _prepare_destination(self) -> None:
         if self.overwrite and os.path.isfile(self.dest):
             os.remove(self.dest)
         self.file_pointer = open(self.dest, "wb")  # pylint: disable=consider-using-with
+        if self.stream_extractor:
+            self.stream_extractor.start()
 
     def async_download(self) -> None:
         """Run the single-stream transfer with stall detection and retries.
@@ -375,6 +383,7 @@ class SimpleDownloader(BaseDownloader):
         for attempt in range(self.RETRY_ATTEMPTS):
             try:
                 self._do_download()
+                self._finish_stream_extraction()
                 self.on_download_completed()
                 return  # Success
             except DownloadStallError as ex:
@@ -477,17 +486,33 @@ class SimpleDownloader(BaseDownloader):
                 stream_bytes += len(chunk)
                 self.downloaded_size += len(chunk)
                 self.file_pointer.write(chunk)
+                if self.stream_extractor:
+                    self.stream_extractor.feed(chunk)
                 stall_monitor.check(stream_bytes)
             self.progress_event.set()
 
+    def _finish_stream_extraction(self) -> None:
+        """Wait for the stream extractor, if any, to catch up with the download."""
+        if not self.stream_extractor:
+            return
+        if self.stop_request and self.stop_request.is_set():
+            self.stream_extractor.abort()
+        elif not self.stream_extractor.finish():
+            # The archive is complete on disk, it will be extracted the regular way.
+            logger.warning("Falling back to regular extraction for %s", self.dest)
+
     def _prepare_retry(self) -> None:
         """Restart the file from the beginning for a retry attempt."""
         self.downloaded_size = 0
         if self.file_pointer:
             self.file_pointer.close()
         self.file_pointer = open(self.dest, "wb")  # pylint: disable=consider-using-with
+        if self.stream_extractor:
+            self.stream_extractor.start()
 
     def _release_resources(self) -> None:
         if self.file_pointer:
             self.file_pointer.close()
             self.file_pointer = None
+        if self.stream_extractor and not self.stream_extractor.completed:
+            self.stream_extractor.abort()
@@ -1,17 +1,50 @@
 import gzip
+import hashlib
+import heapq
 import os
+import queue
 import shutil
+import stat
 import subprocess
 import tarfile
+import threading
 import uuid
 import zipfile
 import zlib
+from concurrent.futures import ThreadPoolExecutor
 
 from lutris import settings
 from lutris.exceptions import MissingExecutableError
 from lutris.util import system
 from lutris.util.log import logger
 
+# Extractors whose archives can be read sequentially, as the bytes arrive,
+# using tarfile's stream mode. Zip, 7z and Inno Setup need random access.
+STREAMABLE_EXTRACTORS = {
+    "tar": "r|",
+    "tgz": "r|gz",
+    "txz": "r|xz",
+    "tbz2": "r|bz2",
+}
+
+
+# Multi-threaded decompressors for tarballs, tried in order. The archive is
+# decompressed by the external program and untarred by tarfile from its output.
+PARALLEL_DECOMPRESSORS = {
+    "tgz": [["pigz", "-dc", "-p{threads}"]],
+    "txz": [["xz", "-dc", "-T{threads}"]],
+    "tbz2": [["lbzip2", "-dc", "-n", "{threads}"], ["pbzip2", "-dc", "-p{threads}"]],
+    "bz2": [["lbzip2", "-dc", "-n", "{threads}"], ["pbzip2", "-dc", "-p{threads}"]],
+    "tzst": [["zstd", "-dc", "-T{threads}"]],
+}
+
+# Zip archives with fewer members than this aren't worth splitting across threads
+PARALLEL_ZIP_MIN_MEMBERS = 32
+
+# Compression methods zipfile can decompress; archives using anything else
+# (deflate64, ppmd...) are left to 7-zip.
+ZIPFILE_METHODS = {zipfile.ZIP_STORED, zipfile.ZIP_DEFLATED, zipfile.ZIP_BZIP2, zipfile.ZIP_LZMA}
+
 
 class ExtractError(Exception):
     """Exception raised when and archive fails to extract"""
@@ -43,12 +76,36 @@ def extract_archive(path: str, to_directory: str = ".", merge_single: bool = Tru
 
     opener, mode = _get_archive_opener(extractor)
 
-    temp_path = temp_dir = os.path.join(to_directory, ".extract-%s" % _random_id())
+    temp_dir = os.path.join(to_directory, ".extract-%s" % _random_id())
     try:
-        _do_extract(path, temp_path, opener, mode, extractor)
+        _do_extract(path, temp_dir, opener, mode, extractor)
     except (OSError, zlib.error, tarfile.ReadError, EOFError) as ex:
         logger.error("Extraction failed: %s", ex)
         raise ExtractError(str(ex)) from ex
+    _merge_extracted(temp_dir, to_directory, merge_single)
+    logger.debug("Finished extracting %s to %s", path, to_directory)
+    return path, to_directory
+
+
+def merge_staged_extraction(staging_path: str, to_directory: str, merge_single: bool = True) -> str:
+    """Move files extracted ahead of time by a StreamingExtractor to their destination.
+
+    The files are moved exactly like extract_archive() moves the contents of its
+    temporary folder, and the staging folder is deleted afterwards.
+
+    Returns:
+        The destination directory.
+    """
+    logger.debug("Moving streamed extraction %s to %s", staging_path, to_directory)
+    os.makedirs(to_directory, exist_ok=True)
+    _merge_extracted(staging_path, to_directory, merge_single)
+    return to_directory
+
+
+def _merge_extracted(temp_dir: str, to_directory: str, merge_single: bool) -> None:
+    """Move the contents of a temporary extraction folder into to_directory,
+    then delete the temporary folder."""
+    temp_path = temp_dir
     if merge_single:
         extracted = os.listdir(temp_path)
         if len(extracted) == 1:
@@ -70,9 +127,10 @@ def extract_archive(path: str, to_directory: str = ".", merge_single: bool = Tru
         if inner_extractor:
             logger.debug("Nested archive detected (%s), extracting inner layer", inner_extractor)
             try:
-                return extract_archive(temp_path, to_directory, merge_single, inner_extractor)
+                extract_archive(temp_path, to_directory, merge_single, inner_extractor)
             finally:
                 system.delete_folder(temp_dir)
+            return
 
         destination_path = os.path.join(to_directory, extracted[0])
         if os.path.isfile(destination_path):
@@ -107,8 +165,16 @@ def extract_archive(path: str, to_directory: str = ".", merge_single: bool = Tru
             else:
                 shutil.move(source_path, destination_path)
         system.delete_folder(temp_dir)
-    logger.debug("Finished extracting %s to %s", path, to_directory)
-    return path, to_directory
+
+
+def get_extraction_threads() -> int:
+    """Return the number of threads extractors may use; this is the `extract_threads`
+    setting if set, or the number of CPUs."""
+    try:
+        threads = int(settings.read_setting("extract_threads") or 0)
+    except ValueError:
+        threads = 0
+    return threads if threads > 0 else os.cpu_count() or 1
 
 
 def _guess_extractor(path):
@@ -125,6 +191,8 @@ def _guess_extractor(path):
         extractor = "tzst"
     elif path.endswith(".gz"):
         extractor = "gzip"
+    elif path.casefold().endswith(".zip"):
+        extractor = "zip"
     elif path.endswith(".exe"):
         extractor = "exe"
     elif path.endswith(".deb"):
@@ -151,6 +219,8 @@ def _get_archive_opener(extractor):
         opener, mode = tarfile.open, "r:zst"  # Note: not supported by tarfile yet
     elif extractor == "gzip":
         opener = "gz"
+    elif extractor == "zip":
+        opener = "zip"
     elif extractor == "gog":
         opener = "innoextract"
     elif extractor == "exe":
@@ -174,6 +244,8 @@ def _do_extract(archive: str, dest: str, opener, mode: str | None = None, extrac
         _decompress_gz(archive, dest)
     elif opener == "7zip":
         _extract_7zip(archive, dest, archive_type=extractor)
+    elif opener == "zip":
+        _extract_zip(archive, dest)
     elif opener == "exe":
         _extract_exe(archive, dest)
     elif opener == "innoextract":
@@ -183,9 +255,106 @@ def _do_extract(archive: str, dest: str, opener, mode: str | None = None, extrac
     elif opener == "AppImage":
         _extract_AppImage(archive, dest)
     else:
-        handler = opener(archive, mode)
-        handler.extractall(dest)
-        handler.close()
+        decompress_command = _get_parallel_decompressor(extractor)
+        if decompress_command:
+            _extract_piped_tar(archive, dest, decompress_command)
+        else:
+            handler = opener(archive, mode)
+            handler.extractall(dest)
+            handler.close()
+
+
+def _get_parallel_decompressor(extractor: str | None) -> list[str] | None:
+    """Return the command of an installed multi-threaded decompressor for
+    the extractor, or None if there is none."""
+    threads = get_extraction_threads()
+    for command in PARALLEL_DECOMPRESSORS.get(extractor or "", []):
+        executable = system.find_executable(command[0])
+        if executable:
+            return [executable] + [arg.format(threads=threads) for arg in command[1:]]
+    return None
+
+
+def _extract_piped_tar(archive: str, dest: str, decompress_command: list[str]) -> None:
+    """Untar the output of an external decompressor."""
+    logger.debug("Decompressing %s with %s", archive, decompress_command[0])
+    with subprocess.Popen(decompress_command + [archive], stdout=subprocess.PIPE, stderr=subprocess.PIPE) as process:
+        with tarfile.open(fileobj=process.stdout, mode="r|") as handler:
+            handler.extractall(dest)
+        # Consume the padding after the end of the archive, so the decompressor can exit.
+        _stdout, stderr = process.communicate()
+    if process.returncode != 0:
+        raise ExtractError(
+            "%s failed to decompress %s: %s" % (decompress_command[0], archive, stderr.decode(errors="replace").strip())
+        )
+
+
+def _extract_zip(path: str, dest: str) -> None:
+    """Extract a zip archive, spreading its members over several threads when it has many.
+
+    zlib, bz2 and lzma release the GIL while they decompress, so the threads do run in
+    parallel. Processes are not an option here, as extraction usually already runs in a
+    daemonic pool worker, which can't have children."""
+    threads = get_extraction_threads()
+    members = _get_parallel_zip_members(path) if threads > 1 else None
+    if not members:
+        _extract_7zip(path, dest)
+        return
+
+    batches = _split_zip_members(members, threads)
+    logger.debug("Extracting %d members of %s with %d threads", len(members), path, len(batches))
+    # Create all folders beforehand; zipfile would race to create them otherwise.
+    for info in members:
+        member_path = _get_zip_member_path(dest, info.filename)
+        os.makedirs(member_path if info.is_dir() else os.path.dirname(member_path), exist_ok=True)
+    with ThreadPoolExecutor(max_workers=len(batches)) as executor:
+        futures = [executor.submit(_extract_zip_members, path, dest, batch) for batch in batches]
+        for future in futures:
+            future.result()
+
+
+def _get_parallel_zip_members(path: str) -> list[zipfile.ZipInfo] | None:
+    """Return the members of a zip archive if zipfile can extract them in parallel,
+    or None if the archive should be left to 7-zip."""
+    try:
+        with zipfile.ZipFile(path) as archive:
+            members = archive.infolist()
+    except (zipfile.BadZipFile, OSError):
+        return None
+    if len(members) < PARALLEL_ZIP_MIN_MEMBERS:
+        return None
+    for info in members:
+        if info.compress_type not in ZIPFILE_METHODS or info.flag_bits & 0x1:  # encrypted
+            return None
+        if stat.S_ISLNK(info.external_attr >> 16):
+            return None
+    return members
+
+
+def _split_zip_members(members: list[zipfile.ZipInfo], count: int) -> list[list[str]]:
+    """Distribute the members' names in at most `count` batches of similar uncompressed size."""
+    heap = [(0, index, []) for index in range(min(count, len(members)))]
+    for info in sorted(members, key=lambda info: info.file_size, reverse=True):
+        size, index, batch = heapq.heappop(heap)
+        batch.append(info.filename)
+        heapq.heappush(heap, (size + info.file_size, index, batch))
+    return [batch for _size, _index, batch in sorted(heap, key=lambda item: item[1]) if batch]
+
+
+def _get_zip_member_path(dest: str, name: str) -> str:
+    """Return where zipfile extracts a member, after discarding unsafe path components."""
+    return os.path.join(dest, *[part for part in name.split("/") if part not in ("", ".", "..")])
+
+
+def _extract_zip_members(path: str, dest: str, names: list[str]) -> None:
+    """Extract some members of a zip archive, restoring their Unix permissions."""
+    with zipfile.ZipFile(path) as archive:
+        for name in names:
+            info = archive.getinfo(name)
+            extracted_path = archive.extract(info, dest)
+            mode = (info.external_attr >> 16) & 0o777
+            if mode and not info.is_dir():
+                os.chmod(extracted_path, mode)
 
 
 def _decompress_gz(file_path: str, dest_path: str):
@@ -204,7 +373,7 @@ def _decompress_gz(file_path: str, dest_path: str):
 
 def _extract_7zip(path: str, dest: str, archive_type: str | None = None) -> None:
     _7zip_path = _get_7zip_path()
-    command = [_7zip_path, "x", path, "-o{}".format(dest), "-aoa"]
+    command = [_7zip_path, "x", path, "-o{}".format(dest), "-aoa", "-mmt{}".format(get_extraction_threads())]
     if archive_type and archive_type != "auto":
         command.append("-t{}".format(archive_type))
     subprocess.call(command)
@@ -315,3 +484,138 @@ def get_innoextract_list(file_path: str) -> list[str]:
     """Return the list of files contained in a GOG archive"""
     output = system.read_process_output([_get_innoextract_path(), "-lmq", file_path])
     return [line[3:] for line in output.split("\n") if line]
+
+
+def is_streamable(path: str, extractor: str | None = None) -> bool:
+    """Return whether the archive at path can be extracted by a StreamingExtractor"""
+    return (extractor or _guess_extractor(path)) in STREAMABLE_EXTRACTORS
+
+
+class _ChunkReader:
+    """Minimal file-like object that reads the chunks pushed into a queue.
+    A None chunk marks the end of the stream."""
+
+    def __init__(self, chunks: queue.Queue) -> None:
+        self._chunks = chunks
+        self._buffer = bytearray()
+        self._eof = False
+
+    def read(self, size: int = -1) -> bytes:
+        while not self._eof and (size < 0 or len(self._buffer) < size):
+            chunk = self._chunks.get()
+            if chunk is None:
+                self._eof = True
+            else:
+                self._buffer += chunk
+        if size < 0:
+            size = len(self._buffer)
+        data = bytes(self._buffer[:size])
+        del self._buffer[:size]
+        return data
+
+
+class StreamingExtractor:
+    """Extracts a tar archive while it is being downloaded.
+
+    The downloader hands every chunk it writes to feed(); a worker thread runs
+    tarfile in stream mode over those chunks, so decompression and disk writes
+    overlap with the transfer. Files land in a staging folder, which
+    merge_staged_extraction() moves to the final destination once the install
+    script asks for the archive to be extracted.
+
+    The archive itself is still written to disk by the downloader, so a failed
+    streaming extraction just falls back to the regular extract_archive().
+    The checksum of the fed bytes is computed on the way, sparing a re-read of
+    the archive to verify it.
+    """
+
+    QUEUE_SIZE = 64  # chunks buffered ahead of the extractor (32MB at the default chunk size)
+
+    def __init__(self, extractor: str, staging_path: str, hash_type: str | None = None) -> None:
+        if extractor not in STREAMABLE_EXTRACTORS:
+            raise ValueError("Extractor %s does not support streaming" % extractor)
+        self.extractor = extractor
+        self.staging_path = staging_path
+        self.hash_type = hash_type
+        self.error: Exception | None = None
+        self.completed = False
+        self.digest: str | None = None
+        self._hasher = None
+        self._chunks: queue.Queue = queue.Queue(maxsize=self.QUEUE_SIZE)
+        self._done = threading.Event()
+        self._thread: threading.Thread | None = None
+
+    @classmethod
+    def for_archive(cls, path: str, staging_path: str, hash_type: str | None = None) -> "StreamingExtractor":
+        """Return an extractor for the archive at path, guessing its format from the file name."""
+        return cls(_guess_extractor(path), staging_path, hash_type=hash_type)
+
+    def start(self) -> None:
+        """Start (or restart from scratch) the extraction thread."""
+        self.abort()
+        self.error = None
+        self.completed = False
+        self.digest = None
+        self._hasher = hashlib.new(self.hash_type) if self.hash_type else None
+        self._chunks = queue.Queue(maxsize=self.QUEUE_SIZE)
+        self._done = threading.Event()
+        self._thread = threading.Thread(target=self._extract, args=(self._chunks, self._done), daemon=True)
+        self._thread.start()
+
+    def _extract(self, chunks: queue.Queue, done: threading.Event) -> None:
+        mode = STREAMABLE_EXTRACTORS[self.extractor]
+        try:
+            os.makedirs(self.staging_path, exist_ok=True)
+            with tarfile.open(fileobj=_ChunkReader(chunks), mode=mode) as handler:
+                handler.extractall(self.staging_path)
+        except Exception as ex:  # pylint: disable=broad-except
+            # Any failure here is recoverable: the archive is still downloaded in full.
+            self.error = ex
+        finally:
+            done.set()
+
+    def _put(self, chunk: bytes | None) -> None:
+        """Queue a chunk, giving up if the extraction thread has already stopped."""
+        while not self._done.is_set():
+            try:
+                self._chunks.put(chunk, timeout=0.5)
+                return
+            except queue.Full:
+                continue
+
+    def feed(self, chunk: bytes) -> None:
+        """Pass the next chunk of the archive to the extractor."""
+        if self._hasher:
+            self._hasher.update(chunk)
+        self._put(chunk)
+
+    def finish(self) -> bool:
+        """Signal the end of the archive and wait for the extraction to complete.
+
+        Returns True if the whole archive was extracted to the staging folder."""
+        if not self._thread:
+            return False
+        self._put(None)
+        self._thread.join()
+        if self._hasher:
+            self.digest = self._hasher.hexdigest()
+        if self.error:
+            logger.warning("Streaming extraction to %s failed: %s", self.staging_path, self.error)
+        else:
+            self.completed = True
+        return self.completed
+
+    def abort(self) -> None:
+        """Stop the extraction thread and delete whatever was extracted so far."""
+        if self._thread:
+            try:
+                while True:
+                    self._chunks.get_nowait()
+            except queue.Empty:
+                pass
+            self._put(None)
+            self._thread.join()
+            self._thread = None
+        self.completed = False
+        if os.path.isdir(self.staging_path):
+            system.delete_folder(self.staging_path)
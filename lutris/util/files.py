@@ -1,6 +1,6 @@
 import os
 
-from lutris.util.system import get_md5_hash
+from lutris.util.hash_cache import get_file_hashes
 
 
 def get_folder_contents(target_directory: str, with_hash: bool = True) -> list:
@@ -29,7 +29,10 @@ def get_folder_contents(target_directory: str, with_hash: bool = True) -> list:
                 "date_accessed": int(file_stats.st_atime),
                 "type": "file",
             }
-            if with_hash:
-                file_desc["md5_hash"] = get_md5_hash(file_path)
             folder_content.append(file_desc)
+    if with_hash:
+        file_descs = [desc for desc in folder_content if desc["type"] == "file"]
+        md5_hashes = get_file_hashes(desc["name"] for desc in file_descs)
+        for file_desc in file_descs:
+            file_desc["md5_hash"] = md5_hashes.get(file_desc["name"], False)
     return folder_content
@@ -1,50 +1,196 @@
-"""Automatically detects game executables in a folder"""
+"""Automatically detects game executables in a folder
+
+Files are identified from their first bytes: ELF and PE headers, shebang lines, AppImage and
+Windows shortcut signatures. Files with asset extensions are skipped without being opened,
+directories unlikely to hold the game's launcher are not entered, and the folder is scanned
+one depth level at a time, the directories of a level in parallel, so that the search stops
+at the shallowest directory holding an executable.
+"""
 
 import os
+import re
+import struct
+from concurrent.futures import ThreadPoolExecutor
+from typing import NamedTuple
 
-from lutris.util import magic, system
+from lutris.util import system
 from lutris.util.log import logger
 
+# Enough for the ELF header and, in most binaries, the PE header following the DOS stub
+HEADER_SIZE = 512
+MAX_SCAN_WORKERS = 8
+
+ELF_MAGIC = b"\x7fELF"
+# Type 2 AppImages are ELF binaries with this magic in the padding of their identification
+APPIMAGE_MAGIC = b"AI\x02"
+ELF_TYPE_EXECUTABLE = 2
+ELF_TYPE_SHARED_OBJECT = 3
+ELF_MACHINES = {3: "i386", 62: "x86-64", 40: "arm", 183: "aarch64"}
+
+PE_MACHINES = {0x14C: "i386", 0x8664: "x86-64", 0xAA64: "arm64"}
+PE_OPTIONAL_HEADER_MAGIC_64 = 0x20B
+PE_SUBSYSTEM_GUI = 2
+PE_CHARACTERISTIC_DLL = 0x2000
+PE_HEADER = struct.Struct("<4sHHIIIHH")
+# The PE header and the start of the optional header, up to the subsystem
+PE_HEADER_SIZE = PE_HEADER.size + 70
+MAX_PE_OFFSET = 0x10000
+
+# Header size and CLSID at the start of every .lnk file
+SHORTCUT_MAGIC = b"\x4c\x00\x00\x00\x01\x14\x02\x00\x00\x00\x00\x00\xc0\x00\x00\x00\x00\x00\x00\x46"
+
+# Files with these extensions are never executables and are not opened
+SKIPPED_EXTENSIONS = frozenset(
+    (
+        # Images, audio and video
+        ".bmp", ".dds", ".gif", ".ico", ".jpeg", ".jpg", ".ktx", ".png", ".psd", ".svg", ".tga", ".tif", ".webp",
+        ".bank", ".fsb", ".flac", ".mid", ".mp3", ".ogg", ".opus", ".wav", ".wem", ".xwm",
+        ".avi", ".bik", ".bk2", ".mkv", ".mov", ".mp4", ".ogv", ".usm", ".webm", ".wmv",
+        # Text, documents and fonts
+        ".cfg", ".csv", ".htm", ".html", ".ini", ".json", ".lua", ".md", ".pdf", ".txt", ".xml", ".yaml", ".yml",
+        ".otf", ".ttf", ".woff",
+        # Libraries
+        ".a", ".dll", ".dylib", ".lib", ".pdb",
+        # Data packs
+        ".arc", ".assets", ".big", ".cab", ".gcf", ".pak", ".pck", ".pk3", ".pk4", ".ress", ".resource",
+        ".rpf", ".sdb", ".ucas", ".utoc", ".vpk", ".wad", ".xnb", ".zip",
+    )
+)  # fmt: skip
+SHARED_LIBRARY_NAME = re.compile(r"\.so(\.\d+)*$")
+
+# Directories holding assets, documentation or redistributables are not searched
+PRUNED_DIRECTORIES = frozenset(
+    (
+        "__macosx", "audio", "doc", "docs", "fonts", "licenses", "locale", "locales", "manual", "movies", "music",
+        "shaders", "sound", "sounds", "textures", "videos",
+        "_commonredist", "directx", "dotnet", "redist", "vcredist",
+    )
+)  # fmt: skip
+PRUNED_LINUX_DIRECTORIES = frozenset(("lib", "lib32", "lib64", "libs"))
+
+# Names that make a file more, or less, likely to be the one launching the game
+PREFERRED_NAMES = ("start", "launch", "run", "play", "game")
+AVOIDED_NAMES = ("server", "editor", "crash", "report", "test", "benchmark", "config", "settings")
+
+
+class Executable(NamedTuple):
+    """An executable found from the header of a file"""
+
+    path: str
+    kind: str  # "script", "appimage", "elf", "pe" or "link"
+    machine: str = ""  # Architecture of binaries, or interpreter of scripts
+    bits: int = 0
+    gui: bool = False
+    size: int = 0
+
+
+def read_executable(path: str, size: int = 0) -> Executable | None:
+    """Identify an executable from the first bytes of a file, or return None if it isn't one"""
+    pe_header = b""
+    try:
+        with open(path, "rb") as exe_file:
+            header = exe_file.read(HEADER_SIZE)
+            if header.startswith(b"MZ") and len(header) >= 0x40:
+                (pe_offset,) = struct.unpack_from("<I", header, 0x3C)
+                if pe_offset <= MAX_PE_OFFSET:
+                    pe_header = header[pe_offset : pe_offset + PE_HEADER_SIZE]
+                    if len(pe_header) < PE_HEADER_SIZE:
+                        exe_file.seek(pe_offset)
+                        pe_header = exe_file.read(PE_HEADER_SIZE)
+    except OSError as ex:
+        logger.debug("Can't read %s: %s", path, ex)
+        return None
+    if header.startswith(b"#!"):
+        return _read_script(path, header, size)
+    if header.startswith(ELF_MAGIC):
+        return _read_elf(path, header, size)
+    if header.startswith(b"MZ"):
+        return _read_pe(path, pe_header, size)
+    if header.startswith(SHORTCUT_MAGIC):
+        return Executable(path, "link", size=size)
+    return None
+
+
+def _read_script(path: str, header: bytes, size: int) -> Executable | None:
+    shebang = header[2:].split(b"\n", 1)[0].split()
+    if not shebang:
+        return None
+    interpreter = os.path.basename(shebang[0].decode("utf-8", "replace"))
+    if interpreter == "env" and len(shebang) > 1:
+        interpreter = shebang[-1].decode("utf-8", "replace")
+    return Executable(path, "script", interpreter, size=size)
+
+
+def _read_elf(path: str, header: bytes, size: int) -> Executable | None:
+    if len(header) < 20 or header[5] != 1:  # Only little endian binaries
+        return None
+    elf_type, machine = struct.unpack_from("<HH", header, 16)
+    if elf_type not in (ELF_TYPE_EXECUTABLE, ELF_TYPE_SHARED_OBJECT):
+        return None
+    kind = "appimage" if header[8:11] == APPIMAGE_MAGIC else "elf"
+    bits = 64 if header[4] == 2 else 32
+    return Executable(path, kind, ELF_MACHINES.get(machine, str(machine)), bits, size=size)
+
+
+def _read_pe(path: str, pe_header: bytes, size: int) -> Executable | None:
+    if len(pe_header) < PE_HEADER_SIZE:
+        return None  # A DOS executable, or a truncated file
+    signature, machine, _sections, _timestamp, _symbols, _symbol_count, _optional_size, characteristics = (
+        PE_HEADER.unpack_from(pe_header)
+    )
+    if signature != b"PE\x00\x00" or characteristics & PE_CHARACTERISTIC_DLL:
+        return None
+    optional_magic, subsystem = struct.unpack_from("<H66xH", pe_header, PE_HEADER.size)
+    bits = 64 if optional_magic == PE_OPTIONAL_HEADER_MAGIC_64 else 32
+    return Executable(
+        path, "pe", PE_MACHINES.get(machine, hex(machine)), bits, gui=subsystem == PE_SUBSYSTEM_GUI, size=size
+    )
+
+
+def get_name_score(path: str) -> int:
+    """Rank a file by its name, lower is better"""
+    name = os.path.basename(path).lower()
+    if any(avoided in name for avoided in AVOIDED_NAMES):
+        return 2
+    dir_name = os.path.basename(os.path.dirname(path)).lower()
+    if any(preferred in name for preferred in PREFERRED_NAMES) or (dir_name and dir_name in name):
+        return 0
+    return 1
+
+
+def get_linux_rank(executable: Executable) -> tuple:
+    """Scripts go first, then AppImages, then binaries for x86 CPUs, 64-bit first"""
+    kind_rank = ("script", "appimage", "elf").index(executable.kind)
+    machine_rank = 0 if executable.kind != "elf" or executable.machine in ("x86-64", "i386") else 1
+    return (
+        kind_rank,
+        machine_rank,
+        -executable.bits,
+        get_name_score(executable.path),
+        -executable.size,
+        executable.path,
+    )
+
+
+def get_windows_rank(executable: Executable) -> tuple:
+    """Shortcuts go first, then 64-bit then 32-bit programs"""
+    kind_rank = 0 if executable.kind == "link" else 1
+    return kind_rank, -executable.bits, get_name_score(executable.path), -executable.size, executable.path
+
 
 def is_excluded_elf(filename):
     excluded = ("xdg-open", "uninstall")
     _fn = filename.lower()
-    return any(exclude in _fn for exclude in excluded)
+    return any(exclude in _fn for exclude in excluded) or bool(SHARED_LIBRARY_NAME.search(_fn))
 
 
-def find_linux_game_executable(path, make_executable=False):
-    """Looks for a binary or shell script that launches the game in a directory"""
+def is_linux_candidate(executable: Executable) -> bool:
+    return executable.kind in ("script", "appimage", "elf")
 
-    for base, _dirs, files in os.walk(path):
-        candidates = {}
-        for _file in files:
-            if is_excluded_elf(_file):
-                continue
-            abspath = os.path.join(base, _file)
-            file_type = magic.from_file(abspath)
-            if "ASCII text executable" in file_type:
-                candidates["shell"] = abspath
-            if "Bourne-Again shell script" in file_type:
-                candidates["bash"] = abspath
-            if "POSIX shell script executable" in file_type:
-                candidates["posix"] = abspath
-            if "64-bit LSB executable" in file_type or "64-bit LSB shared object" in file_type:
-                candidates["64bit"] = abspath
-            if "32-bit LSB executable" in file_type or "32-bit LSB shared object" in file_type:
-                candidates["32bit"] = abspath
-        if candidates:
-            if make_executable:
-                for candidate in candidates.values():
-                    system.make_executable(candidate)
-            return (
-                candidates.get("shell")
-                or candidates.get("bash")
-                or candidates.get("posix")
-                or candidates.get("64bit")
-                or candidates.get("32bit")
-            )
-    logger.error("Couldn't find a Linux executable in %s", path)
-    return ""
+
+def is_linux_pruned_dir(path):
+    name = os.path.basename(path).lower()
+    return name.startswith(".") or name in PRUNED_DIRECTORIES or name in PRUNED_LINUX_DIRECTORIES
 
 
 def is_excluded_dir(path):
@@ -61,6 +207,10 @@ def is_excluded_dir(path):
     return any(dir_name in excluded for dir_name in path.split("/"))
 
 
+def is_windows_pruned_dir(path):
+    return is_excluded_dir(path) or os.path.basename(path).lower() in PRUNED_DIRECTORIES
+
+
 def is_excluded_exe(filename):
     excluded = (
         "unins000",
@@ -75,27 +225,80 @@ def is_excluded_exe(filename):
     return any(exclude in _fn for exclude in excluded)
 
 
-def find_windows_game_executable(path):
-    for base, _dirs, files in os.walk(path):
-        candidates = {}
-        if is_excluded_dir(base):
-            continue
-        for _file in files:
-            if is_excluded_exe(_file):
+def is_windows_candidate(executable: Executable) -> bool:
+    if executable.kind == "link":
+        return True
+    return executable.kind == "pe" and executable.gui and executable.machine in ("x86-64", "i386")
+
+
+def scan_directory(path, is_excluded_file, is_candidate, is_pruned_dir):
+    """Return the subdirectories to search next and the executables of a directory"""
+    subdirectories = []
+    executables = []
+    try:
+        entries = list(os.scandir(path))
+    except OSError as ex:
+        logger.warning("Can't list %s: %s", path, ex)
+        return subdirectories, executables
+    for entry in entries:
+        try:
+            if entry.is_symlink():
                 continue
-            abspath = os.path.join(base, _file)
-            if os.path.islink(abspath):
+            if entry.is_dir():
+                if not is_pruned_dir(entry.path):
+                    subdirectories.append(entry.path)
                 continue
-            file_type = magic.from_file(abspath)
-            if "MS Windows shortcut" in file_type:
-                candidates["link"] = abspath
-            elif all([_ in file_type for _ in ("PE32+ executable", "(GUI)", "x86-64")]):
-                candidates["64bit"] = abspath
-            elif all([_ in file_type for _ in ("PE32 executable", "(GUI)")]) and any(
-                [_ in file_type for _ in ("Intel i386", "Intel 80386")]
-            ):
-                candidates["32bit"] = abspath
-        if candidates:
-            return candidates.get("link") or candidates.get("64bit") or candidates.get("32bit")
-    logger.error("Couldn't find a Windows executable in %s", path)
-    return ""
+            if os.path.splitext(entry.name)[1].lower() in SKIPPED_EXTENSIONS or is_excluded_file(entry.name):
+                continue
+            size = entry.stat().st_size
+        except OSError:
+            continue
+        if size < 4:
+            continue
+        executable = read_executable(entry.path, size)
+        if executable and is_candidate(executable):
+            executables.append(executable)
+    return subdirectories, executables
+
+
+def find_executables(path, is_excluded_file, is_candidate, is_pruned_dir, max_workers=MAX_SCAN_WORKERS):
+    """Return the executables of the shallowest directories under path that have some.
+    The directories of each depth level are scanned in parallel."""
+    level = [path]
+    with ThreadPoolExecutor(max_workers=max_workers) as executor:
+        while level:
+            next_level = []
+            executables = []
+            results = executor.map(
+                lambda directory: scan_directory(directory, is_excluded_file, is_candidate, is_pruned_dir),
+                sorted(level),
+            )
+            for subdirectories, directory_executables in results:
+                next_level.extend(subdirectories)
+                executables.extend(directory_executables)
+            if executables:
+                return executables
+            level = next_level
+    return []
+
+
+def find_linux_game_executable(path, make_executable=False):
+    """Looks for a binary or shell script that launches the game in a directory"""
+    executables = find_executables(path, is_excluded_elf, is_linux_candidate, is_linux_pruned_dir)
+    if not executables:
+        logger.error("Couldn't find a Linux executable in %s", path)
+        return ""
+    best = min(executables, key=get_linux_rank)
+    if make_executable:
+        for executable in executables:
+            if os.path.dirname(executable.path) == os.path.dirname(best.path):
+                system.make_executable(executable.path)
+    return best.path
+
+
+def find_windows_game_executable(path):
+    executables = find_executables(path, is_excluded_exe, is_windows_candidate, is_windows_pruned_dir)
+    if not executables:
+        logger.error("Couldn't find a Windows executable in %s", path)
+        return ""
+    return min(executables, key=get_windows_rank).path
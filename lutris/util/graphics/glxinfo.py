@@ -1,9 +1,39 @@
 """Parser for the glxinfo utility"""
 
+import os
 from typing import Any
 
 from lutris.util.log import logger
-from lutris.util.system import read_process_output
+from lutris.util.probe_cache import PROBE_CACHE, get_driver_fingerprint, get_files_fingerprint
+from lutris.util.system import find_executable, read_process_output
+
+# Environment variables that change the renderer glxinfo reports
+GLXINFO_ENV_VARS = (
+    "DISPLAY",
+    "WAYLAND_DISPLAY",
+    "DRI_PRIME",
+    "__NV_PRIME_RENDER_OFFLOAD",
+    "__GLX_VENDOR_LIBRARY_NAME",
+    "LIBGL_ALWAYS_SOFTWARE",
+    "MESA_LOADER_DRIVER_OVERRIDE",
+)
+
+
+def get_glxinfo_fingerprint() -> list[Any]:
+    """The glxinfo output changes with the drivers, which come with new libraries
+    and so update the ldconfig cache"""
+    return [
+        get_driver_fingerprint(),
+        get_files_fingerprint([find_executable("glxinfo") or "glxinfo", "/etc/ld.so.cache"]),
+        [os.environ.get(name) for name in GLXINFO_ENV_VARS],
+    ]
+
+
+def read_glxinfo_output() -> str:
+    return read_process_output(["glxinfo", "-B"])
+
+
+get_cached_glxinfo_output = PROBE_CACHE.register("glxinfo", get_glxinfo_fingerprint, read_glxinfo_output)
 
 
 class Container:  # pylint: disable=too-few-public-methods
@@ -27,7 +57,7 @@ class GlxInfo:
     @staticmethod
     def get_glxinfo_output() -> str:
         """Return the glxinfo -B output"""
-        return read_process_output(["glxinfo", "-B"])
+        return get_cached_glxinfo_output()
 
     def as_dict(self) -> dict[str, Any]:
         """Return the attributes as a dict"""
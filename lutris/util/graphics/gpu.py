@@ -3,12 +3,13 @@ import os
 import re
 import subprocess
 import threading
-from typing import TypeAlias
+from typing import Any, TypeAlias
 
 from lutris.util import system
 from lutris.util.graphics import drivers
 from lutris.util.linux import LINUX_SYSTEM
 from lutris.util.log import logger
+from lutris.util.probe_cache import PROBE_CACHE, get_driver_fingerprint, get_files_fingerprint
 
 VULKANINFO_PATH = system.find_executable("vulkaninfo")
 VULKAN_DATA_DIRS = [
@@ -160,9 +161,20 @@ class GPU:
         return infos
 
     def get_vulkaninfo(self) -> dict[str, dict[str, str]]:
-        """Runs vulkaninfo to find the GPU name"""
+        """Runs vulkaninfo to find the GPU name; the result is cached until the drivers change"""
         if not VULKANINFO_PATH:
             raise RuntimeError("vulkaninfo is not available")
+        return PROBE_CACHE.get("vulkaninfo:%s" % self.card, self.get_vulkaninfo_fingerprint(), self.read_vulkaninfo)
+
+    def get_vulkaninfo_fingerprint(self) -> list[Any]:
+        return [
+            get_driver_fingerprint(),
+            get_files_fingerprint([VULKANINFO_PATH, "/etc/ld.so.cache"] + get_vk_icd_files()),
+            [os.environ.get(name) for name in ("VK_DRIVER_FILES", "VK_ICD_FILENAMES")],
+            self.pci_id,
+        ]
+
+    def read_vulkaninfo(self) -> dict[str, dict[str, str]]:
         subprocess_env = dict(os.environ)
         vulkaninfo_output_raw = system.read_process_output(
             [VULKANINFO_PATH, "--summary"],
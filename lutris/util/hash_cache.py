@@ -0,0 +1,228 @@
+"""Persistent cache of file digests, shared by everything that hashes local files.
+
+Digests are stored in a SQLite database under the cache folder, keyed by the device,
+inode, size and modification time of the file they were computed from, so checking an
+unchanged file again only costs a stat. A file can have several digests (md5, sha1...)
+recorded at once."""
+
+import hashlib
+import os
+import sqlite3
+import threading
+from collections.abc import Iterable
+from concurrent.futures import ThreadPoolExecutor
+
+from lutris import settings
+from lutris.database import sql
+from lutris.util.log import logger
+
+HASH_CACHE_PATH = os.path.join(settings.CACHE_DIR, "file-hashes.db")
+
+# Files are read into a reusable buffer of this size; hashlib releases the GIL while it
+# digests such large blocks, so several files can be hashed in parallel by threads.
+READ_BUFFER_SIZE = 1024 * 1024
+
+FileKey = tuple[int, int, int, int]
+
+
+def compute_file_hashes(path: str, hash_types: Iterable[str]) -> dict[str, str]:
+    """Read a file once and return its digests for each of the requested hash types"""
+    hashers = {hash_type: hashlib.new(hash_type) for hash_type in hash_types}
+    buffer = bytearray(READ_BUFFER_SIZE)
+    view = memoryview(buffer)
+    with open(path, "rb", buffering=0) as input_file:
+        while True:
+            size = input_file.readinto(buffer)
+            if not size:
+                break
+            for hasher in hashers.values():
+                hasher.update(view[:size])
+    return {hash_type: hasher.hexdigest() for hash_type, hasher in hashers.items()}
+
+
+def get_file_key(file_stat: os.stat_result) -> FileKey:
+    return file_stat.st_dev, file_stat.st_ino, file_stat.st_size, file_stat.st_mtime_ns
+
+
+class HashCacheStats:
+    """Counts of the lookups answered from the cache and of the files that had to be read"""
+
+    def __init__(self) -> None:
+        self.hits = 0
+        self.misses = 0
+
+    @property
+    def hit_rate(self) -> float:
+        total = self.hits + self.misses
+        return self.hits / total if total else 0.0
+
+    def __repr__(self) -> str:
+        return "%d hits, %d misses (%.0f%% hit rate)" % (self.hits, self.misses, self.hit_rate * 100)
+
+
+class FileHashCache:
+    """Digests of local files, persisted to a SQLite database.
+
+    Files that can't be read are left out of the results of get_hashes(); get_hash()
+    raises OSError for them. If the database itself is unusable or busy, files are simply
+    hashed without being cached."""
+
+    def __init__(self, db_path: str, max_workers: int | None = None) -> None:
+        self.db_path = db_path
+        self.max_workers = max_workers or min(8, os.cpu_count() or 1)
+        self.stats = HashCacheStats()
+        self._initialized = False
+        self._stats_lock = threading.Lock()
+
+    def _init_database(self) -> None:
+        if self._initialized:
+            return
+        os.makedirs(os.path.dirname(self.db_path), exist_ok=True)
+        with sql.db_cursor(self.db_path) as cursor:
+            sql.cursor_execute(
+                cursor,
+                "CREATE TABLE IF NOT EXISTS file_hashes ("
+                "device INTEGER, inode INTEGER, size INTEGER, mtime_ns INTEGER, "
+                "hash_type TEXT, digest TEXT, path TEXT, "
+                "PRIMARY KEY (device, inode, size, mtime_ns, hash_type))",
+            )
+        self._initialized = True
+
+    def _lookup(self, keys: Iterable[FileKey], hash_type: str) -> dict[FileKey, str]:
+        digests = {}
+        try:
+            self._init_database()
+            with sql.db_cursor(self.db_path) as cursor:
+                for key in keys:
+                    row = sql.cursor_execute(
+                        cursor,
+                        "SELECT digest FROM file_hashes "
+                        "WHERE device=? AND inode=? AND size=? AND mtime_ns=? AND hash_type=?",
+                        (*key, hash_type),
+                    ).fetchone()
+                    if row:
+                        digests[key] = row[0]
+        except (OSError, RuntimeError, sqlite3.Error) as ex:
+            logger.warning("Unable to read the file hash cache %s: %s", self.db_path, ex)
+        return digests
+
+    def _store(self, entries: Iterable[tuple[FileKey, str, str, str]]) -> None:
+        """Save (key, hash type, digest, path) entries"""
+        try:
+            self._init_database()
+            with sql.db_cursor(self.db_path) as cursor:
+                for key, hash_type, digest, path in entries:
+                    sql.cursor_execute(
+                        cursor,
+                        "INSERT OR REPLACE INTO file_hashes "
+                        "(device, inode, size, mtime_ns, hash_type, digest, path) VALUES (?, ?, ?, ?, ?, ?, ?)",
+                        (*key, hash_type, digest, path),
+                    )
+        except (OSError, RuntimeError, sqlite3.Error) as ex:
+            logger.warning("Unable to update the file hash cache %s: %s", self.db_path, ex)
+
+    def _count(self, hits: int, misses: int) -> None:
+        with self._stats_lock:
+            self.stats.hits += hits
+            self.stats.misses += misses
+
+    def get_hash(self, path: str, hash_type: str = "md5") -> str:
+        """Return the digest of type hash_type of a file"""
+        hashlib.new(hash_type)  # Raises ValueError for unsupported types before anything is read
+        key = get_file_key(os.stat(path))
+        digest = self._lookup([key], hash_type).get(key)
+        if digest:
+            self._count(1, 0)
+            return digest
+        self._count(0, 1)
+        digest = compute_file_hashes(path, [hash_type])[hash_type]
+        self._store([(key, hash_type, digest, path)])
+        return digest
+
+    def get_hashes(self, paths: Iterable[str], hash_type: str = "md5") -> dict[str, str]:
+        """Return the digests of type hash_type of many files, as a path -> digest dict.
+        Files missing from the cache are read in parallel."""
+        hashlib.new(hash_type)
+        keys = {}
+        for path in paths:
+            try:
+                keys[path] = get_file_key(os.stat(path))
+            except OSError as ex:
+                logger.warning("Error reading %s: %s", path, ex)
+        cached = self._lookup(set(keys.values()), hash_type)
+        digests = {path: cached[key] for path, key in keys.items() if key in cached}
+        missing = [path for path in keys if path not in digests]
+
+        def hash_file(path):
+            try:
+                return path, compute_file_hashes(path, [hash_type])[hash_type]
+            except OSError as ex:
+                logger.warning("Error reading %s: %s", path, ex)
+                return path, None
+
+        entries = []
+        if missing:
+            with ThreadPoolExecutor(max_workers=min(self.max_workers, len(missing))) as executor:
+                for path, digest in executor.map(hash_file, missing):
+                    if digest:
+                        digests[path] = digest
+                        entries.append((keys[path], hash_type, digest, path))
+            self._store(entries)
+        self._count(len(keys) - len(missing), len(missing))
+        logger.debug("Hashed %d files (%s), file hash cache: %s", len(keys), hash_type, self.stats)
+        return digests
+
+    def store_hash(self, path: str, hash_type: str, digest: str) -> None:
+        """Record a digest computed elsewhere, for example while the file was downloaded"""
+        try:
+            key = get_file_key(os.stat(path))
+        except OSError:
+            return
+        self._store([(key, hash_type, digest, path)])
+
+    def prune(self) -> int:
+        """Remove the entries for files that were deleted or modified, and return how many were removed;
+        this is done at startup so that the database doesn't keep growing"""
+        try:
+            self._init_database()
+            with sql.db_cursor(self.db_path) as cursor:
+                rows = sql.cursor_execute(
+                    cursor, "SELECT DISTINCT device, inode, size, mtime_ns, path FROM file_hashes"
+                ).fetchall()
+            stale_keys = []
+            for row in rows:
+                key, path = tuple(row[:4]), row[4]
+                try:
+                    if get_file_key(os.stat(path)) == key:
+                        continue
+                except OSError:
+                    pass
+                stale_keys.append(key)
+            with sql.db_cursor(self.db_path) as cursor:
+                for key in stale_keys:
+                    sql.cursor_execute(
+                        cursor, "DELETE FROM file_hashes WHERE device=? AND inode=? AND size=? AND mtime_ns=?", key
+                    )
+        except (OSError, RuntimeError, sqlite3.Error) as ex:
+            logger.warning("Unable to prune the file hash cache %s: %s", self.db_path, ex)
+            return 0
+        return len(stale_keys)
+
+
+FILE_HASH_CACHE = FileHashCache(HASH_CACHE_PATH)
+
+
+def get_file_hash(path: str, hash_type: str = "md5") -> str:
+    """Return the digest of a file, from the cache if the file hasn't changed"""
+    return FILE_HASH_CACHE.get_hash(path, hash_type)
+
+
+def get_file_hashes(paths: Iterable[str], hash_type: str = "md5") -> dict[str, str]:
+    """Return the digests of many files as a path -> digest dict, hashing the files
+    that aren't cached in parallel. Unreadable files are left out."""
+    return FILE_HASH_CACHE.get_hashes(paths, hash_type)
+
+
+def store_file_hash(path: str, hash_type: str, digest: str) -> None:
+    """Record the digest of a file that was computed without going through the cache"""
+    FILE_HASH_CACHE.store_hash(path, hash_type, digest)
@@ -4,12 +4,14 @@ import json
 import os
 import socket
 import ssl
+import time
 import urllib.error
 import urllib.parse
 import urllib.request
-from collections.abc import Collection, Generator
+from collections.abc import Callable, Collection, Generator, Iterable
+from concurrent.futures import ThreadPoolExecutor
 from ssl import CertificateError
-from typing import TYPE_CHECKING, Any
+from typing import TYPE_CHECKING, Any, TypeVar
 
 import certifi
 
@@ -24,6 +26,16 @@ if TYPE_CHECKING:
 
 DEFAULT_TIMEOUT = read_setting("default_http_timeout") or 30
 
+# Requests made at the same time when fetching the pages of a paginated resource
+MAX_CONCURRENT_REQUESTS = 4
+# Attempts made after a request fails in a way that may not happen again, and the
+# delay before the first one, doubled for each of the next
+REQUEST_RETRIES = 2
+RETRY_DELAY = 1.0
+
+T = TypeVar("T")
+R = TypeVar("R")
+
 
 def _create_ssl_context() -> ssl.SSLContext:
     return ssl.create_default_context(cafile=certifi.where())
@@ -226,3 +238,65 @@ def download_file(url: str, dest: str, overwrite: bool = False, raise_errors: bo
         return None
     request.write_to_file(dest)
     return dest
+
+
+def is_retryable(error: Exception) -> bool:
+    """Return whether a request that failed with error may succeed if made again:
+    connection failures, timeouts, rate limiting and server errors"""
+    if isinstance(error, HTTPError):
+        return error.code is None or error.code == 429 or error.code >= 500
+    return isinstance(error, OSError)
+
+
+def fetch_with_retry(fetch: Callable[[T], R], item: T, retries: int = REQUEST_RETRIES) -> R:
+    """Return fetch(item), calling it again when it fails with a retryable error"""
+    attempt = 0
+    while True:
+        try:
+            return fetch(item)
+        except Exception as ex:
+            if attempt >= retries or not is_retryable(ex):
+                raise
+            logger.warning("Request for %s failed (%s), retrying", item, ex)
+            time.sleep(RETRY_DELAY * 2**attempt)
+            attempt += 1
+
+
+def fetch_concurrently(
+    fetch: Callable[[T], R], items: Iterable[T], max_workers: int = MAX_CONCURRENT_REQUESTS
+) -> list[R]:
+    """Return fetch(item) for each item, in order, making at most max_workers calls at a
+    time. The first error raised by a call is raised once all the calls are done."""
+    items = list(items)
+    if len(items) < 2 or max_workers < 2:
+        return [fetch(item) for item in items]
+    with ThreadPoolExecutor(max_workers=min(max_workers, len(items))) as executor:
+        return list(executor.map(fetch, items))
+
+
+def fetch_pages(
+    fetch_page: Callable[[int], T],
+    get_page_count: Callable[[T], int],
+    first_page: int = 1,
+    max_workers: int = MAX_CONCURRENT_REQUESTS,
+    retries: int = REQUEST_RETRIES,
+    on_error: Callable[[int, Exception], T] | None = None,
+) -> list[T]:
+    """Fetch all the pages of a paginated resource and return the responses, in page order.
+
+    fetch_page(page) fetches a single page. The first one is fetched on its own, to learn
+    from get_page_count(response) how many pages there are, then the others are fetched
+    concurrently. Requests failing with retryable errors are retried. If on_error is given,
+    a page that can't be fetched is replaced with on_error(page, error) instead of raising."""
+    first_response = fetch_with_retry(fetch_page, first_page, retries)
+    page_count = get_page_count(first_response)
+
+    def fetch(page: int) -> T:
+        try:
+            return fetch_with_retry(fetch_page, page, retries)
+        except Exception as ex:
+            if on_error is None:
+                raise
+            return on_error(page, ex)
+
+    return [first_response] + fetch_concurrently(fetch, range(first_page + 1, first_page + page_count), max_workers)
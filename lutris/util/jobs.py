@@ -1,7 +1,9 @@
 import sys
 import threading
 import traceback
+from collections import deque
 from collections.abc import Callable
+from enum import IntEnum
 from typing import TYPE_CHECKING, Any, TypeVar
 
 from gi.repository import GLib
@@ -14,30 +16,168 @@ if TYPE_CHECKING:
 ResultType = TypeVar("ResultType")
 
 
-class AsyncCall(threading.Thread):
+class Priority(IntEnum):
+    """Classes of jobs run by AsyncCall; each has its own limit of concurrent jobs, and
+    when several classes have jobs waiting, the lower values go first."""
+
+    INTERACTIVE = 0  # the user is waiting for it: searches, dialogs, installer steps
+    BACKGROUND = 1  # service reloads, library sync, media downloads
+    BULK_IO = 2  # downloads and extraction of large files
+
+
+# How many jobs of each class may run at once
+PRIORITY_LIMITS = {Priority.INTERACTIVE: 8, Priority.BACKGROUND: 4, Priority.BULK_IO: 4}
+
+# Idle worker threads exit after this many seconds
+WORKER_IDLE_TIMEOUT = 60.0
+
+
+class JobPool:
+    """Runs AsyncCalls on a set of shared worker threads, queuing them by priority class once
+    the class has as many jobs running as its limit allows.
+
+    A job submitted from one of the workers is never queued, but runs at once on an extra thread:
+    the worker may well be waiting for it, and it would otherwise hold up its slot for good."""
+
+    def __init__(self, limits: dict[Priority, int], idle_timeout: float = WORKER_IDLE_TIMEOUT) -> None:
+        self.limits = dict(limits)
+        self.idle_timeout = idle_timeout
+        self._queues: dict[Priority, deque["AsyncCall"]] = {priority: deque() for priority in Priority}
+        self._running = dict.fromkeys(Priority, 0)
+        self._condition = threading.Condition()
+        self._local = threading.local()
+        self._workers = 0
+        self._idle_workers = 0
+        self._notified_workers = 0
+        self.submitted = 0
+        self.completed = 0
+        self.cancelled = 0
+        self.overflowed = 0
+        self.max_queue_depth = 0
+
+    def submit(self, call: "AsyncCall") -> None:
+        with self._condition:
+            self.submitted += 1
+            if getattr(self._local, "is_worker", False) and self._running[call.priority] >= self.limits[call.priority]:
+                self.overflowed += 1
+                threading.Thread(target=self._run_overflow, args=(call,), daemon=True).start()
+                return
+            self._queues[call.priority].append(call)
+            self.max_queue_depth = max(self.max_queue_depth, self.get_queue_depth())
+            if self._running[call.priority] < self.limits[call.priority]:
+                self._wake_worker()
+
+    def remove(self, call: "AsyncCall") -> bool:
+        """Remove a call that has not started yet from its queue; returns False if it has started."""
+        with self._condition:
+            try:
+                self._queues[call.priority].remove(call)
+            except ValueError:
+                return False
+            self.cancelled += 1
+            return True
+
+    def get_queue_depth(self) -> int:
+        return sum(len(queue) for queue in self._queues.values())
+
+    def get_stats(self) -> dict[str, Any]:
+        """Return the number of queued and running jobs of each class, and counters since startup"""
+        with self._condition:
+            return {
+                "classes": {
+                    priority.name.lower(): {
+                        "queued": len(self._queues[priority]),
+                        "running": self._running[priority],
+                        "limit": self.limits[priority],
+                    }
+                    for priority in Priority
+                },
+                "workers": self._workers,
+                "submitted": self.submitted,
+                "completed": self.completed,
+                "cancelled": self.cancelled,
+                "overflowed": self.overflowed,
+                "max_queue_depth": self.max_queue_depth,
+            }
+
+    def _wake_worker(self) -> None:
+        if self._idle_workers > self._notified_workers:
+            self._notified_workers += 1
+            self._condition.notify()
+        else:
+            self._workers += 1
+            threading.Thread(target=self._work, name="AsyncCall-worker", daemon=True).start()
+
+    def _next_call(self) -> "AsyncCall | None":
+        for priority in Priority:
+            if self._queues[priority] and self._running[priority] < self.limits[priority]:
+                self._running[priority] += 1
+                return self._queues[priority].popleft()
+        return None
+
+    def _work(self) -> None:
+        self._local.is_worker = True
+        while True:
+            with self._condition:
+                call = self._next_call()
+                while not call:
+                    self._idle_workers += 1
+                    notified = self._condition.wait(self.idle_timeout)
+                    self._idle_workers -= 1
+                    if notified:
+                        self._notified_workers -= 1
+                    call = self._next_call()
+                    if not call and not notified:
+                        self._workers -= 1
+                        return
+            try:
+                call.run()
+            finally:
+                with self._condition:
+                    self._running[call.priority] -= 1
+                    self.completed += 1
+
+    def _run_overflow(self, call: "AsyncCall") -> None:
+        self._local.is_worker = True
+        try:
+            call.run()
+        finally:
+            with self._condition:
+                self.completed += 1
+
+
+JOB_POOL = JobPool(PRIORITY_LIMITS)
+
+
+class AsyncCall:
     def __init__(
         self,
         func: Callable[..., ResultType],
         callback: Callable[[ResultType, Exception], None] | None,
         *args: Any,
         callback_target: "Gtk.Widget | None" = None,
+        priority: Priority = Priority.INTERACTIVE,
         **kwargs: Any,
     ):
-        """Execute `function` in a new thread then schedule `callback` for
+        """Execute `function` on a worker thread of the job pool then schedule `callback` for
         execution in the main loop. If 'callback_target' is a widget and it is destroyed
-        in the meantime, the callback is cancelled.
+        in the meantime, the callback is cancelled. The 'priority' sets the class of the job,
+        which decides how soon it runs when the pool is busy.
         """
         self.callback_task = None
         self.stop_request = threading.Event()
+        self.done = threading.Event()
 
-        super().__init__(target=self.target, args=args, kwargs=kwargs)
         self.function = func
+        self.priority = priority
+        self.daemon = kwargs.pop("daemon", True)  # Worker threads are always daemons
+        self.args = args
+        self.kwargs = kwargs
         if not callback:
             self.callback = lambda r, e: None
         else:
             self.callback = self._protect_callback(callback, callback_target)
-        self.daemon = kwargs.pop("daemon", True)
-        self.start()
+        JOB_POOL.submit(self)
 
     def _protect_callback(
         self, callback: Callable[[Any, Exception], None], callback_target: "Gtk.Widget | None" = None
@@ -69,6 +209,30 @@ class AsyncCall(threading.Thread):
         else:
             return callback
 
+    def cancel(self) -> bool:
+        """Set the stop request, which the function may check to stop early. If the call
+        has not started yet, it is dropped altogether and its callback never runs; this
+        returns True in that case."""
+        self.stop_request.set()
+        if JOB_POOL.remove(self):
+            self.done.set()
+            return True
+        return False
+
+    def is_alive(self) -> bool:
+        """True until the function has completed or the call was cancelled before running."""
+        return not self.done.is_set()
+
+    def join(self, timeout: float | None = None) -> bool:
+        """Wait for the function to complete; returns False on timeout."""
+        return self.done.wait(timeout)
+
+    def run(self) -> None:
+        try:
+            self.target(*self.args, **self.kwargs)
+        finally:
+            self.done.set()
+
     def target(self, *a: Any, **kw: Any) -> None:
         result = None
         error = None
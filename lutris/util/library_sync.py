@@ -3,15 +3,9 @@ import time
 
 from lutris import settings
 from lutris.api import read_api_key
-from lutris.database.categories import (
-    add_category,
-    add_game_to_category,
-    get_all_games_categories,
-    get_categories,
-    remove_category_from_game,
-)
-from lutris.database.games import add_game, get_games, get_games_where
-from lutris.game import Game
+from lutris.database import sql
+from lutris.database.categories import get_all_games_categories, get_categories
+from lutris.database.games import clear_library_journal, get_games, get_library_journal
 from lutris.gui.widgets import NotificationSource
 from lutris.util import http
 from lutris.util.log import logger
@@ -68,58 +62,118 @@ class LibrarySyncer:
             game["service"] or "",
         )
 
-    def _get_game(self, remote_game) -> Game | None:
-        """Return a Game instance from a remote API record"""
-        conditions = {"slug": remote_game["slug"]}
-        for cond_key in ("runner", "platform", "service"):
-            if remote_game[cond_key]:
-                conditions[cond_key] = remote_game[cond_key]
-        pga_game = get_games_where(**conditions)
-        if len(pga_game) == 0:
-            logger.error("No game found for %s", remote_game["slug"])
-            return None
-        if len(pga_game) > 1:
-            logger.error("More than one game found for %s", remote_game["slug"])
-            return None
-        pga_game = pga_game[0]
-        return Game(pga_game["id"])
-
-    def _create_new_game(self, remote_game):
-        """Create a new local game from a remote record"""
-        logger.info("Create %s", remote_game["slug"])
-        game_id = add_game(
-            name=remote_game["name"],
-            slug=remote_game["slug"],
-            runner=remote_game["runner"],
-            platform=remote_game["platform"],
-            lastplayed=remote_game["lastplayed"],
-            playtime=remote_game["playtime"],
-            service=remote_game["service"],
-            service_id=remote_game["service_id"],
-            installed=0,
+    def _get_local_games(self):
+        """Return the local games by key, with the keys shared by several games"""
+        local_games = {}
+        duplicate_keys = set()
+        query = "SELECT id, slug, runner, platform, service, playtime, lastplayed FROM games"
+        for db_game in sql.db_query(settings.DB_PATH, query):
+            library_key = self._make_game_key(db_game)
+            if library_key in local_games:
+                duplicate_keys.add(library_key)
+            local_games[library_key] = db_game
+        return local_games, duplicate_keys
+
+    def _get_game_categories(self, game_id) -> set[str]:
+        return {
+            self.categories[category_id]
+            for category_id in self.games_categories.get(str(game_id), [])
+            if category_id in self.categories
+        }
+
+    def _apply_remote_games(self, remote_games) -> bool:
+        """Merge the games of the remote library into the local one, in a single transaction.
+        Returns True if the local library changed."""
+        local_games, duplicate_keys = self._get_local_games()
+        library_slugs = {library_key[0] for library_key in local_games}
+        updates = []
+        new_games = []
+        category_changes = []
+        for remote_game in remote_games:
+            remote_key = self._make_game_key(remote_game)
+            if remote_key in duplicate_keys:
+                logger.warning("Duplicate game %s, not syncing.", remote_key)
+                continue
+            local_game = local_games.get(remote_key)
+            if local_game:
+                playtime = local_game["playtime"] or 0
+                lastplayed = local_game["lastplayed"] or 0
+                if remote_game["playtime"] > playtime or remote_game["lastplayed"] > lastplayed:
+                    updates.append(
+                        (
+                            max(playtime, remote_game["playtime"]),
+                            max(lastplayed, remote_game["lastplayed"]),
+                            local_game["id"],
+                        )
+                    )
+                game_categories = self._get_game_categories(local_game["id"])
+                if set(remote_game["categories"]) != game_categories:
+                    category_changes.append((local_game["id"], game_categories, remote_game["categories"]))
+            elif remote_game["slug"] not in library_slugs:
+                new_games.append(remote_game)
+        if not updates and not new_games and not category_changes:
+            return False
+
+        logger.info(
+            "Updating %s games, %s categories and creating %s games from the remote library",
+            len(updates),
+            len(category_changes),
+            len(new_games),
         )
-        for category in remote_game["categories"]:
-            self._ensure_category(category)
-            add_game_to_category(game_id, self.category_ids[category], no_signal=True)
-
-    def _ensure_category(self, category):
-        """Make sure a given category exists in the database, create it if not"""
-        if category not in self.categories.values():
-            add_category(category, no_signal=True)
-            self.categories = self._load_categories()
-            self.category_ids = self._load_categories(reverse=True)
-
-    def _update_categories(self, game: Game, remote_game: dict):
-        """Update the categories of a local game"""
-        game_categories: list[str] = game.get_categories()
-        remote_categories: list[str] = remote_game["categories"]
-        for category in game_categories:
-            if category not in remote_categories and category in self.category_ids:
-                remove_category_from_game(game.id, self.category_ids[category], no_signal=True)
-        for category in remote_categories:
-            if category not in game_categories:
-                self._ensure_category(category)
-                add_game_to_category(game.id, self.category_ids[category], no_signal=True)
+        with sql.db_cursor(settings.DB_PATH) as cursor:
+            # Changes made while the sync ran are still to be sent; those made here are not
+            pending_game_ids = {row[0] for row in cursor.execute("SELECT game_id FROM library_journal")}
+            last_entry_id = cursor.execute("SELECT max(id) FROM library_journal").fetchone()[0] or 0
+
+            cursor.executemany("UPDATE games SET playtime=?, lastplayed=? WHERE id=?", updates)
+            installed_at = int(time.time())
+            for remote_game in new_games:
+                sql.cursor_execute(
+                    cursor,
+                    "INSERT INTO games (name, slug, runner, platform, lastplayed, playtime, service, service_id, "
+                    "installed, installed_at) VALUES (?, ?, ?, ?, ?, ?, ?, ?, 0, ?)",
+                    (
+                        remote_game["name"],
+                        remote_game["slug"],
+                        remote_game["runner"],
+                        remote_game["platform"],
+                        remote_game["lastplayed"],
+                        remote_game["playtime"],
+                        remote_game["service"],
+                        remote_game["service_id"],
+                        installed_at,
+                    ),
+                )
+                category_changes.append((cursor.lastrowid, set(), remote_game["categories"]))
+            self._update_categories(cursor, category_changes)
+
+            journaled = cursor.execute("SELECT id, game_id FROM library_journal WHERE id > ?", (last_entry_id,))
+            cursor.executemany(
+                "DELETE FROM library_journal WHERE id=?",
+                [(entry_id,) for entry_id, game_id in journaled.fetchall() if game_id not in pending_game_ids],
+            )
+        self.categories = self._load_categories()
+        self.category_ids = self._load_categories(reverse=True)
+        self.games_categories = get_all_games_categories()
+        return True
+
+    def _update_categories(self, cursor, category_changes):
+        """Set the categories of games to the remote ones, creating the missing categories"""
+        category_ids = dict(self.category_ids)
+        removed = []
+        added = []
+        for game_id, game_categories, remote_categories in category_changes:
+            for category in game_categories.difference(remote_categories):
+                removed.append((category_ids[category], game_id))
+            for category in dict.fromkeys(remote_categories):
+                if category in game_categories:
+                    continue
+                if category not in category_ids:
+                    sql.cursor_execute(cursor, "INSERT INTO categories (name) VALUES (?)", (category,))
+                    category_ids[category] = cursor.lastrowid
+                added.append((game_id, category_ids[category]))
+        cursor.executemany("DELETE FROM games_categories WHERE category_id=? AND game_id=?", removed)
+        cursor.executemany("INSERT INTO games_categories (game_id, category_id) VALUES (?, ?)", added)
 
     def _db_game_to_api(self, db_game):
         """Serialize DB game entry to a payload compatible with the API"""
@@ -136,20 +190,15 @@ class LibrarySyncer:
             "categories": categories,
         }
 
-    def _db_games_to_api(self, db_games, since=None):
-        """Serialize a collection of games to API format, optionally filtering by date"""
-        payload = []
-        for db_game in db_games:
-            lastplayed = db_game["lastplayed"] or 0
-            installed_at = db_game["installed_at"] or 0
-
-            if since and lastplayed < since and installed_at < since:
-                continue
-            payload.append(self._db_game_to_api(db_game))
-        return payload
+    def _db_games_to_api(self, db_games):
+        """Serialize a collection of games to API format"""
+        return [self._db_game_to_api(db_game) for db_game in db_games]
 
     def sync_local_library(self, force: bool = False) -> None:
-        """Sync task to send recent changes to the server and sync back server changes to the local client"""
+        """Sync task to send recent changes to the server and sync back server changes to the local client
+
+        Only the games in the library journal, changed since the last sync, are sent, unless
+        the sync is forced or was never done."""
         global _IS_LOCAL_LIBRARY_SYNCING
 
         if _IS_LOCAL_LIBRARY_SYNCING:
@@ -159,9 +208,6 @@ class LibrarySyncer:
             since = int(settings.read_setting("last_library_sync_at"))
         else:
             since = None
-        all_games = get_games()
-        local_library = self._db_games_to_api(all_games)
-        local_library_updates = self._db_games_to_api(all_games, since=since)
 
         request = self._get_request(since)
         if not request:
@@ -171,50 +217,15 @@ class LibrarySyncer:
         any_local_changes = False
         try:
             _IS_LOCAL_LIBRARY_SYNCING = True
+            last_entry_id, changed_games = get_library_journal()
+            local_library_updates = self._db_games_to_api(changed_games if since else get_games())
             try:
                 request.post(data=json.dumps(local_library_updates).encode())
             except http.HTTPError as ex:
                 logger.error("Could not send local library to server: %s", ex)
                 return None
-            library_keys = set()
-            duplicate_keys = set()
-            library_map = {}
-            library_slugs = set()
-            for game in local_library:
-                library_key = self._make_game_key(game)
-                if library_key in library_keys:
-                    duplicate_keys.add(library_key)
-                library_keys.add(library_key)
-                library_map[library_key] = game
-                library_slugs.add(game["slug"])
-
-            for remote_game in request.json:
-                remote_key = self._make_game_key(remote_game)
-                if remote_key in duplicate_keys:
-                    logger.warning("Duplicate game %s, not syncing.", remote_key)
-                    continue
-                if remote_key in library_map:
-                    game = self._get_game(remote_game)
-                    if not game:
-                        continue
-                    changed = False
-                    if remote_game["playtime"] > game.playtime:
-                        game.playtime = remote_game["playtime"]
-                        changed = True
-                    if remote_game["lastplayed"] > game.lastplayed:
-                        game.lastplayed = remote_game["lastplayed"]
-                        changed = True
-                    if set(remote_game["categories"]) != set(game.get_categories()):
-                        self._update_categories(game, remote_game)
-                    if changed:
-                        any_local_changes = True
-                        game.save()
-                else:
-                    if remote_game["slug"] in library_slugs:
-                        continue
-                    self._create_new_game(remote_game)
-                    any_local_changes = True
-
+            clear_library_journal(last_entry_id)
+            any_local_changes = self._apply_remote_games(request.json)
             settings.write_setting("last_library_sync_at", int(time.time()))
         finally:
             _IS_LOCAL_LIBRARY_SYNCING = False
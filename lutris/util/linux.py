@@ -18,6 +18,7 @@ from lutris.util import cache_single, flatpak, system
 from lutris.util.graphics import drivers, glxinfo, vkquery
 from lutris.util.graphics.glxinfo import GlxInfo
 from lutris.util.log import logger
+from lutris.util.probe_cache import PROBE_CACHE, get_files_fingerprint
 
 try:
     import distro
@@ -140,6 +141,8 @@ class LinuxSystem:  # pylint: disable=too-many-public-methods
         # Expensive fields are lazy; see properties below.
         self._shared_libraries: dict[str, list[SharedLibrary]] | None = None
         self._glxinfo: GlxInfo | object | None = self._glxinfo_unset
+        if self.get("ldconfig"):
+            PROBE_CACHE.register("ldconfig", self.get_ldconfig_fingerprint, self.read_ldconfig_libs)
 
     @property
     def shared_libraries(self) -> dict[str, list["SharedLibrary"]]:
@@ -404,17 +407,25 @@ class LinuxSystem:  # pylint: disable=too-many-public-methods
                         yield lib_paths[1]
 
     def get_ldconfig_libs(self) -> list[str]:
-        """Return a list of available libraries, as returned by `ldconfig -p`."""
-        ldconfig = self.get("ldconfig")
-        if not ldconfig:
+        """Return a list of available libraries, as returned by `ldconfig -p`; this
+        is cached until the ldconfig cache changes."""
+        if not self.get("ldconfig"):
             logger.error("Could not detect ldconfig on this system")
             return []
+        return cast(list[str], PROBE_CACHE.get("ldconfig", self.get_ldconfig_fingerprint(), self.read_ldconfig_libs))
 
-        ld_cmd = [ldconfig, "-p"]
+    def get_ldconfig_command(self) -> list[str]:
+        ldconfig = cast(str, self.get("ldconfig"))
         if is_exherbo_with_cross_i686():
-            ld_cmd = [ldconfig, "-C", "/etc/ld-i686-pc-linux-gnu.cache", "-p"]
+            return [ldconfig, "-C", "/etc/ld-i686-pc-linux-gnu.cache", "-p"]
+        return [ldconfig, "-p"]
 
-        output = system.read_process_output(ld_cmd).split("\n")
+    def get_ldconfig_fingerprint(self) -> list[Any]:
+        ld_cache_path = "/etc/ld-i686-pc-linux-gnu.cache" if is_exherbo_with_cross_i686() else "/etc/ld.so.cache"
+        return [self.get_ldconfig_command(), get_files_fingerprint([ld_cache_path])]
+
+    def read_ldconfig_libs(self) -> list[str]:
+        output = system.read_process_output(self.get_ldconfig_command()).split("\n")
         return [line.strip("\t") for line in output if line.startswith("\t")]
 
     def get_shared_libraries(self) -> dict[str, list["SharedLibrary"]]:
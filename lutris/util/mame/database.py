@@ -1,15 +1,51 @@
-"""Utility functions for MAME"""
+"""Utility functions for MAME
+
+The machines listed by 'mame -listxml' are read from the XML incrementally and stored in a
+SQLite database, which is then queried as needed instead of loading the whole list."""
 
 # Standard Library
 import json
 import os
+import sqlite3
 from xml.etree import ElementTree
 
 # Lutris Modules
 from lutris import settings
+from lutris.database import sql
 from lutris.util.log import logger
 
 CACHE_DIR = os.path.join(settings.CACHE_DIR, "mame")
+MAME_DB_PATH = os.path.join(CACHE_DIR, "mame.db")
+
+# Machines are written to the database in batches, so that the database lock is only held briefly
+INSERT_BATCH_SIZE = 1000
+
+MACHINE_FIELDS = (
+    "name",
+    "description",
+    "manufacturer",
+    "year",
+    "parent",
+    "romof",
+    "sourcefile",
+    "driver_status",
+    "is_system",
+    "is_game",
+    "info",
+)
+MACHINES_SCHEMA = (
+    "CREATE TABLE machines ("
+    "name TEXT PRIMARY KEY, description TEXT, manufacturer TEXT, year TEXT, parent TEXT, romof TEXT, "
+    "sourcefile TEXT, driver_status TEXT, is_system INTEGER, is_game INTEGER, info TEXT)",
+    "CREATE INDEX machines_parent ON machines (parent)",
+    "CREATE INDEX machines_manufacturer ON machines (manufacturer)",
+    "CREATE INDEX machines_year ON machines (year)",
+    "CREATE INDEX machines_driver_status ON machines (driver_status)",
+    "CREATE INDEX machines_is_system ON machines (is_system)",
+    "CREATE INDEX machines_is_game ON machines (is_game)",
+    # The XML the machines were read from, to know when they need to be read again
+    "CREATE TABLE source (path TEXT, size INTEGER, mtime_ns INTEGER)",
+)
 
 
 def simplify_manufacturer(manufacturer):
@@ -27,9 +63,9 @@ def is_game(machine):
     Clones return False
     """
     return (
-        machine.attrib["isbios"] == "no"
-        and machine.attrib["isdevice"] == "no"
-        and machine.attrib["runnable"] == "yes"
+        machine.attrib.get("isbios", "no") == "no"
+        and machine.attrib.get("isdevice", "no") == "no"
+        and machine.attrib.get("runnable", "yes") == "yes"
         and "romof" not in machine.attrib
         # FIXME: Filter by the machines that accept coins, but not like that
         # and "coin" in machine.find("input").attrib
@@ -59,24 +95,27 @@ def is_system(machine):
 
 
 def iter_machines(xml_path, filter_func=None):
-    """Iterate through machine nodes in the MAME XML"""
-    try:
-        root = ElementTree.parse(xml_path).getroot()
-    except Exception as ex:  # pylint: disable=broad-except
-        logger.error("Failed to read MAME XML: %s", ex)
-        return []
-    for machine in root:
-        if filter_func and not filter_func(machine):
+    """Iterate through machine nodes in the MAME XML. The XML is read incrementally, and
+    each machine is cleared once the caller is done with it, so memory use stays flat.
+    Raises ElementTree.ParseError if the XML is invalid."""
+    context = ElementTree.iterparse(xml_path, events=("start", "end"))
+    _event, root = next(context)
+    for event, element in context:
+        if event != "end" or element.tag != "machine":
             continue
-        yield machine
+        if not filter_func or filter_func(element):
+            yield element
+        # Drop the machine, and the references the root keeps to the previous ones
+        element.clear()
+        root.clear()
 
 
 def get_machine_info(machine):
     """Return human readable information about a machine node"""
     return {
-        "description": machine.find("description").text,
-        "manufacturer": simplify_manufacturer(machine.find("manufacturer").text),
-        "year": machine.find("year").text,
+        "description": machine.findtext("description"),
+        "manufacturer": simplify_manufacturer(machine.findtext("manufacturer")),
+        "year": machine.findtext("year"),
         "roms": [rom.attrib for rom in machine.findall("rom")],
         "ports": [port.attrib for port in machine.findall("port")],
         "devices": [
@@ -88,36 +127,146 @@ def get_machine_info(machine):
             }
             for device in machine.findall("device")
         ],
-        "input": machine.find("input").attrib,
-        "driver": machine.find("driver").attrib,
+        "input": getattr(machine.find("input"), "attrib", {}),
+        "driver": getattr(machine.find("driver"), "attrib", {}),
     }
 
 
-def get_supported_systems(xml_path, force=False):
+def get_machine_row(machine):
+    """Return the database row of a machine node. The full information is only kept for
+    systems and games."""
+    _is_system = is_system(machine)
+    _is_game = is_game(machine)
+    driver = machine.find("driver")
+    return (
+        machine.attrib["name"],
+        machine.findtext("description"),
+        simplify_manufacturer(machine.findtext("manufacturer")),
+        machine.findtext("year"),
+        machine.attrib.get("cloneof"),
+        machine.attrib.get("romof"),
+        machine.attrib.get("sourcefile"),
+        driver.attrib.get("status") if driver is not None else None,
+        _is_system,
+        _is_game,
+        json.dumps(get_machine_info(machine)) if _is_system or _is_game else None,
+    )
+
+
+def get_source_key(xml_path):
+    xml_stat = os.stat(xml_path)
+    return xml_path, xml_stat.st_size, xml_stat.st_mtime_ns
+
+
+def is_database_current(xml_path, db_path=MAME_DB_PATH):
+    """Return True if the database was built from the current version of the XML"""
+    if not os.path.exists(db_path):
+        return False
+    try:
+        source = sql.db_query(db_path, "SELECT path, size, mtime_ns FROM source")
+        return bool(source) and tuple(source[0].values()) == get_source_key(xml_path)
+    except (OSError, sqlite3.Error):
+        return False
+
+
+def build_database(xml_path, db_path=MAME_DB_PATH):
+    """Read the machines of the MAME XML into a new database, replacing the previous one
+    once complete. Return the number of machines read."""
+    try:
+        source_key = get_source_key(xml_path)
+    except OSError as ex:
+        logger.error("Failed to read MAME XML: %s", ex)
+        return 0
+    os.makedirs(os.path.dirname(db_path), exist_ok=True)
+    temp_path = db_path + ".tmp"
+    if os.path.exists(temp_path):
+        os.remove(temp_path)
+    with sql.db_cursor(temp_path) as cursor:
+        for statement in MACHINES_SCHEMA:
+            sql.cursor_execute(cursor, statement)
+    insert_query = "INSERT OR REPLACE INTO machines (%s) VALUES (%s)" % (
+        ", ".join(MACHINE_FIELDS),
+        ", ".join("?" * len(MACHINE_FIELDS)),
+    )
+    count = 0
+    batch = []
+    try:
+        for machine in iter_machines(xml_path):
+            batch.append(get_machine_row(machine))
+            if len(batch) >= INSERT_BATCH_SIZE:
+                with sql.db_cursor(temp_path) as cursor:
+                    cursor.executemany(insert_query, batch)
+                count += len(batch)
+                batch = []
+    except (ElementTree.ParseError, OSError) as ex:
+        logger.error("Failed to read MAME XML: %s", ex)
+        os.remove(temp_path)
+        return 0
+    with sql.db_cursor(temp_path) as cursor:
+        cursor.executemany(insert_query, batch)
+        sql.cursor_execute(cursor, "INSERT INTO source (path, size, mtime_ns) VALUES (?, ?, ?)", source_key)
+    count += len(batch)
+    if not count:
+        os.remove(temp_path)
+        return 0
+    os.replace(temp_path, db_path)
+    logger.info("Wrote %d MAME machines to %s", count, db_path)
+    return count
+
+
+def ensure_database(xml_path, db_path=MAME_DB_PATH, force=False):
+    """Build the database from the XML if it's missing or out of date; return True if it's usable"""
+    if (
+        not force
+        and os.path.exists(db_path)
+        and (not os.path.exists(xml_path) or is_database_current(xml_path, db_path))
+    ):
+        return True
+    logger.info("Reading MAME XML into %s", db_path)
+    return bool(build_database(xml_path, db_path))
+
+
+def query_machines(where, params=(), columns="name, description, manufacturer, year", db_path=MAME_DB_PATH):
+    """Return the machines matching a SQL condition, without their full information"""
+    return sql.db_query(
+        db_path,
+        "SELECT %s FROM machines WHERE %s ORDER BY manufacturer, description" % (columns, where),
+        params,
+    )
+
+
+def get_machine(name, db_path=MAME_DB_PATH):
+    """Return the information about a system or game, or None if unknown"""
+    if not os.path.exists(db_path):
+        return None
+    rows = sql.db_query(db_path, "SELECT info FROM machines WHERE name=?", (name,))
+    if not rows or not rows[0]["info"]:
+        return None
+    return json.loads(rows[0]["info"])
+
+
+def get_systems(db_path=MAME_DB_PATH):
+    """Return the name, description, manufacturer and year of the supported systems,
+    sorted by manufacturer and description"""
+    if not os.path.exists(db_path):
+        return []
+    return query_machines("is_system=1", db_path=db_path)
+
+
+def get_supported_systems(xml_path, force=False, db_path=MAME_DB_PATH):
     """Return supported systems (computers and consoles) supported.
     From the full XML list extracted from MAME, filter the systems that are
     runnable, not clones and have the ability to run software.
     """
-    systems_cache_path = os.path.join(CACHE_DIR, "systems.json")
-    if os.path.exists(systems_cache_path) and not force:
-        with open(systems_cache_path, "r", encoding="utf-8") as systems_cache_file:
-            try:
-                systems = json.load(systems_cache_file)
-            except json.JSONDecodeError:
-                logger.error("Failed to read systems cache %s", systems_cache_path)
-                systems = None
-        if systems:
-            return systems
-    logger.info("Parsing MAME XML to build systems list")
-    systems = {machine.attrib["name"]: get_machine_info(machine) for machine in iter_machines(xml_path, is_system)}
-    if not systems:
+    if not ensure_database(xml_path, db_path, force=force):
         return {}
-    logger.info("Writing %d systems to %s", len(systems), systems_cache_path)
-    with open(systems_cache_path, "w", encoding="utf-8") as systems_cache_file:
-        json.dump(systems, systems_cache_file, indent=2)
-    return systems
+    rows = query_machines("is_system=1", columns="name, info", db_path=db_path)
+    return {row["name"]: json.loads(row["info"]) for row in rows}
 
 
-def get_games(xml_path):
+def get_games(xml_path, db_path=MAME_DB_PATH):
     """Return a list of all games"""
-    return {machine.attrib["name"]: get_machine_info(machine) for machine in iter_machines(xml_path, is_game)}
+    if not ensure_database(xml_path, db_path):
+        return {}
+    rows = query_machines("is_game=1", columns="name, info", db_path=db_path)
+    return {row["name"]: json.loads(row["info"]) for row in rows}
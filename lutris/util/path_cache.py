@@ -9,7 +9,7 @@ from lutris.database.games import get_games
 from lutris.game import GAME_START, GAME_UPDATED, Game
 from lutris.gui.widgets import NotificationSource
 from lutris.util import cache_single
-from lutris.util.jobs import AsyncCall
+from lutris.util.jobs import AsyncCall, Priority
 from lutris.util.log import logger
 
 GAME_PATH_CACHE_PATH = os.path.join(settings.CACHE_DIR, "game-paths.json")
@@ -138,7 +138,7 @@ class MissingGames:
 
         if not self._update_running:
             self._update_running = True
-            AsyncCall(self._update_missing_games, self._update_missing_games_cb)
+            AsyncCall(self._update_missing_games, self._update_missing_games_cb, priority=Priority.BACKGROUND)
 
     def update_one_missing(self, game_id: str, path: str | None = None) -> None:
         """Recheck a single game's missing status synchronously and fire
@@ -0,0 +1,157 @@
+"""Persistent cache of the results of the probes of the system's capabilities.
+
+Tools like ldconfig, vulkaninfo, glxinfo or wine --version take a while to run and their
+output rarely changes. Each result is saved under the cache folder with a fingerprint of
+what it depends on: modification times of files, the kernel and driver versions... A probe
+is only run again once its fingerprint changed. Results must be JSON serializable; empty
+results are taken as failures and not saved, so those probes are run again next time."""
+
+import json
+import os
+import platform
+import threading
+from collections.abc import Callable, Iterable
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any
+
+from lutris import settings
+from lutris.util.log import logger
+
+PROBE_CACHE_PATH = os.path.join(settings.CACHE_DIR, "system-probes.json")
+PROBE_CACHE_VERSION = 1
+NVIDIA_VERSION_PATH = "/proc/driver/nvidia/version"
+
+# Stale probes are refreshed this many at a time
+MAX_CONCURRENT_PROBES = 4
+
+
+def get_files_fingerprint(paths: Iterable[str]) -> list[Any]:
+    """Return the size and modification time of files, None for missing ones"""
+    fingerprint = []
+    for path in paths:
+        try:
+            file_stat = os.stat(path)
+            fingerprint.append([path, file_stat.st_size, file_stat.st_mtime_ns])
+        except OSError:
+            fingerprint.append([path, None])
+    return fingerprint
+
+
+def get_driver_fingerprint() -> list[str]:
+    """Return the kernel release and the version of the NVIDIA driver, if it is loaded"""
+    try:
+        with open(NVIDIA_VERSION_PATH, encoding="utf-8") as version_file:
+            nvidia_version = version_file.readline().strip()
+    except OSError:
+        nvidia_version = ""
+    return [platform.release(), nvidia_version]
+
+
+class ProbeCache:
+    """Results of system probes, persisted to a JSON file.
+
+    If the file can't be read or written, the probes are simply run every time."""
+
+    def __init__(self, path: str) -> None:
+        self.path = path
+        self._entries: dict[str, dict[str, Any]] | None = None
+        self._probes: dict[str, tuple[Callable[[], Any], Callable[[], Any]]] = {}
+        self._lock = threading.Lock()
+        self._probe_locks: dict[str, threading.Lock] = {}
+
+    @property
+    def entries(self) -> dict[str, dict[str, Any]]:
+        if self._entries is None:
+            self._entries = self._load()
+        return self._entries
+
+    def _load(self) -> dict[str, dict[str, Any]]:
+        try:
+            with open(self.path, encoding="utf-8") as cache_file:
+                content = json.load(cache_file)
+        except FileNotFoundError:
+            return {}
+        except (OSError, ValueError) as ex:
+            logger.warning("Unable to read the system probe cache %s: %s", self.path, ex)
+            return {}
+        if not isinstance(content, dict) or content.get("version") != PROBE_CACHE_VERSION:
+            return {}
+        return content.get("probes") or {}
+
+    def _save(self) -> None:
+        temp_path = "%s.%s.tmp" % (self.path, threading.get_ident())
+        try:
+            os.makedirs(os.path.dirname(self.path), exist_ok=True)
+            with open(temp_path, "w", encoding="utf-8") as cache_file:
+                json.dump({"version": PROBE_CACHE_VERSION, "probes": self.entries}, cache_file)
+            os.replace(temp_path, self.path)
+        except OSError as ex:
+            logger.warning("Unable to save the system probe cache %s: %s", self.path, ex)
+
+    @staticmethod
+    def _normalize(fingerprint: Any) -> Any:
+        """Return the fingerprint as it reads back from JSON, tuples turned to lists and so on"""
+        return json.loads(json.dumps(fingerprint))
+
+    def is_stale(self, name: str, fingerprint: Any) -> bool:
+        with self._lock:
+            entry = self.entries.get(name)
+        return not entry or entry["fingerprint"] != self._normalize(fingerprint)
+
+    def get(self, name: str, fingerprint: Any, probe: Callable[[], Any]) -> Any:
+        """Return the result of probe(), from the cache if it was saved with the same fingerprint"""
+        fingerprint = self._normalize(fingerprint)
+        with self._lock:
+            probe_lock = self._probe_locks.setdefault(name, threading.Lock())
+        # The same probe isn't run twice at once; the second caller gets the result of the first
+        with probe_lock:
+            with self._lock:
+                entry = self.entries.get(name)
+                if entry and entry["fingerprint"] == fingerprint:
+                    return entry["result"]
+            logger.debug("Running system probe %s", name)
+            result = probe()
+            if result:
+                with self._lock:
+                    self.entries[name] = {"fingerprint": fingerprint, "result": result}
+                    self._save()
+        return result
+
+    def register(self, name: str, get_fingerprint: Callable[[], Any], probe: Callable[[], Any]) -> Callable[[], Any]:
+        """Register a probe so refresh() can run it ahead of time, and return a function
+        that returns its result"""
+        self._probes[name] = (get_fingerprint, probe)
+        return lambda: self.get(name, get_fingerprint(), probe)
+
+    def refresh(self, max_workers: int = MAX_CONCURRENT_PROBES) -> list[str]:
+        """Run the registered probes whose results are missing or stale, in parallel,
+        and return their names"""
+        stale = []
+        for name, (get_fingerprint, probe) in list(self._probes.items()):
+            fingerprint = get_fingerprint()
+            if self.is_stale(name, fingerprint):
+                stale.append((name, fingerprint, probe))
+        if not stale:
+            return []
+
+        def run_probe(args: tuple[str, Any, Callable[[], Any]]) -> None:
+            try:
+                self.get(*args)
+            except Exception as ex:
+                logger.error("System probe %s failed: %s", args[0], ex)
+
+        with ThreadPoolExecutor(max_workers=min(max_workers, len(stale))) as executor:
+            list(executor.map(run_probe, stale))
+        logger.debug("Refreshed system probes: %s", ", ".join(name for name, _fingerprint, _probe in stale))
+        return [name for name, _fingerprint, _probe in stale]
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries = {}
+            try:
+                os.remove(self.path)
+            except FileNotFoundError:
+                pass
+
+
+PROBE_CACHE = ProbeCache(PROBE_CACHE_PATH)
@@ -0,0 +1,208 @@
+"""Index of the libretro core info files"""
+
+import json
+import os
+import threading
+
+from lutris.settings import CACHE_DIR
+from lutris.util.libretro import RetroConfig
+from lutris.util.log import logger
+
+CORE_INFO_CACHE_PATH = os.path.join(CACHE_DIR, "libretro-cores.json")
+CORE_INFO_INDEX_VERSION = 1
+CORE_INFO_SUFFIX = "_libretro.info"
+
+
+def parse_firmware_checksums(notes: str) -> dict[str, str]:
+    """Return the MD5 checksums of firmware files listed in the notes of a core, as
+    '(!) bios.bin (md5): <checksum>|(!) other.bin (md5): <checksum>'"""
+    checksums = {}
+    if not notes.startswith("(!)"):
+        return checksums
+    for part in notes.split("|"):
+        try:
+            filename, checksum = part.split(" (md5): ")
+        except ValueError:
+            logger.warning("Unable to parse firmware info: %s", notes)
+            continue
+        checksums[filename.replace("(!) ", "")] = checksum
+    return checksums
+
+
+def read_core_info(info_file_path: str) -> dict:
+    """Parse a core info file into the record stored in the index"""
+    core_config = RetroConfig(info_file_path)
+    checksums = parse_firmware_checksums(str(core_config["notes"] or ""))
+    try:
+        firmware_count = int(core_config["firmware_count"])
+    except (ValueError, TypeError):
+        firmware_count = 0
+    firmware = []
+    for index in range(firmware_count):
+        firmware_path = core_config["firmware%d_path" % index]
+        if not firmware_path:
+            continue
+        firmware_name = firmware_path.split("/")[-1]
+        firmware.append(
+            {
+                "path": firmware_path,
+                "name": firmware_name,
+                "optional": bool(core_config.get("firmware%d_opt" % index)),
+                "md5": checksums.get(firmware_name),
+            }
+        )
+    extensions = core_config["supported_extensions"] or ""
+    return {
+        "core": os.path.basename(info_file_path)[: -len(CORE_INFO_SUFFIX)],
+        "display_name": core_config["display_name"] or "",
+        "systemname": core_config["systemname"] or "",
+        "is_emulator": "Emulator" in (core_config["categories"] or ""),
+        "extensions": [extension.lower() for extension in extensions.split("|") if extension],
+        "firmware": firmware,
+    }
+
+
+class CoreInfoIndex:
+    """The parsed contents of the libretro core info files, persisted to a JSON file.
+
+    Each info file is recorded with its size and mtime; a refresh only parses files
+    that are new or for which one of those changed, so refreshing an unchanged
+    folder costs one stat per file. Lookups by core, extension and firmware go
+    through dicts built from the records."""
+
+    def __init__(self, cache_path: str) -> None:
+        self.cache_path = cache_path
+        self.files: dict[str, dict] = {}
+        self.cores: dict[str, dict] = {}
+        self.extension_index: dict[str, list[str]] = {}
+        self.firmware_index: dict[str, list[str]] = {}
+        self._loaded = False
+        self._lock = threading.RLock()
+
+    def _load(self) -> None:
+        if self._loaded:
+            return
+        self._loaded = True
+        try:
+            with open(self.cache_path, encoding="utf-8") as cache_file:
+                data = json.load(cache_file)
+        except (OSError, json.JSONDecodeError):
+            return
+        if isinstance(data, dict) and data.get("version") == CORE_INFO_INDEX_VERSION:
+            self.files = data.get("files") or {}
+            self._build_indexes()
+
+    def _build_indexes(self) -> None:
+        self.cores = {record["core"]: record for record in self.files.values()}
+        self.extension_index = {}
+        self.firmware_index = {}
+        for core, record in sorted(self.cores.items()):
+            for extension in record["extensions"]:
+                self.extension_index.setdefault(extension, []).append(core)
+            for firmware in record["firmware"]:
+                self.firmware_index.setdefault(firmware["name"], []).append(core)
+
+    def _save(self) -> None:
+        temp_path = self.cache_path + ".tmp"
+        try:
+            os.makedirs(os.path.dirname(self.cache_path), exist_ok=True)
+            with open(temp_path, "w", encoding="utf-8") as cache_file:
+                json.dump({"version": CORE_INFO_INDEX_VERSION, "files": self.files}, cache_file, indent=2)
+            os.replace(temp_path, self.cache_path)
+        except OSError as ex:
+            logger.warning("Unable to save the core info index %s: %s", self.cache_path, ex)
+
+    @staticmethod
+    def _is_unchanged(record: dict | None, file_stat: os.stat_result) -> bool:
+        return bool(record and record["size"] == file_stat.st_size and record["mtime_ns"] == file_stat.st_mtime_ns)
+
+    def _read(self, path: str, file_stat: os.stat_result) -> dict | None:
+        try:
+            record = read_core_info(path)
+        except (OSError, UnicodeDecodeError) as ex:
+            logger.warning("Unable to read core info %s: %s", path, ex)
+            return None
+        record["size"] = file_stat.st_size
+        record["mtime_ns"] = file_stat.st_mtime_ns
+        return record
+
+    def refresh(self, info_directory: str) -> bool:
+        """Bring the index up to date with the info files of info_directory,
+        and return True if anything changed."""
+        with self._lock:
+            self._load()
+            files = {}
+            parsed_count = 0
+            try:
+                entries = list(os.scandir(info_directory))
+            except OSError as ex:
+                logger.warning("Unable to list core info files in %s: %s", info_directory, ex)
+                entries = []
+            for entry in entries:
+                if not entry.name.endswith(CORE_INFO_SUFFIX):
+                    continue
+                try:
+                    file_stat = entry.stat()
+                except OSError:
+                    continue
+                record = self.files.get(entry.path)
+                if not self._is_unchanged(record, file_stat):
+                    record = self._read(entry.path, file_stat)
+                    parsed_count += 1
+                if record:
+                    files[entry.path] = record
+
+            changed = bool(parsed_count) or files.keys() != self.files.keys()
+            if changed:
+                # Info files from other folders are dropped, the index only follows one
+                self.files = files
+                self._build_indexes()
+                self._save()
+            logger.debug("Core info index of %s: %d cores, %d parsed", info_directory, len(files), parsed_count)
+            return changed
+
+    def get_file(self, info_file_path: str) -> dict | None:
+        """Return the record of a single info file, parsing it only if it changed
+        since it was indexed."""
+        with self._lock:
+            self._load()
+            try:
+                file_stat = os.stat(info_file_path)
+            except OSError:
+                return None
+            record = self.files.get(info_file_path)
+            if self._is_unchanged(record, file_stat):
+                return record
+            record = self._read(info_file_path, file_stat)
+            if record:
+                self.files[info_file_path] = record
+                self._build_indexes()
+                self._save()
+            return record
+
+    def get_cores(self) -> list[dict]:
+        """Return the records of all indexed cores"""
+        with self._lock:
+            self._load()
+            return list(self.cores.values())
+
+    def get_core(self, core: str) -> dict | None:
+        """Return the record of a core from its identifier, like 'snes9x'"""
+        with self._lock:
+            self._load()
+            return self.cores.get(core)
+
+    def find_cores_for_extension(self, extension: str) -> list[str]:
+        """Return the identifiers of the cores supporting files with an extension, with or without the dot"""
+        with self._lock:
+            self._load()
+            return list(self.extension_index.get(extension.lower().lstrip("."), []))
+
+    def find_cores_requiring_firmware(self, firmware_name: str) -> list[str]:
+        """Return the identifiers of the cores using a firmware file, optionally or not"""
+        with self._lock:
+            self._load()
+            return list(self.firmware_index.get(firmware_name, []))
+
+
+CORE_INFO_INDEX = CoreInfoIndex(CORE_INFO_CACHE_PATH)
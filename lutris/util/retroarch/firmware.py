@@ -1,41 +1,154 @@
+"""Index of the BIOS and firmware files in the user's BIOS folder"""
+
 import json
 import os
 import shutil
+import threading
 
 from lutris.settings import CACHE_DIR
-from lutris.util import system
-from lutris.util.files import get_folder_contents
+from lutris.util import hash_cache, system
 from lutris.util.log import logger
 
 FIRMWARE_CACHE_PATH = os.path.join(CACHE_DIR, "bios-files.json")
+FIRMWARE_INDEX_VERSION = 2
 
 
-def scan_firmware_directory(target_directory: str):
-    """Scans a target directory for firmwares and generates/updates the JSON 'firmware cache'
-    file with relevant details and hashes for each file within the directory"""
+class FirmwareIndex:
+    """MD5 hashes of the files in a BIOS folder, persisted to a JSON file.
+
+    Each file is recorded with its size, mtime and inode; a rescan only looks
+    up files that are new or for which one of those changed, so scanning an
+    unchanged folder costs one stat per file. Those files go through the shared
+    file hash cache, which hashes them in parallel. Lookups by MD5 hash go through
+    a dict built from the records."""
+
+    def __init__(self, cache_path: str) -> None:
+        self.cache_path = cache_path
+        self.directory: str | None = None
+        self.files: dict[str, dict] = {}
+        self.md5_index: dict[str, str] = {}
+        self._loaded = False
+        self._lock = threading.RLock()
+
+    def _load(self) -> None:
+        if self._loaded:
+            return
+        self._loaded = True
+        try:
+            with open(self.cache_path, encoding="utf-8") as cache_file:
+                data = json.load(cache_file)
+        except (OSError, json.JSONDecodeError):
+            return
+        # Indexes written by older versions were plain lists without stat info; they get rebuilt.
+        if isinstance(data, dict) and data.get("version") == FIRMWARE_INDEX_VERSION:
+            self.directory = data.get("directory")
+            self.files = data.get("files") or {}
+            self._build_md5_index()
+
+    def _build_md5_index(self) -> None:
+        self.md5_index = {record["md5_hash"]: path for path, record in self.files.items()}
+
+    def _save(self) -> None:
+        os.makedirs(os.path.dirname(self.cache_path), exist_ok=True)
+        temp_path = self.cache_path + ".tmp"
+        with open(temp_path, "w", encoding="utf-8") as cache_file:
+            json.dump(
+                {"version": FIRMWARE_INDEX_VERSION, "directory": self.directory, "files": self.files},
+                cache_file,
+                indent=2,
+            )
+        os.replace(temp_path, self.cache_path)
+
+    @staticmethod
+    def _is_unchanged(record: dict | None, file_stat: os.stat_result) -> bool:
+        return bool(
+            record
+            and record["size"] == file_stat.st_size
+            and record["mtime_ns"] == file_stat.st_mtime_ns
+            and record["inode"] == file_stat.st_ino
+        )
+
+    def scan(self, target_directory: str) -> bool:
+        """Bring the index up to date with the contents of target_directory,
+        and return True if anything changed."""
+        with self._lock:
+            self._load()
+            files = {}
+            modified = {}
+            for path, _dir_names, file_names in os.walk(target_directory):
+                for file_name in file_names:
+                    file_path = os.path.join(path, file_name)
+                    try:
+                        file_stat = os.stat(file_path)
+                    except OSError:
+                        continue
+                    record = self.files.get(file_path)
+                    if self._is_unchanged(record, file_stat):
+                        files[file_path] = record
+                    else:
+                        modified[file_path] = file_stat
 
-    with open(FIRMWARE_CACHE_PATH, "w+") as firmwares_cache:
-        json.dump(get_folder_contents(target_directory, with_hash=True), firmwares_cache, indent=2)
+            md5_hashes = hash_cache.get_file_hashes(modified) if modified else {}
+            for file_path, file_stat in modified.items():
+                if file_path in md5_hashes:
+                    files[file_path] = {
+                        "size": file_stat.st_size,
+                        "mtime_ns": file_stat.st_mtime_ns,
+                        "inode": file_stat.st_ino,
+                        "md5_hash": md5_hashes[file_path],
+                    }
+            hashed_count = len(md5_hashes)
+
+            changed = bool(hashed_count) or files.keys() != self.files.keys() or target_directory != self.directory
+            self.directory = target_directory
+            self.files = files
+            self._build_md5_index()
+            if changed:
+                self._save()
+            logger.debug("Firmware index of %s: %d files, %d hashed", target_directory, len(files), hashed_count)
+            return changed
+
+    def find(self, md5_hash: str) -> str | None:
+        """Return the path of a file with the given MD5 hash, if the index has one
+        and the file hasn't changed since it was indexed."""
+        with self._lock:
+            self._load()
+            path = self.md5_index.get(md5_hash)
+            if not path:
+                return None
+            try:
+                file_stat = os.stat(path)
+            except OSError:
+                return None
+            if self._is_unchanged(self.files.get(path), file_stat):
+                return path
+            return None
+
+
+FIRMWARE_INDEX = FirmwareIndex(FIRMWARE_CACHE_PATH)
+
+
+def scan_firmware_directory(target_directory: str):
+    """Scans a target directory for firmwares and updates the firmware index
+    with the hashes of the files that were added or modified since the last scan."""
+    FIRMWARE_INDEX.scan(target_directory)
 
 
 def get_firmware(target_firmware_name: str, target_firmware_checksum: str, runner_system_path: str):
     """Given a target firmware's name and checksum and the target runner's system directory, searches the
-    user's BIOS cache for a firmware matching the checksum and places it under the provided system directory
+    user's BIOS index for a firmware matching the checksum and places it under the provided system directory
     and name"""
-
-    if not system.path_exists(FIRMWARE_CACHE_PATH):
-        logger.error(f"Firmware {FIRMWARE_CACHE_PATH} not found.")
+    firmware_path = FIRMWARE_INDEX.find(target_firmware_checksum)
+    if not firmware_path and FIRMWARE_INDEX.directory and FIRMWARE_INDEX.md5_index.get(target_firmware_checksum):
+        # The indexed file changed on disk since the last scan; refresh the index and try again.
+        FIRMWARE_INDEX.scan(FIRMWARE_INDEX.directory)
+        firmware_path = FIRMWARE_INDEX.find(target_firmware_checksum)
+    if not firmware_path:
+        logger.warning(
+            "No firmware matching %s (%s) in the BIOS folder", target_firmware_name, target_firmware_checksum
+        )
         return
 
-    with open(FIRMWARE_CACHE_PATH) as bios_cache_data:
-        bios_cache = json.load(bios_cache_data)
-
-    for cached_firmware_record in bios_cache:
-        # The checksum of the installed firmware we're looking at matches our target
-        if cached_firmware_record.get("md5_hash") == target_firmware_checksum:
-            system.create_folder(runner_system_path)
-            shutil.copyfile(
-                cached_firmware_record["name"],
-                os.path.join(runner_system_path, target_firmware_name),
-            )
-            logger.info(f"Firmware {target_firmware_name} found and copied to {runner_system_path}")
+    system.create_folder(runner_system_path)
+    shutil.copyfile(firmware_path, os.path.join(runner_system_path, target_firmware_name))
+    logger.info(f"Firmware {target_firmware_name} found and copied to {runner_system_path}")
@@ -1,7 +1,9 @@
 import json
 import os
 import platform
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime
+from tempfile import TemporaryDirectory
 
 try:
     from webdav4.client import Client
@@ -12,6 +14,7 @@ except ImportError:
 
 from lutris import settings
 from lutris.game import Game
+from lutris.util.hash_cache import compute_file_hashes, get_file_hashes, store_file_hash
 from lutris.util.log import logger
 from lutris.util.strings import human_size
 from lutris.util.wine.prefix import find_prefix
@@ -19,6 +22,15 @@ from lutris.util.wine.prefix import find_prefix
 DIR_CREATE_CACHE = []
 SAVE_TYPES = ["saves", "logs", "config", "screenshots"]
 SYNC_TYPES = ["saves", "config"]
+SAVE_INFO_NAME = "saveinfo.json"
+
+# Remote layout, under the folder of each game: one folder per snapshot holding its save info,
+# the content of the files stored once by hash, and the manifest of the latest snapshot.
+REMOTE_OBJECTS_DIR = "objects"
+REMOTE_MANIFEST_NAME = "latest.json"
+
+# Files are uploaded and downloaded this many at a time
+MAX_CONCURRENT_TRANSFERS = 4
 
 
 class SaveInfo:
@@ -175,15 +187,80 @@ def get_existing_saves(client, game_base_dir):
     base_dir_content = client.ls(game_base_dir)
     saves = []
     for save_folder in base_dir_content:
-        if save_folder["type"] != "directory":
+        if save_folder["type"] != "directory" or os.path.basename(save_folder["name"]) == REMOTE_OBJECTS_DIR:
             continue
         local_save_info = os.path.join(settings.CACHE_DIR, "%s.json" % os.path.basename(save_folder["name"]))
-        client.download_file(os.path.join(save_folder["name"], "saveinfo.json"), local_save_info)
+        client.download_file(os.path.join(save_folder["name"], SAVE_INFO_NAME), local_save_info)
         saves.append(local_save_info)
     return saves
 
 
-def upload_save(game, sections=None):
+def get_save_manifest(save_files: dict, sections: list[str]) -> dict[str, dict]:
+    """Return the size, modification time and SHA-256 of the files of the synced sections,
+    by path relative to the base directory of the saves"""
+    local_paths = {}
+    for section in sections:
+        section_data = save_files.get(section)
+        if section not in SaveInfo.save_types or not section_data:
+            continue
+        basepath = section_data["path"]
+        if os.path.isfile(basepath):
+            basepath = os.path.dirname(basepath)
+        for save_file in section_data["files"]:
+            local_path = os.path.join(basepath, save_file["file"])
+            local_paths[local_path] = (os.path.relpath(local_path, save_files["basedir"]), save_file)
+    hashes = get_file_hashes(local_paths, "sha256")
+    return {
+        relpath: {"size": save_file["size"], "modified": save_file["modified"], "sha256": hashes[local_path]}
+        for local_path, (relpath, save_file) in local_paths.items()
+        if local_path in hashes
+    }
+
+
+def get_object_path(game_base_dir: str, sha256: str) -> str:
+    """Return the remote path of a file's content; snapshots share the files they have in common"""
+    return os.path.join(game_base_dir, REMOTE_OBJECTS_DIR, sha256[:2], sha256)
+
+
+def get_local_save_path(basedir: str, relpath: str) -> str:
+    path = os.path.normpath(os.path.join(basedir, relpath))
+    if os.path.isabs(relpath) or not path.startswith(os.path.normpath(basedir) + os.sep):
+        raise ValueError("Save file %s is outside of %s" % (relpath, basedir))
+    return path
+
+
+def read_remote_json(client, remote_path: str) -> dict:
+    """Return the content of a JSON file of the remote host, or an empty dict if it doesn't exist"""
+    if not client.exists(remote_path):
+        return {}
+    with TemporaryDirectory(prefix="lutris-savesync-") as temp_dir:
+        local_path = os.path.join(temp_dir, os.path.basename(remote_path))
+        client.download_file(remote_path, local_path)
+        with open(local_path, "r", encoding="utf-8") as json_file:
+            return json.load(json_file)
+
+
+def write_remote_json(client, remote_path: str, content: dict) -> None:
+    with TemporaryDirectory(prefix="lutris-savesync-") as temp_dir:
+        local_path = os.path.join(temp_dir, os.path.basename(remote_path))
+        with open(local_path, "w", encoding="utf-8") as json_file:
+            json.dump(content, json_file, indent=2)
+        client.upload_file(local_path, remote_path, overwrite=True)
+
+
+def run_transfers(transfer, items: list) -> None:
+    """Run transfer() on each item, a few at a time; the first error is raised once they're all done"""
+    if not items:
+        return
+    with ThreadPoolExecutor(max_workers=min(MAX_CONCURRENT_TRANSFERS, len(items))) as executor:
+        for _result in executor.map(transfer, items):
+            pass
+
+
+def upload_save(game, sections=None, client=None):
+    """Upload the files of the game's saves that aren't on the remote host yet, then record
+    the new snapshot. Nothing is uploaded if the saves haven't changed since the last upload.
+    Returns the number of files uploaded."""
     if not sections:
         sections = SYNC_TYPES
     try:
@@ -197,41 +274,111 @@ def upload_save(game, sections=None):
     if not webdav_saves_path:
         logger.error("No save path for the remote host (webdav_saves_path setting)")
         return
-    client = get_webdav_client()
+    client = client or get_webdav_client()
     if not client:
         return
 
-    # game_base_dir = os.path.join(webdav_saves_path, game.slug)
-    # existing_saves = get_existing_saves(client, game_base_dir)
-    # for save in existing_saves:
-    #     print(save)
-    #     os.remove(save)
+    game_base_dir = os.path.join(webdav_saves_path, game.slug)
     save_files = save_info.get_save_files()
-    max_time = 0
-    for section in sections:
-        for save_file in save_files[section].get("files", []):
-            if int(save_file["modified"]) > max_time:
-                max_time = int(save_file["modified"])
-
+    manifest = get_save_manifest(save_files, sections)
+    remote_manifest = read_remote_json(client, os.path.join(game_base_dir, REMOTE_MANIFEST_NAME))
+    if remote_manifest.get("files") == manifest:
+        print("Saves of %s are up to date (%s)" % (game, remote_manifest["save_id"]))
+        return 0
+
+    remote_hashes = {file_info["sha256"] for file_info in remote_manifest.get("files", {}).values()}
+    uploads = {}
+    for relpath, file_info in manifest.items():
+        object_path = get_object_path(game_base_dir, file_info["sha256"])
+        if file_info["sha256"] not in remote_hashes and object_path not in uploads:
+            uploads[object_path] = os.path.join(save_info.basedir, relpath)
+    # Files from older snapshots, or other hosts, may already be there
+    uploads = {object_path: path for object_path, path in uploads.items() if not client.exists(object_path)}
+    for object_dir in sorted({os.path.dirname(object_path) for object_path in uploads}):
+        create_dirs(client, object_dir)
+
+    def upload(upload_item):
+        object_path, local_path = upload_item
+        print(local_path, ">", object_path)
+        client.upload_file(local_path, object_path, overwrite=True)
+
+    run_transfers(upload, list(uploads.items()))
+
+    max_time = max((int(file_info["modified"]) for file_info in manifest.values()), default=0)
     save_id = f"{platform.node()}-{max_time}"
-    save_dest_dir = os.path.join(webdav_saves_path, game.slug, save_id)
+    save_dest_dir = os.path.join(game_base_dir, save_id)
     create_dirs(client, save_dest_dir)
+    save_files["manifest"] = manifest
+    write_remote_json(client, os.path.join(save_dest_dir, SAVE_INFO_NAME), save_files)
+    write_remote_json(
+        client, os.path.join(game_base_dir, REMOTE_MANIFEST_NAME), {"save_id": save_id, "files": manifest}
+    )
+    logger.info("Uploaded %s of the %s save files of %s as %s", len(uploads), len(manifest), game, save_id)
+    return len(uploads)
+
+
+def download_save(game, save_id=None, sections=None, client=None):
+    """Restore the saves of a game from the latest snapshot on the remote host, or the one
+    given by 'save_id'. Only the files that differ from the local ones are downloaded.
+    Returns the number of files downloaded."""
+    if not sections:
+        sections = SYNC_TYPES
+    try:
+        save_info = SaveInfo(game)
+    except ValueError:
+        logger.error("Can't get save info for %s", game)
+        return
 
-    save_info_name = "saveinfo.json"
-    save_info_path = os.path.join(settings.CACHE_DIR, save_info_name)
-    with open(save_info_path, "w", encoding="utf-8") as save_info_file:
-        json.dump(save_files, save_info_file, indent=2)
-    client.upload_file(save_info_path, os.path.join(save_dest_dir, save_info_name))
-    basepath = save_files["saves"]["path"]
-    if os.path.isfile(basepath):
-        basepath = os.path.dirname(basepath)
-    relpath = basepath[len(save_files["basedir"]) + 1 :]
-    create_dirs(client, os.path.join(save_dest_dir, relpath))
-    for save_file in save_files["saves"]["files"]:
-        upload_file_source = os.path.join(basepath, save_file["file"])
-        upload_file_dest = os.path.join(save_dest_dir, relpath, save_file["file"])
-        print(upload_file_source, ">", upload_file_dest)
-        client.upload_file(upload_file_source, upload_file_dest)
+    webdav_saves_path = settings.read_setting("webdav_saves_path")
+    if not webdav_saves_path:
+        logger.error("No save path for the remote host (webdav_saves_path setting)")
+        return
+    client = client or get_webdav_client()
+    if not client:
+        return
+
+    game_base_dir = os.path.join(webdav_saves_path, game.slug)
+    if save_id:
+        remote_files = read_remote_json(client, os.path.join(game_base_dir, save_id, SAVE_INFO_NAME)).get("manifest")
+    else:
+        remote_files = read_remote_json(client, os.path.join(game_base_dir, REMOTE_MANIFEST_NAME)).get("files")
+    if remote_files is None:
+        logger.error("No saves of %s found on the remote host", game)
+        return
+
+    local_manifest = get_save_manifest(save_info.get_save_files(), sections)
+    downloads = []
+    for relpath, file_info in remote_files.items():
+        local_info = local_manifest.get(relpath)
+        if not local_info or local_info["sha256"] != file_info["sha256"]:
+            downloads.append((get_local_save_path(save_info.basedir, relpath), file_info))
+
+    def download(download_item):
+        local_path, file_info = download_item
+        object_path = get_object_path(game_base_dir, file_info["sha256"])
+        print(object_path, ">", local_path)
+        os.makedirs(os.path.dirname(local_path), exist_ok=True)
+        temp_path = local_path + ".lutris-download"
+        try:
+            client.download_file(object_path, temp_path)
+            # A truncated or corrupted object must not replace the local file
+            sha256 = compute_file_hashes(temp_path, ["sha256"])["sha256"]
+            if sha256 != file_info["sha256"]:
+                raise ValueError("%s doesn't match its checksum (got %s)" % (object_path, sha256))
+            os.utime(temp_path, (file_info["modified"], file_info["modified"]))
+            os.replace(temp_path, local_path)
+        finally:
+            if os.path.exists(temp_path):
+                os.remove(temp_path)
+        store_file_hash(local_path, "sha256", sha256)
+
+    try:
+        run_transfers(download, downloads)
+    except ValueError as ex:
+        logger.error("Failed to restore the saves of %s: %s", game, ex)
+        return
+    logger.info("Restored %s of the %s save files of %s", len(downloads), len(remote_files), game)
+    return len(downloads)
 
 
 def load_save_info(save_info_path):
@@ -0,0 +1,353 @@
+"""Reader for Steam's appcache/appinfo.vdf
+
+Steam keeps the metadata of every app it knows about in a single binary file,
+often more than 100 MB. Rather than parsing all of it, the file is memory
+mapped and an index of the offset of each app is built by hopping from one
+entry header to the next. The index is cached on disk, along with the size and
+mtime of the file it describes, so that opening the file again is nearly free.
+Only the entries that are looked up get parsed."""
+
+import mmap
+import os
+import struct
+import sys
+import threading
+from array import array
+from binascii import crc32
+from bisect import bisect_left
+from collections.abc import Iterator
+from contextlib import contextmanager
+from typing import Any
+
+from lutris import settings
+from lutris.util.log import logger
+from lutris.util.steam import vdf
+from lutris.util.steam.config import get_steam_dir
+
+APPINFO_INDEX_DIR = os.path.join(settings.CACHE_DIR, "steam")
+
+# Magic numbers of the supported versions of appinfo.vdf. Version 28 added the SHA-1
+# of the binary data to the entry headers, version 29 moved the keys to a string table.
+APPINFO_V27 = 0x07564427
+APPINFO_V28 = 0x07564428
+APPINFO_V29 = 0x07564429
+
+_header = struct.Struct("<II")  # magic, universe
+_string_table_offset = struct.Struct("<q")
+_entry_start = struct.Struct("<II")  # appid, size of the rest of the entry
+_uint32 = struct.Struct("<I")
+
+# Size of the entry header that follows the size field: info state, last updated,
+# PICS token, SHA-1 of the text data, change number and from v28 on, SHA-1 of the data.
+_ENTRY_HEADER_SIZES = {APPINFO_V27: 40, APPINFO_V28: 60, APPINFO_V29: 60}
+_VERSIONS = {APPINFO_V27: 27, APPINFO_V28: 28, APPINFO_V29: 29}
+
+_INDEX_MAGIC = b"LTAI"
+_INDEX_VERSION = 1
+_index_header = struct.Struct("<4sIqqII")  # magic, version, mtime_ns, size, path length, app count
+
+
+class AppInfoReader:
+    """Look up apps in an appinfo.vdf file without loading the whole file
+
+    The reader can be used as a context manager; lookups are safe from several threads."""
+
+    def __init__(self, path: str, index_path: str | None = None) -> None:
+        self.path = path
+        self.index_path = index_path
+        self.version = 0
+        self.universe = 0
+        self.mtime_ns = 0
+        self.size = 0
+        self._file = None
+        self._mmap: mmap.mmap | None = None
+        self._appids = array("I")
+        self._offsets = array("I")
+        self._sizes = array("I")
+        self._key_table: list[str] | None = None
+        self._lock = threading.Lock()
+
+    def __enter__(self) -> "AppInfoReader":
+        self.open()
+        return self
+
+    def __exit__(self, *_args: Any) -> None:
+        self.close()
+
+    def __len__(self) -> int:
+        return len(self._appids)
+
+    def __contains__(self, appid: int | str) -> bool:
+        return self._find(appid) is not None
+
+    def open(self) -> None:
+        """Map the file and load its index, building it if the cached one is missing or stale.
+        Raises OSError if the file can't be read and ValueError if it isn't a supported appinfo.vdf"""
+        self.close()
+        self._file = open(self.path, "rb")  # pylint: disable=consider-using-with
+        try:
+            file_stat = os.fstat(self._file.fileno())
+            self.mtime_ns = file_stat.st_mtime_ns
+            self.size = file_stat.st_size
+            if self.size < _header.size:
+                raise ValueError("%s is too small to be an appinfo.vdf file" % self.path)
+            self._mmap = mmap.mmap(self._file.fileno(), 0, access=mmap.ACCESS_READ)
+            magic, self.universe = _header.unpack_from(self._mmap, 0)
+            if magic not in _ENTRY_HEADER_SIZES:
+                raise ValueError("Unsupported appinfo.vdf version %#x in %s" % (magic, self.path))
+            self.version = _VERSIONS[magic]
+            if not self._load_index():
+                self._build_index(magic)
+                self._save_index()
+        except Exception:
+            self.close()
+            raise
+
+    def close(self) -> None:
+        if self._mmap is not None:
+            self._mmap.close()
+            self._mmap = None
+        if self._file is not None:
+            self._file.close()
+            self._file = None
+        self._appids = array("I")
+        self._offsets = array("I")
+        self._sizes = array("I")
+        self._key_table = None
+
+    @property
+    def is_stale(self) -> bool:
+        """True if the file changed since it was opened"""
+        try:
+            file_stat = os.stat(self.path)
+        except OSError:
+            return True
+        return file_stat.st_mtime_ns != self.mtime_ns or file_stat.st_size != self.size
+
+    @property
+    def appids(self) -> list[int]:
+        return self._appids.tolist()
+
+    def _build_index(self, magic: int) -> None:
+        """Walk the entry headers of the file to record where the data of each app is"""
+        data = self._mmap
+        entry_header_size = _ENTRY_HEADER_SIZES[magic]
+        end = self.size
+        position = _header.size
+        if magic == APPINFO_V29:
+            end = _string_table_offset.unpack_from(data, position)[0]
+            position += _string_table_offset.size
+        entries = []
+        while position + _entry_start.size <= end:
+            appid, entry_size = _entry_start.unpack_from(data, position)
+            if appid == 0:
+                break
+            data_offset = position + _entry_start.size + entry_header_size
+            position += _entry_start.size + entry_size
+            if position > end:
+                raise ValueError("Truncated entry for app %s in %s" % (appid, self.path))
+            entries.append((appid, data_offset, position - data_offset))
+        entries.sort()
+        self._appids = array("I", [entry[0] for entry in entries])
+        self._offsets = array("I", [entry[1] for entry in entries])
+        self._sizes = array("I", [entry[2] for entry in entries])
+
+    def _load_index(self) -> bool:
+        if not self.index_path:
+            return False
+        try:
+            with open(self.index_path, "rb") as index_file:
+                header = index_file.read(_index_header.size)
+                magic, version, mtime_ns, size, path_length, count = _index_header.unpack(header)
+                if (
+                    magic != _INDEX_MAGIC
+                    or version != _INDEX_VERSION
+                    or (mtime_ns, size) != (self.mtime_ns, self.size)
+                    or index_file.read(path_length).decode("utf-8") != self.path
+                ):
+                    return False
+                columns = []
+                for _column in range(3):
+                    column = array("I")
+                    column.fromfile(index_file, count)
+                    columns.append(column)
+        except (OSError, EOFError, UnicodeDecodeError, struct.error):
+            return False
+        if sys.byteorder == "big":
+            for column in columns:
+                column.byteswap()
+        self._appids, self._offsets, self._sizes = columns
+        return True
+
+    def _save_index(self) -> None:
+        if not self.index_path:
+            return
+        path = self.path.encode("utf-8")
+        try:
+            os.makedirs(os.path.dirname(self.index_path), exist_ok=True)
+            temp_path = self.index_path + ".tmp"
+            with open(temp_path, "wb") as index_file:
+                index_file.write(
+                    _index_header.pack(
+                        _INDEX_MAGIC, _INDEX_VERSION, self.mtime_ns, self.size, len(path), len(self._appids)
+                    )
+                )
+                index_file.write(path)
+                for column in (self._appids, self._offsets, self._sizes):
+                    if sys.byteorder == "big":
+                        column = array("I", column)
+                        column.byteswap()
+                    column.tofile(index_file)
+            os.replace(temp_path, self.index_path)
+        except OSError as ex:
+            logger.warning("Unable to save the appinfo.vdf index to %s: %s", self.index_path, ex)
+
+    def _get_key_table(self) -> list[str] | None:
+        """Return the string table of v29 files, which is only read when first needed"""
+        if self.version < 29:
+            return None
+        with self._lock:
+            if self._key_table is None:
+                offset = _string_table_offset.unpack_from(self._mmap, _header.size)[0]
+                count = _uint32.unpack_from(self._mmap, offset)[0]
+                strings = self._mmap[offset + _uint32.size :].split(b"\x00", count)[:count]
+                self._key_table = [string.decode("utf-8", "replace") for string in strings]
+            return self._key_table
+
+    def _find(self, appid: int | str) -> int | None:
+        try:
+            appid = int(appid)
+        except ValueError:
+            return None
+        index = bisect_left(self._appids, appid)
+        if index < len(self._appids) and self._appids[index] == appid:
+            return index
+        return None
+
+    def get_app_data(self, appid: int | str) -> dict[str, Any] | None:
+        """Return the raw data of an app, usually a dict with an "appinfo" key, or None
+        if the app isn't in the file. Raises SyntaxError if the entry can't be parsed."""
+        if self._mmap is None:
+            raise ValueError("%s is not open" % self.path)
+        index = self._find(appid)
+        if index is None:
+            return None
+        offset = self._offsets[index]
+        entry = self._mmap[offset : offset + self._sizes[index]]
+        return vdf.binary_loads(entry, key_table=self._get_key_table())
+
+    def get_app_info(self, appid: int | str) -> dict[str, Any] | None:
+        """Return the commonly used information about an app: its name, type (game, tool,
+        dlc...), the operating systems it supports and the names of its library assets."""
+        try:
+            app_data = self.get_app_data(appid)
+        except SyntaxError as ex:
+            logger.warning("Invalid entry for app %s in %s: %s", appid, self.path, ex)
+            return None
+        if not app_data:
+            return None
+        common = app_data.get("appinfo", app_data).get("common") or {}
+        oslist = common.get("oslist") or ""
+        return {
+            "appid": int(appid),
+            "name": common.get("name", ""),
+            "type": str(common.get("type", "")).lower(),
+            "oslist": [os_name.strip() for os_name in oslist.split(",") if os_name.strip()],
+            "library_assets": common.get("library_assets_full") or common.get("library_assets") or {},
+            "header_image": common.get("header_image") or {},
+        }
+
+
+def get_asset_filename(app_info: dict[str, Any], asset: str, language: str = "english") -> str | None:
+    """Return the file name of a library asset ("library_capsule", "library_hero",
+    "library_logo"...) or of the header image ("header_image") of an app, relative
+    to its folder on the Steam CDN or in the library cache"""
+    if asset == "header_image":
+        localized = app_info.get("header_image")
+    else:
+        localized = app_info.get("library_assets", {}).get(asset)
+        if isinstance(localized, dict) and "image" in localized:
+            localized = localized["image"]
+    if not isinstance(localized, dict) or not localized:
+        return None
+    filename = localized.get(language) or next(iter(localized.values()))
+    return filename if isinstance(filename, str) and filename else None
+
+
+def get_library_cache_path(steam_dir: str, appid: int | str, filename: str) -> str | None:
+    """Return the path of an image in Steam's own library cache, if it was downloaded by Steam.
+    Recent versions of Steam store them in a folder per app, older ones prefix them with the appid."""
+    library_cache = os.path.join(steam_dir, "appcache", "librarycache")
+    candidates = [
+        os.path.join(library_cache, str(appid), filename),
+        os.path.join(library_cache, str(appid), os.path.basename(filename)),
+        os.path.join(library_cache, "%s_%s" % (appid, os.path.basename(filename))),
+    ]
+    for candidate in candidates:
+        if os.path.isfile(candidate) and os.path.getsize(candidate):
+            return candidate
+    return None
+
+
+_readers: dict[str, AppInfoReader] = {}
+# Number of callers using each reader; readers replaced by a newer one are closed once unused
+_reader_users: dict[AppInfoReader, int] = {}
+_readers_lock = threading.Lock()
+
+
+def _acquire_reader(steam_dir: str | None) -> AppInfoReader | None:
+    steam_dir = steam_dir or get_steam_dir()
+    if not steam_dir:
+        return None
+    path = os.path.join(steam_dir, "appcache", "appinfo.vdf")
+    with _readers_lock:
+        reader = _readers.get(path)
+        # Readers of files without apps are falsy
+        if reader is not None and reader.is_stale:
+            del _readers[path]
+            if not _reader_users.get(reader):
+                reader.close()
+            reader = None
+        if reader is None:
+            if not os.path.isfile(path):
+                return None
+            index_name = "appinfo-%08x.index" % crc32(path.encode("utf-8"))
+            reader = AppInfoReader(path, os.path.join(APPINFO_INDEX_DIR, index_name))
+            try:
+                reader.open()
+            except (OSError, ValueError) as ex:
+                logger.warning("Unable to read %s: %s", path, ex)
+                return None
+            _readers[path] = reader
+        _reader_users[reader] = _reader_users.get(reader, 0) + 1
+        return reader
+
+
+def _release_reader(reader: AppInfoReader) -> None:
+    with _readers_lock:
+        _reader_users[reader] -= 1
+        if not _reader_users[reader]:
+            del _reader_users[reader]
+            if _readers.get(reader.path) is not reader:
+                reader.close()
+
+
+@contextmanager
+def get_appinfo_reader(steam_dir: str | None = None) -> Iterator[AppInfoReader | None]:
+    """Provide a reader for the appinfo.vdf of a Steam installation (the default one if not
+    given), or None if there is none. Readers are shared and reopened when Steam updates the
+    file; the replaced ones are closed when the last caller using them is done."""
+    reader = _acquire_reader(steam_dir)
+    try:
+        yield reader
+    finally:
+        if reader is not None:
+            _release_reader(reader)
+
+
+def get_app_info(appid: int | str, steam_dir: str | None = None) -> dict[str, Any] | None:
+    """Return the information about an app from Steam's local cache, see AppInfoReader.get_app_info()"""
+    with get_appinfo_reader(steam_dir) as reader:
+        if not reader:
+            return None
+        return reader.get_app_info(appid)
@@ -1,7 +1,9 @@
 """Steam appmanifest file handling"""
 
+import json
 import os
 import re
+import threading
 from typing import Any
 
 from lutris.util.log import logger
@@ -131,3 +133,127 @@ def get_path_from_appmanifest(steamapps_path: str, appid: str) -> str | None:
 def get_appmanifests(steamapps_path: str) -> list[str]:
     """Return the list for all appmanifest files in a Steam library folder"""
     return [f for f in os.listdir(steamapps_path) if re.match(r"^appmanifest_\d+.acf$", f)]
+
+
+class AppManifestIndex:
+    """Record of the app manifests found in Steam library folders, persisted to a
+    JSON file so that a sync only needs to parse the manifests that changed.
+
+    Each manifest is recorded with its mtime and size, along with its appid and
+    whether the game was installed. A full scan is required on first use, or
+    when the list of library folders differs from the recorded one."""
+
+    version = 1
+
+    def __init__(self, cache_path: str) -> None:
+        self.cache_path = cache_path
+        self.library_paths: list[str] | None = None
+        self.manifests: dict[str, dict[str, Any]] = {}
+        self._loaded = False
+        self._lock = threading.RLock()
+
+    def _load(self) -> None:
+        if self._loaded:
+            return
+        self._loaded = True
+        try:
+            with open(self.cache_path, encoding="utf-8") as cache_file:
+                data = json.load(cache_file)
+        except (OSError, json.JSONDecodeError):
+            return
+        if isinstance(data, dict) and data.get("version") == self.version:
+            self.library_paths = data.get("library_paths")
+            self.manifests = data.get("manifests") or {}
+
+    def save(self) -> None:
+        with self._lock:
+            os.makedirs(os.path.dirname(self.cache_path), exist_ok=True)
+            temp_path = self.cache_path + ".tmp"
+            with open(temp_path, "w", encoding="utf-8") as cache_file:
+                json.dump(
+                    {"version": self.version, "library_paths": self.library_paths, "manifests": self.manifests},
+                    cache_file,
+                    indent=2,
+                )
+            os.replace(temp_path, self.cache_path)
+
+    def invalidate(self) -> None:
+        """Force the next update to be a full scan"""
+        with self._lock:
+            self._load()
+            self.library_paths = None
+
+    def needs_full_scan(self, steamapps_paths: list[str]) -> bool:
+        with self._lock:
+            self._load()
+            return self.library_paths != list(steamapps_paths)
+
+    @property
+    def installed_appids(self) -> set[str]:
+        with self._lock:
+            self._load()
+            return {record["appid"] for record in self.manifests.values() if record["installed"]}
+
+    def _read_manifest(self, appmanifest_path: str, file_stat: os.stat_result) -> AppManifest:
+        app_manifest = AppManifest(appmanifest_path)
+        self.manifests[appmanifest_path] = {
+            "mtime_ns": file_stat.st_mtime_ns,
+            "size": file_stat.st_size,
+            "appid": app_manifest.steamid,
+            "installed": app_manifest.is_installed(),
+        }
+        return app_manifest
+
+    def update(self, steamapps_paths: list[str]) -> tuple[list[AppManifest], set[str]]:
+        """Bring the index up to date with the library folders. Return the manifests that
+        were added or modified (all of them on a full scan) and the appids that are no
+        longer installed."""
+        with self._lock:
+            full_scan = self.needs_full_scan(steamapps_paths)
+            previous_appids = self.installed_appids
+            manifests = self.manifests
+            self.manifests = {}
+            changed = []
+            for steamapps_path in steamapps_paths:
+                try:
+                    appmanifest_files = get_appmanifests(steamapps_path)
+                except OSError as ex:
+                    logger.warning("Unable to read Steam library folder %s: %s", steamapps_path, ex)
+                    continue
+                for appmanifest_file in appmanifest_files:
+                    appmanifest_path = os.path.join(steamapps_path, appmanifest_file)
+                    try:
+                        file_stat = os.stat(appmanifest_path)
+                        record = manifests.get(appmanifest_path)
+                        if (
+                            not full_scan
+                            and record
+                            and record["mtime_ns"] == file_stat.st_mtime_ns
+                            and record["size"] == file_stat.st_size
+                        ):
+                            self.manifests[appmanifest_path] = record
+                            continue
+                        changed.append(self._read_manifest(appmanifest_path, file_stat))
+                    except Exception as ex:
+                        logger.error("Failed to process app manifest %s: %s", appmanifest_path, ex)
+            self.library_paths = list(steamapps_paths)
+            return changed, previous_appids - self.installed_appids
+
+    def forget(self, appmanifest_path: str) -> None:
+        """Drop the record of a manifest, so that it is handled again on the next update"""
+        with self._lock:
+            self._load()
+            self.manifests.pop(appmanifest_path, None)
+
+    def update_manifest(self, appmanifest_path: str) -> tuple[AppManifest | None, set[str]]:
+        """Update a single manifest after it was created, modified or deleted. Return the
+        manifest (None if it was deleted) and the appids that are no longer installed."""
+        with self._lock:
+            self._load()
+            previous_appids = self.installed_appids
+            app_manifest = None
+            try:
+                app_manifest = self._read_manifest(appmanifest_path, os.stat(appmanifest_path))
+            except FileNotFoundError:
+                self.manifests.pop(appmanifest_path, None)
+            return app_manifest, previous_appids - self.installed_appids
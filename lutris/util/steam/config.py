@@ -182,7 +182,7 @@ def read_config(steam_data_dir: str | None) -> dict[str, Any] | None:
     if not system.path_exists(config_filename):
         return None
     with open(config_filename, "r", encoding="utf-8") as steam_config_file:
-        config = vdf_parse(steam_config_file, {})
+        config = vdf_parse(steam_config_file, {}, paths=["InstallConfigStore/Software/Valve/Steam"])
     try:
         return dict(get_entry_case_insensitive(config, ["InstallConfigStore", "Software", "Valve", "Steam"]))
     except KeyError as ex:
@@ -13,8 +13,7 @@ __author__ = "Rossen Georgiev"
 import re
 import struct
 from binascii import crc32
-from io import StringIO as unicodeIO
-from typing import IO, Any, Iterator
+from typing import IO, Any, Iterable, Iterator
 
 string_type = str
 int_type = int
@@ -61,128 +60,210 @@ def _unescape(text: str) -> str:
 # parsing and dumping for KV1
 
 
-def parse(
-    fp: IO[str], mapper: type[dict[str, Any]] = dict, merge_duplicate_keys: bool = True, escaped: bool = True
+# A single pattern splits a whole VDF document into tokens, along with the whitespace
+# before them. The most common constructs, a quoted key followed by a quoted value on the
+# same line or by an opening bracket, are matched at once. Comments and conditionals
+# ([$WIN32] and the like) are matched so they can be skipped. Tokens are told apart by
+# the index of their last group.
+_quoted = r'"([^"\\]*(?:\\.[^"\\]*)*)"'
+_re_token = re.compile(
+    r"\s*(?:"
+    + _quoted
+    + r"(?:[ \t]*"
+    + _quoted
+    + r"|\s*(\{))?"  # 1: quoted string, 2: value following it, 3: bracket following it
+    r"|(\{)"  # 4
+    r"|(\})"  # 5
+    r"|(//[^\n]*|\[[^\]\n]*\])"  # 6: skipped
+    r'|([^\s{}"\[]+)'  # 7: unquoted string
+    r"|(\S))",  # 8: error
+    flags=re.S,
+)
+_TOKEN_STRING = 1
+_TOKEN_PAIR = 2
+_TOKEN_KEY_OPEN = 3
+_TOKEN_OPEN = 4
+_TOKEN_CLOSE = 5
+_TOKEN_SKIP = 6
+_TOKEN_ERROR = 8
+
+# Skips everything up to the next bracket that isn't in a string or a comment
+_re_skip_to_bracket = re.compile(r'(?:[^{}"/]+|"[^"\\]*(?:\\.[^"\\]*)*"|//[^\n]*|/)*([{}])?')
+
+# How the content of a block is handled in selective mode
+_KEEP_ALL = 0
+_KEEP_SELECTED = 1
+
+
+def _syntax_error(message: str, text: str, position: int, source: str) -> SyntaxError:
+    lineno = text.count("\n", 0, position) + 1
+    line_start = text.rfind("\n", 0, position) + 1
+    line_end = text.find("\n", position)
+    line = text[line_start : line_end if line_end != -1 else len(text)]
+    return SyntaxError("vdf.parse: %s" % message, (source, lineno, position - line_start + 1, line))
+
+
+def _split_paths(paths: Iterable[str]) -> tuple[set[tuple[str, ...]], set[tuple[str, ...]]]:
+    """Return the requested paths, and all their ancestors, as tuples of lower case keys"""
+    selected = set()
+    ancestors = set()
+    for path in paths:
+        keys = tuple(key.lower() for key in path.strip("/").split("/"))
+        selected.add(keys)
+        for index in range(len(keys)):
+            ancestors.add(keys[:index])
+    return selected, ancestors
+
+
+def _skip_block(text: str, position: int, source: str) -> int:
+    """Return the position following the end of the block starting at position"""
+    depth = 1
+    while depth:
+        match = _re_skip_to_bracket.match(text, position)
+        if not match.group(1):
+            raise _syntax_error("unclosed parenthasis or quotes (EOF)", text, len(text), source)
+        depth += 1 if match.group(1) == "{" else -1
+        position = match.end()
+    return position
+
+
+def parse_string(
+    text: str,
+    mapper: type[dict[str, Any]] = dict,
+    merge_duplicate_keys: bool = True,
+    escaped: bool = True,
+    paths: Iterable[str] | None = None,
+    source: str = "<string>",
 ) -> dict[str, Any]:
     """
-    Deserialize ``s`` (a ``str`` or ``unicode`` instance containing a VDF)
-    to a Python object.
+    Deserialize ``text``, a whole VDF document, to a Python object.
 
-    ``mapper`` specifies the Python object used after deserializetion. ``dict` is
-    used by default. Alternatively, ``collections.OrderedDict`` can be used if you
-    wish to preserve key order. Or any object that acts like a ``dict``.
+    ``paths`` restricts the result to some subtrees, given as slash separated keys
+    matched case insensitively, for example ``UserLocalConfigStore/Software/Valve/Steam/apps``.
+    The other blocks are skipped over without being tokenized.
 
-    ``merge_duplicate_keys`` when ``True`` will merge multiple KeyValue lists with the
-    same key into one instead of overwriting. You can se this to ``False`` if you are
-    using ``VDFDict`` and need to preserve the duplicates.
+    See ``parse`` for the other arguments.
     """
     if not issubclass(mapper, dict):
         raise TypeError("Expected mapper to be subclass of dict, got %s" % type(mapper))
-    if not hasattr(fp, "readline"):
-        raise TypeError("Expected fp to be a file-like object supporting line iteration")
-
-    lineno = 0
-    stack = [mapper()]
-    expect_bracket = False
-
-    re_keyvalue = re.compile(
-        r'^("(?P<qkey>(?:\\.|[^\\"])+)"|(?P<key>#?[a-z0-9\-\_\\\?]+))'
-        r"([ \t]*("
-        r'"(?P<qval>(?:\\.|[^\\"])*)(?P<vq_end>")?'
-        r"|(?P<val>[a-z0-9\-\_\\\?\*\.]+)"
-        r"))?",
-        flags=re.I,
-    )
-
-    for lineno, line in enumerate(fp, 1):
-        if lineno == 1:
-            line = strip_bom(line)
-
-        line = line.lstrip()
-
-        # skip empty and comment lines
-        if line == "" or line[0] == "/":
-            continue
-
-        # one level deeper
-        if line[0] == "{":
-            expect_bracket = False
-            continue
-
-        if expect_bracket:
-            raise SyntaxError(
-                "vdf.parse: expected openning bracket",
-                (getattr(fp, "name", "<%s>" % fp.__class__.__name__), lineno, 1, line),
-            )
-
-        # one level back
-        if line[0] == "}":
-            if len(stack) > 1:
+    text = strip_bom(text)
+    if paths is None:
+        selected, ancestors = set(), set()
+        mode = _KEEP_ALL
+    else:
+        selected, ancestors = _split_paths(paths)
+        mode = _KEEP_SELECTED
+    current = mapper()
+    current_path: tuple[str, ...] = ()
+    stack = [(current, current_path, mode)]
+    key = None
+    key_position = 0
+
+    tokens = _re_token.finditer(text)
+    while tokens:
+        for match in tokens:
+            token = match.lastindex
+            if token == _TOKEN_PAIR:
+                name, value = match.group(1, 2)
+                if key is not None:
+                    # The first string is the value of the previous key, the second one a new key
+                    name, value, key = key, name, value
+                    key_position = match.start(2)
+                    if escaped and "\\" in key:
+                        key = _unescape(key)
+                elif escaped and "\\" in name:
+                    name = _unescape(name)
+            elif token == _TOKEN_KEY_OPEN or token == _TOKEN_OPEN:
+                if token == _TOKEN_KEY_OPEN:
+                    if key is not None:
+                        raise _syntax_error("expected a value or opening bracket", text, key_position, source)
+                    key = match.group(1)
+                    if escaped and "\\" in key:
+                        key = _unescape(key)
+                elif key is None:
+                    raise _syntax_error("expected a key before opening bracket", text, match.start(token), source)
+                child_path = current_path
+                if mode == _KEEP_SELECTED:
+                    child_path = current_path + (key.lower(),)
+                    if child_path in selected:
+                        mode = _KEEP_ALL
+                    elif child_path not in ancestors:
+                        # Not requested, resume after the end of the block
+                        tokens = _re_token.finditer(text, _skip_block(text, match.end(), source))
+                        key = None
+                        break
+                if merge_duplicate_keys and isinstance(current.get(key), dict):
+                    child = current[key]
+                else:
+                    child = mapper()
+                    current[key] = child
+                stack.append((child, child_path, mode))
+                current, current_path, mode = stack[-1]
+                key = None
+                continue
+            elif token == _TOKEN_CLOSE:
+                if key is not None:
+                    raise _syntax_error("expected a value or opening bracket", text, key_position, source)
+                if len(stack) == 1:
+                    raise _syntax_error("one too many closing parenthasis", text, match.start(token), source)
                 stack.pop()
+                current, current_path, mode = stack[-1]
                 continue
+            elif token == _TOKEN_SKIP:
+                continue
+            elif token == _TOKEN_ERROR:
+                raise _syntax_error("unexpected character (open quote?)", text, match.start(token), source)
+            else:
+                string = match.group(token)
+                if escaped and "\\" in string:
+                    string = _unescape(string)
+                if key is None:
+                    key = string
+                    key_position = match.start(token)
+                    continue
+                name, value, key = key, string, None
+            if mode == _KEEP_ALL or current_path + (name.lower(),) in selected:
+                current[name] = _unescape(value) if escaped and "\\" in value else value
+        else:
+            tokens = None
 
-            raise SyntaxError(
-                "vdf.parse: one too many closing parenthasis",
-                (getattr(fp, "name", "<%s>" % fp.__class__.__name__), lineno, 0, line),
-            )
-
-        # parse keyvalue pairs
-        while True:
-            match = re_keyvalue.match(line)
+    if len(stack) != 1 or key is not None:
+        raise _syntax_error("unclosed parenthasis or quotes (EOF)", text, len(text), source)
+    return stack[0][0]
 
-            if not match:
-                try:
-                    line += next(fp)
-                    continue
-                except StopIteration:
-                    raise SyntaxError(
-                        "vdf.parse: unexpected EOF (open key quote?)",
-                        (getattr(fp, "name", "<%s>" % fp.__class__.__name__), lineno, 0, line),
-                    )
-
-            key = match.group("key") if match.group("qkey") is None else match.group("qkey")
-            val = match.group("val") if match.group("qval") is None else match.group("qval")
-
-            if escaped:
-                key = _unescape(key)
-
-            # we have a key with value in parenthesis, so we make a new dict obj (level deeper)
-            if val is None:
-                if merge_duplicate_keys and key in stack[-1]:
-                    _m = stack[-1][key]
-                else:
-                    _m = mapper()
-                    stack[-1][key] = _m
 
-                stack.append(_m)
-                expect_bracket = True
+def parse(
+    fp: IO[str],
+    mapper: type[dict[str, Any]] = dict,
+    merge_duplicate_keys: bool = True,
+    escaped: bool = True,
+    paths: Iterable[str] | None = None,
+) -> dict[str, Any]:
+    """
+    Deserialize ``fp`` (a file-like object containing a VDF)
+    to a Python object.
 
-            # we've matched a simple keyvalue pair, map it to the last dict obj in the stack
-            else:
-                # if the value is line consume one more line and try to match again,
-                # until we get the KeyValue pair
-                if match.group("vq_end") is None and match.group("qval") is not None:
-                    try:
-                        line += next(fp)
-                        continue
-                    except StopIteration:
-                        raise SyntaxError(
-                            "vdf.parse: unexpected EOF (open quote for value?)",
-                            (getattr(fp, "name", "<%s>" % fp.__class__.__name__), lineno, 0, line),
-                        )
-
-                stack[-1][key] = _unescape(val) if escaped else val
-
-            # exit the loop
-            break
+    ``mapper`` specifies the Python object used after deserializetion. ``dict` is
+    used by default. Alternatively, ``collections.OrderedDict`` can be used if you
+    wish to preserve key order. Or any object that acts like a ``dict``.
 
-    if len(stack) != 1:
-        raise SyntaxError(
-            "vdf.parse: unclosed parenthasis or quotes (EOF)",
-            (getattr(fp, "name", "<%s>" % fp.__class__.__name__), lineno, 0, line),
-        )
+    ``merge_duplicate_keys`` when ``True`` will merge multiple KeyValue lists with the
+    same key into one instead of overwriting. You can se this to ``False`` if you are
+    using ``VDFDict`` and need to preserve the duplicates.
 
-    return stack.pop()
+    ``paths`` only keeps the given subtrees, see ``parse_string``.
+    """
+    if not hasattr(fp, "read"):
+        raise TypeError("Expected fp to be a file-like object")
+    source = getattr(fp, "name", "<%s>" % fp.__class__.__name__)
+    return parse_string(
+        fp.read(),
+        mapper=mapper,
+        merge_duplicate_keys=merge_duplicate_keys,
+        escaped=escaped,
+        paths=paths,
+        source=str(source),
+    )
 
 
 def loads(s: str, **kwargs: Any) -> dict[str, Any]:
@@ -192,8 +273,7 @@ def loads(s: str, **kwargs: Any) -> dict[str, Any]:
     """
     if not isinstance(s, string_type):
         raise TypeError("Expected s to be a str, got %s" % type(s))
-    fp = unicodeIO(s)
-    return parse(fp, **kwargs)
+    return parse_string(s, **kwargs)
 
 
 def load(fp: IO[str], **kwargs: Any) -> dict[str, Any]:
@@ -295,7 +375,11 @@ BIN_END_ALT = b"\x0b"
 
 
 def binary_loads(
-    s: bytes, mapper: type[dict[str, Any]] = dict, merge_duplicate_keys: bool = True, alt_format: bool = False
+    s: bytes,
+    mapper: type[dict[str, Any]] = dict,
+    merge_duplicate_keys: bool = True,
+    alt_format: bool = False,
+    key_table: list[str] | None = None,
 ) -> dict[str, Any]:
     """
     Deserialize ``s`` (``bytes`` containing a VDF in "binary form")
@@ -308,6 +392,9 @@ def binary_loads(
     ``merge_duplicate_keys`` when ``True`` will merge multiple KeyValue lists with the
     same key into one instead of overwriting. You can se this to ``False`` if you are
     using ``VDFDict`` and need to preserve the duplicates.
+
+    ``key_table`` is the list of key names of formats that store keys as indexes
+    into a string table instead of inline, like appinfo.vdf since version 29.
     """
     if not isinstance(s, bytes):
         raise TypeError("Expected s to be bytes, got %s" % type(s))
@@ -316,6 +403,7 @@ def binary_loads(
 
     # helpers
     int32 = struct.Struct("<i")
+    uint32 = struct.Struct("<I")
     uint64 = struct.Struct("<Q")
     int64 = struct.Struct("<q")
     float32 = struct.Struct("<f")
@@ -351,7 +439,14 @@ def binary_loads(
                 continue
             break
 
-        key, idx = read_string(s, idx)
+        if key_table is None:
+            key, idx = read_string(s, idx)
+        else:
+            try:
+                key = key_table[uint32.unpack_from(s, idx)[0]]
+            except (IndexError, struct.error) as ex:
+                raise SyntaxError("Invalid key index at offset %d" % idx) from ex
+            idx += uint32.size
 
         if t == BIN_NONE:
             if merge_duplicate_keys and key in stack[-1]:
@@ -1,48 +1,25 @@
 """Read and write VDF files"""
 
-from typing import IO, Any
+from typing import IO, Any, Iterable
 
 # Lutris Modules
 from lutris.util.log import logger
-
-
-def vdf_parse(steam_config_file: IO[str], config: dict[str, Any]) -> dict[str, Any]:
-    """Parse a Steam config file and return the contents as a dict."""
-    line = " "
-    while line:
-        try:
-            line = steam_config_file.readline()
-
-        except UnicodeDecodeError:
-            logger.error(
-                "Error while reading Steam VDF file %s. Returning %s",
-                steam_config_file,
-                config,
-            )
-
-            return config
-        if not line or line.strip() == "}":
-            return config
-        while not line.strip().endswith('"'):
-            nextline = steam_config_file.readline()
-            if not nextline:
-                break
-            line = line[:-1] + nextline
-        # Handle escaped quotes in values by temporarily replacing them
-        # This allows split('"') to work correctly
-        line = line.replace('\\"', "\x00")  # Use null as placeholder
-        line_elements = line.strip().split('"')
-        # Restore escaped quotes in the parsed values
-        line_elements = [elem.replace("\x00", '"') for elem in line_elements]
-        if len(line_elements) == 3:
-            key = line_elements[1]
-            steam_config_file.readline()  # skip '{'
-            config[key] = vdf_parse(steam_config_file, {})
-        else:
-            try:
-                config[line_elements[1]] = line_elements[3]
-            except IndexError:
-                logger.error("Malformed config file: %s", line)
+from lutris.util.steam import vdf
+
+
+def vdf_parse(steam_config_file: IO[str], config: dict[str, Any], paths: Iterable[str] | None = None) -> dict[str, Any]:
+    """Parse a Steam config file and return the contents as a dict.
+    With paths, only the given subtrees are read, see vdf.parse_string()."""
+    try:
+        config.update(vdf.parse(steam_config_file, paths=paths))
+    except UnicodeDecodeError:
+        logger.error(
+            "Error while reading Steam VDF file %s. Returning %s",
+            steam_config_file,
+            config,
+        )
+    except SyntaxError as ex:
+        logger.error("Malformed config file %s: %s", steam_config_file, ex)
     return config
 
 
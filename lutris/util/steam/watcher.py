@@ -12,13 +12,18 @@ from lutris.util.log import logger
 
 
 class SteamWatcher:
-    """Watches a Steam library folder and notify changes"""
+    """Watches Steam library folders and notify changes to their app manifests,
+    and optionally to the libraryfolders.vdf file listing the library folders"""
 
     def __init__(
-        self, steamapps_paths: Iterable[str], callback: Callable[[Gio.FileMonitorEvent, str], None] | None = None
+        self,
+        steamapps_paths: Iterable[str],
+        callback: Callable[[Gio.FileMonitorEvent, str], None] | None = None,
+        library_config_path: str | None = None,
     ):
         self.monitors = []
         self.callback = callback
+        self.library_config_path = library_config_path
         for steam_path in steamapps_paths:
             path = Gio.File.new_for_path(steam_path)
             try:
@@ -28,6 +33,19 @@ class SteamWatcher:
                 self.monitors.append(monitor)
             except GLib.Error as ex:
                 logger.exception("Failed to monitor Steam folder %s: %s", steam_path, ex)
+        if library_config_path:
+            try:
+                monitor = Gio.File.new_for_path(library_config_path).monitor_file(Gio.FileMonitorFlags.NONE)
+                monitor.connect("changed", self._on_library_config_changed)
+                self.monitors.append(monitor)
+            except GLib.Error as ex:
+                logger.exception("Failed to monitor Steam library config %s: %s", library_config_path, ex)
+
+    def stop(self) -> None:
+        """Stop watching the Steam folders"""
+        for monitor in self.monitors:
+            monitor.cancel()
+        self.monitors = []
 
     def _on_directory_changed(
         self, _monitor: Gio.FileMonitor, _file: Gio.File, _other_file: Gio.File, event_type: Gio.FileMonitorEvent
@@ -37,3 +55,9 @@ class SteamWatcher:
             return None
         if self.callback:
             self.callback(event_type, path)
+
+    def _on_library_config_changed(
+        self, _monitor: Gio.FileMonitor, _file: Gio.File, _other_file: Gio.File, event_type: Gio.FileMonitorEvent
+    ) -> None:
+        if self.callback and self.library_config_path:
+            self.callback(event_type, self.library_config_path)
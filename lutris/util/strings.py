@@ -7,6 +7,7 @@ import time
 import unicodedata
 import uuid
 from dataclasses import dataclass
+from functools import lru_cache
 from gettext import gettext as _
 
 from gi.repository import GLib
@@ -75,14 +76,19 @@ def strip_accents(value: str) -> str:
     return value
 
 
+NUMBER_RUNS_RE = re.compile("([0-9]+)")
+
+
+@lru_cache(maxsize=65536)
 def get_natural_sort_key(value: str, number_width: int = 16) -> str:
     """Returns a string with the numerical parts (runs of digits)
-    0-padded out to 'number_width' digits."""
+    0-padded out to 'number_width' digits. The keys are cached, since the
+    same names get sorted over and over."""
 
     def pad_numbers(text: str) -> str:
         return text.zfill(number_width) if text.isdigit() else text.casefold()
 
-    runs = [pad_numbers(c) for c in re.split("([0-9]+)", value)]
+    runs = [pad_numbers(c) for c in NUMBER_RUNS_RE.split(value)]
     return "".join(runs)
 
 
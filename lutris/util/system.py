@@ -17,6 +17,7 @@ from gi.repository import Gio, GLib
 
 from lutris import settings
 from lutris.exceptions import MissingExecutableError
+from lutris.util import hash_cache
 from lutris.util.log import logger
 from lutris.util.portals import TrashPortal
 
@@ -232,14 +233,12 @@ def get_md5_in_zip(filename: str) -> str:
 
 
 def get_md5_hash(filename: str) -> bool | str:
-    """Return the md5 hash of a file."""
+    """Return the md5 hash of a file. Hashes of unchanged files come from the file hash cache."""
     try:
-        with open(filename, "rb") as _file:
-            _hash = read_file_md5(_file)
+        return hash_cache.get_file_hash(filename, "md5")
     except IOError:
         logger.warning("Error reading %s", filename)
         return False
-    return _hash
 
 
 def read_file_md5(filedesc: IO[bytes]) -> str:
@@ -251,11 +250,7 @@ def read_file_md5(filedesc: IO[bytes]) -> str:
 
 def get_file_checksum(filename: str, hash_type: str) -> str:
     """Return the checksum of type `hash_type` for a given filename"""
-    hasher = hashlib.new(hash_type)
-    with open(filename, "rb") as input_file:
-        for chunk in iter(lambda: input_file.read(4096), b""):
-            hasher.update(chunk)
-    return hasher.hexdigest()
+    return hash_cache.get_file_hash(filename, hash_type)
 
 
 def is_executable(exec_path: str) -> bool:
@@ -4,6 +4,7 @@ import os
 import re
 import signal
 from collections import OrderedDict
+from functools import partial
 from gettext import gettext as _
 from typing import Any
 
@@ -11,6 +12,7 @@ from lutris.exceptions import MisconfigurationError, UnspecifiedVersionError
 from lutris.settings import WINE_DIR
 from lutris.util import cache_single, linux, system
 from lutris.util.log import logger
+from lutris.util.probe_cache import PROBE_CACHE, get_files_fingerprint
 from lutris.util.process import Process
 from lutris.util.strings import get_natural_sort_key, parse_version
 from lutris.util.wine import fsync, proton
@@ -253,13 +255,21 @@ def get_default_wine_version() -> str:
     return GE_PROTON_LATEST
 
 
+def get_wine_fingerprint(wine_path: str) -> list[Any]:
+    """The version of a Wine build changes when its executable is replaced"""
+    executable = system.find_executable(wine_path) or wine_path
+    return get_files_fingerprint([os.path.realpath(executable)])
+
+
 def get_system_wine_version(wine_path: str = "wine") -> str:
     """Return the version of Wine installed on the system."""
     if wine_path != "wine" and not system.path_exists(wine_path):
         return ""
     if wine_path == "wine" and not system.can_find_executable("wine"):
         return ""
-    version = system.read_process_output([wine_path, "--version"])
+    version = PROBE_CACHE.get(
+        "wine-version:%s" % wine_path, get_wine_fingerprint(wine_path), partial(read_wine_version, wine_path)
+    )
     if not version:
         logger.error("Error reading wine version for %s", wine_path)
         return ""
@@ -268,6 +278,20 @@ def get_system_wine_version(wine_path: str = "wine") -> str:
     return version
 
 
+def read_wine_version(wine_path: str) -> str:
+    return system.read_process_output([wine_path, "--version"])
+
+
+# Let the system's Wine builds have their versions read ahead of time, with the other probes
+for _wine_path in WINE_PATHS.values():
+    if system.can_find_executable(_wine_path):
+        PROBE_CACHE.register(
+            "wine-version:%s" % _wine_path,
+            partial(get_wine_fingerprint, _wine_path),
+            partial(read_wine_version, _wine_path),
+        )
+
+
 def get_real_executable(windows_executable: str, working_dir: str | None) -> tuple[str, list[str], str | None]:
     """Given a Windows executable, return the real program
     capable of launching it along with necessary arguments."""
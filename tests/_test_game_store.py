@@ -0,0 +1,89 @@
+"""Tests for the in place updates of the game store."""
+
+import unittest
+
+from gi.repository import Gtk
+
+from lutris.gui.views import (
+    COL_ID,
+    COL_INSTALLED,
+    COL_INSTALLED_AT,
+    COL_LASTPLAYED,
+    COL_MEDIA_PATHS,
+    COL_NAME,
+    COL_PLAYTIME,
+)
+from lutris.gui.views.store import GameStore
+from lutris.services.lutris import LutrisBanner
+from lutris.services.service_media import MediaPath
+
+
+def gtk_store_available():
+    try:
+        store = Gtk.ListStore(str)
+        store.append(("game",))
+        return len(store) == 1
+    except TypeError:
+        return False
+
+
+def make_row(game_id, name=None):
+    row = [""] * 16
+    row[COL_ID] = game_id
+    row[COL_NAME] = name or "Game %s" % game_id
+    row[COL_MEDIA_PATHS] = []
+    row[COL_LASTPLAYED] = 0
+    row[COL_INSTALLED] = False
+    row[COL_INSTALLED_AT] = 0
+    row[COL_PLAYTIME] = 0.0
+    return tuple(row)
+
+
+class TestCountChanges(unittest.TestCase):
+    def test_count_changes(self):
+        values = {"1": make_row("1"), "2": make_row("2"), "3": make_row("3")}
+        rows = [make_row("3"), make_row("1", "Renamed"), make_row("4")]
+        # 2 removed, 1 renamed, 4 added; 3 only moves
+        assert GameStore.count_changes(values, rows) == 3
+        assert GameStore.count_changes(values, [make_row("3"), make_row("2"), make_row("1")]) == 0
+
+    def test_unusable_stores(self):
+        assert GameStore.count_changes(None, [make_row("1")]) is None
+        assert GameStore.count_changes({}, [make_row("1"), make_row("1")]) is None
+
+    def test_media_paths_compare_by_value(self):
+        media = LutrisBanner()
+        assert MediaPath("/tmp/a.jpg", media) == MediaPath("/tmp/a.jpg", LutrisBanner())
+        assert MediaPath("/tmp/a.jpg", media) != MediaPath("/tmp/b.jpg", media)
+        assert len({MediaPath("/tmp/a.jpg", media), MediaPath("/tmp/a.jpg", media)}) == 1
+
+
+@unittest.skipUnless(gtk_store_available(), "GTK is not available")
+class TestApplyRows(unittest.TestCase):
+    def setUp(self):
+        self.game_store = GameStore(None, LutrisBanner())
+        for game_id in ("1", "2", "3", "4"):
+            self.game_store.add_row(make_row(game_id))
+        self.row_ref = Gtk.TreeRowReference(self.game_store.store, self.game_store.get_path_by_id("3"))
+
+    def get_names(self):
+        return [row[COL_NAME] for row in self.game_store.store]
+
+    def test_apply_rows(self):
+        rows = [make_row("3"), make_row("5"), make_row("1", "Renamed")]
+        assert self.game_store.apply_rows(rows) == (1, 2, 1)
+        assert self.get_names() == ["Game 3", "Game 5", "Renamed"]
+        assert self.game_store.get_values() == {row[COL_ID]: row for row in rows}
+        assert self.game_store.get_path_by_id("1").get_indices() == [2]
+        assert self.game_store.get_path_by_id("2") is None
+        # Rows are moved, not replaced
+        assert self.row_ref.valid() and self.row_ref.get_path().get_indices() == [0]
+
+    def test_nothing_to_do(self):
+        rows = [make_row(game_id) for game_id in ("1", "2", "3", "4")]
+        assert self.game_store.apply_rows(rows) == (0, 0, 0)
+        assert self.get_names() == ["Game 1", "Game 2", "Game 3", "Game 4"]
+
+    def test_duplicate_rows(self):
+        self.game_store.add_row(make_row("1"))
+        assert self.game_store.get_values() is None
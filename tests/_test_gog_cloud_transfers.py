@@ -0,0 +1,229 @@
+"""Tests for the transfers of GOG cloud saves, against a local stand-in of GOG's cloud storage."""
+
+import gzip
+import hashlib
+import json
+import os
+import threading
+import time
+import unittest
+import urllib.parse
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from tempfile import TemporaryDirectory
+from unittest.mock import MagicMock, patch
+
+import lutris.services.gog_cloud as _mod
+from lutris.services.gog_cloud import (
+    GOGCloudSync,
+    SyncAction,
+    SyncMetadataCache,
+    compress_file,
+    get_local_files,
+)
+
+
+class CloudStorageServer(ThreadingHTTPServer):
+    """Stores the files it is sent in memory, the way GOG's cloud storage lists and serves them"""
+
+    def __init__(self, delay=0.0):
+        self.files = {}
+        self.requests = []
+        self.delay = delay
+        self.in_flight = 0
+        self.max_in_flight = 0
+        self.lock = threading.Lock()
+        server = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def handle_one_request(self):
+                with server.lock:
+                    server.in_flight += 1
+                    server.max_in_flight = max(server.max_in_flight, server.in_flight)
+                try:
+                    super().handle_one_request()
+                finally:
+                    with server.lock:
+                        server.in_flight -= 1
+
+            def get_name(self):
+                # Paths are /v1/<user_id>/<client_id>/<dir_name>/<file>
+                return urllib.parse.unquote(self.path.split("/", 4)[4])
+
+            def send(self, code, content=b"", headers=None):
+                self.send_response(code)
+                for key, value in (headers or {}).items():
+                    self.send_header(key, value)
+                self.send_header("Content-Length", str(len(content)))
+                self.end_headers()
+                self.wfile.write(content)
+
+            def do_GET(self):
+                time.sleep(server.delay)
+                if self.path.count("/") == 3:
+                    listing = [
+                        {"name": name, "hash": hashlib.md5(data).hexdigest(), "last_modified": last_modified}
+                        for name, (data, last_modified) in server.files.items()
+                    ]
+                    self.send(200, json.dumps(listing).encode())
+                    return
+                name = self.get_name()
+                server.requests.append(("GET", name))
+                if name not in server.files:
+                    self.send(404)
+                    return
+                data, last_modified = server.files[name]
+                self.send(200, data, {"X-Object-Meta-LocalLastModified": last_modified})
+
+            def do_PUT(self):
+                time.sleep(server.delay)
+                data = self.rfile.read(int(self.headers["Content-Length"]))
+                name = self.get_name()
+                server.requests.append(("PUT", name))
+                if hashlib.md5(data).hexdigest() != self.headers["Etag"]:
+                    self.send(422)
+                    return
+                server.files[name] = (data, self.headers["X-Object-Meta-LocalLastModified"])
+                self.send(201)
+
+            def do_DELETE(self):
+                name = self.get_name()
+                server.requests.append(("DELETE", name))
+                server.files.pop(name, None)
+                self.send(204)
+
+            def log_message(self, *args):
+                pass
+
+        super().__init__(("127.0.0.1", 0), Handler)
+
+
+class GOGCloudTransfersTestCase(unittest.TestCase):
+    def setUp(self):
+        self.tmp_dir = TemporaryDirectory()
+        self.addCleanup(self.tmp_dir.cleanup)
+        self.save_dir = os.path.join(self.tmp_dir.name, "saves")
+        os.makedirs(self.save_dir)
+        self.server = self.start_server()
+        self.service = MagicMock()
+        self.service.load_token.return_value = {"access_token": "access", "refresh_token": "refresh"}
+        self.metadata_cache = SyncMetadataCache(os.path.join(self.tmp_dir.name, "gog-cloud-files.db"))
+        for patcher in (
+            patch.object(_mod, "SYNC_METADATA_CACHE", self.metadata_cache),
+            patch.object(GOGCloudSync, "_get_timestamp_path", return_value=os.path.join(self.tmp_dir.name, "ts.json")),
+            patch.object(_mod, "get_game_client_credentials", return_value=("cid", "csecret")),
+            patch.object(_mod, "get_game_scoped_token", return_value={"access_token": "token", "user_id": "user1"}),
+        ):
+            patcher.start()
+            self.addCleanup(patcher.stop)
+
+    def start_server(self, delay=0.0):
+        server = CloudStorageServer(delay)
+        threading.Thread(target=server.serve_forever, daemon=True).start()
+        self.addCleanup(server.server_close)
+        self.addCleanup(server.shutdown)
+        patcher = patch.object(_mod, "GOG_CLOUDSTORAGE_URL", "http://127.0.0.1:%s" % server.server_address[1])
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        return server
+
+    def write_save(self, name, content, save_dir=None, modified=False):
+        path = os.path.join(save_dir or self.save_dir, name)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        with open(path, "wb") as save_file:
+            save_file.write(content)
+        if modified:
+            # Saved after the last sync, whatever the resolution of the clock
+            mtime = time.time() + 1
+            os.utime(path, (mtime, mtime))
+        return path
+
+    def sync(self, save_dir=None, **kwargs):
+        self.server.requests.clear()
+        result = GOGCloudSync(self.service).sync_saves("1207658924", save_dir or self.save_dir, "saves", **kwargs)
+        self.assertIsNone(result.error)
+        return result
+
+    def get_cloud_content(self, name):
+        return gzip.decompress(self.server.files["saves/" + name][0])
+
+
+class TestGOGCloudTransfers(GOGCloudTransfersTestCase):
+    def test_compressed_in_chunks_like_gzip_compress(self):
+        data = os.urandom(100000) + b"save" * 50000
+        path = self.write_save("big.sav", data)
+        with patch.object(_mod, "READ_CHUNK_SIZE", 4096):
+            metadata = compress_file(path)
+        assert metadata.md5 == hashlib.md5(data).hexdigest()
+        assert metadata.gzip_md5 == hashlib.md5(gzip.compress(data, compresslevel=6, mtime=0)).hexdigest()
+
+    def test_unchanged_files_are_not_read_again(self):
+        self.write_save("slot1.sav", b"level 1")
+        self.write_save("profiles/player.cfg", b"name")
+        files = get_local_files(self.save_dir)
+        assert sorted(f.relative_path for f in files) == ["profiles/player.cfg", "slot1.sav"]
+
+        with patch.object(_mod, "compress_file", wraps=compress_file) as compress:
+            assert get_local_files(self.save_dir) == files
+            compress.assert_not_called()
+            self.write_save("slot1.sav", b"level 2", modified=True)
+            get_local_files(self.save_dir)
+        compress.assert_called_once()
+
+    def test_sync_both_ways(self):
+        self.write_save("slot1.sav", b"level 1")
+        self.write_save("profiles/player.cfg", b"name")
+        result = self.sync()
+        assert (result.action, sorted(result.uploaded)) == (SyncAction.UPLOAD, ["profiles/player.cfg", "slot1.sav"])
+        assert self.get_cloud_content("slot1.sav") == b"level 1"
+        assert self.sync().action == SyncAction.NONE
+
+        self.write_save("slot1.sav", b"level 2", modified=True)
+        result = self.sync()
+        assert result.uploaded == ["slot1.sav"]
+        assert self.server.requests == [("PUT", "saves/slot1.sav")]
+
+        other_dir = os.path.join(self.tmp_dir.name, "other")
+        result = self.sync(save_dir=other_dir)
+        assert (result.action, len(result.downloaded)) == (SyncAction.DOWNLOAD, 2)
+        with open(os.path.join(other_dir, "slot1.sav"), "rb") as save_file:
+            assert save_file.read() == b"level 2"
+        # What was downloaded is known to match the cloud without being read
+        with patch.object(_mod, "compress_file") as compress:
+            local_files = get_local_files(other_dir)
+        compress.assert_not_called()
+        cloud_hashes = {f.relative_path: f.md5 for f in _mod.GOGCloudStorageClient("u", "c", "t").list_files("saves")}
+        assert {f.relative_path: f.md5 for f in local_files} == cloud_hashes
+
+    def test_identical_files_are_not_transferred(self):
+        self.write_save("slot1.sav", b"level 1")
+        self.write_save("slot2.sav", b"level 2")
+        self.sync()
+        self.write_save("slot2.sav", b"level 3", modified=True)
+        result = self.sync(preferred_action="forceupload")
+        assert result.uploaded == ["slot2.sav"]
+        assert self.server.requests == [("PUT", "saves/slot2.sav")]
+
+    def test_parallel_transfers(self):
+        self.server = self.start_server(delay=0.05)
+        for index in range(12):
+            self.write_save("slot%s.sav" % index, b"level %d" % index)
+        start = time.monotonic()
+        assert len(self.sync().uploaded) == 12
+        elapsed = time.monotonic() - start
+        assert 1 < self.server.max_in_flight <= _mod.MAX_CONCURRENT_TRANSFERS
+        assert elapsed < 12 * 0.05
+
+    def test_cancelled_sync_stops_the_transfers(self):
+        for index in range(12):
+            self.write_save("slot%s.sav" % index, b"level %d" % index)
+
+        def progress_callback(index, total, name):
+            raise InterruptedError("cancelled")
+
+        with self.assertRaises(InterruptedError):
+            self.sync(progress_callback=progress_callback)
+        assert len(self.server.files) < 12
+
+
+if __name__ == "__main__":
+    unittest.main()
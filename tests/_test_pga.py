@@ -91,6 +91,9 @@ class TestDbCreator(DatabaseTester):
         id_field = schema.field_to_string("id", "INTEGER", indexed=True)
         self.assertEqual(id_field, "id INTEGER PRIMARY KEY")
 
+        journal_id_field = schema.field_to_string("id", "INTEGER", indexed=True, autoincrement=True)
+        self.assertEqual(journal_id_field, "id INTEGER PRIMARY KEY AUTOINCREMENT")
+
     def test_can_create_table(self):
         fields = [{"name": "id", "type": "INTEGER", "indexed": True}, {"name": "name", "type": "TEXT"}]
         schema.create_table("testing", fields)
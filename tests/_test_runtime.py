@@ -0,0 +1,164 @@
+"""Tests for the delta updates of runtime components, against a local HTTP server."""
+
+import functools
+import hashlib
+import json
+import os
+import tarfile
+import threading
+from http.server import SimpleHTTPRequestHandler, ThreadingHTTPServer
+from tempfile import TemporaryDirectory
+from unittest import TestCase
+from unittest.mock import patch
+
+from lutris import runtime, settings
+from lutris.runtime import MANIFEST_FILENAME, RuntimeExtractedComponentUpdater
+
+RUNTIME_FILES = {
+    "lib/libfoo.so.1": b"foo 1" * 1000,
+    "lib/libbar.so.1": b"bar 1" * 1000,
+    "lib/libbaz.so.1": b"baz 1" * 1000,
+    "bin/tool": b"#!/bin/sh\n" * 1000,
+    "share/data.pak": b"data" * 20000,
+}
+
+
+class RuntimeServer(ThreadingHTTPServer):
+    """Serves a folder, remembering the paths requested"""
+
+    def __init__(self, directory):
+        self.requested = []
+        requested = self.requested
+
+        class Handler(SimpleHTTPRequestHandler):
+            def do_GET(self):
+                requested.append(self.path)
+                super().do_GET()
+
+            def log_message(self, *args):
+                pass
+
+        super().__init__(("127.0.0.1", 0), functools.partial(Handler, directory=directory))
+
+
+class TestRuntimeDeltaUpdate(TestCase):
+    def setUp(self):
+        self.tmp_dir = TemporaryDirectory()
+        self.addCleanup(self.tmp_dir.cleanup)
+        self.server_dir = os.path.join(self.tmp_dir.name, "server")
+        self.runtime_dir = os.path.join(self.tmp_dir.name, "runtime")
+        os.makedirs(self.runtime_dir)
+        patcher = patch.object(settings, "RUNTIME_DIR", self.runtime_dir)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+        self.server = RuntimeServer(self.server_dir)
+        threading.Thread(target=self.server.serve_forever, daemon=True).start()
+        self.addCleanup(self.server.server_close)
+        self.addCleanup(self.server.shutdown)
+
+    def publish(self, version, files, links=None):
+        """Publish a version of the runtime as an archive and a manifest of its files"""
+        version_dir = os.path.join(self.server_dir, version)
+        manifest = {"files": {}}
+        for path, content in files.items():
+            file_path = os.path.join(version_dir, "files", path)
+            os.makedirs(os.path.dirname(file_path), exist_ok=True)
+            with open(file_path, "wb") as runtime_file:
+                runtime_file.write(content)
+            manifest["files"][path] = {"size": len(content), "sha256": hashlib.sha256(content).hexdigest()}
+        for path, target in (links or {}).items():
+            os.symlink(target, os.path.join(version_dir, "files", path))
+            manifest["files"][path] = {"link": target}
+        manifest["base_url"] = "%s/%s/files/" % (self.base_url, version)
+        with open(os.path.join(version_dir, "manifest.json"), "w", encoding="utf-8") as manifest_file:
+            json.dump(manifest, manifest_file)
+        with tarfile.open(os.path.join(version_dir, "test-runtime.tar.gz"), "w:gz") as archive:
+            archive.add(os.path.join(version_dir, "files"), arcname="test-runtime")
+
+    @property
+    def base_url(self):
+        return "http://127.0.0.1:%s" % self.server.server_address[1]
+
+    def update(self, version, manifest=True):
+        info = {
+            "name": "test-runtime",
+            "url": "%s/%s/test-runtime.tar.gz" % (self.base_url, version),
+            "created_at": "2024-01-01T00:00:00",
+        }
+        if manifest:
+            info["manifest_url"] = "%s/%s/manifest.json" % (self.base_url, version)
+        self.server.requested.clear()
+        updater = RuntimeExtractedComponentUpdater(info)
+        updater.install_update(None)
+        updater.join()
+        return [path.split("/", 2)[2] for path in self.server.requested]
+
+    def read_runtime(self):
+        runtime_path = os.path.join(self.runtime_dir, "test-runtime")
+        files = {}
+        for root, _dirs, filenames in os.walk(runtime_path):
+            for filename in filenames:
+                path = os.path.join(root, filename)
+                if os.path.islink(path):
+                    files[os.path.relpath(path, runtime_path)] = "-> %s" % os.readlink(path)
+                elif filename != MANIFEST_FILENAME:
+                    with open(path, "rb") as runtime_file:
+                        files[os.path.relpath(path, runtime_path)] = runtime_file.read()
+        return files
+
+    def test_only_changed_files_are_downloaded(self):
+        self.publish("1", RUNTIME_FILES, {"lib/libfoo.so": "libfoo.so.1"})
+        assert self.update("1") == ["manifest.json", "test-runtime.tar.gz"]
+        tool_inode = os.stat(os.path.join(self.runtime_dir, "test-runtime/bin/tool")).st_ino
+
+        files = dict(RUNTIME_FILES, **{"lib/libfoo.so.2": b"foo 2" * 1000, "lib/libbar.so.1": b"bar 2" * 1000})
+        del files["lib/libbaz.so.1"]
+        self.publish("2", files, {"lib/libfoo.so": "libfoo.so.2"})
+        assert sorted(self.update("2")) == ["files/lib/libbar.so.1", "files/lib/libfoo.so.2", "manifest.json"]
+        expected = dict(files, **{"lib/libfoo.so": "-> libfoo.so.2"})
+        assert self.read_runtime() == expected
+        assert os.stat(os.path.join(self.runtime_dir, "test-runtime/bin/tool")).st_ino == tool_inode
+        assert sorted(os.listdir(self.runtime_dir)) == ["test-runtime"]
+
+        assert self.update("2") == ["manifest.json"]
+        assert self.read_runtime() == expected
+
+    def test_fallback_to_the_archive(self):
+        self.publish("1", RUNTIME_FILES)
+        self.update("1")
+        files = dict(RUNTIME_FILES, **{"lib/libbar.so.1": b"bar 2" * 1000})
+        self.publish("2", files)
+        with open(os.path.join(self.server_dir, "2/files/lib/libbar.so.1"), "wb") as corrupted_file:
+            corrupted_file.write(b"corrupted")
+        assert self.update("2") == ["manifest.json", "files/lib/libbar.so.1", "test-runtime.tar.gz"]
+        # The archive was made before the file got corrupted
+        assert self.read_runtime() == files
+        assert sorted(os.listdir(self.runtime_dir)) == ["test-runtime"]
+
+    def test_big_changes_use_the_archive(self):
+        self.publish("1", RUNTIME_FILES)
+        self.update("1")
+        self.publish("2", {path: content.upper() for path, content in RUNTIME_FILES.items()})
+        assert self.update("2") == ["manifest.json", "test-runtime.tar.gz"]
+        assert self.read_runtime()["bin/tool"] == b"#!/BIN/SH\n" * 1000
+
+    def test_runtime_without_manifest(self):
+        self.publish("1", RUNTIME_FILES)
+        assert self.update("1", manifest=False) == ["test-runtime.tar.gz"]
+        self.publish("2", RUNTIME_FILES)
+        assert self.update("2") == ["manifest.json", "test-runtime.tar.gz"]
+        assert self.update("2") == ["manifest.json"]
+
+    def test_paths_outside_the_runtime(self):
+        with self.assertRaises(ValueError):
+            RuntimeExtractedComponentUpdater.get_file_path(self.runtime_dir, "../escape")
+        with self.assertRaises(ValueError):
+            RuntimeExtractedComponentUpdater.get_file_path(self.runtime_dir, "/etc/passwd")
+
+    def test_ratio_is_configurable(self):
+        self.publish("1", RUNTIME_FILES)
+        self.update("1")
+        self.publish("2", dict(RUNTIME_FILES, **{"bin/tool": b"#!/bin/bash\n" * 1000}))
+        with patch.object(runtime, "DELTA_MAX_CHANGED_RATIO", 0.1):
+            assert self.update("2") == ["manifest.json", "test-runtime.tar.gz"]
@@ -0,0 +1,158 @@
+"""Tests for the TOSEC ROM scanner."""
+
+import hashlib
+import os
+from pathlib import Path
+from tempfile import TemporaryDirectory
+from unittest import TestCase
+from unittest.mock import patch
+
+from lutris.scanners import tosec
+from lutris.util import hash_cache
+
+DAT_TEMPLATE = """<?xml version="1.0"?>
+<datafile>
+    <header>
+        <name>Nintendo Famicom - Games</name>
+        <description>Nintendo Famicom - Games (TOSEC-v2023-01-01)</description>
+    </header>
+    %s
+</datafile>
+"""
+
+
+def md5(content):
+    return hashlib.md5(content).hexdigest()
+
+
+def make_game(name, roms):
+    rom_tags = "".join(
+        '<rom name="%s" size="%d" md5="%s"/>' % (rom_name, len(content), md5(content)) for rom_name, content in roms
+    )
+    return '<game name="%s"><description>%s</description>%s</game>' % (name, name, rom_tags)
+
+
+class TosecTestCase(TestCase):
+    def setUp(self):
+        self.tmp_dir = TemporaryDirectory()
+        self.tmp_path = Path(self.tmp_dir.name)
+        self.index = tosec.TosecIndex(str(self.tmp_path / "cache" / "tosec.db"))
+        self.rom_path = self.tmp_path / "roms"
+        self.rom_path.mkdir()
+        file_hash_cache = hash_cache.FileHashCache(str(self.tmp_path / "cache" / "file-hashes.db"))
+        for patcher in (
+            patch.object(tosec, "TOSEC_INDEX", self.index),
+            patch.object(hash_cache, "FILE_HASH_CACHE", file_hash_cache),
+        ):
+            patcher.start()
+            self.addCleanup(patcher.stop)
+
+    def tearDown(self):
+        self.tmp_dir.cleanup()
+
+    def import_games(self, *games):
+        dat_path = self.tmp_path / "famicom.dat"
+        dat_path.write_text(DAT_TEMPLATE % "".join(games))
+        return self.index.import_dat(str(dat_path))
+
+    def write_rom(self, name, content):
+        (self.rom_path / name).write_bytes(content)
+
+
+class TestTosecIndex(TosecTestCase):
+    def test_import_and_search(self):
+        assert self.index.is_empty
+        assert self.import_games(make_game("Mario (1985)", [("Mario (1985).nes", b"mario")])) == 1
+        assert not self.index.is_empty
+        results = self.index.search_by_md5s([md5(b"mario"), md5(b"unknown")])
+        assert list(results) == [md5(b"mario")]
+        game = results[md5(b"mario")][0]
+        assert game["name"] == "Mario (1985)"
+        assert game["roms"] == [{"name": "Mario (1985).nes", "size": 5, "md5": md5(b"mario")}]
+        assert tosec.guess_platform(game) == "nes"
+
+    def test_reimport_replaces_category(self):
+        self.import_games(make_game("Mario (1985)", [("Mario.nes", b"mario")]))
+        self.import_games(make_game("Zelda (1986)", [("Zelda.nes", b"zelda")]))
+        assert not self.index.search_by_md5s([md5(b"mario")])
+        assert self.index.search_by_md5s([md5(b"zelda")])
+
+    def test_import_folder(self):
+        dat_dir = self.tmp_path / "dats"
+        dat_dir.mkdir()
+        (dat_dir / "famicom.dat").write_text(DAT_TEMPLATE % make_game("Mario (1985)", [("Mario.nes", b"mario")]))
+        (dat_dir / "snes.dat").write_text(
+            DAT_TEMPLATE.replace("Nintendo Famicom", "Super Famicom") % make_game("F-Zero", [("F-Zero.sfc", b"fzero")])
+        )
+        (dat_dir / "broken.dat").write_text("<datafile><game")
+        (dat_dir / "readme.txt").write_text("TOSEC")
+        with self.assertLogs(tosec.logger, "ERROR"):
+            assert tosec.import_tosec_dats(str(dat_dir)) == 2
+        assert len(self.index.search_by_md5s([md5(b"mario"), md5(b"fzero")])) == 2
+        assert tosec.import_tosec_dats(str(dat_dir / "famicom.dat")) == 1
+
+
+class TestSearchByMd5s(TosecTestCase):
+    @patch("lutris.scanners.tosec.search_tosec_by_md5")
+    def test_local_index_first_then_api(self, search_tosec_by_md5):
+        self.import_games(make_game("Mario (1985)", [("Mario.nes", b"mario")]))
+        search_tosec_by_md5.side_effect = lambda md5sum: [{"name": "Remote"}] if md5sum == md5(b"zelda") else []
+        results = tosec.search_tosec_by_md5s([md5(b"mario"), md5(b"zelda"), md5(b"unknown"), None])
+        assert results[md5(b"mario")][0]["name"] == "Mario (1985)"
+        assert results[md5(b"zelda")] == [{"name": "Remote"}]
+        assert md5(b"unknown") not in results
+        assert sorted(call.args[0] for call in search_tosec_by_md5.call_args_list) == sorted(
+            [md5(b"zelda"), md5(b"unknown")]
+        )
+
+    @patch("lutris.scanners.tosec.search_tosec_by_md5")
+    def test_failed_lookups_are_kept_apart(self, search_tosec_by_md5):
+        self.import_games(make_game("Mario (1985)", [("Mario.nes", b"mario")]))
+
+        def search(md5sum):
+            if md5sum == md5(b"broken"):
+                raise KeyError("results")
+            return [{"name": "Remote"}]
+
+        search_tosec_by_md5.side_effect = search
+        with self.assertLogs(tosec.logger, "ERROR"):
+            results = tosec.search_tosec_by_md5s([md5(b"mario"), md5(b"zelda"), md5(b"broken")])
+        assert sorted(results) == sorted([md5(b"mario"), md5(b"zelda")])
+
+    @patch("lutris.scanners.tosec.search_tosec_by_md5")
+    def test_offline(self, search_tosec_by_md5):
+        tosec.search_tosec_by_md5s([md5(b"mario")], use_api=False)
+        search_tosec_by_md5.assert_not_called()
+
+
+class TestScanFolder(TosecTestCase):
+    def setUp(self):
+        super().setUp()
+        self.import_games(
+            make_game("Mario (1985)", [("Mario (1985).nes", b"mario")]),
+            make_game("Two Disks (1990)", [("Two Disks (Disk 1).fds", b"disk1"), ("Two Disks (Disk 2).fds", b"disk2")]),
+        )
+
+    def test_dry_run_does_not_touch_files(self):
+        self.write_rom("mario.nes", b"mario")
+        self.write_rom("mario.srm", b"save")
+        plan = tosec.scan_folder(str(self.rom_path), dry_run=True, use_api=False)
+        assert sorted(plan) == [("mario.nes", "Mario (1985).nes"), ("mario.srm", "Mario (1985).srm")]
+        assert sorted(os.listdir(self.rom_path)) == ["mario.nes", "mario.srm"]
+
+    def test_renames_roms_and_saves(self):
+        self.write_rom("mario.nes", b"mario")
+        self.write_rom("mario.srm", b"save")
+        self.write_rom("unknown.nes", b"unknown")
+        tosec.scan_folder(str(self.rom_path), use_api=False)
+        assert sorted(os.listdir(self.rom_path)) == ["Mario (1985).nes", "Mario (1985).srm", "unknown.nes"]
+
+    def test_multi_rom_games(self):
+        self.write_rom("a.fds", b"disk1")
+        self.write_rom("b.fds", b"disk2")
+        plan = tosec.scan_folder(str(self.rom_path), dry_run=True, use_api=False)
+        assert sorted(plan) == [("a.fds", "Two Disks (Disk 1).fds"), ("b.fds", "Two Disks (Disk 2).fds")]
+
+    def test_incomplete_sets_are_skipped(self):
+        self.write_rom("a.fds", b"disk1")
+        assert tosec.scan_folder(str(self.rom_path), dry_run=True, use_api=False) == []
@@ -112,6 +112,14 @@ class TestStringUtils(TestCase):
         self.assertEqual(strings.parse_playtime("2h45"), 2.75)
         self.assertEqual(strings.parse_playtime("2:45"), 2.75)
 
+    def test_natural_sort_key(self):
+        names = ["Mega slap battler 20", "mega Slap battler 3", "Mega slap battler"]
+        self.assertEqual(
+            sorted(names, key=strings.get_natural_sort_key),
+            ["Mega slap battler", "mega Slap battler 3", "Mega slap battler 20"],
+        )
+        self.assertIs(strings.get_natural_sort_key(names[0]), strings.get_natural_sort_key(names[0]))
+
 
 class TestVersionSort(TestCase):
     def test_parse_version(self):
@@ -0,0 +1,129 @@
+"""Tests for the cache of the responses of the services' APIs."""
+
+import os
+import time
+import unittest
+from tempfile import TemporaryDirectory
+from unittest.mock import Mock, patch
+
+from lutris.services import base
+from lutris.services.base import ServiceLibraryCache
+from lutris.services.gog import GOGService
+
+
+class LibraryCacheTestCase(unittest.TestCase):
+    def setUp(self):
+        self.tmp_dir = TemporaryDirectory()
+        self.addCleanup(self.tmp_dir.cleanup)
+        for patcher in (
+            patch.object(base, "LIBRARY_CACHE_DIR", self.tmp_dir.name),
+            patch.object(ServiceLibraryCache, "_caches", {}),
+        ):
+            patcher.start()
+            self.addCleanup(patcher.stop)
+
+
+class TestServiceLibraryCache(LibraryCacheTestCase):
+    def test_pages_are_used_until_they_expire(self):
+        cache = ServiceLibraryCache("test", ttl=3600)
+        fetch = Mock(return_value=({"games": [1]}, {"ETag": '"v1"'}))
+        assert cache.get_page("1", fetch) == ({"games": [1]}, True)
+        assert cache.get_page("1", fetch) == ({"games": [1]}, False)
+        fetch.assert_called_once_with({})
+
+        cache.expire()
+        fetch.return_value = None
+        assert cache.get_page("1", fetch) == ({"games": [1]}, False)
+        fetch.assert_called_with({"If-None-Match": '"v1"'})
+
+    def test_conditional_headers(self):
+        cache = ServiceLibraryCache("test", ttl=0)
+        headers = [("etag", '"v1"'), ("Last-Modified", "Wed, 21 Oct 2015 07:28:00 GMT")]
+        cache.get_page("1", Mock(return_value=({}, headers)))
+        fetch = Mock(return_value=None)
+        cache.get_page("1", fetch)
+        fetch.assert_called_once_with({"If-None-Match": '"v1"', "If-Modified-Since": "Wed, 21 Oct 2015 07:28:00 GMT"})
+
+    def test_only_changed_pages_are_processed(self):
+        cache = ServiceLibraryCache("test", ttl=0)
+        process = Mock(side_effect=lambda data: dict(data, processed=True))
+        assert cache.get_page("1", lambda _headers: ({"a": 1}, {}), process) == ({"a": 1, "processed": True}, True)
+        assert cache.get_page("1", lambda _headers: ({"a": 1}, {}), process) == ({"a": 1, "processed": True}, False)
+        assert cache.get_page("1", lambda _headers: ({"a": 2}, {}), process) == ({"a": 2, "processed": True}, True)
+        assert process.call_count == 2
+
+    def test_not_modified_without_cached_page(self):
+        with self.assertRaises(ValueError):
+            ServiceLibraryCache("test", ttl=0).get_page("1", lambda _headers: None)
+
+    def test_save_retain_and_clear(self):
+        cache = ServiceLibraryCache("test", ttl=3600)
+        for key in ("1", "2"):
+            cache.get_page(key, lambda _headers, key=key: ({"page": key}, {}))
+        cache.retain(["2"])
+        cache.save()
+
+        cache = ServiceLibraryCache("test", ttl=3600)
+        fetch = Mock()
+        assert cache.get_page("2", fetch) == ({"page": "2"}, False)
+        fetch.assert_not_called()
+        assert list(cache.pages) == ["2"]
+
+        cache.clear()
+        assert not os.path.exists(cache.path)
+        assert cache.pages == {}
+
+    def test_invalid_file(self):
+        os.makedirs(self.tmp_dir.name, exist_ok=True)
+        with open(os.path.join(self.tmp_dir.name, "test.json"), "w", encoding="utf-8") as cache_file:
+            cache_file.write("{not json")
+        assert ServiceLibraryCache("test", ttl=3600).pages == {}
+
+    def test_shared_by_id(self):
+        cache = ServiceLibraryCache.get("test", 60)
+        assert ServiceLibraryCache.get("test", 120) is cache
+        assert cache.ttl == 120
+
+
+class TestGOGLibraryCache(LibraryCacheTestCase):
+    def setUp(self):
+        super().setUp()
+        self.requests = []
+        for patcher in (
+            patch.object(GOGService, "is_authenticated", return_value=True),
+            patch.object(GOGService, "make_conditional_request", side_effect=self.make_conditional_request),
+            patch.object(GOGService, "get_supported_os", return_value=[{"operatingSystem": {"name": "linux"}}]),
+        ):
+            patcher.start()
+            self.addCleanup(patcher.stop)
+
+    def make_conditional_request(self, url, headers):
+        self.requests.append((url, headers))
+        if headers.get("If-None-Match") == '"unchanged"':
+            return None
+        page = int(url.split("page=")[1])
+        products = [{"id": page, "worksOn": {}}]
+        return {"totalPages": 2, "products": products}, [("ETag", '"unchanged"' if page == 1 else '"%s"' % time.time())]
+
+    def test_reload(self):
+        service = GOGService()
+        games = service.get_library()
+        assert [game["id"] for game in games] == [1, 2]
+        assert games[0]["worksOn"] == {"Linux": True}
+        assert GOGService.get_supported_os.call_count == 2
+
+        self.requests.clear()
+        assert service.get_library() == games
+        assert self.requests == []
+
+        # A reload keeps using the pages until they expire
+        service.wipe_api_cache()
+        assert service.get_library() == games
+        assert self.requests == []
+
+        service.expire_api_cache()
+        assert service.get_library() == games
+        assert self.requests[0][1] == {"If-None-Match": '"unchanged"'}
+        assert "If-None-Match" in self.requests[1][1]
+        # The second page came back with a new ETag but the same content, so it wasn't processed again
+        assert GOGService.get_supported_os.call_count == 2
@@ -0,0 +1,266 @@
+"""Tests for the reload of service games."""
+
+import json
+import os
+import threading
+import time
+import unittest
+from unittest.mock import patch
+
+from lutris import settings
+from lutris.database import schema, sql
+from lutris.database.services import ServiceGameCollection, ServiceGameUpdate, get_content_hash
+from lutris.services import base
+from lutris.services.base import BaseService, ReloadTimings
+from lutris.services.service_game import ServiceGame
+from lutris.util.log import logger
+
+# Raise this to benchmark against bigger libraries, e.g. LUTRIS_SERVICE_GAMES_BENCHMARK_GAMES=50000
+BENCHMARK_GAMES = int(os.environ.get("LUTRIS_SERVICE_GAMES_BENCHMARK_GAMES", "500"))
+
+
+class ServiceReloadTestCase(unittest.TestCase):
+    def setUp(self):
+        if os.path.exists(settings.DB_PATH):
+            os.remove(settings.DB_PATH)
+        schema.syncdb()
+
+    def save_game(self, service, appid, name=None):
+        game = ServiceGame()
+        game.service = service
+        game.appid = appid
+        game.name = name or "Game %s" % appid
+        game.details = "{}"
+        game.save()
+
+    def get_appids(self, service):
+        return sorted(game["appid"] for game in ServiceGameCollection.get_for_service(service))
+
+
+class TestServiceGameUpdate(ServiceReloadTestCase):
+    def test_changes(self):
+        for appid in ("1", "2", "3"):
+            self.save_game("test", appid)
+        self.save_game("other", "1")
+        with ServiceGameCollection.update_service_games("test") as update:
+            self.save_game("test", "1")
+            self.save_game("test", "2", name="Renamed")
+            self.save_game("test", "4")
+        assert self.get_appids("test") == ["1", "2", "3"]
+        changes = update.apply()
+        assert (changes.added, changes.updated, changes.removed) == ({"4"}, {"2"}, {"3"})
+        assert self.get_appids("test") == ["1", "2", "4"]
+        assert ServiceGameCollection.get_game("test", "2")["name"] == "Renamed"
+        assert self.get_appids("other") == ["1"]
+
+    def test_unchanged_games_are_not_written(self):
+        self.save_game("test", "1")
+        with ServiceGameCollection.update_service_games("test") as update:
+            self.save_game("test", "1")
+        with patch.object(ServiceGameUpdate, "_update_games") as update_games:
+            assert not update.apply()
+        assert update_games.call_args.args[1] == []
+
+    def test_games_read_back_while_loading(self):
+        with ServiceGameCollection.update_service_games("test") as update:
+            self.save_game("test", "1")
+            assert ServiceGameCollection.get_game("test", "1")["name"] == "Game 1"
+            self.save_game("test", "1", name="Renamed")
+        changes = update.apply()
+        assert (changes.added, changes.updated) == ({"1"}, set())
+        assert ServiceGameCollection.get_game("test", "1")["name"] == "Renamed"
+
+    def test_duplicates_are_removed(self):
+        for _index in range(2):
+            sql.db_insert(settings.DB_PATH, "service_games", {"service": "test", "appid": "1", "name": "Game 1"})
+        with ServiceGameCollection.update_service_games("test") as update:
+            self.save_game("test", "1")
+        assert update.apply().updated == {"1"}
+        assert self.get_appids("test") == ["1"]
+
+    def test_saves_outside_an_update(self):
+        self.save_game("test", "1")
+        self.save_game("test", "1", name="Renamed")
+        game = ServiceGameCollection.get_game("test", "1")
+        assert game["name"] == "Renamed"
+        assert game["content_hash"] == get_content_hash({k: v for k, v in game.items() if k not in ("id", "url")})
+
+
+class FakeService(BaseService):
+    id = "test"
+    name = "Test"
+
+    def __init__(self, appids):
+        super().__init__()
+        self.appids = appids
+        self.calls = []
+
+    def load(self):
+        self.calls.append("load")
+        for appid in self.appids:
+            game = ServiceGame()
+            game.service = self.id
+            game.appid = appid
+            game.name = "Game %s" % appid
+            game.details = "{}"
+            game.save()
+
+    def load_icons(self):
+        self.calls.append("media")
+
+    def add_installed_games(self):
+        self.calls.append("installed")
+
+
+class TestReloadGames(ServiceReloadTestCase):
+    def test_games_are_kept_while_loading_and_pruned_after(self):
+        for appid in ("1", "2"):
+            self.save_game("test", appid)
+        service = FakeService(["2", "3"])
+        original_load = service.load
+
+        def load():
+            assert self.get_appids("test") == ["1", "2"]
+            original_load()
+
+        service.load = load
+        timings = ReloadTimings()
+        changes = service.reload_games(timings)
+        assert (changes.added, changes.updated, changes.removed) == ({"3"}, set(), {"1"})
+        assert self.get_appids("test") == ["2", "3"]
+        assert service.calls[0] == "load"
+        assert sorted(service.calls[1:]) == ["installed", "media"]
+        assert set(timings.phases) == {"load", "save", "media", "installed"}
+
+    def test_failed_load_keeps_games(self):
+        self.save_game("test", "1")
+        service = FakeService([])
+        with patch.object(service, "load", side_effect=RuntimeError("offline")):
+            with self.assertRaises(RuntimeError):
+                service.reload_games(ReloadTimings())
+        assert self.get_appids("test") == ["1"]
+
+    def test_api_cache_expires_on_refresh_only(self):
+        service = FakeService([])
+        with patch.object(service, "expire_api_cache") as expire_api_cache:
+            service.reload_games(ReloadTimings())
+            expire_api_cache.assert_not_called()
+            service.reload_games(ReloadTimings(), refresh=True)
+            expire_api_cache.assert_called_once_with()
+
+
+class TestReleaseYears(unittest.TestCase):
+    def setUp(self):
+        patcher = patch.object(base, "RELEASE_YEARS", {})
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def test_years_are_read_once_per_content(self):
+        service = FakeService([])
+        game = {"appid": "1", "content_hash": "a"}
+        with patch.object(FakeService, "get_game_release_date", return_value="1998-11-19") as get_date:
+            assert service.get_game_release_year(game) == "1998"
+            assert service.get_game_release_year(dict(game)) == "1998"
+            assert get_date.call_count == 1
+            get_date.return_value = "2004-11-16"
+            assert service.get_game_release_year(dict(game, content_hash="b")) == "2004"
+            assert service.get_game_release_year({"appid": "1"}) == "2004"
+            assert get_date.call_count == 3
+
+
+class TestReloadServices(unittest.TestCase):
+    def setUp(self):
+        patcher = patch.object(base, "SERVICE_RELOAD_TIMINGS", {})
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def test_callback_gets_errors_once_all_are_done(self):
+        services = [FakeService([]) for _index in range(3)]
+        for index, service in enumerate(services):
+            service.id = "service%d" % index
+        callbacks = []
+
+        def start_reload(service, reloaded_callback, refresh=False):
+            reloaded_callback(ValueError("failed") if service.id == "service1" else None)
+
+        with patch.object(FakeService, "start_reload", autospec=True, side_effect=start_reload):
+            base.reload_services(services, callbacks.append)
+        assert len(callbacks) == 1
+        assert list(callbacks[0]) == ["service1"]
+
+    def test_no_services(self):
+        callbacks = []
+        base.reload_services([], callbacks.append)
+        assert callbacks == [{}]
+
+    def test_reloads_share_slots(self):
+        running = []
+        peak = []
+        lock = threading.Lock()
+
+        def reload_games(_service, _timings, refresh=False):
+            with lock:
+                running.append(1)
+                peak.append(len(running))
+            threading.Event().wait(0.02)
+            with lock:
+                running.pop()
+
+        threads = []
+        with patch.object(FakeService, "reload_games", autospec=True, side_effect=reload_games):
+            for index in range(6):
+                service = FakeService([])
+                service.id = "service%d" % index
+                with patch.object(
+                    base, "AsyncCall", lambda func, _callback, **_kwargs: threads.append(threading.Thread(target=func))
+                ):
+                    service.start_reload(lambda error: None)
+            for thread in threads:
+                thread.start()
+            for thread in threads:
+                thread.join()
+        assert max(peak) <= base.MAX_CONCURRENT_RELOADS
+        assert len(base.SERVICE_RELOAD_TIMINGS) == 6
+
+
+class TestServiceGameUpdateBenchmark(ServiceReloadTestCase):
+    """Compare reloading a big library game by game, as it was done before, with an
+    update, when nothing changed. The timings are logged rather than asserted."""
+
+    def test_benchmark(self):
+        details = json.dumps({"description": "x" * 2000, "tags": list(range(50))})
+        games = [
+            {"service": "test", "appid": str(appid), "name": "Game %s" % appid, "details": details}
+            for appid in range(BENCHMARK_GAMES)
+        ]
+        timings = {}
+
+        start = time.perf_counter()
+        for game_data in games:
+            existing_game = ServiceGameCollection.get_game("test", game_data["appid"])
+            if existing_game:
+                sql.db_update(settings.DB_PATH, "service_games", game_data, {"id": existing_game["id"]})
+            else:
+                sql.db_insert(settings.DB_PATH, "service_games", game_data)
+        timings["game by game, first load"] = time.perf_counter() - start
+
+        start = time.perf_counter()
+        sql.db_delete(settings.DB_PATH, "service_games", "service", "test")
+        for game_data in games:
+            sql.db_insert(settings.DB_PATH, "service_games", game_data)
+        timings["wipe and reload"] = time.perf_counter() - start
+
+        for label in ("update, first load", "update, unchanged"):
+            start = time.perf_counter()
+            with ServiceGameCollection.update_service_games("test") as update:
+                for game_data in games:
+                    ServiceGameCollection.save_game(game_data)
+            changes = update.apply()
+            timings[label] = time.perf_counter() - start
+        assert not changes
+        assert len(ServiceGameCollection.get_for_service("test")) == BENCHMARK_GAMES
+        logger.info(
+            "Reloading %d service games: %s",
+            BENCHMARK_GAMES,
+            ", ".join("%s %.3fs" % (name, timing) for name, timing in timings.items()),
+        )
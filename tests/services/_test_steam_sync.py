@@ -0,0 +1,173 @@
+"""Tests for the incremental sync of installed Steam games."""
+
+import os
+import time
+import unittest
+from pathlib import Path
+from tempfile import TemporaryDirectory
+from unittest.mock import patch
+
+from lutris.services import steam
+from lutris.services.steam import SteamService
+from lutris.util.steam.appmanifest import AppManifestIndex
+
+MANIFEST_TEMPLATE = """"AppState"
+{
+    "appid"        "%s"
+    "name"        "Game %s"
+    "StateFlags"        "%s"
+    "installdir"        "Game %s"
+}
+"""
+
+INSTALLED = 4
+UNINSTALLED = 1
+
+
+class SteamSyncTestCase(unittest.TestCase):
+    def setUp(self):
+        self.tmp_dir = TemporaryDirectory()
+        self.tmp_path = Path(self.tmp_dir.name)
+        self.steamapps_path = self.tmp_path / "library" / "steamapps"
+        self.steamapps_path.mkdir(parents=True)
+        self.cache_path = str(self.tmp_path / "cache" / "steam-manifests.json")
+
+    def tearDown(self):
+        self.tmp_dir.cleanup()
+
+    def write_manifest(self, appid, state_flags=INSTALLED):
+        path = self.steamapps_path / ("appmanifest_%s.acf" % appid)
+        path.write_text(MANIFEST_TEMPLATE % (appid, appid, state_flags, appid))
+        # Make sure rewritten manifests get a new mtime, even on coarse grained file systems
+        os.utime(path, ns=(time.time_ns(), time.time_ns() + int(appid)))
+        return str(path)
+
+
+class TestAppManifestIndex(SteamSyncTestCase):
+    def test_first_update_is_a_full_scan(self):
+        self.write_manifest("10")
+        self.write_manifest("20", UNINSTALLED)
+        index = AppManifestIndex(self.cache_path)
+        assert index.needs_full_scan([str(self.steamapps_path)])
+        changed, removed = index.update([str(self.steamapps_path)])
+        assert sorted(manifest.steamid for manifest in changed) == ["10", "20"]
+        assert removed == set()
+        assert index.installed_appids == {"10"}
+
+    def test_unchanged_manifests_are_not_parsed(self):
+        self.write_manifest("10")
+        index = AppManifestIndex(self.cache_path)
+        index.update([str(self.steamapps_path)])
+        index.save()
+
+        index = AppManifestIndex(self.cache_path)
+        assert not index.needs_full_scan([str(self.steamapps_path)])
+        with patch("lutris.util.steam.appmanifest.AppManifest") as app_manifest:
+            changed, removed = index.update([str(self.steamapps_path)])
+            app_manifest.assert_not_called()
+        assert changed == [] and removed == set()
+
+    def test_modified_and_removed_manifests(self):
+        self.write_manifest("10")
+        path = self.write_manifest("20")
+        index = AppManifestIndex(self.cache_path)
+        index.update([str(self.steamapps_path)])
+
+        self.write_manifest("10", UNINSTALLED)
+        os.remove(path)
+        self.write_manifest("30")
+        changed, removed = index.update([str(self.steamapps_path)])
+        assert sorted(manifest.steamid for manifest in changed) == ["10", "30"]
+        assert removed == {"10", "20"}
+        assert index.installed_appids == {"30"}
+
+    def test_library_folder_change_requires_full_scan(self):
+        self.write_manifest("10")
+        index = AppManifestIndex(self.cache_path)
+        index.update([str(self.steamapps_path)])
+        assert index.needs_full_scan([str(self.steamapps_path), str(self.tmp_path / "other")])
+        index.invalidate()
+        assert index.needs_full_scan([str(self.steamapps_path)])
+
+    def test_update_manifest(self):
+        index = AppManifestIndex(self.cache_path)
+        index.update([str(self.steamapps_path)])
+        path = self.write_manifest("10")
+        manifest, removed = index.update_manifest(path)
+        assert manifest.steamid == "10" and removed == set()
+        os.remove(path)
+        manifest, removed = index.update_manifest(path)
+        assert manifest is None and removed == {"10"}
+
+
+@patch("lutris.services.steam.sync_media")
+class TestSteamServiceSync(SteamSyncTestCase):
+    def setUp(self):
+        super().setUp()
+        self.service = SteamService()
+        for patcher in (
+            patch.object(steam, "MANIFEST_INDEXES", {"steam": AppManifestIndex(self.cache_path)}),
+            patch.object(SteamService, "steamapps_paths", [str(self.steamapps_path)]),
+            patch.object(SteamService, "install_from_steam", side_effect=lambda manifest: "game-%s" % manifest.steamid),
+            patch.object(SteamService, "has_lutris_game", return_value=True),
+            patch.object(SteamService, "uninstall_missing_games", return_value=0),
+            patch.object(SteamService, "deduplicate_games", return_value=0),
+            patch.object(SteamService, "uninstall_appids"),
+        ):
+            patcher.start()
+            self.addCleanup(patcher.stop)
+
+    def test_full_scan_on_first_sync(self, sync_media):
+        self.write_manifest("10")
+        self.service.add_installed_games()
+        SteamService.uninstall_missing_games.assert_called_once_with({"10"})
+        SteamService.deduplicate_games.assert_called_once()
+        sync_media.assert_called_once_with(["game-10"])
+
+    def test_incremental_sync(self, sync_media):
+        path = self.write_manifest("10")
+        self.write_manifest("20")
+        self.service.add_installed_games()
+        SteamService.install_from_steam.reset_mock()
+        SteamService.uninstall_missing_games.reset_mock()
+
+        os.remove(path)
+        self.write_manifest("30")
+        self.service.add_installed_games()
+        assert [call.args[0].steamid for call in SteamService.install_from_steam.call_args_list] == ["30"]
+        SteamService.uninstall_missing_games.assert_not_called()
+        SteamService.uninstall_appids.assert_called_with({"10"})
+        sync_media.assert_called_with(["game-30"])
+
+    def test_games_that_were_not_added_are_retried(self, sync_media):
+        self.write_manifest("10")
+        self.write_manifest("20")
+        self.write_manifest("30")
+        added_appids = {"10"}
+
+        def install_from_steam(manifest):
+            # 30 is already in Lutris, 20 isn't in the Steam library yet
+            if manifest.steamid in added_appids:
+                return "game-%s" % manifest.steamid
+            return None
+
+        SteamService.install_from_steam.side_effect = install_from_steam
+        SteamService.has_lutris_game.side_effect = lambda appid: appid == "30"
+        self.service.add_installed_games()
+        sync_media.assert_called_with(["game-10"])
+
+        added_appids.add("20")
+        SteamService.install_from_steam.reset_mock()
+        self.service.add_installed_games()
+        assert [call.args[0].steamid for call in SteamService.install_from_steam.call_args_list] == ["20"]
+        sync_media.assert_called_with(["game-20"])
+        SteamService.uninstall_appids.assert_called_with(set())
+
+    def test_sync_app_manifest(self, _sync_media):
+        self.service.add_installed_games()
+        path = self.write_manifest("10")
+        self.service.sync_app_manifest(path)
+        assert SteamService.install_from_steam.call_args.args[0].steamid == "10"
+        os.remove(path)
+        self.service.sync_app_manifest(path)
+        SteamService.uninstall_appids.assert_called_with({"10"})
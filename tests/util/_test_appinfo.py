@@ -0,0 +1,249 @@
+"""Tests for the appinfo.vdf reader."""
+
+import os
+import struct
+import time
+from pathlib import Path
+from tempfile import TemporaryDirectory
+from unittest import TestCase
+from unittest.mock import patch
+
+from lutris.util.log import logger
+from lutris.util.steam import appinfo, vdf
+from lutris.util.steam.appinfo import AppInfoReader, get_asset_filename, get_library_cache_path
+
+# Raise this to benchmark against bigger files, e.g. LUTRIS_APPINFO_BENCHMARK_APPS=200000
+BENCHMARK_APPS = int(os.environ.get("LUTRIS_APPINFO_BENCHMARK_APPS", "20000"))
+
+
+def make_app(appid):
+    return {
+        "appinfo": {
+            "appid": appid,
+            "common": {
+                "name": "Game %d" % appid,
+                "type": "Game" if appid % 2 else "Tool",
+                "oslist": "windows,linux",
+                "library_assets_full": {
+                    "library_capsule": {"image": {"english": "abc%d/library_600x900.jpg" % appid}},
+                },
+                "header_image": {"english": "header.jpg"},
+            },
+        }
+    }
+
+
+def dump_with_key_table(data, keys):
+    """Encode binary VDF the way appinfo.vdf v29 does, with keys replaced by indexes"""
+
+    def key_index(key):
+        if key not in keys:
+            keys.append(key)
+        return struct.pack("<I", keys.index(key))
+
+    chunks = []
+    for key, value in data.items():
+        if isinstance(value, dict):
+            chunks += [vdf.BIN_NONE, key_index(key), dump_with_key_table(value, keys)]
+        elif isinstance(value, int):
+            chunks += [vdf.BIN_INT32, key_index(key), struct.pack("<i", value)]
+        else:
+            chunks += [vdf.BIN_STRING, key_index(key), value.encode("utf-8") + b"\x00"]
+    return b"".join(chunks) + vdf.BIN_END
+
+
+def make_appinfo(apps, version=29):
+    """Return the content of an appinfo.vdf file holding apps"""
+    keys = []
+    entries = []
+    for app in apps:
+        if version == 29:
+            data = dump_with_key_table(app, keys)
+        else:
+            data = vdf.binary_dumps(app)
+        entry_header = struct.pack("<IIQ20sI", 2, 1700000000, 0, b"\x00" * 20, 1)
+        if version >= 28:
+            entry_header += b"\x00" * 20
+        entries.append(struct.pack("<II", app["appinfo"]["appid"], len(entry_header) + len(data)) + entry_header + data)
+    body = b"".join(entries) + struct.pack("<I", 0)
+    magic = {27: appinfo.APPINFO_V27, 28: appinfo.APPINFO_V28, 29: appinfo.APPINFO_V29}[version]
+    if version < 29:
+        return struct.pack("<II", magic, 1) + body
+    string_table_offset = 16 + len(body)
+    string_table = struct.pack("<I", len(keys)) + b"".join(key.encode("utf-8") + b"\x00" for key in keys)
+    return struct.pack("<IIq", magic, 1, string_table_offset) + body + string_table
+
+
+class AppInfoTestCase(TestCase):
+    def setUp(self):
+        self.tmp_dir = TemporaryDirectory()
+        self.tmp_path = Path(self.tmp_dir.name)
+        self.path = str(self.tmp_path / "appinfo.vdf")
+        self.index_path = str(self.tmp_path / "cache" / "appinfo.index")
+
+    def tearDown(self):
+        self.tmp_dir.cleanup()
+
+    def write_appinfo(self, appids, version=29):
+        Path(self.path).write_bytes(make_appinfo([make_app(appid) for appid in appids], version))
+
+    def open_reader(self):
+        reader = AppInfoReader(self.path, self.index_path)
+        reader.open()
+        self.addCleanup(reader.close)
+        return reader
+
+
+class TestAppInfoReader(AppInfoTestCase):
+    def test_versions(self):
+        for version in (27, 28, 29):
+            with self.subTest(version):
+                self.write_appinfo([10, 440, 20], version)
+                with AppInfoReader(self.path) as reader:
+                    assert reader.version == version
+                    assert reader.appids == [10, 20, 440]
+                    assert reader.get_app_info(440) == {
+                        "appid": 440,
+                        "name": "Game 440",
+                        "type": "tool",
+                        "oslist": ["windows", "linux"],
+                        "library_assets": {"library_capsule": {"image": {"english": "abc440/library_600x900.jpg"}}},
+                        "header_image": {"english": "header.jpg"},
+                    }
+
+    def test_missing_app(self):
+        self.write_appinfo([10])
+        reader = self.open_reader()
+        assert "10" in reader
+        assert 11 not in reader and "nope" not in reader
+        assert reader.get_app_info(11) is None
+
+    def test_invalid_file(self):
+        Path(self.path).write_bytes(b"not an appinfo.vdf file")
+        with self.assertRaises(ValueError):
+            self.open_reader()
+
+    def test_truncated_file(self):
+        self.write_appinfo([10, 20], version=28)
+        Path(self.path).write_bytes(Path(self.path).read_bytes()[:-40])
+        with self.assertRaises(ValueError):
+            self.open_reader()
+
+    def test_index_is_cached(self):
+        self.write_appinfo([10, 20])
+        self.open_reader()
+        with patch.object(AppInfoReader, "_build_index") as build_index:
+            reader = self.open_reader()
+            build_index.assert_not_called()
+        assert reader.appids == [10, 20]
+        assert reader.get_app_info(20)["name"] == "Game 20"
+
+    def test_index_is_rebuilt_when_the_file_changes(self):
+        self.write_appinfo([10, 20])
+        reader = self.open_reader()
+        self.write_appinfo([10, 20, 30])
+        os.utime(self.path, ns=(time.time_ns(), time.time_ns() + 1000))
+        assert reader.is_stale
+        reader = self.open_reader()
+        assert reader.appids == [10, 20, 30]
+        assert reader.get_app_info(30)["name"] == "Game 30"
+
+
+class TestAssets(AppInfoTestCase):
+    def test_get_asset_filename(self):
+        app_info = {
+            "library_assets": {"library_capsule": {"image": {"english": "a/cover.jpg", "french": "b/cover.jpg"}}},
+            "header_image": {"french": "header_fr.jpg"},
+        }
+        assert get_asset_filename(app_info, "library_capsule") == "a/cover.jpg"
+        assert get_asset_filename(app_info, "library_capsule", "french") == "b/cover.jpg"
+        assert get_asset_filename(app_info, "header_image") == "header_fr.jpg"
+        assert get_asset_filename(app_info, "library_hero") is None
+
+    def test_get_library_cache_path(self):
+        library_cache = self.tmp_path / "appcache" / "librarycache"
+        (library_cache / "10" / "abc").mkdir(parents=True)
+        (library_cache / "10" / "abc" / "library_600x900.jpg").write_bytes(b"jpg")
+        (library_cache / "20_library_600x900.jpg").write_bytes(b"jpg")
+        (library_cache / "30_library_600x900.jpg").write_bytes(b"")
+        steam_dir = str(self.tmp_path)
+        assert get_library_cache_path(steam_dir, 10, "abc/library_600x900.jpg").endswith("10/abc/library_600x900.jpg")
+        assert get_library_cache_path(steam_dir, 20, "abc/library_600x900.jpg").endswith("20_library_600x900.jpg")
+        assert get_library_cache_path(steam_dir, 30, "library_600x900.jpg") is None
+
+    def test_get_app_info_from_steam_dir(self):
+        (self.tmp_path / "appcache").mkdir()
+        self.path = str(self.tmp_path / "appcache" / "appinfo.vdf")
+        self.write_appinfo([10])
+        with (
+            patch.object(appinfo, "APPINFO_INDEX_DIR", str(self.tmp_path / "cache")),
+            patch.object(appinfo, "_readers", {}),
+        ):
+            assert appinfo.get_app_info(10, str(self.tmp_path))["name"] == "Game 10"
+            with appinfo.get_appinfo_reader(str(self.tmp_path)) as reader:
+                with appinfo.get_appinfo_reader(str(self.tmp_path)) as other_reader:
+                    assert other_reader is reader
+            assert appinfo.get_app_info(10, str(self.tmp_path / "nothing")) is None
+
+    def test_replaced_readers_are_closed(self):
+        (self.tmp_path / "appcache").mkdir()
+        self.path = str(self.tmp_path / "appcache" / "appinfo.vdf")
+        self.write_appinfo([10])
+        steam_dir = str(self.tmp_path)
+        with (
+            patch.object(appinfo, "APPINFO_INDEX_DIR", str(self.tmp_path / "cache")),
+            patch.object(appinfo, "_readers", {}),
+            patch.object(appinfo, "_reader_users", {}),
+        ):
+            with appinfo.get_appinfo_reader(steam_dir) as first_reader:
+                # Replaced rather than rewritten, for the mapping of the first reader to stay valid
+                os.rename(self.path, self.path + ".old")
+                self.write_appinfo([10, 20])
+                with appinfo.get_appinfo_reader(steam_dir) as second_reader:
+                    assert second_reader is not first_reader
+                    assert 20 in second_reader
+                # Still in use
+                assert first_reader.get_app_info(10)["name"] == "Game 10"
+            with self.assertRaises(ValueError):
+                first_reader.get_app_data(10)
+            self.write_appinfo([30])
+            assert appinfo.get_app_info(30, steam_dir)["name"] == "Game 30"
+            with self.assertRaises(ValueError):
+                second_reader.get_app_data(10)
+            assert appinfo._reader_users == {}
+
+
+class TestBinaryLoadsKeyTable(TestCase):
+    def test_key_table(self):
+        keys = []
+        data = dump_with_key_table({"appinfo": {"appid": 10, "common": {"name": "Game"}}}, keys)
+        assert vdf.binary_loads(data, key_table=keys) == {"appinfo": {"appid": 10, "common": {"name": "Game"}}}
+        with self.assertRaises(SyntaxError):
+            vdf.binary_loads(data, key_table=keys[:1])
+
+
+class TestAppInfoBenchmark(AppInfoTestCase):
+    """Time the indexing of a big appinfo.vdf, the opening with a cached index and the
+    lookups. The timings are logged rather than asserted."""
+
+    def test_benchmark(self):
+        self.write_appinfo(range(1, BENCHMARK_APPS + 1))
+        timings = {}
+
+        start = time.perf_counter()
+        self.open_reader()
+        timings["first open"] = time.perf_counter() - start
+
+        start = time.perf_counter()
+        reader = self.open_reader()
+        timings["open with cached index"] = time.perf_counter() - start
+
+        start = time.perf_counter()
+        for appid in range(1, BENCHMARK_APPS + 1, max(BENCHMARK_APPS // 1000, 1)):
+            assert reader.get_app_info(appid)["name"] == "Game %d" % appid
+        timings["1000 lookups"] = time.perf_counter() - start
+        logger.info(
+            "Reading %d KB of appinfo.vdf: %s",
+            os.path.getsize(self.path) // 1024,
+            ", ".join("%s %.4fs" % (name, timing) for name, timing in timings.items()),
+        )
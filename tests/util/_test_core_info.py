@@ -0,0 +1,171 @@
+"""Tests for the index of libretro core info files, on generated info folders."""
+
+import os
+import time
+from tempfile import TemporaryDirectory
+from unittest import TestCase
+from unittest.mock import PropertyMock, patch
+
+from lutris.runners import libretro as libretro_runner
+from lutris.util.log import logger
+from lutris.util.retroarch import core_info
+from lutris.util.retroarch.core_info import CoreInfoIndex, read_core_info
+
+# Raise this to benchmark against bigger folders, e.g. LUTRIS_CORE_INFO_BENCHMARK_CORES=5000
+BENCHMARK_CORES = int(os.environ.get("LUTRIS_CORE_INFO_BENCHMARK_CORES", "500"))
+
+SNES_INFO = """# Software Information
+display_name = "Nintendo - SNES / SFC (Snes9x - Current)"
+categories = "Emulator"
+supported_extensions = "smc|sfc|swc|fig|bs|st"
+systemname = "Super Nintendo Entertainment System"
+"""
+PSX_INFO = (
+    """display_name = "Sony - PlayStation (Beetle PSX)"
+categories = "Emulator"
+supported_extensions = "cue|toc|m3u|CCD|exe|pbp|chd"
+systemname = "PlayStation"
+firmware_count = "3"
+firmware0_desc = "scph5500.bin (PS1 JP BIOS)"
+firmware0_path = "scph5500.bin"
+firmware0_opt = "false"
+firmware1_desc = "scph5501.bin (PS1 US BIOS)"
+firmware1_path = "scph5501.bin"
+firmware1_opt = "false"
+firmware2_desc = "PSXONPSP660.bin (PSP PS1 BIOS)"
+firmware2_path = "psx/PSXONPSP660.bin"
+firmware2_opt = "true"
+notes = "(!) scph5500.bin (md5): 8dd7d5296a650fac7319bce665a6a53c|"""
+    """(!) scph5501.bin (md5): 490f666e1afb15b7362b406ed1cea246"
+"""
+)
+TOOL_INFO = """display_name = "Video Processor"
+categories = "Video"
+supported_extensions = "mkv|avi"
+"""
+
+
+class CoreInfoTestCase(TestCase):
+    def setUp(self):
+        self.tmp_dir = TemporaryDirectory()
+        self.addCleanup(self.tmp_dir.cleanup)
+        self.info_dir = os.path.join(self.tmp_dir.name, "info")
+        os.makedirs(self.info_dir)
+        self.cache_path = os.path.join(self.tmp_dir.name, "cache", "libretro-cores.json")
+
+    def write_info(self, core, content):
+        path = os.path.join(self.info_dir, "%s_libretro.info" % core)
+        with open(path, "w", encoding="utf-8") as info_file:
+            info_file.write(content)
+        return path
+
+
+class TestCoreInfoIndex(CoreInfoTestCase):
+    def setUp(self):
+        super().setUp()
+        self.write_info("snes9x", SNES_INFO)
+        self.write_info("mednafen_psx", PSX_INFO)
+        self.write_info("ffmpeg", TOOL_INFO)
+
+    def test_read_firmware(self):
+        record = read_core_info(os.path.join(self.info_dir, "mednafen_psx_libretro.info"))
+        assert record["core"] == "mednafen_psx"
+        assert record["is_emulator"]
+        assert record["extensions"] == ["cue", "toc", "m3u", "ccd", "exe", "pbp", "chd"]
+        assert [(f["name"], f["optional"], f["md5"]) for f in record["firmware"]] == [
+            ("scph5500.bin", False, "8dd7d5296a650fac7319bce665a6a53c"),
+            ("scph5501.bin", False, "490f666e1afb15b7362b406ed1cea246"),
+            ("PSXONPSP660.bin", True, None),
+        ]
+        assert record["firmware"][2]["path"] == "psx/PSXONPSP660.bin"
+
+    def test_lookups(self):
+        index = CoreInfoIndex(self.cache_path)
+        assert index.refresh(self.info_dir)
+        assert sorted(core["core"] for core in index.get_cores()) == ["ffmpeg", "mednafen_psx", "snes9x"]
+        assert index.get_core("snes9x")["systemname"] == "Super Nintendo Entertainment System"
+        assert not index.get_core("ffmpeg")["is_emulator"]
+        assert index.find_cores_for_extension(".CHD") == ["mednafen_psx"]
+        assert index.find_cores_for_extension("mkv") == ["ffmpeg"]
+        assert index.find_cores_requiring_firmware("scph5501.bin") == ["mednafen_psx"]
+        assert index.find_cores_requiring_firmware("PSXONPSP660.bin") == ["mednafen_psx"]
+        assert index.find_cores_requiring_firmware("bios.bin") == []
+
+    def test_only_changed_files_are_parsed(self):
+        assert CoreInfoIndex(self.cache_path).refresh(self.info_dir)
+        # A new instance, like on the next start, reads the records from the cache
+        index = CoreInfoIndex(self.cache_path)
+        with patch.object(core_info, "read_core_info", wraps=read_core_info) as read:
+            assert not index.refresh(self.info_dir)
+            read.assert_not_called()
+            assert index.get_core("snes9x")
+
+            # An updated core and a new one
+            self.write_info("snes9x", SNES_INFO + 'firmware_count = "1"\nfirmware0_path = "BS-X.bin"\n')
+            self.write_info("gambatte", SNES_INFO.replace("SNES", "Game Boy"))
+            os.remove(os.path.join(self.info_dir, "ffmpeg_libretro.info"))
+            assert index.refresh(self.info_dir)
+        assert sorted(os.path.basename(call.args[0]) for call in read.call_args_list) == [
+            "gambatte_libretro.info",
+            "snes9x_libretro.info",
+        ]
+        assert index.find_cores_requiring_firmware("BS-X.bin") == ["snes9x"]
+        assert index.get_core("ffmpeg") is None
+        assert index.find_cores_for_extension("mkv") == []
+
+    def test_get_file_reparses_a_changed_file(self):
+        index = CoreInfoIndex(self.cache_path)
+        index.refresh(self.info_dir)
+        path = self.write_info("snes9x", SNES_INFO.replace("Current", "2010"))
+        assert index.get_file(path)["display_name"] == "Nintendo - SNES / SFC (Snes9x - 2010)"
+        assert CoreInfoIndex(self.cache_path).get_core("snes9x")["display_name"].endswith("(Snes9x - 2010)")
+        assert index.get_file(os.path.join(self.info_dir, "missing_libretro.info")) is None
+
+    def test_unwritable_cache(self):
+        os.makedirs(self.cache_path)  # A folder where the cache file should be
+        index = CoreInfoIndex(self.cache_path)
+        with self.assertLogs(logger, "WARNING"):
+            assert index.refresh(self.info_dir)
+        assert index.get_core("snes9x")["systemname"] == "Super Nintendo Entertainment System"
+        path = self.write_info("snes9x", SNES_INFO.replace("Current", "2010"))
+        assert index.get_file(path)["display_name"] == "Nintendo - SNES / SFC (Snes9x - 2010)"
+
+
+class TestLibretroRunner(CoreInfoTestCase):
+    def test_platform_of_a_core_missing_from_the_index(self):
+        systemname = "Homebrew Console"
+        self.write_info("snes9x", SNES_INFO.replace("Super Nintendo Entertainment System", systemname))
+        for patcher in (
+            patch.object(libretro_runner, "RETROARCH_DIR", self.tmp_dir.name),
+            # Nothing was indexed yet, like on a fresh cache or after installing a core
+            patch.object(libretro_runner, "CORE_INFO_INDEX", CoreInfoIndex(self.cache_path)),
+            patch.object(libretro_runner, "get_libretro_cores", return_value=[("Snes9x", "snes9x", systemname)]),
+        ):
+            patcher.start()
+            self.addCleanup(patcher.stop)
+        runner = libretro_runner.libretro()
+        with patch.object(libretro_runner.libretro, "game_config", new_callable=PropertyMock) as game_config:
+            game_config.return_value = {"core": "snes9x"}
+            assert runner.get_platform() == systemname
+
+
+class TestCoreInfoBenchmark(CoreInfoTestCase):
+    def test_refresh_big_folder(self):
+        for index in range(BENCHMARK_CORES):
+            self.write_info("core%d" % index, PSX_INFO)
+        start = time.monotonic()
+        CoreInfoIndex(self.cache_path).refresh(self.info_dir)
+        first_refresh = time.monotonic() - start
+
+        start = time.monotonic()
+        index = CoreInfoIndex(self.cache_path)
+        with patch.object(core_info, "read_core_info") as read:
+            index.refresh(self.info_dir)
+        read.assert_not_called()
+        logger.info(
+            "Indexed %d core info files in %.3fs, refreshed them in %.3fs",
+            BENCHMARK_CORES,
+            first_refresh,
+            time.monotonic() - start,
+        )
+        assert len(index.find_cores_requiring_firmware("scph5500.bin")) == BENCHMARK_CORES
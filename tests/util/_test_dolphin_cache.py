@@ -0,0 +1,118 @@
+"""Tests for the reader of the Dolphin game cache, on generated cache files."""
+
+import os
+import struct
+from tempfile import TemporaryDirectory
+from unittest import TestCase
+from unittest.mock import patch
+
+from lutris.util.dolphin import cache_reader
+from lutris.util.dolphin.cache_reader import STRUCTURE_V24, DolphinCacheReader
+
+BANNER_PIXELS = [0x00FF0000, 0x0000FF00, 0x000000FF]
+
+
+def pack_string(value):
+    data = value.encode("utf8")
+    return struct.pack("<I", len(data)) + data
+
+
+def pack_entry(file_name, game_id, platform=0):
+    """Pack a game the way Dolphin writes it in its cache"""
+    entry = b""
+    for key, field_type in STRUCTURE_V24.items():
+        if key == "platform":
+            entry += bytes([platform])
+        elif field_type == "b":
+            entry += b"\x01"
+        elif isinstance(field_type, int):
+            entry += b"\x00" * field_type
+        elif key in ("file_path", "file_name"):
+            entry += pack_string(file_name if key == "file_name" else "/games/" + file_name)
+        elif key == "game_id":
+            entry += pack_string(game_id)
+        elif field_type == "s":
+            entry += pack_string("")
+        elif key == "long_names":
+            entry += struct.pack("<I", 1) + struct.pack("<I", 1) + pack_string("Long %s" % game_id)
+        elif field_type == "a":
+            entry += struct.pack("<I", 0)
+        elif key == "volume_banner":
+            entry += struct.pack("<I%dI" % len(BANNER_PIXELS), len(BANNER_PIXELS), *BANNER_PIXELS)
+            entry += struct.pack("<II", 3, 1)
+        elif field_type == "i":
+            entry += struct.pack("<IIII", 1, 0xFFFFFFFF, 1, 1)
+        elif key == "default_cover":
+            entry += pack_string("PNG data")
+        elif field_type == "c":
+            entry += struct.pack("<I", 0)
+    return entry
+
+
+class TestDolphinCacheReader(TestCase):
+    def setUp(self):
+        self.tmp_dir = TemporaryDirectory()
+        self.addCleanup(self.tmp_dir.cleanup)
+        self.cache_path = os.path.join(self.tmp_dir.name, "gamelist.cache")
+        patcher = patch.object(cache_reader, "_PARSED_CACHES", {})
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def write_cache(self, entries, version=24, tail=b""):
+        header = struct.pack("<I", version) + b"\x00" * 16
+        with open(self.cache_path, "wb") as cache_file:
+            cache_file.write(header + b"".join(entries) + tail)
+
+    def test_read_games(self):
+        self.write_cache([pack_entry("zelda.iso", "GZLE01"), pack_entry("mario.wbfs", "RMGE01", platform=1)])
+        games = DolphinCacheReader(self.cache_path).get_games()
+        assert [game["game_id"] for game in games] == ["GZLE01", "RMGE01"]
+        assert games[1]["file_path"] == "/games/mario.wbfs"
+        assert games[1]["platform"] == "01"
+        assert games[0]["valid"] is True
+        assert games[0]["long_names"] == {"01 00 00 00": "Long GZLE01"}
+        banner = games[0]["volume_banner"]
+        assert (banner.width, banner.height, banner.data) == (3, 1, None)
+        assert banner.read() == struct.pack("<3I", *BANNER_PIXELS)
+        assert games[0]["default_cover"].read() == pack_string("PNG data")[4:]
+        assert games[0]["custom_cover"].read() == b""
+
+    def test_load_images(self):
+        self.write_cache([pack_entry("zelda.iso", "GZLE01")])
+        games = DolphinCacheReader(self.cache_path).get_games(load_images=True)
+        assert games[0]["volume_banner"].data == struct.pack("<3I", *BANNER_PIXELS)
+        assert games[0]["custom_banner"].data == b"\xff\xff\xff\xff"
+
+    def test_unchanged_cache_is_not_parsed_again(self):
+        self.write_cache([pack_entry("zelda.iso", "GZLE01")])
+        games = DolphinCacheReader(self.cache_path).get_games()
+        with patch.object(DolphinCacheReader, "_read_games") as read_games:
+            assert DolphinCacheReader(self.cache_path).get_games() == games
+        read_games.assert_not_called()
+
+        self.write_cache([pack_entry("zelda.iso", "GZLE01"), pack_entry("mario.wbfs", "RMGE01")])
+        assert len(DolphinCacheReader(self.cache_path).get_games()) == 2
+
+    def test_corrupted_tails(self):
+        entries = [pack_entry("zelda.iso", "GZLE01"), pack_entry("mario.wbfs", "RMGE01")]
+        for tail in (entries[1][:10], entries[1][:-3], b"\xff" * 64, b"\x00"):
+            self.write_cache(entries[:1], tail=tail)
+            with self.assertLogs(cache_reader.logger, "ERROR"):
+                games = DolphinCacheReader(self.cache_path).get_games()
+            assert [game["game_id"] for game in games] == ["GZLE01"]
+
+    def test_other_versions(self):
+        self.write_cache([pack_entry("zelda.iso", "GZLE01")], version=23)
+        reader = DolphinCacheReader(self.cache_path)
+        with self.assertLogs(cache_reader.logger, "WARNING"):
+            games = reader.get_games()
+        assert reader.cache_version == 23
+        assert [game["game_id"] for game in games] == ["GZLE01"]
+
+    def test_empty_and_truncated_files(self):
+        self.write_cache([])
+        assert DolphinCacheReader(self.cache_path).get_games() == []
+        with open(self.cache_path, "wb") as cache_file:
+            cache_file.write(b"\x18\x00")
+        with self.assertLogs(cache_reader.logger, "ERROR"):
+            assert DolphinCacheReader(self.cache_path).get_games() == []
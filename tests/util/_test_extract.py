@@ -0,0 +1,248 @@
+"""Tests for the multi-threaded extraction engine."""
+
+import io
+import os
+import shutil
+import tarfile
+import time
+import zipfile
+from pathlib import Path
+from tempfile import TemporaryDirectory
+from unittest import TestCase
+from unittest.mock import patch
+
+from lutris.util import extract
+from lutris.util.log import logger
+
+# Raise this to benchmark against bigger archives, e.g. LUTRIS_EXTRACT_BENCHMARK_MEMBERS=5000
+BENCHMARK_MEMBERS = int(os.environ.get("LUTRIS_EXTRACT_BENCHMARK_MEMBERS", "400"))
+
+
+def make_member_data(index, size=64 * 1024):
+    """Return compressible but not trivial data, different for each member."""
+    line = ("member %06d: the quick brown fox jumps over the lazy dog\n" % index).encode()
+    return (line * (size // len(line) + 1))[:size]
+
+
+def make_zip(path, member_count, compression=zipfile.ZIP_DEFLATED):
+    with zipfile.ZipFile(path, "w", compression=compression) as archive:
+        for index in range(member_count):
+            info = zipfile.ZipInfo("game/data/%02d/file%05d.dat" % (index % 10, index))
+            info.compress_type = compression
+            info.external_attr = 0o644 << 16
+            archive.writestr(info, make_member_data(index))
+        script = zipfile.ZipInfo("game/start.sh")
+        script.external_attr = 0o755 << 16
+        archive.writestr(script, b"#!/bin/sh\n")
+
+
+def list_tree(path):
+    """Return a mapping of relative paths to file contents for a folder."""
+    tree = {}
+    for root, _dirs, files in os.walk(path):
+        for name in files:
+            file_path = os.path.join(root, name)
+            with open(file_path, "rb") as tree_file:
+                tree[os.path.relpath(file_path, path)] = tree_file.read()
+    return tree
+
+
+class TestGetExtractionThreads(TestCase):
+    @patch("lutris.util.extract.settings.read_setting", return_value="3")
+    def test_uses_setting(self, _read_setting):
+        assert extract.get_extraction_threads() == 3
+
+    @patch("lutris.util.extract.os.cpu_count", return_value=12)
+    @patch("lutris.util.extract.settings.read_setting", return_value="")
+    def test_defaults_to_cpu_count(self, _read_setting, _cpu_count):
+        assert extract.get_extraction_threads() == 12
+
+    @patch("lutris.util.extract.os.cpu_count", return_value=4)
+    @patch("lutris.util.extract.settings.read_setting", return_value="lots")
+    def test_ignores_invalid_setting(self, _read_setting, _cpu_count):
+        assert extract.get_extraction_threads() == 4
+
+
+class TestSplitZipMembers(TestCase):
+    def make_info(self, name, size):
+        info = zipfile.ZipInfo(name)
+        info.file_size = size
+        return info
+
+    def test_balances_batches_by_size(self):
+        members = [self.make_info("big", 100), self.make_info("a", 50), self.make_info("b", 50)]
+        batches = extract._split_zip_members(members, 2)
+        assert sorted(batches) == [["a", "b"], ["big"]]
+
+    def test_no_empty_batches(self):
+        members = [self.make_info("a", 1), self.make_info("b", 1)]
+        assert len(extract._split_zip_members(members, 8)) == 2
+
+    def test_keeps_every_member(self):
+        members = [self.make_info("file%d" % i, i * 7 % 13) for i in range(100)]
+        batches = extract._split_zip_members(members, 6)
+        assert sorted(name for batch in batches for name in batch) == sorted(m.filename for m in members)
+
+
+class TestZipMemberPath(TestCase):
+    def test_discards_unsafe_components(self):
+        assert extract._get_zip_member_path("/dest", "../../etc/passwd") == "/dest/etc/passwd"
+        assert extract._get_zip_member_path("/dest", "/abs/./file") == "/dest/abs/file"
+
+
+@patch("lutris.util.extract.get_extraction_threads", return_value=4)
+class TestParallelZipExtraction(TestCase):
+    def setUp(self):
+        self.tmp_dir = TemporaryDirectory()
+        self.tmp_path = Path(self.tmp_dir.name)
+        self.archive = str(self.tmp_path / "game.zip")
+        self.dest = str(self.tmp_path / "dest")
+
+    def tearDown(self):
+        self.tmp_dir.cleanup()
+
+    def test_matches_serial_extraction(self, _threads):
+        make_zip(self.archive, 100)
+        extract._extract_zip(self.archive, self.dest)
+        serial_dest = str(self.tmp_path / "serial")
+        with zipfile.ZipFile(self.archive) as archive:
+            archive.extractall(serial_dest)
+        assert list_tree(self.dest) == list_tree(serial_dest)
+
+    def test_restores_permissions(self, _threads):
+        make_zip(self.archive, 100)
+        extract._extract_zip(self.archive, self.dest)
+        assert os.access(os.path.join(self.dest, "game", "start.sh"), os.X_OK)
+        assert not os.access(os.path.join(self.dest, "game", "data", "00", "file00000.dat"), os.X_OK)
+
+    def test_extract_archive_merges_single_folder(self, _threads):
+        make_zip(self.archive, 100)
+        extract.extract_archive(self.archive, self.dest)
+        assert os.path.isfile(os.path.join(self.dest, "start.sh"))
+        assert len(os.listdir(os.path.join(self.dest, "data"))) == 10
+
+    @patch("lutris.util.extract._extract_7zip")
+    def test_small_archives_use_7zip(self, extract_7zip, _threads):
+        make_zip(self.archive, 3)
+        extract._extract_zip(self.archive, self.dest)
+        extract_7zip.assert_called_once_with(self.archive, self.dest)
+
+    @patch("lutris.util.extract._extract_7zip")
+    def test_single_thread_uses_7zip(self, extract_7zip, threads):
+        threads.return_value = 1
+        make_zip(self.archive, 100)
+        extract._extract_zip(self.archive, self.dest)
+        extract_7zip.assert_called_once()
+
+    @patch("lutris.util.extract._extract_7zip")
+    def test_symlinks_use_7zip(self, extract_7zip, _threads):
+        make_zip(self.archive, 100)
+        with zipfile.ZipFile(self.archive, "a") as archive:
+            link = zipfile.ZipInfo("game/link")
+            link.external_attr = 0o120777 << 16
+            archive.writestr(link, "start.sh")
+        extract._extract_zip(self.archive, self.dest)
+        extract_7zip.assert_called_once()
+
+    @patch("lutris.util.extract._extract_7zip")
+    def test_invalid_zip_uses_7zip(self, extract_7zip, _threads):
+        with open(self.archive, "wb") as archive:
+            archive.write(b"Rar!\x1a\x07\x00 not really a zip")
+        extract._extract_zip(self.archive, self.dest)
+        extract_7zip.assert_called_once()
+
+
+class TestParallelDecompressors(TestCase):
+    def setUp(self):
+        self.tmp_dir = TemporaryDirectory()
+        self.tmp_path = Path(self.tmp_dir.name)
+        self.dest = str(self.tmp_path / "dest")
+
+    def tearDown(self):
+        self.tmp_dir.cleanup()
+
+    def make_tar(self, path, mode):
+        with tarfile.open(path, mode) as archive:
+            for index in range(20):
+                data = make_member_data(index, size=10000)
+                info = tarfile.TarInfo("game/file%d.dat" % index)
+                info.size = len(data)
+                archive.addfile(info, io.BytesIO(data))
+
+    @patch("lutris.util.extract.get_extraction_threads", return_value=8)
+    @patch("lutris.util.extract.system.find_executable", side_effect=lambda name: "/usr/bin/" + name)
+    def test_builds_command(self, _find_executable, _threads):
+        assert extract._get_parallel_decompressor("txz") == ["/usr/bin/xz", "-dc", "-T8"]
+        assert extract._get_parallel_decompressor("tbz2") == ["/usr/bin/lbzip2", "-dc", "-n", "8"]
+        assert extract._get_parallel_decompressor("tar") is None
+        assert extract._get_parallel_decompressor(None) is None
+
+    @patch("lutris.util.extract.system.find_executable", side_effect=lambda name: None)
+    def test_no_decompressor_installed(self, _find_executable):
+        assert extract._get_parallel_decompressor("tgz") is None
+
+    def test_piped_tar(self):
+        gzip_path = shutil.which("gzip")
+        if not gzip_path:
+            self.skipTest("gzip is not installed")
+        archive = str(self.tmp_path / "game.tar.gz")
+        self.make_tar(archive, "w:gz")
+        extract._extract_piped_tar(archive, self.dest, [gzip_path, "-dc"])
+        assert len(os.listdir(os.path.join(self.dest, "game"))) == 20
+
+    def test_piped_tar_reports_decompressor_errors(self):
+        gzip_path = shutil.which("gzip")
+        if not gzip_path:
+            self.skipTest("gzip is not installed")
+        archive = str(self.tmp_path / "game.tar.gz")
+        with open(archive, "wb") as archive_file:
+            archive_file.write(b"\x1f\x8b not gzip data at all" * 100)
+        with self.assertRaises((extract.ExtractError, tarfile.TarError)):
+            extract._extract_piped_tar(archive, self.dest, [gzip_path, "-dc"])
+
+
+class TestExtract7zip(TestCase):
+    @patch("lutris.util.extract.get_extraction_threads", return_value=6)
+    @patch("lutris.util.extract._get_7zip_path", return_value="/usr/bin/7z")
+    @patch("lutris.util.extract.subprocess.call")
+    def test_passes_thread_count(self, call, _7zip_path, _threads):
+        extract._extract_7zip("/tmp/game.7z", "/tmp/dest")
+        assert "-mmt6" in call.call_args[0][0]
+
+
+class TestExtractionBenchmark(TestCase):
+    """Compare single threaded and parallel zip extraction on a synthetic archive.
+
+    The timings are logged rather than asserted, since they depend on the machine."""
+
+    def setUp(self):
+        self.tmp_dir = TemporaryDirectory()
+        self.tmp_path = Path(self.tmp_dir.name)
+        self.archive = str(self.tmp_path / "benchmark.zip")
+        make_zip(self.archive, BENCHMARK_MEMBERS)
+
+    def tearDown(self):
+        self.tmp_dir.cleanup()
+
+    def test_benchmark_zip(self):
+        serial_dest = str(self.tmp_path / "serial")
+        start = time.perf_counter()
+        with zipfile.ZipFile(self.archive) as archive:
+            archive.extractall(serial_dest)
+        serial_time = time.perf_counter() - start
+
+        threads = max(os.cpu_count() or 1, 2)
+        parallel_dest = str(self.tmp_path / "parallel")
+        with patch("lutris.util.extract.get_extraction_threads", return_value=threads):
+            start = time.perf_counter()
+            extract._extract_zip(self.archive, parallel_dest)
+            parallel_time = time.perf_counter() - start
+
+        logger.info(
+            "Extracting %d zip members: %.3fs serial, %.3fs with %d threads",
+            BENCHMARK_MEMBERS,
+            serial_time,
+            parallel_time,
+            threads,
+        )
+        assert list_tree(serial_dest) == list_tree(parallel_dest)
@@ -0,0 +1,138 @@
+"""Tests for the incremental BIOS / firmware index."""
+
+import hashlib
+import json
+import os
+from pathlib import Path
+from tempfile import TemporaryDirectory
+from unittest import TestCase
+from unittest.mock import patch
+
+from lutris.util import hash_cache
+from lutris.util.retroarch import firmware
+from lutris.util.retroarch.firmware import FirmwareIndex
+
+
+class FirmwareTestCase(TestCase):
+    def setUp(self):
+        self.tmp_dir = TemporaryDirectory()
+        self.tmp_path = Path(self.tmp_dir.name)
+        self.bios_path = self.tmp_path / "bios"
+        self.bios_path.mkdir()
+        self.cache_path = str(self.tmp_path / "cache" / "bios-files.json")
+        patcher = patch.object(
+            hash_cache, "FILE_HASH_CACHE", hash_cache.FileHashCache(str(self.tmp_path / "cache" / "file-hashes.db"))
+        )
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def tearDown(self):
+        self.tmp_dir.cleanup()
+
+    def write_bios(self, name, content):
+        path = self.bios_path / name
+        path.parent.mkdir(parents=True, exist_ok=True)
+        path.write_bytes(content)
+        return str(path)
+
+
+class TestFirmwareIndex(FirmwareTestCase):
+    def test_scan_indexes_files_by_md5(self):
+        path = self.write_bios("psx/scph5501.bin", b"playstation")
+        index = FirmwareIndex(self.cache_path)
+        assert index.scan(str(self.bios_path))
+        assert index.find(hashlib.md5(b"playstation").hexdigest()) == path
+        assert index.find("0" * 32) is None
+
+    def test_unchanged_files_are_not_rehashed(self):
+        self.write_bios("a.bin", b"a")
+        self.write_bios("b.bin", b"b")
+        FirmwareIndex(self.cache_path).scan(str(self.bios_path))
+
+        index = FirmwareIndex(self.cache_path)
+        with patch.object(hash_cache, "get_file_hashes", wraps=hash_cache.get_file_hashes) as get_file_hashes:
+            assert not index.scan(str(self.bios_path))
+            get_file_hashes.assert_not_called()
+        assert index.find(hashlib.md5(b"a").hexdigest())
+
+    def test_only_modified_files_are_rehashed(self):
+        self.write_bios("a.bin", b"a")
+        path = self.write_bios("b.bin", b"b")
+        index = FirmwareIndex(self.cache_path)
+        index.scan(str(self.bios_path))
+
+        self.write_bios("b.bin", b"bigger b")
+        with patch.object(hash_cache, "get_file_hashes", wraps=hash_cache.get_file_hashes) as get_file_hashes:
+            assert index.scan(str(self.bios_path))
+            get_file_hashes.assert_called_once()
+            assert list(get_file_hashes.call_args[0][0]) == [path]
+        assert index.find(hashlib.md5(b"bigger b").hexdigest()) == path
+        assert index.find(hashlib.md5(b"b").hexdigest()) is None
+
+    def test_removed_files_are_dropped(self):
+        path = self.write_bios("a.bin", b"a")
+        index = FirmwareIndex(self.cache_path)
+        index.scan(str(self.bios_path))
+        os.remove(path)
+        assert index.scan(str(self.bios_path))
+        assert index.files == {}
+
+    def test_find_ignores_files_changed_since_scan(self):
+        path = self.write_bios("a.bin", b"a")
+        index = FirmwareIndex(self.cache_path)
+        index.scan(str(self.bios_path))
+        self.write_bios("a.bin", b"not a anymore")
+        assert index.find(hashlib.md5(b"a").hexdigest()) is None
+        os.remove(path)
+        assert index.find(hashlib.md5(b"a").hexdigest()) is None
+
+    def test_legacy_cache_is_rebuilt(self):
+        os.makedirs(os.path.dirname(self.cache_path))
+        with open(self.cache_path, "w", encoding="utf-8") as cache_file:
+            json.dump([{"name": "/old/bios.bin", "md5_hash": "abc", "type": "file"}], cache_file)
+        self.write_bios("a.bin", b"a")
+        index = FirmwareIndex(self.cache_path)
+        assert index.find("abc") is None
+        index.scan(str(self.bios_path))
+        with open(self.cache_path, encoding="utf-8") as cache_file:
+            assert json.load(cache_file)["version"] == firmware.FIRMWARE_INDEX_VERSION
+
+    def test_changing_directory_replaces_index(self):
+        self.write_bios("a.bin", b"a")
+        other_path = self.tmp_path / "other"
+        other_path.mkdir()
+        (other_path / "c.bin").write_bytes(b"c")
+        index = FirmwareIndex(self.cache_path)
+        index.scan(str(self.bios_path))
+        assert index.scan(str(other_path))
+        assert index.find(hashlib.md5(b"a").hexdigest()) is None
+        assert index.find(hashlib.md5(b"c").hexdigest()) == str(other_path / "c.bin")
+
+
+class TestGetFirmware(FirmwareTestCase):
+    def setUp(self):
+        super().setUp()
+        self.index = FirmwareIndex(self.cache_path)
+        patcher = patch.object(firmware, "FIRMWARE_INDEX", self.index)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        self.system_path = str(self.tmp_path / "system")
+
+    def test_copies_matching_firmware(self):
+        self.write_bios("some/folder/renamed.bin", b"bios data")
+        firmware.scan_firmware_directory(str(self.bios_path))
+        firmware.get_firmware("scph5501.bin", hashlib.md5(b"bios data").hexdigest(), self.system_path)
+        with open(os.path.join(self.system_path, "scph5501.bin"), "rb") as copied:
+            assert copied.read() == b"bios data"
+
+    def test_missing_firmware(self):
+        firmware.scan_firmware_directory(str(self.bios_path))
+        firmware.get_firmware("scph5501.bin", "0" * 32, self.system_path)
+        assert not os.path.exists(os.path.join(self.system_path, "scph5501.bin"))
+
+    def test_rescans_when_indexed_file_moved(self):
+        self.write_bios("a.bin", b"bios data")
+        firmware.scan_firmware_directory(str(self.bios_path))
+        os.rename(self.bios_path / "a.bin", self.bios_path / "b.bin")
+        firmware.get_firmware("scph5501.bin", hashlib.md5(b"bios data").hexdigest(), self.system_path)
+        assert os.path.exists(os.path.join(self.system_path, "scph5501.bin"))
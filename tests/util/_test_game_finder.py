@@ -0,0 +1,133 @@
+"""Tests for the detection of game executables, on generated game folders."""
+
+import os
+import struct
+import time
+from tempfile import TemporaryDirectory
+from unittest import TestCase
+from unittest.mock import patch
+
+from lutris.util import game_finder
+from lutris.util.game_finder import (
+    SHORTCUT_MAGIC,
+    find_linux_game_executable,
+    find_windows_game_executable,
+    read_executable,
+)
+from lutris.util.log import logger
+
+# Raise this to benchmark against bigger folders, e.g. LUTRIS_GAME_FINDER_BENCHMARK_FILES=500000
+BENCHMARK_FILES = int(os.environ.get("LUTRIS_GAME_FINDER_BENCHMARK_FILES", "100000"))
+
+
+def make_elf(bits=64, machine=62, elf_type=2, appimage=False):
+    ident = b"\x7fELF" + bytes([2 if bits == 64 else 1, 1, 1, 0]) + (b"AI\x02" if appimage else b"\x00" * 3)
+    return ident.ljust(16, b"\x00") + struct.pack("<HH", elf_type, machine) + b"\x00" * 100
+
+
+def make_pe(machine=0x8664, subsystem=2, dll=False, pe_offset=0x80):
+    dos_header = b"MZ".ljust(0x3C, b"\x00") + struct.pack("<I", pe_offset)
+    characteristics = 0x2022 if dll else 0x22
+    pe_header = struct.pack("<4sHHIIIHH", b"PE\x00\x00", machine, 3, 0, 0, 0, 240, characteristics)
+    optional_header = struct.pack("<H66xH", 0x20B if machine == 0x8664 else 0x10B, subsystem)
+    return dos_header.ljust(pe_offset, b"\x00") + pe_header + optional_header + b"\x00" * 100
+
+
+class GameFinderTestCase(TestCase):
+    def setUp(self):
+        self.tmp_dir = TemporaryDirectory()
+        self.addCleanup(self.tmp_dir.cleanup)
+        self.game_dir = self.tmp_dir.name
+
+    def write_file(self, name, content):
+        path = os.path.join(self.game_dir, name)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        with open(path, "wb") as game_file:
+            game_file.write(content)
+        return path
+
+
+class TestReadExecutable(GameFinderTestCase):
+    def test_elf(self):
+        executable = read_executable(self.write_file("game.x86", make_elf(bits=32, machine=3)))
+        assert (executable.kind, executable.machine, executable.bits) == ("elf", "i386", 32)
+        assert read_executable(self.write_file("game.AppImage", make_elf(appimage=True))).kind == "appimage"
+        # Relocatable objects are not executables
+        assert read_executable(self.write_file("game.o", make_elf(elf_type=1))) is None
+
+    def test_pe(self):
+        executable = read_executable(self.write_file("game.exe", make_pe()))
+        assert (executable.kind, executable.machine, executable.bits, executable.gui) == ("pe", "x86-64", 64, True)
+        executable = read_executable(self.write_file("tool.exe", make_pe(machine=0x14C, subsystem=3)))
+        assert (executable.machine, executable.bits, executable.gui) == ("i386", 32, False)
+        # The PE header is past the first bytes that were read
+        assert read_executable(self.write_file("big.exe", make_pe(pe_offset=0x1000))).kind == "pe"
+        assert read_executable(self.write_file("game.bin", make_pe(dll=True))) is None
+        assert read_executable(self.write_file("dos.exe", b"MZ" + b"\x00" * 100)) is None
+
+    def test_scripts_and_shortcuts(self):
+        assert read_executable(self.write_file("start.sh", b"#!/bin/bash\nexec ./game\n")).machine == "bash"
+        assert read_executable(self.write_file("run", b"#!/usr/bin/env python3\n")).machine == "python3"
+        assert read_executable(self.write_file("Game.lnk", SHORTCUT_MAGIC + b"\x00" * 50)).kind == "link"
+        assert read_executable(self.write_file("readme", b"Hello")) is None
+
+
+class TestFindExecutables(GameFinderTestCase):
+    def test_find_linux_executable(self):
+        self.write_file("data/game.x86_64", make_elf())
+        self.write_file("game.x86", make_elf(bits=32, machine=3))
+        self.write_file("game.x86_64", make_elf())
+        self.write_file("libsteam_api.so", make_elf(elf_type=3))
+        self.write_file("uninstall", make_elf())
+        assert find_linux_game_executable(self.game_dir) == os.path.join(self.game_dir, "game.x86_64")
+
+        self.write_file("start.sh", b"#!/bin/sh\n./game.x86_64\n")
+        assert find_linux_game_executable(self.game_dir, make_executable=True).endswith("start.sh")
+        assert os.access(os.path.join(self.game_dir, "game.x86"), os.X_OK)
+        assert not os.access(os.path.join(self.game_dir, "data/game.x86_64"), os.X_OK)
+
+    def test_shallowest_directory_wins(self):
+        self.write_file("game/bin/x86_64/game", make_elf())
+        self.write_file("game/lib/helper", make_elf())
+        self.write_file("game/sounds/tool", make_elf())
+        assert find_linux_game_executable(self.game_dir) == os.path.join(self.game_dir, "game/bin/x86_64/game")
+        with self.assertLogs(logger, "ERROR"):
+            assert find_linux_game_executable(os.path.join(self.game_dir, "game/sounds/missing")) == ""
+
+    def test_ranking_by_name_and_size(self):
+        self.write_file("server.x86_64", make_elf() + b"\x00" * 5000)
+        self.write_file("blob", make_elf())
+        self.write_file("game", make_elf() + b"\x00" * 1000)
+        assert find_linux_game_executable(self.game_dir).endswith("/game")
+
+    def test_find_windows_executable(self):
+        self.write_file("drive_c/windows/notepad.exe", make_pe())
+        self.write_file("drive_c/Game/unins000.exe", make_pe())
+        self.write_file("drive_c/Game/steam_api64.dll", make_pe(dll=True))
+        self.write_file("drive_c/Game/console.exe", make_pe(subsystem=3))
+        self.write_file("drive_c/Game/Game32.exe", make_pe(machine=0x14C))
+        assert find_windows_game_executable(self.game_dir).endswith("Game32.exe")
+        self.write_file("drive_c/Game/Game64.exe", make_pe())
+        assert find_windows_game_executable(self.game_dir).endswith("Game64.exe")
+        self.write_file("drive_c/Game/Game.lnk", SHORTCUT_MAGIC + b"\x00" * 50)
+        assert find_windows_game_executable(self.game_dir).endswith("Game.lnk")
+
+    def test_assets_are_not_opened(self):
+        self.write_file("textures.pak", make_elf())
+        self.write_file("music.ogg", b"OggS" + b"\x00" * 100)
+        self.write_file("game", make_elf())
+        with patch.object(game_finder, "read_executable", wraps=read_executable) as read:
+            assert find_linux_game_executable(self.game_dir).endswith("/game")
+        read.assert_called_once()
+
+
+class TestGameFinderBenchmark(GameFinderTestCase):
+    def test_find_in_big_folder(self):
+        # Assets spread in nested folders, the game binary in the deepest one
+        for index in range(BENCHMARK_FILES):
+            extension = (".png", ".ogg", ".dat", "", ".bin")[index % 5]
+            self.write_file("data/%d/%d/asset%d%s" % (index % 10, index % 100, index, extension), b"\x00" * 16)
+        self.write_file("data/9/99/game.x86_64", make_elf())
+        start = time.monotonic()
+        assert find_linux_game_executable(self.game_dir).endswith("game.x86_64")
+        logger.info("Searched a folder of %s files in %.2fs", BENCHMARK_FILES, time.monotonic() - start)
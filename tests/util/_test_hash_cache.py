@@ -0,0 +1,144 @@
+"""Tests for the persistent file hash cache."""
+
+import hashlib
+import os
+from pathlib import Path
+from tempfile import TemporaryDirectory
+from unittest import TestCase
+from unittest.mock import patch
+
+from lutris.util import hash_cache, system
+from lutris.util.hash_cache import FileHashCache, compute_file_hashes
+
+
+class HashCacheTestCase(TestCase):
+    def setUp(self):
+        self.tmp_dir = TemporaryDirectory()
+        self.tmp_path = Path(self.tmp_dir.name)
+        self.db_path = str(self.tmp_path / "cache" / "file-hashes.db")
+        self.cache = FileHashCache(self.db_path)
+
+    def tearDown(self):
+        self.tmp_dir.cleanup()
+
+    def write_file(self, name, content):
+        path = self.tmp_path / name
+        path.write_bytes(content)
+        return str(path)
+
+
+class TestComputeFileHashes(HashCacheTestCase):
+    def test_several_hash_types_in_one_pass(self):
+        content = os.urandom(hash_cache.READ_BUFFER_SIZE * 2 + 123)
+        path = self.write_file("data.bin", content)
+        assert compute_file_hashes(path, ["md5", "sha1", "sha256"]) == {
+            "md5": hashlib.md5(content).hexdigest(),
+            "sha1": hashlib.sha1(content).hexdigest(),
+            "sha256": hashlib.sha256(content).hexdigest(),
+        }
+
+    def test_empty_file(self):
+        path = self.write_file("empty.bin", b"")
+        assert compute_file_hashes(path, ["md5"]) == {"md5": hashlib.md5(b"").hexdigest()}
+
+
+class TestFileHashCache(HashCacheTestCase):
+    def test_get_hash(self):
+        path = self.write_file("rom.bin", b"rom")
+        assert self.cache.get_hash(path) == hashlib.md5(b"rom").hexdigest()
+        assert self.cache.get_hash(path, "sha1") == hashlib.sha1(b"rom").hexdigest()
+
+    def test_unchanged_files_are_not_read_again(self):
+        path = self.write_file("rom.bin", b"rom")
+        self.cache.get_hash(path)
+        cache = FileHashCache(self.db_path)
+        with patch("lutris.util.hash_cache.compute_file_hashes") as compute:
+            assert cache.get_hash(path) == hashlib.md5(b"rom").hexdigest()
+            compute.assert_not_called()
+        assert cache.stats.hits == 1
+        assert cache.stats.misses == 0
+
+    def test_modified_files_are_hashed_again(self):
+        path = self.write_file("rom.bin", b"rom")
+        self.cache.get_hash(path)
+        self.write_file("rom.bin", b"patched rom")
+        assert self.cache.get_hash(path) == hashlib.md5(b"patched rom").hexdigest()
+        assert self.cache.stats.misses == 2
+
+    def test_digest_types_are_cached_separately(self):
+        path = self.write_file("rom.bin", b"rom")
+        self.cache.get_hash(path, "md5")
+        assert self.cache.get_hash(path, "sha1") == hashlib.sha1(b"rom").hexdigest()
+        assert self.cache.stats.hits == 0
+
+    def test_missing_file_raises(self):
+        with self.assertRaises(OSError):
+            self.cache.get_hash(str(self.tmp_path / "missing.bin"))
+
+    def test_invalid_hash_type_raises(self):
+        path = self.write_file("rom.bin", b"rom")
+        with self.assertRaises(ValueError):
+            self.cache.get_hash(path, "not-a-hash")
+
+    def test_get_hashes(self):
+        contents = {"rom%d.bin" % index: os.urandom(1000 + index) for index in range(20)}
+        paths = {self.write_file(name, content): content for name, content in contents.items()}
+        missing = str(self.tmp_path / "missing.bin")
+        digests = self.cache.get_hashes(list(paths) + [missing])
+        assert digests == {path: hashlib.md5(content).hexdigest() for path, content in paths.items()}
+
+        self.write_file("rom0.bin", b"changed")
+        digests = self.cache.get_hashes(paths)
+        assert digests[str(self.tmp_path / "rom0.bin")] == hashlib.md5(b"changed").hexdigest()
+        assert self.cache.stats.hits == 19
+        assert self.cache.stats.misses == 21
+        assert round(self.cache.stats.hit_rate, 3) == round(19 / 40, 3)
+
+    def test_store_hash(self):
+        path = self.write_file("game.tar.gz", b"archive")
+        self.cache.store_hash(path, "sha256", "precomputed")
+        assert self.cache.get_hash(path, "sha256") == "precomputed"
+
+    def test_prune(self):
+        kept = self.write_file("kept.bin", b"kept")
+        modified = self.write_file("modified.bin", b"modified")
+        deleted = self.write_file("deleted.bin", b"deleted")
+        self.cache.get_hashes([kept, modified, deleted])
+        self.write_file("modified.bin", b"modified again")
+        os.remove(deleted)
+        assert self.cache.prune() == 2
+        assert self.cache.prune() == 0
+
+    def test_unusable_database(self):
+        os.makedirs(self.db_path)  # A folder where the database should be
+        path = self.write_file("rom.bin", b"rom")
+        assert self.cache.get_hash(path) == hashlib.md5(b"rom").hexdigest()
+        assert self.cache.get_hashes([path]) == {path: hashlib.md5(b"rom").hexdigest()}
+
+    def test_busy_database(self):
+        path = self.write_file("rom.bin", b"rom")
+        with patch.object(hash_cache.sql, "db_cursor", side_effect=RuntimeError("Database is busy")):
+            assert self.cache.get_hash(path) == hashlib.md5(b"rom").hexdigest()
+            assert self.cache.get_hashes([path]) == {path: hashlib.md5(b"rom").hexdigest()}
+            assert self.cache.prune() == 0
+
+
+class TestSystemHelpers(HashCacheTestCase):
+    def setUp(self):
+        super().setUp()
+        patcher = patch.object(hash_cache, "FILE_HASH_CACHE", self.cache)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def test_get_md5_hash_uses_cache(self):
+        path = self.write_file("rom.bin", b"rom")
+        assert system.get_md5_hash(path) == hashlib.md5(b"rom").hexdigest()
+        assert system.get_md5_hash(path) == hashlib.md5(b"rom").hexdigest()
+        assert self.cache.stats.hits == 1
+
+    def test_get_md5_hash_of_missing_file(self):
+        assert system.get_md5_hash(str(self.tmp_path / "missing.bin")) is False
+
+    def test_get_file_checksum(self):
+        path = self.write_file("rom.bin", b"rom")
+        assert system.get_file_checksum(path, "sha1") == hashlib.sha1(b"rom").hexdigest()
@@ -0,0 +1,200 @@
+"""Tests for the concurrent fetching of paginated resources."""
+
+import threading
+import time
+from tempfile import TemporaryDirectory
+from unittest import TestCase
+from unittest.mock import patch
+
+from lutris import api
+from lutris.services import base
+from lutris.services.base import ServiceLibraryCache
+from lutris.services.gog import GOGService
+from lutris.util import http
+from lutris.util.http import HTTPError, fetch_concurrently, fetch_pages, fetch_with_retry
+from lutris.util.log import logger
+
+
+class HTTPTestCase(TestCase):
+    def setUp(self):
+        patcher = patch.object(http, "RETRY_DELAY", 0)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+
+class TestFetchPages(HTTPTestCase):
+    def test_pages_in_order(self):
+        def fetch_page(page):
+            time.sleep(0.01 * (5 - page))
+            return {"page": page, "total": 5}
+
+        pages = fetch_pages(fetch_page, lambda response: response["total"])
+        assert [response["page"] for response in pages] == [1, 2, 3, 4, 5]
+
+    def test_bounded_concurrency(self):
+        running = []
+        peak = []
+        lock = threading.Lock()
+
+        def fetch_page(page):
+            with lock:
+                running.append(page)
+                peak.append(len(running))
+            time.sleep(0.01)
+            with lock:
+                running.remove(page)
+            return 12
+
+        assert len(fetch_pages(fetch_page, lambda count: count, max_workers=3)) == 12
+        assert max(peak) == 3
+
+    def test_first_page_and_single_page(self):
+        assert fetch_pages(lambda page: page, lambda _response: 0, first_page=0) == [0]
+        assert fetch_pages(lambda page: page, lambda _response: 1) == [1]
+        assert fetch_pages(lambda page: page, lambda _response: 3, first_page=0) == [0, 1, 2]
+
+    def test_retry(self):
+        attempts = []
+
+        def fetch_page(page):
+            attempts.append(page)
+            if attempts.count(page) < 2:
+                raise HTTPError("Too many requests", code=429)
+            return page
+
+        assert fetch_pages(fetch_page, lambda _response: 3) == [1, 2, 3]
+        assert sorted(attempts) == [1, 1, 2, 2, 3, 3]
+
+    def test_errors(self):
+        def fetch_page(page):
+            if page == 2:
+                raise HTTPError("Not found", code=404)
+            return page
+
+        with self.assertRaises(HTTPError):
+            fetch_pages(fetch_page, lambda _response: 3)
+        assert fetch_pages(fetch_page, lambda _response: 3, on_error=lambda page, _ex: -page) == [1, -2, 3]
+
+    def test_fetch_with_retry_gives_up(self):
+        attempts = []
+
+        def fetch(item):
+            attempts.append(item)
+            raise HTTPError("Server error", code=503)
+
+        with self.assertRaises(HTTPError):
+            fetch_with_retry(fetch, "a", retries=2)
+        assert attempts == ["a", "a", "a"]
+
+    def test_fetch_concurrently(self):
+        assert fetch_concurrently(lambda item: item * 2, range(10)) == [item * 2 for item in range(10)]
+        assert fetch_concurrently(lambda item: item, []) == []
+
+
+class TestGOGLibrary(HTTPTestCase):
+    def setUp(self):
+        super().setUp()
+        self.service = GOGService()
+        tmp_dir = TemporaryDirectory()
+        self.addCleanup(tmp_dir.cleanup)
+        for patcher in (
+            patch.object(GOGService, "is_authenticated", return_value=True),
+            patch.object(GOGService, "make_request", side_effect=self.make_request),
+            patch.object(
+                GOGService,
+                "make_conditional_request",
+                side_effect=lambda url, _headers: (self.make_request(url), []),
+            ),
+            patch.object(base, "LIBRARY_CACHE_DIR", tmp_dir.name),
+            patch.object(ServiceLibraryCache, "_caches", {}),
+        ):
+            patcher.start()
+            self.addCleanup(patcher.stop)
+
+    @staticmethod
+    def make_request(url):
+        if url.startswith("https://api.gog.com/v2/games/"):
+            product_id = int(url.rsplit("/", 1)[1])
+            if product_id == 4:
+                raise HTTPError("Not found", code=404)
+            return {"_embedded": {"supportedOperatingSystems": [{"operatingSystem": {"name": "linux"}}]}}
+        page = int(url.split("page=")[1].split("&")[0])
+        products = [
+            {"id": page * 2 - 1, "worksOn": {"Windows": True}},
+            {"id": page * 2, "worksOn": {}},
+        ]
+        return {"totalPages": 3, "products": products}
+
+    def test_get_library(self):
+        games = self.service.get_library()
+        assert [game["id"] for game in games] == [1, 2, 3, 4, 5, 6]
+        assert games[1]["worksOn"] == {"Linux": True}
+        assert games[3]["worksOn"] == {"Windows": True}
+        assert self.service.get_library() == games
+
+
+class TestApiGames(HTTPTestCase):
+    def test_get_api_games(self):
+        def get_game_api_page(game_slugs, page=1, raise_errors=False):
+            results = [{"slug": slug} for slug in game_slugs[(page - 1) * 2 : page * 2]]
+            return {"count": len(game_slugs), "next": "?page=%s" % (page + 1) if page < 3 else None, "results": results}
+
+        with patch.object(api, "get_game_api_page", side_effect=get_game_api_page) as get_page:
+            games = api.get_api_games(["a", "b", "c", "d", "e"])
+        assert [game["slug"] for game in games] == ["a", "b", "c", "d", "e"]
+        assert get_page.call_count == 3
+
+        with patch.object(api, "get_game_api_page", side_effect=get_game_api_page) as get_page:
+            games = api.get_api_games(["a", "b", "c", "d", "e"], page=2)
+        assert [game["slug"] for game in games] == ["c", "d", "e"]
+        assert [call.kwargs["page"] for call in get_page.call_args_list] == [2, 3]
+
+    def test_failed_pages(self):
+        def get_game_service_api_page(_service, appids, page=1, raise_errors=False):
+            if page == 2:
+                raise HTTPError("Unable to connect to server")
+            return {"count": 6, "next": "?page=2", "results": [{"appid": appid} for appid in appids[:2]]}
+
+        with patch.object(api, "get_game_service_api_page", side_effect=get_game_service_api_page):
+            assert len(api.get_api_games(["1", "2"], service="gog")) == 4
+        with patch.object(api, "get_game_api_page", side_effect=HTTPError("Service unavailable", code=503)):
+            assert api.get_api_games(["a"]) == []
+
+    def test_client_errors_are_not_retried(self):
+        class Request:
+            posts = []
+
+            def __init__(self, url, headers=None):
+                self.status_code = None
+
+            def post(self, data=None):
+                self.posts.append(data)
+                self.status_code = 400
+
+        with patch.object(http, "Request", Request):
+            assert api.get_api_games(["a"]) == []
+            assert len(Request.posts) == 1
+            with self.assertRaises(HTTPError) as error:
+                api.get_game_api_page(["a"], raise_errors=True)
+            assert error.exception.code == 400
+            with self.assertLogs(logger, "ERROR"):
+                assert api.get_game_api_page(["a"]) is None
+
+
+class TestFetchPagesBenchmark(HTTPTestCase):
+    """Compare fetching 20 pages one after the other and concurrently, with a simulated
+    latency of 20ms per request. The timings are logged rather than asserted."""
+
+    def test_benchmark(self):
+        def fetch_page(page):
+            time.sleep(0.02)
+            return page
+
+        timings = {}
+        start = time.perf_counter()
+        assert [fetch_page(page) for page in range(1, 21)] == list(range(1, 21))
+        timings["sequential"] = time.perf_counter() - start
+        start = time.perf_counter()
+        assert fetch_pages(fetch_page, lambda _response: 20) == list(range(1, 21))
+        timings["concurrent"] = time.perf_counter() - start
+        logger.info("Fetching 20 pages: %s", ", ".join("%s %.3fs" % (name, timing) for name, timing in timings.items()))
@@ -0,0 +1,105 @@
+"""Tests for the pool of worker threads running AsyncCalls."""
+
+import threading
+import time
+from unittest import TestCase
+from unittest.mock import Mock, patch
+
+from lutris.util import jobs
+from lutris.util.jobs import AsyncCall, JobPool, Priority
+
+
+class JobPoolTestCase(TestCase):
+    def setUp(self):
+        self.pool = JobPool({Priority.INTERACTIVE: 2, Priority.BACKGROUND: 1, Priority.BULK_IO: 1}, idle_timeout=1)
+        self.release = threading.Event()
+        self.addCleanup(self.release.set)
+        for patcher in (
+            patch.object(jobs, "JOB_POOL", self.pool),
+            patch.object(jobs, "schedule_at_idle", side_effect=lambda func, *args: func(*args)),
+        ):
+            patcher.start()
+            self.addCleanup(patcher.stop)
+
+    def blocking_call(self, priority, result=None, callback=None):
+        return AsyncCall(lambda: self.release.wait(5) and result, callback, priority=priority)
+
+    def wait_for_workers(self, running):
+        """Wait until the workers picked up this many jobs"""
+        deadline = time.monotonic() + 5
+        while sum(stats["running"] for stats in self.pool.get_stats()["classes"].values()) < running:
+            assert time.monotonic() < deadline
+            time.sleep(0.01)
+
+
+class TestJobPool(JobPoolTestCase):
+    def test_callback_receives_result_and_error(self):
+        callback = Mock()
+        call = AsyncCall(lambda value: value * 2, callback, 21)
+        assert call.join(5)
+        callback.assert_called_once_with(42, None)
+
+        error = ValueError("oops")
+
+        def fail():
+            raise error
+
+        call = AsyncCall(fail, callback)
+        assert call.join(5)
+        callback.assert_called_with(None, error)
+
+    def test_classes_are_limited(self):
+        calls = [self.blocking_call(Priority.BACKGROUND) for _index in range(3)]
+        calls += [self.blocking_call(Priority.INTERACTIVE) for _index in range(3)]
+        self.wait_for_workers(3)
+        stats = self.pool.get_stats()["classes"]
+        assert stats["background"] == {"queued": 2, "running": 1, "limit": 1}
+        assert stats["interactive"] == {"queued": 1, "running": 2, "limit": 2}
+        self.release.set()
+        for call in calls:
+            assert call.join(5)
+        stats = self.pool.get_stats()
+        assert stats["completed"] == 6
+        assert stats["max_queue_depth"] >= 3
+
+    def test_higher_priorities_go_first(self):
+        pool = JobPool(dict.fromkeys(Priority, 1))
+        calls = {priority: Mock(priority=priority) for priority in reversed(Priority)}
+        for call in calls.values():
+            pool._queues[call.priority].append(call)
+        # The interactive class is full, so the next job is from the background one
+        pool._running[Priority.INTERACTIVE] = 1
+        assert pool._next_call() is calls[Priority.BACKGROUND]
+        assert pool._next_call() is calls[Priority.BULK_IO]
+        assert pool._next_call() is None
+        pool._running[Priority.INTERACTIVE] = 0
+        assert pool._next_call() is calls[Priority.INTERACTIVE]
+
+    def test_cancel_queued_call(self):
+        running = self.blocking_call(Priority.BULK_IO)
+        self.wait_for_workers(1)
+        callback = Mock()
+        queued = self.blocking_call(Priority.BULK_IO, callback=callback)
+        assert queued.cancel()
+        assert not queued.is_alive()
+        assert not running.cancel()
+        assert running.stop_request.is_set()
+        self.release.set()
+        assert running.join(5)
+        callback.assert_not_called()
+        assert self.pool.get_stats()["cancelled"] == 1
+
+    def test_nested_calls_do_not_wait_for_their_parent(self):
+        def parent():
+            child = AsyncCall(lambda: "child", None, priority=Priority.BACKGROUND)
+            return child.join(5)
+
+        callback = Mock()
+        assert AsyncCall(parent, callback, priority=Priority.BACKGROUND).join(5)
+        callback.assert_called_once_with(True, None)
+        assert self.pool.get_stats()["overflowed"] == 1
+
+    def test_workers_are_reused(self):
+        for _index in range(10):
+            assert AsyncCall(lambda: None, None).join(5)
+        assert self.pool.get_stats()["workers"] == 1
@@ -0,0 +1,194 @@
+"""Tests for the sync of the library with lutris.net, against a local stand-in of its API."""
+
+import json
+import os
+import threading
+import time
+import unittest
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from unittest.mock import patch
+
+from lutris import settings
+from lutris.database import categories as categories_db
+from lutris.database import games as games_db
+from lutris.database import schema, sql
+from lutris.util import library_sync
+from lutris.util.library_sync import LibrarySyncer
+from lutris.util.log import logger
+
+# Raise this to benchmark against bigger libraries, e.g. LUTRIS_LIBRARY_SYNC_BENCHMARK_GAMES=50000
+BENCHMARK_GAMES = int(os.environ.get("LUTRIS_LIBRARY_SYNC_BENCHMARK_GAMES", "20000"))
+
+
+class LibraryServer(ThreadingHTTPServer):
+    """Answers library syncs with the remote games, remembering the games it was sent"""
+
+    def __init__(self):
+        self.received = []
+        self.remote_games = []
+        server = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_POST(self):
+                server.received.append(json.loads(self.rfile.read(int(self.headers["Content-Length"]))))
+                content = json.dumps(server.remote_games).encode()
+                self.send_response(200)
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(content)))
+                self.end_headers()
+                self.wfile.write(content)
+
+            def log_message(self, *args):
+                pass
+
+        super().__init__(("127.0.0.1", 0), Handler)
+
+
+def make_remote_game(slug, playtime=1.0, lastplayed=100, categories=()):
+    return {
+        "name": slug.title(),
+        "slug": slug,
+        "runner": "linux",
+        "platform": "Linux",
+        "playtime": playtime,
+        "lastplayed": lastplayed,
+        "service": "",
+        "service_id": "",
+        "categories": list(categories),
+    }
+
+
+class LibrarySyncTestCase(unittest.TestCase):
+    def setUp(self):
+        if os.path.exists(settings.DB_PATH):
+            os.remove(settings.DB_PATH)
+        schema.syncdb()
+        self.settings = {}
+        self.server = LibraryServer()
+        threading.Thread(target=self.server.serve_forever, daemon=True).start()
+        self.addCleanup(self.server.server_close)
+        self.addCleanup(self.server.shutdown)
+        url = "http://127.0.0.1:%s/api/users/library" % self.server.server_address[1]
+        for patcher in (
+            patch.object(library_sync, "LIBRARY_URL", url),
+            patch.object(library_sync, "read_api_key", return_value={"token": "token"}),
+            patch.object(settings, "read_setting", side_effect=lambda key, *args, **kwargs: self.settings.get(key)),
+            patch.object(settings, "write_setting", side_effect=self.settings.__setitem__),
+        ):
+            patcher.start()
+            self.addCleanup(patcher.stop)
+
+    def add_game(self, slug, **fields):
+        return games_db.add_game(name=slug.title(), slug=slug, runner="linux", platform="Linux", **fields)
+
+    def sync(self, force=False):
+        self.server.received.clear()
+        LibrarySyncer().sync_local_library(force=force)
+        assert len(self.server.received) == 1
+        return sorted(game["slug"] for game in self.server.received[0])
+
+    def get_game(self, slug):
+        return games_db.get_games_by_slug(slug)[0]
+
+
+class TestLibrarySync(LibrarySyncTestCase):
+    def test_only_changed_games_are_sent(self):
+        self.add_game("quake")
+        doom_id = self.add_game("doom")
+        assert self.sync() == ["doom", "quake"]
+        assert self.sync() == []
+
+        sql.db_update(settings.DB_PATH, "games", {"playtime": 2.5}, {"id": doom_id})
+        assert self.sync() == ["doom"]
+        # Writing the same values again is not a change
+        sql.db_update(settings.DB_PATH, "games", {"playtime": 2.5, "directory": "/games"}, {"id": doom_id})
+        category_id = categories_db.add_category("shooters", no_signal=True)
+        categories_db.add_game_to_category(doom_id, category_id, no_signal=True)
+        sent = self.sync()
+        assert sent == ["doom"]
+        assert self.server.received[0][0]["categories"] == ["shooters"]
+        assert self.sync(force=True) == ["doom", "quake"]
+
+    def test_failed_sync_keeps_the_journal(self):
+        self.add_game("quake")
+        with patch.object(library_sync.http.Request, "post", side_effect=library_sync.http.HTTPError("down")):
+            LibrarySyncer().sync_local_library()
+        assert self.sync() == ["quake"]
+
+    def test_journal_ids_are_not_reused(self):
+        doom_id = self.add_game("doom")
+        quake_id = self.add_game("quake")
+        self.sync()
+        sql.db_update(settings.DB_PATH, "games", {"playtime": 1.0}, {"id": quake_id})
+        # A sync starts, then the game with the last journal entry is deleted and another one changes
+        last_entry_id, _games = games_db.get_library_journal()
+        games_db.delete_game(quake_id)
+        sql.db_update(settings.DB_PATH, "games", {"playtime": 2.0}, {"id": doom_id})
+        games_db.clear_library_journal(last_entry_id)
+        assert self.sync() == ["doom"]
+
+    def test_remote_changes_are_applied(self):
+        doom_id = self.add_game("doom", playtime=3.0, lastplayed=50)
+        quake_id = self.add_game("quake")
+        category_id = categories_db.add_category("old", no_signal=True)
+        categories_db.add_game_to_category(quake_id, category_id, no_signal=True)
+        self.sync()
+
+        self.server.remote_games = [
+            make_remote_game("doom", playtime=1.0, lastplayed=200, categories=["shooters"]),
+            make_remote_game("quake", categories=["shooters", "favorite"]),
+            make_remote_game("heretic", playtime=4.0, categories=["shooters"]),
+        ]
+        with patch.object(library_sync.LOCAL_LIBRARY_UPDATED, "fire") as fire:
+            self.sync()
+        fire.assert_called_once()
+        doom = self.get_game("doom")
+        assert (doom["playtime"], doom["lastplayed"]) == (3.0, 200)
+        assert self.get_game("heretic")["installed"] == 0
+        assert categories_db.get_categories_in_game(doom_id) == ["shooters"]
+        assert sorted(categories_db.get_categories_in_game(quake_id)) == ["favorite", "shooters"]
+        assert categories_db.get_categories_in_game(self.get_game("heretic")["id"]) == ["shooters"]
+        # What came from the server is not sent back
+        assert self.sync() == []
+
+    def test_duplicates_are_not_synced(self):
+        self.add_game("doom")
+        self.add_game("doom")
+        self.sync()
+        self.server.remote_games = [make_remote_game("doom", playtime=10.0)]
+        self.sync()
+        assert [game["playtime"] for game in games_db.get_games_by_slug("doom")] == [None, None]
+
+    def test_existing_games_are_journaled_on_upgrade(self):
+        self.add_game("doom")
+        self.sync()
+        with sql.db_cursor(settings.DB_PATH) as cursor:
+            cursor.execute("DROP TABLE library_journal")
+        schema.syncdb()
+        assert self.sync() == ["doom"]
+
+
+class TestLibrarySyncBenchmark(LibrarySyncTestCase):
+    def test_sync_big_library(self):
+        with sql.db_cursor(settings.DB_PATH) as cursor:
+            cursor.executemany(
+                "INSERT INTO games (name, slug, runner, platform, playtime, lastplayed) VALUES (?, ?, ?, ?, ?, ?)",
+                [
+                    ("Game %s" % index, "game-%s" % index, "linux", "Linux", 1.0, 100)
+                    for index in range(BENCHMARK_GAMES)
+                ],
+            )
+        self.sync()
+        self.server.remote_games = [
+            make_remote_game("game-%s" % index, playtime=2.0 if index % 100 == 0 else 1.0)
+            for index in range(BENCHMARK_GAMES)
+        ]
+        start = time.monotonic()
+        assert self.sync() == []
+        logger.info("Synced a library of %s games in %.2fs", BENCHMARK_GAMES, time.monotonic() - start)
+        assert self.get_game("game-100")["playtime"] == 2.0
+        assert self.get_game("game-101")["playtime"] == 1.0
+
+        self.server.remote_games = []
+        sql.db_update(settings.DB_PATH, "games", {"lastplayed": 200}, {"slug": "game-5"})
+        assert self.sync() == ["game-5"]
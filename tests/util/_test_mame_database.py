@@ -0,0 +1,151 @@
+"""Tests for the database of MAME machines, built from generated -listxml output."""
+
+import os
+import time
+import tracemalloc
+from tempfile import TemporaryDirectory
+from unittest import TestCase
+from unittest.mock import patch
+
+from lutris.util.log import logger
+from lutris.util.mame import database
+from lutris.util.mame.database import (
+    build_database,
+    ensure_database,
+    get_games,
+    get_machine,
+    get_supported_systems,
+    get_systems,
+    query_machines,
+)
+
+# Raise this to benchmark against bigger lists, e.g. LUTRIS_MAME_BENCHMARK_MACHINES=50000
+BENCHMARK_MACHINES = int(os.environ.get("LUTRIS_MAME_BENCHMARK_MACHINES", "20000"))
+
+SYSTEM = """
+  <machine name="{name}" sourcefile="{name}.cpp">
+    <description>{description}</description>
+    <year>1985</year>
+    <manufacturer>Commodore Business Machines</manufacturer>
+    <rom name="{name}.rom" size="8192" crc="e801dadc"/>
+    <device_ref name="software_list"/>
+    <input players="1" coins="0"/>
+    <driver status="good" emulation="good"/>
+    <device type="floppydisk" tag="flop"><instance name="floppydisk" briefname="flop"/><extension name="d64"/></device>
+  </machine>"""
+GAME = """
+  <machine name="{name}" sourcefile="{name}.cpp"{clone}>
+    <description>{description}</description>
+    <year>1981</year>
+    <manufacturer>Nintendo</manufacturer>
+    <rom name="{name}.bin" size="4096" crc="ba70b88b"/>
+    <input players="2" coins="1"/>
+    <driver status="{status}" emulation="good"/>
+  </machine>"""
+DEVICE = """
+  <machine name="{name}" sourcefile="{name}.cpp" isdevice="yes" runnable="no">
+    <description>{description}</description>
+  </machine>"""
+
+
+def make_machine(template, name, description=None, clone=None, status="good"):
+    return template.format(
+        name=name,
+        description=description or name.title(),
+        clone=' cloneof="{0}" romof="{0}"'.format(clone) if clone else "",
+        status=status,
+    )
+
+
+class MameDatabaseTestCase(TestCase):
+    def setUp(self):
+        self.tmp_dir = TemporaryDirectory()
+        self.addCleanup(self.tmp_dir.cleanup)
+        self.xml_path = os.path.join(self.tmp_dir.name, "mame.xml")
+        self.db_path = os.path.join(self.tmp_dir.name, "mame.db")
+
+    def write_xml(self, machines):
+        with open(self.xml_path, "w", encoding="utf-8") as xml_file:
+            xml_file.write('<?xml version="1.0"?>\n<mame build="0.261">')
+            xml_file.writelines(machines)
+            xml_file.write("\n</mame>\n")
+
+
+class TestMameDatabase(MameDatabaseTestCase):
+    def setUp(self):
+        super().setUp()
+        self.write_xml(
+            [
+                make_machine(SYSTEM, "c64", "Commodore 64"),
+                make_machine(SYSTEM, "vic20", "VIC-20"),
+                make_machine(GAME, "dkong", "Donkey Kong"),
+                make_machine(GAME, "dkongjp", "Donkey Kong (Japan)", clone="dkong", status="imperfect"),
+                make_machine(DEVICE, "z80"),
+            ]
+        )
+
+    def test_systems_and_games(self):
+        systems = get_supported_systems(self.xml_path, db_path=self.db_path)
+        assert list(systems) == ["c64", "vic20"]
+        assert systems["c64"]["manufacturer"] == "Commodore"
+        assert systems["c64"]["devices"][0]["extensions"] == ["d64"]
+        # Clones are left out
+        assert sorted(get_games(self.xml_path, db_path=self.db_path)) == ["c64", "dkong", "vic20"]
+
+    def test_lazy_queries(self):
+        assert get_systems(self.db_path) == []
+        assert get_machine("c64", self.db_path) is None
+        assert build_database(self.xml_path, self.db_path) == 5
+        assert [system["name"] for system in get_systems(self.db_path)] == ["c64", "vic20"]
+        assert get_systems(self.db_path)[0]["description"] == "Commodore 64"
+        assert get_machine("dkong", self.db_path)["driver"]["status"] == "good"
+        # Devices are indexed but their details aren't kept
+        assert get_machine("z80", self.db_path) is None
+        clones = query_machines("parent=?", ("dkong",), columns="name, driver_status", db_path=self.db_path)
+        assert clones == [{"name": "dkongjp", "driver_status": "imperfect"}]
+
+    def test_database_is_only_rebuilt_when_the_xml_changes(self):
+        assert ensure_database(self.xml_path, self.db_path)
+        with patch.object(database, "build_database") as build:
+            assert ensure_database(self.xml_path, self.db_path)
+            build.assert_not_called()
+            os.remove(self.xml_path)
+            assert ensure_database(self.xml_path, self.db_path)
+            build.assert_not_called()
+        self.write_xml([make_machine(SYSTEM, "amiga")])
+        assert ensure_database(self.xml_path, self.db_path)
+        assert [system["name"] for system in get_systems(self.db_path)] == ["amiga"]
+
+    def test_invalid_xml_keeps_the_previous_database(self):
+        build_database(self.xml_path, self.db_path)
+        with open(self.xml_path, "w", encoding="utf-8") as xml_file:
+            xml_file.write("<mame>" + make_machine(SYSTEM, "amiga") + "<machine name=")
+        with self.assertLogs(logger, "ERROR"):
+            assert not ensure_database(self.xml_path, self.db_path)
+        assert len(get_systems(self.db_path)) == 2
+
+
+class TestMameDatabaseBenchmark(MameDatabaseTestCase):
+    def test_build_big_database(self):
+        self.write_xml(
+            make_machine(SYSTEM if index % 50 == 0 else GAME, "machine%d" % index)
+            for index in range(BENCHMARK_MACHINES)
+        )
+        xml_size = os.path.getsize(self.xml_path)
+        tracemalloc.start()
+        start = time.monotonic()
+        try:
+            assert build_database(self.xml_path, self.db_path) == BENCHMARK_MACHINES
+            _current, peak = tracemalloc.get_traced_memory()
+        finally:
+            tracemalloc.stop()
+        logger.info(
+            "Read %d MAME machines (%.1f MB of XML) in %.2fs, peak memory %.1f MB",
+            BENCHMARK_MACHINES,
+            xml_size / 1e6,
+            time.monotonic() - start,
+            peak / 1e6,
+        )
+        # Memory doesn't grow with the number of machines
+        assert peak < 4 * 1024 * 1024
+        assert len(get_systems(self.db_path)) == BENCHMARK_MACHINES // 50
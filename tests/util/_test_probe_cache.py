@@ -0,0 +1,104 @@
+"""Tests for the persistent cache of system probes."""
+
+import os
+import threading
+import time
+from tempfile import TemporaryDirectory
+from unittest import TestCase
+from unittest.mock import Mock, patch
+
+from lutris.util import linux
+from lutris.util.probe_cache import ProbeCache, get_files_fingerprint
+
+
+class ProbeCacheTestCase(TestCase):
+    def setUp(self):
+        self.tmp_dir = TemporaryDirectory()
+        self.addCleanup(self.tmp_dir.cleanup)
+        self.cache_path = os.path.join(self.tmp_dir.name, "system-probes.json")
+        self.cache = ProbeCache(self.cache_path)
+
+
+class TestProbeCache(ProbeCacheTestCase):
+    def test_results_are_kept_until_the_fingerprint_changes(self):
+        probe = Mock(return_value=["libGL.so.1"])
+        assert self.cache.get("ldconfig", [1], probe) == ["libGL.so.1"]
+        assert ProbeCache(self.cache_path).get("ldconfig", (1,), probe) == ["libGL.so.1"]
+        assert probe.call_count == 1
+        probe.return_value = ["libvulkan.so.1"]
+        assert self.cache.get("ldconfig", [2], probe) == ["libvulkan.so.1"]
+        assert probe.call_count == 2
+
+    def test_failed_probes_are_not_saved(self):
+        probe = Mock(return_value="")
+        self.cache.get("wine", [1], probe)
+        self.cache.get("wine", [1], probe)
+        assert probe.call_count == 2
+        assert not os.path.exists(self.cache_path)
+
+        probe.side_effect = OSError("No such file")
+        with self.assertRaises(OSError):
+            self.cache.get("wine", [1], probe)
+
+    def test_invalid_file(self):
+        with open(self.cache_path, "w", encoding="utf-8") as cache_file:
+            cache_file.write("{not json")
+        assert self.cache.get("probe", [1], lambda: "result") == "result"
+        assert ProbeCache(self.cache_path).entries["probe"]["result"] == "result"
+
+    def test_probes_run_once_at_a_time(self):
+        calls = []
+
+        def probe():
+            calls.append(1)
+            time.sleep(0.05)
+            return "result"
+
+        threads = [threading.Thread(target=self.cache.get, args=("slow", [1], probe)) for _index in range(4)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        assert len(calls) == 1
+
+    def test_refresh_runs_stale_probes_in_parallel(self):
+        self.cache.get("fresh", [1], lambda: "fresh")
+        fresh_probe = Mock(return_value="fresh")
+        self.cache.register("fresh", lambda: [1], fresh_probe)
+        barrier = threading.Barrier(2, timeout=5)
+
+        def stale_probe():
+            barrier.wait()
+            return "stale"
+
+        get_stale = self.cache.register("stale", lambda: [1], stale_probe)
+        self.cache.register("other", lambda: [1], stale_probe)
+        assert sorted(self.cache.refresh()) == ["other", "stale"]
+        fresh_probe.assert_not_called()
+        assert get_stale() == "stale"
+        assert self.cache.refresh() == []
+
+    def test_files_fingerprint(self):
+        path = os.path.join(self.tmp_dir.name, "ld.so.cache")
+        missing = get_files_fingerprint([path])
+        with open(path, "w", encoding="utf-8") as ld_cache:
+            ld_cache.write("libs")
+        created = get_files_fingerprint([path])
+        assert created != missing
+        os.utime(path, ns=(0, 0))
+        assert get_files_fingerprint([path]) != created
+
+
+class TestLdconfigProbe(ProbeCacheTestCase):
+    def test_ldconfig_is_not_run_again(self):
+        output = "2 libs found in cache\n\tlibGL.so.1 (libc6,x86-64) => /usr/lib/libGL.so.1\n"
+        system = linux.LINUX_SYSTEM
+        with (
+            patch.object(linux, "PROBE_CACHE", self.cache),
+            patch.object(linux, "is_exherbo_with_cross_i686", return_value=False),
+            patch.object(linux.LinuxSystem, "get", return_value="/sbin/ldconfig"),
+            patch.object(linux.system, "read_process_output", return_value=output) as read_process_output,
+        ):
+            assert system.get_ldconfig_libs() == ["libGL.so.1 (libc6,x86-64) => /usr/lib/libGL.so.1"]
+            assert system.get_ldconfig_libs() == ["libGL.so.1 (libc6,x86-64) => /usr/lib/libGL.so.1"]
+        read_process_output.assert_called_once_with(["/sbin/ldconfig", "-p"])
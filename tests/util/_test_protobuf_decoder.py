@@ -0,0 +1,200 @@
+"""Tests for the protobuf decoder used by the Amazon and Battle.net services."""
+
+import os
+import struct
+import time
+from io import BytesIO
+from unittest import TestCase
+
+from lutris.util.amazon import protobuf_decoder
+from lutris.util.amazon.protobuf_decoder import Message, type_int64, type_sint32, type_uint32
+from lutris.util.amazon.sds_proto2 import HashAlgorithm, Manifest, ManifestHeader
+from lutris.util.battlenet.product_db import ProductDb
+from lutris.util.log import logger
+
+# Raise this to benchmark against bigger manifests, e.g. LUTRIS_PROTOBUF_BENCHMARK_FILES=200000
+BENCHMARK_FILES = int(os.environ.get("LUTRIS_PROTOBUF_BENCHMARK_FILES", "50000"))
+
+
+def varint(value):
+    if value < 0:
+        value += 1 << 64
+    chunks = bytearray()
+    while True:
+        byte = value & 127
+        value >>= 7
+        if value:
+            chunks.append(byte | 128)
+        else:
+            chunks.append(byte)
+            return bytes(chunks)
+
+
+def field(number, value):
+    """Encode a field: ints as varints, bytes and str as length delimited"""
+    if isinstance(value, int):
+        return varint(number << 3) + varint(value)
+    if isinstance(value, str):
+        value = value.encode("utf-8")
+    return varint(number << 3 | 2) + varint(len(value)) + value
+
+
+def make_file(index):
+    file_hash = field(1, HashAlgorithm.sha256) + field(2, struct.pack(">Q", index) * 4)
+    return (
+        field(1, "game\\data\\file%06d.pak" % index)
+        + field(2, 0o644)
+        + field(3, index * 1024)
+        + field(4, "2023-01-01T00:00:00Z")
+        + field(5, file_hash)
+    )
+
+
+def make_manifest(file_count):
+    files = b"".join(field(2, make_file(index)) for index in range(file_count))
+    package = field(1, "main") + files + field(3, field(1, "game\\data"))
+    return field(1, package)
+
+
+def legacy_decode(message, s):
+    """The BytesIO based decoding used before, kept to compare against"""
+    f = BytesIO(bytes(s))
+    while f.tell() < len(s):
+        field_number, _, data = Message.read_tag(f)
+        entry = None
+        for lookup_entry in message.__lookup__:
+            if lookup_entry[3] == field_number:
+                entry = lookup_entry
+                break
+        if not entry:
+            continue
+        field_multiplicity, field_type, field_name, _ = entry
+        if issubclass(field_type, protobuf_decoder.PrimativeType):
+            value = field_type.decode(data)
+        else:
+            value = field_type()
+            legacy_decode(value, data)
+        if field_multiplicity == "repeated":
+            if getattr(message, field_name) is None:
+                setattr(message, field_name, [])
+            getattr(message, field_name).append(value)
+        else:
+            setattr(message, field_name, value)
+
+
+def walk_manifest(manifest):
+    return [
+        (file.path.decode(), file.size, file.hash.algorithm, file.hash.value.hex())
+        for package in manifest.packages
+        for file in package.files
+    ]
+
+
+class Numbers(Message):
+    values = None
+    signed = None
+    count = None
+
+    def __init__(self):
+        self.__lookup__ = [
+            ("repeated", type_uint32, "values", 1),
+            ("optional", type_sint32, "signed", 2),
+            ("optional", type_int64, "count", 3),
+        ]
+
+
+class TestDecoder(TestCase):
+    def test_amazon_manifest(self):
+        manifest = Manifest()
+        manifest.decode(make_manifest(3))
+        package = manifest.packages[0]
+        assert package.name == b"main"
+        assert [file.path for file in package.files] == [b"game\\data\\file%06d.pak" % index for index in range(3)]
+        assert package.files[2].size == 2048
+        assert package.files[2].mode == 0o644
+        assert package.files[2].hash.value == struct.pack(">Q", 2) * 4
+        assert package.files[2].hidden is None
+        assert package.dirs[0].path == b"game\\data"
+
+    def test_matches_legacy_decoder(self):
+        data = make_manifest(50)
+        manifest = Manifest()
+        manifest.decode(data)
+        legacy_manifest = Manifest()
+        legacy_decode(legacy_manifest, data)
+        assert walk_manifest(manifest) == walk_manifest(legacy_manifest)
+
+    def test_nested_messages_are_decoded_on_access(self):
+        manifest = Manifest()
+        manifest.decode(make_manifest(3))
+        assert "packages" not in manifest.__dict__
+        package = manifest.packages[0]
+        assert "files" not in package.__dict__
+        assert manifest.__dict__["packages"] == [package]
+        assert ManifestHeader().compression is None
+
+    def test_memoryview_slices(self):
+        data = b"\xff\xff" + make_manifest(2)
+        manifest = Manifest()
+        manifest.decode(memoryview(data)[2:])
+        assert manifest.packages[0].files[1].size == 1024
+
+    def test_product_db(self):
+        state = field(1, field(1, 1) + field(2, 1) + field(7, "1.2.3"))
+        install = field(1, "wow") + field(2, "wow") + field(3, field(1, "C:\\Games\\WoW") + field(2, "EU"))
+        database = ProductDb()
+        database.decode(field(1, install + field(4, state)) + field(1, field(2, "agent")))
+        first, second = database.product_installs
+        assert first.product_code == "wow"
+        assert first.settings.install_path == "C:\\Games\\WoW"
+        assert first.cached_product_state.base_product_state.current_version_str == "1.2.3"
+        assert first.cached_product_state.base_product_state.installed is True
+        assert second.product_code == "agent" and second.settings is None
+
+    def test_scalars_packed_and_unknown_fields(self):
+        packed = varint(1 << 3 | 2) + varint(3) + varint(1) + varint(2) + varint(3)
+        unknown = field(9, "skipped") + varint(10 << 3 | 5) + b"\x00" * 4 + varint(11 << 3 | 1) + b"\x00" * 8
+        numbers = Numbers()
+        numbers.decode(field(1, 7) + packed + unknown + field(2, 3) + field(3, -2))
+        assert numbers.values == [7, 1, 2, 3]
+        assert numbers.signed == -2
+        assert numbers.count == -2
+
+    def test_truncated_message(self):
+        with self.assertRaises((ValueError, IndexError)):
+            Manifest().decode(make_manifest(2)[:-5])
+
+    def test_lookup_id(self):
+        assert Numbers().lookup_id(2) == ("optional", type_sint32, "signed", 2)
+        assert Numbers().lookup_id(4) is None
+
+
+class TestDecoderBenchmark(TestCase):
+    """Compare the decoder with the previous one on a big Amazon manifest. The
+    timings are logged rather than asserted."""
+
+    def test_benchmark(self):
+        data = make_manifest(BENCHMARK_FILES)
+        timings = {}
+
+        start = time.perf_counter()
+        legacy_manifest = Manifest()
+        legacy_decode(legacy_manifest, data)
+        legacy_files = walk_manifest(legacy_manifest)
+        timings["legacy decoder"] = time.perf_counter() - start
+        del legacy_manifest
+
+        start = time.perf_counter()
+        manifest = Manifest()
+        manifest.decode(data)
+        timings["decode"] = time.perf_counter() - start
+        files = walk_manifest(manifest)
+        timings["decode and read all files"] = time.perf_counter() - start
+
+        assert files == legacy_files
+        logger.info(
+            "Decoding a %d KB manifest of %d files: %s",
+            len(data) // 1024,
+            BENCHMARK_FILES,
+            ", ".join("%s %.3fs" % (name, timing) for name, timing in timings.items()),
+        )
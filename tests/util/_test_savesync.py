@@ -0,0 +1,166 @@
+"""Tests for the sync of game saves, against a local stand-in of a WebDAV host."""
+
+import os
+import shutil
+import threading
+from tempfile import TemporaryDirectory
+from unittest import TestCase
+from unittest.mock import Mock, patch
+
+from lutris import settings
+from lutris.util import hash_cache, savesync
+from lutris.util.hash_cache import FileHashCache
+from lutris.util.log import logger
+from lutris.util.savesync import download_save, upload_save
+
+
+class LocalWebdavClient:
+    """Stand-in for the webdav4 client, storing the files in a local folder"""
+
+    def __init__(self, root):
+        self.root = root
+        self.uploaded = []
+        self.downloaded = []
+        self.lock = threading.Lock()
+
+    def get_path(self, path):
+        return os.path.join(self.root, path.lstrip("/"))
+
+    def exists(self, path):
+        return os.path.exists(self.get_path(path))
+
+    def mkdir(self, path):
+        os.mkdir(self.get_path(path))
+
+    def ls(self, path):
+        return [
+            {"name": os.path.join(path, name), "type": "directory" if entry.is_dir() else "file"}
+            for name, entry in ((entry.name, entry) for entry in os.scandir(self.get_path(path)))
+        ]
+
+    def upload_file(self, from_path, to_path, overwrite=False):
+        if self.exists(to_path) and not overwrite:
+            raise FileExistsError(to_path)
+        shutil.copyfile(from_path, self.get_path(to_path))
+        with self.lock:
+            self.uploaded.append(to_path)
+
+    def download_file(self, from_path, to_path):
+        shutil.copyfile(self.get_path(from_path), to_path)
+        with self.lock:
+            self.downloaded.append(from_path)
+
+
+class TestSaveSync(TestCase):
+    def setUp(self):
+        self.tmp_dir = TemporaryDirectory()
+        self.addCleanup(self.tmp_dir.cleanup)
+        os.makedirs(os.path.join(self.tmp_dir.name, "remote"))
+        self.client = LocalWebdavClient(os.path.join(self.tmp_dir.name, "remote"))
+        self.game_dir = os.path.join(self.tmp_dir.name, "doom")
+        for patcher in (
+            patch.object(savesync, "DIR_CREATE_CACHE", []),
+            patch.object(hash_cache, "FILE_HASH_CACHE", FileHashCache(os.path.join(self.tmp_dir.name, "hashes.db"))),
+            patch.object(settings, "read_setting", return_value="saves"),
+        ):
+            patcher.start()
+            self.addCleanup(patcher.stop)
+
+    def make_game(self, game_dir):
+        game = Mock(slug="doom", directory=game_dir, runner_name="linux")
+        game.config.game_level = {"game": {"save_config": {"basedir": game_dir, "saves": "saves"}}}
+        game.config.game_config = {"exe": os.path.join(game_dir, "doom")}
+        return game
+
+    def write_save(self, name, content, game_dir=None, mtime=None):
+        path = os.path.join(game_dir or self.game_dir, "saves", name)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        with open(path, "w", encoding="utf-8") as save_file:
+            save_file.write(content)
+        if mtime:
+            os.utime(path, (mtime, mtime))
+        return path
+
+    def read_save(self, name, game_dir):
+        with open(os.path.join(game_dir, "saves", name), encoding="utf-8") as save_file:
+            return save_file.read()
+
+    def get_uploaded_objects(self):
+        return sorted(path for path in self.client.uploaded if "/objects/" in path)
+
+    def test_only_changed_files_are_uploaded(self):
+        game = self.make_game(self.game_dir)
+        self.write_save("slot1.sav", "level 1", mtime=1000)
+        self.write_save("slot2.sav", "level 2", mtime=1000)
+        self.write_save("profiles/player.cfg", "name", mtime=1000)
+        assert upload_save(game, client=self.client) == 3
+        assert upload_save(game, client=self.client) == 0
+
+        self.client.uploaded.clear()
+        self.write_save("slot1.sav", "level 3", mtime=2000)
+        # Same content as a file already uploaded
+        self.write_save("slot3.sav", "level 2", mtime=2000)
+        assert upload_save(game, client=self.client) == 1
+        assert len(self.get_uploaded_objects()) == 1
+        entries = {os.path.basename(entry["name"]).rsplit("-", 1)[-1] for entry in self.client.ls("saves/doom")}
+        assert entries == {"1000", "2000", "latest.json", "objects"}
+
+    def test_restore(self):
+        self.write_save("slot1.sav", "level 1", mtime=1000)
+        self.write_save("profiles/player.cfg", "name", mtime=1000)
+        upload_save(self.make_game(self.game_dir), client=self.client)
+
+        other_dir = os.path.join(self.tmp_dir.name, "other")
+        self.write_save("profiles/player.cfg", "name", game_dir=other_dir)
+        self.write_save("slot1.sav", "level 0", game_dir=other_dir)
+        other_game = self.make_game(other_dir)
+        assert download_save(other_game, client=self.client) == 1
+        assert self.read_save("slot1.sav", other_dir) == "level 1"
+        assert os.stat(os.path.join(other_dir, "saves/slot1.sav")).st_mtime == 1000
+        assert download_save(other_game, client=self.client) == 0
+        assert upload_save(other_game, client=self.client) == 0
+
+    def test_corrupted_download_is_not_restored(self):
+        self.write_save("slot1.sav", "level 1", mtime=1000)
+        self.write_save("slot2.sav", "level 2", mtime=1000)
+        upload_save(self.make_game(self.game_dir), client=self.client)
+        manifest = savesync.read_remote_json(self.client, "saves/doom/latest.json")["files"]
+        object_path = savesync.get_object_path("saves/doom", manifest["saves/slot1.sav"]["sha256"])
+        with open(self.client.get_path(object_path), "w", encoding="utf-8") as object_file:
+            object_file.write("lev")
+
+        other_dir = os.path.join(self.tmp_dir.name, "other")
+        self.write_save("slot1.sav", "level 0", game_dir=other_dir)
+        other_game = self.make_game(other_dir)
+        with self.assertLogs(logger, "ERROR"):
+            assert download_save(other_game, client=self.client) is None
+        assert self.read_save("slot1.sav", other_dir) == "level 0"
+        assert sorted(os.listdir(os.path.join(other_dir, "saves"))) == ["slot1.sav", "slot2.sav"]
+        # The local file is still known to differ, so it's downloaded again once fixed
+        shutil.copyfile(os.path.join(self.game_dir, "saves/slot1.sav"), self.client.get_path(object_path))
+        assert download_save(other_game, client=self.client) == 1
+        assert self.read_save("slot1.sav", other_dir) == "level 1"
+
+    def test_restore_older_snapshot(self):
+        game = self.make_game(self.game_dir)
+        self.write_save("slot1.sav", "level 1", mtime=1000)
+        upload_save(game, client=self.client)
+        first_save = savesync.read_remote_json(self.client, "saves/doom/latest.json")["save_id"]
+        self.write_save("slot1.sav", "level 2", mtime=2000)
+        upload_save(game, client=self.client)
+
+        assert download_save(game, save_id=first_save, client=self.client) == 1
+        assert self.read_save("slot1.sav", self.game_dir) == "level 1"
+
+    def test_parallel_uploads(self):
+        game = self.make_game(self.game_dir)
+        for index in range(20):
+            self.write_save("slot%s.sav" % index, "level %s" % index, mtime=1000)
+        assert upload_save(game, client=self.client) == 20
+        assert len(self.get_uploaded_objects()) == 20
+
+    def test_paths_outside_the_save_folder(self):
+        with self.assertRaises(ValueError):
+            savesync.get_local_save_path(self.game_dir, "../escape")
+        with self.assertRaises(ValueError):
+            savesync.get_local_save_path(self.game_dir, "/etc/passwd")
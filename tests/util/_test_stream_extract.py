@@ -0,0 +1,216 @@
+"""Tests for extracting tar archives while they download."""
+
+import hashlib
+import io
+import os
+import tarfile
+from pathlib import Path
+from tempfile import TemporaryDirectory
+from unittest import TestCase
+from unittest.mock import MagicMock, patch
+
+from lutris.util.downloader import SimpleDownloader
+from lutris.util.extract import StreamingExtractor, is_streamable, merge_staged_extraction
+
+
+def make_tar(mode="w:gz", files=None):
+    """Return the bytes of a tar archive holding `files` (a name -> content mapping)."""
+    files = files or {"game/data/level1.dat": os.urandom(200000), "game/run.sh": b"#!/bin/sh\n"}
+    buffer = io.BytesIO()
+    with tarfile.open(fileobj=buffer, mode=mode) as archive:
+        for name, content in files.items():
+            info = tarfile.TarInfo(name)
+            info.size = len(content)
+            archive.addfile(info, io.BytesIO(content))
+    return buffer.getvalue()
+
+
+def feed_in_chunks(extractor, data, chunk_size=4096):
+    for offset in range(0, len(data), chunk_size):
+        extractor.feed(data[offset : offset + chunk_size])
+
+
+class TestIsStreamable(TestCase):
+    def test_tar_archives_are_streamable(self):
+        for name in ("game.tar", "game.tar.gz", "game.tgz", "game.tar.xz", "game.tar.bz2"):
+            assert is_streamable(name), name
+
+    def test_random_access_archives_are_not_streamable(self):
+        for name in ("game.zip", "setup.exe", "game.7z", "game.deb"):
+            assert not is_streamable(name), name
+
+    def test_explicit_extractor(self):
+        assert is_streamable("archive.bin", "txz")
+        assert not is_streamable("archive.tar.gz", "zip")
+
+
+class TestStreamingExtractor(TestCase):
+    def setUp(self):
+        self.tmp_dir = TemporaryDirectory()
+        self.tmp_path = Path(self.tmp_dir.name)
+        self.staging_path = str(self.tmp_path / "staging")
+
+    def tearDown(self):
+        self.tmp_dir.cleanup()
+
+    def test_rejects_unstreamable_extractor(self):
+        with self.assertRaises(ValueError):
+            StreamingExtractor("zip", self.staging_path)
+
+    def test_extracts_fed_chunks(self):
+        for extractor, mode in (("tar", "w"), ("tgz", "w:gz"), ("txz", "w:xz"), ("tbz2", "w:bz2")):
+            with self.subTest(extractor):
+                streaming = StreamingExtractor(extractor, self.staging_path)
+                streaming.start()
+                feed_in_chunks(streaming, make_tar(mode))
+                assert streaming.finish()
+                with open(os.path.join(self.staging_path, "game", "run.sh"), "rb") as script:
+                    assert script.read() == b"#!/bin/sh\n"
+                assert os.path.getsize(os.path.join(self.staging_path, "game", "data", "level1.dat")) == 200000
+                streaming.abort()
+
+    def test_computes_digest_of_fed_bytes(self):
+        data = make_tar()
+        streaming = StreamingExtractor.for_archive("game.tar.gz", self.staging_path, hash_type="md5")
+        streaming.start()
+        feed_in_chunks(streaming, data)
+        streaming.finish()
+        assert streaming.digest == hashlib.md5(data).hexdigest()
+
+    def test_corrupt_archive_fails_without_raising(self):
+        data = make_tar()
+        streaming = StreamingExtractor("tgz", self.staging_path, hash_type="sha256")
+        streaming.start()
+        feed_in_chunks(streaming, data[:100] + b"\x00" * 5000 + data[5100:])
+        assert not streaming.finish()
+        assert streaming.error is not None
+        assert not streaming.completed
+        # The digest is still available, the caller decides what to do with it
+        assert streaming.digest is not None
+
+    def test_truncated_archive_fails(self):
+        streaming = StreamingExtractor("tgz", self.staging_path)
+        streaming.start()
+        data = make_tar()
+        feed_in_chunks(streaming, data[: len(data) // 2])
+        assert not streaming.finish()
+
+    def test_abort_deletes_staging_folder(self):
+        streaming = StreamingExtractor("tgz", self.staging_path)
+        streaming.start()
+        feed_in_chunks(streaming, make_tar()[:50000])
+        streaming.abort()
+        assert not os.path.exists(self.staging_path)
+        assert not streaming.completed
+
+    def test_restart_discards_previous_attempt(self):
+        streaming = StreamingExtractor("tgz", self.staging_path)
+        streaming.start()
+        feed_in_chunks(streaming, make_tar(files={"old.txt": b"old"})[:200])
+        streaming.start()
+        feed_in_chunks(streaming, make_tar(files={"new.txt": b"new"}))
+        assert streaming.finish()
+        assert os.listdir(self.staging_path) == ["new.txt"]
+
+    def test_feed_does_not_block_after_failure(self):
+        streaming = StreamingExtractor("tgz", self.staging_path)
+        streaming.QUEUE_SIZE = 2
+        streaming.start()
+        feed_in_chunks(streaming, b"not a tar archive" * 100000, chunk_size=1024)
+        assert not streaming.finish()
+
+
+class TestMergeStagedExtraction(TestCase):
+    def setUp(self):
+        self.tmp_dir = TemporaryDirectory()
+        self.tmp_path = Path(self.tmp_dir.name)
+        self.staging_path = str(self.tmp_path / ".game-file1.extract")
+        self.game_path = str(self.tmp_path / "game")
+
+    def tearDown(self):
+        self.tmp_dir.cleanup()
+
+    def stage(self, files=None):
+        streaming = StreamingExtractor("tgz", self.staging_path)
+        streaming.start()
+        feed_in_chunks(streaming, make_tar(files=files))
+        assert streaming.finish()
+
+    def test_merges_single_top_level_folder(self):
+        self.stage()
+        merge_staged_extraction(self.staging_path, self.game_path)
+        assert os.path.isfile(os.path.join(self.game_path, "run.sh"))
+        assert os.path.isfile(os.path.join(self.game_path, "data", "level1.dat"))
+        assert not os.path.exists(self.staging_path)
+
+    def test_keeps_structure_without_merge_single(self):
+        self.stage()
+        merge_staged_extraction(self.staging_path, self.game_path, merge_single=False)
+        assert os.path.isfile(os.path.join(self.game_path, "game", "run.sh"))
+
+    def test_merges_into_existing_folder(self):
+        os.makedirs(os.path.join(self.game_path, "data"))
+        with open(os.path.join(self.game_path, "data", "save.dat"), "w") as save_file:
+            save_file.write("save")
+        self.stage()
+        merge_staged_extraction(self.staging_path, self.game_path)
+        assert os.path.isfile(os.path.join(self.game_path, "data", "save.dat"))
+        assert os.path.isfile(os.path.join(self.game_path, "data", "level1.dat"))
+
+
+class TestSimpleDownloaderStreaming(TestCase):
+    def setUp(self):
+        self.tmp_dir = TemporaryDirectory()
+        self.tmp_path = Path(self.tmp_dir.name)
+        self.dest = str(self.tmp_path / "game.tar.gz.tmp")
+        self.staging_path = str(self.tmp_path / "staging")
+        self.data = make_tar()
+
+    def tearDown(self):
+        self.tmp_dir.cleanup()
+
+    def mock_response(self):
+        response = MagicMock()
+        response.status_code = 200
+        response.headers = {"Content-Length": str(len(self.data))}
+        response.iter_content.return_value = [
+            self.data[offset : offset + 8192] for offset in range(0, len(self.data), 8192)
+        ]
+        return response
+
+    @patch("lutris.util.downloader.requests.get")
+    def test_download_feeds_extractor(self, mock_get):
+        mock_get.return_value = self.mock_response()
+        streaming = StreamingExtractor("tgz", self.staging_path, hash_type="md5")
+        downloader = SimpleDownloader("https://example.com/game.tar.gz", self.dest, stream_extractor=streaming)
+        downloader._prepare_destination()
+        downloader.async_download()
+
+        assert downloader.state == downloader.COMPLETED
+        assert streaming.completed
+        assert streaming.digest == hashlib.md5(self.data).hexdigest()
+        assert os.path.isfile(os.path.join(self.staging_path, "game", "run.sh"))
+        # The archive itself is still kept
+        with open(self.dest, "rb") as archive:
+            assert archive.read() == self.data
+
+    @patch("lutris.util.downloader.requests.get")
+    def test_failed_extraction_does_not_fail_download(self, mock_get):
+        self.data = b"garbage" * 10000
+        mock_get.return_value = self.mock_response()
+        streaming = StreamingExtractor("tgz", self.staging_path)
+        downloader = SimpleDownloader("https://example.com/game.tar.gz", self.dest, stream_extractor=streaming)
+        downloader._prepare_destination()
+        downloader.async_download()
+
+        assert downloader.state == downloader.COMPLETED
+        assert not streaming.completed
+        assert not os.path.exists(self.staging_path)
+
+    def test_cancel_discards_extraction(self):
+        streaming = StreamingExtractor("tgz", self.staging_path)
+        downloader = SimpleDownloader("https://example.com/game.tar.gz", self.dest, stream_extractor=streaming)
+        downloader._prepare_destination()
+        streaming.feed(self.data[:20000])
+        downloader.cancel()
+        assert not os.path.exists(self.staging_path)
@@ -0,0 +1,188 @@
+"""Tests for the VDF text parser."""
+
+import io
+import os
+import time
+from unittest import TestCase
+
+from lutris.util.log import logger
+from lutris.util.steam import vdf, vdfutils
+
+# Raise this to benchmark against bigger files, e.g. LUTRIS_VDF_BENCHMARK_APPS=100000
+BENCHMARK_APPS = int(os.environ.get("LUTRIS_VDF_BENCHMARK_APPS", "5000"))
+
+
+def make_localconfig(app_count):
+    """Return a localconfig.vdf like document with app_count apps"""
+    lines = ['"UserLocalConfigStore"', "{", '\t"friends"', "\t{"]
+    for index in range(app_count // 4):
+        lines += ['\t\t"%d"' % (76561197960265728 + index), "\t\t{", '\t\t\t"name"\t\t"Friend %d"' % index, "\t\t}"]
+    lines += [
+        "\t}",
+        '\t"Software"',
+        "\t{",
+        '\t\t"Valve"',
+        "\t\t{",
+        '\t\t\t"Steam"',
+        "\t\t\t{",
+        '\t\t\t\t"apps"',
+        "\t\t\t\t{",
+    ]
+    for appid in range(app_count):
+        lines += [
+            '\t\t\t\t\t"%d"' % appid,
+            "\t\t\t\t\t{",
+            '\t\t\t\t\t\t"LastPlayed"\t\t"%d"' % (1600000000 + appid),
+            '\t\t\t\t\t\t"Playtime"\t\t"%d"' % (appid * 7),
+            '\t\t\t\t\t\t"LaunchOptions"\t\t"%%command%% -novid -width %d"' % appid,
+            '\t\t\t\t\t\t"cloud"',
+            "\t\t\t\t\t\t{",
+            '\t\t\t\t\t\t\t"last_sync_state"\t\t"synchronized"',
+            "\t\t\t\t\t\t}",
+            "\t\t\t\t\t}",
+        ]
+    lines += ["\t\t\t\t}", "\t\t\t}", "\t\t}", "\t}", "}"]
+    return "\n".join(lines) + "\n"
+
+
+def legacy_vdf_parse(steam_config_file, config):
+    """The line based parser vdfutils used before, kept to compare against"""
+    line = " "
+    while line:
+        line = steam_config_file.readline()
+        if not line or line.strip() == "}":
+            return config
+        while not line.strip().endswith('"'):
+            nextline = steam_config_file.readline()
+            if not nextline:
+                break
+            line = line[:-1] + nextline
+        line = line.replace('\\"', "\x00")
+        line_elements = [elem.replace("\x00", '"') for elem in line.strip().split('"')]
+        if len(line_elements) == 3:
+            key = line_elements[1]
+            steam_config_file.readline()  # skip '{'
+            config[key] = legacy_vdf_parse(steam_config_file, {})
+        else:
+            config[line_elements[1]] = line_elements[3]
+    return config
+
+
+class TestParse(TestCase):
+    def test_nested_blocks(self):
+        text = '"AppState"\n{\n\t"appid"\t\t"10"\n\t"UserConfig"\n\t{\n\t\t"language"\t\t"english"\n\t}\n}\n'
+        assert vdf.loads(text) == {"AppState": {"appid": "10", "UserConfig": {"language": "english"}}}
+
+    def test_compact_and_unquoted(self):
+        text = '"root" { key value "other" { "a" "b" } empty "" }'
+        assert vdf.loads(text) == {"root": {"key": "value", "other": {"a": "b"}, "empty": ""}}
+
+    def test_comments_and_conditionals(self):
+        text = '// A comment\n"root"\n{\n\t"key" "value" [$WIN32]\n\t// "ignored" "value"\n}\n'
+        assert vdf.loads(text) == {"root": {"key": "value"}}
+
+    def test_escapes(self):
+        text = r'"root" { "path" "C:\\Games\\Steam" "quoted" "say \"hi\"" }'
+        assert vdf.loads(text) == {"root": {"path": "C:\\Games\\Steam", "quoted": 'say "hi"'}}
+        assert vdf.loads(text, escaped=False)["root"]["path"] == "C:\\\\Games\\\\Steam"
+
+    def test_multi_line_values(self):
+        assert vdf.loads('"root" { "text" "line 1\nline 2" }') == {"root": {"text": "line 1\nline 2"}}
+
+    def test_merge_duplicate_keys(self):
+        text = '"root" { "a" { "x" "1" } "a" { "y" "2" } }'
+        assert vdf.loads(text) == {"root": {"a": {"x": "1", "y": "2"}}}
+        assert vdf.loads(text, merge_duplicate_keys=False) == {"root": {"a": {"y": "2"}}}
+
+    def test_byte_order_mark(self):
+        assert vdf.loads('\ufeff"root" { "a" "b" }') == {"root": {"a": "b"}}
+
+    def test_syntax_errors(self):
+        for text in ('"root" { "a" "b"', '"root" { "a "b" }', '"root" { "a" "b" } }', '{ "a" "b" }', '"a" }'):
+            with self.subTest(text), self.assertRaises(SyntaxError):
+                vdf.loads(text)
+
+    def test_parse_file(self):
+        assert vdf.parse(io.StringIO('"root" { "a" "b" }')) == {"root": {"a": "b"}}
+
+
+class TestSelectivePaths(TestCase):
+    text = make_localconfig(8)
+
+    def test_only_requested_subtree(self):
+        config = vdf.loads(self.text, paths=["UserLocalConfigStore/Software/Valve/Steam/apps"])
+        assert list(config["UserLocalConfigStore"]) == ["Software"]
+        assert list(config["UserLocalConfigStore"]["Software"]["Valve"]["Steam"]) == ["apps"]
+        apps = config["UserLocalConfigStore"]["Software"]["Valve"]["Steam"]["apps"]
+        assert apps == vdf.loads(self.text)["UserLocalConfigStore"]["Software"]["Valve"]["Steam"]["apps"]
+
+    def test_case_insensitive(self):
+        config = vdf.loads(self.text, paths=["userlocalconfigstore/software/valve/steam/apps/3"])
+        assert config["UserLocalConfigStore"]["Software"]["Valve"]["Steam"]["apps"] == {
+            "3": {
+                "LastPlayed": "1600000003",
+                "Playtime": "21",
+                "LaunchOptions": "%command% -novid -width 3",
+                "cloud": {"last_sync_state": "synchronized"},
+            }
+        }
+
+    def test_values_and_several_paths(self):
+        config = vdf.loads(
+            self.text,
+            paths=["UserLocalConfigStore/friends/76561197960265728/name", "UserLocalConfigStore/Software/Valve/x"],
+        )
+        assert config == {
+            "UserLocalConfigStore": {"friends": {"76561197960265728": {"name": "Friend 0"}}, "Software": {"Valve": {}}}
+        }
+
+    def test_missing_path(self):
+        assert vdf.loads(self.text, paths=["Nothing/Here"]) == {}
+
+    def test_brackets_in_skipped_strings_and_comments(self):
+        text = '"root" { "skipped" { "a" "}" // }\n "b" { "c" "{" } } "other" { "x" "y" } }'
+        assert vdf.loads(text, paths=["root/other"]) == {"root": {"other": {"x": "y"}}}
+
+    def test_unclosed_skipped_block(self):
+        with self.assertRaises(SyntaxError):
+            vdf.loads('"root" { "skipped" { "a" "b" }', paths=["root/other"])
+
+
+class TestVdfUtils(TestCase):
+    def test_matches_legacy_parser(self):
+        text = make_localconfig(20)
+        assert vdfutils.vdf_parse(io.StringIO(text), {}) == legacy_vdf_parse(io.StringIO(text), {})
+
+    def test_malformed_file_returns_config(self):
+        assert vdfutils.vdf_parse(io.StringIO('"root" { "a"'), {"default": "1"}) == {"default": "1"}
+
+    def test_round_trip(self):
+        data = {"AppState": {"appid": "10", "UserConfig": {"name": "Game"}}}
+        assert vdfutils.vdf_parse(io.StringIO(vdfutils.to_vdf(data)), {}) == data
+
+
+class TestParserBenchmark(TestCase):
+    """Compare the tokenizer, the previous parsers and the selective mode on a big
+    localconfig.vdf. The timings are logged rather than asserted."""
+
+    def test_benchmark(self):
+        text = make_localconfig(BENCHMARK_APPS)
+        timings = {}
+
+        def measure(name, func):
+            start = time.perf_counter()
+            result = func()
+            timings[name] = time.perf_counter() - start
+            return result
+
+        legacy = measure("legacy line parser", lambda: legacy_vdf_parse(io.StringIO(text), {}))
+        tokenized = measure("tokenizer", lambda: vdf.loads(text))
+        measure(
+            "tokenizer, apps only", lambda: vdf.loads(text, paths=["UserLocalConfigStore/Software/Valve/Steam/apps"])
+        )
+        assert tokenized == legacy
+        logger.info(
+            "Parsing %d KB of VDF: %s",
+            len(text) // 1024,
+            ", ".join("%s %.3fs" % (name, timing) for name, timing in timings.items()),
+        )